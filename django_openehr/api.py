@@ -0,0 +1,204 @@
+"""
+A read-only JSON API over the archetype models and a few others (see
+API_MODELS), served by views.api_list and views.api_detail:
+
+    GET api/<model>/                 list, e.g. api/symptomsign/
+    GET api/<model>/<pk>/            detail
+
+Archetype models are written as canonical openEHR JSON (see serializers)
+with their "id" added; the other models as flat objects.
+
+Lists are paged by keyset rather than OFFSET: a page is the rows after the
+(ordering field, id) of the last row of the page before, so every page costs
+the same index range scan however deep it is. ?ordering= and filters are
+only accepted on indexed fields, for the same reason. The `next` link
+carries a signed, opaque cursor which is only valid with the ordering and
+filters it was issued for.
+"""
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+from django_openehr import archetypes
+from django_openehr.models import ArchetypeVersion, Identifier, PatientSummary
+from django_openehr.serializers import get_serializer
+from django_openehr.utils import to_json
+
+PAGE_SIZE = getattr(settings, 'OPENEHR_API_PAGE_SIZE', 50)
+MAX_PAGE_SIZE = getattr(settings, 'OPENEHR_API_MAX_PAGE_SIZE', 500)
+
+# lookups accepted on indexed fields, e.g. ?date_of_birth__gte=1970-01-01
+FILTER_LOOKUPS = ('exact', 'gt', 'gte', 'lt', 'lte')
+
+CURSOR_SALT = 'django_openehr.api.cursor'
+
+# URL name -> model: the archetype models, plus the record's identifiers,
+# its version history and the patient summaries; the bookkeeping tables
+# (audit log, rollups, search documents, deduplication runs, ...) stay out
+API_MODELS = {
+    model._meta.model_name: model
+    for model in archetypes.archetype_models() + [Identifier, ArchetypeVersion, PatientSummary]
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def indexed_fields(model):
+    """
+    The names of the fields an index can serve a filter or ordering on: the
+    primary key, indexed, unique and foreign key fields, and the leading
+    field of every multi-column index.
+    """
+    opts = model._meta
+    names = {opts.pk.name}
+    for field in opts.concrete_fields:
+        if field.db_index or field.unique:
+            names.add(field.name)
+    for together in tuple(opts.index_together) + tuple(opts.unique_together):
+        names.add(together[0])
+    for index in opts.indexes:
+        names.add(index.fields[0].lstrip('-'))
+    return names
+
+
+def flat_object(instance):
+    data = {}
+    for field in instance._meta.concrete_fields:
+        data[field.attname] = to_json(getattr(instance, field.attname))
+    return data
+
+
+def represent(instance):
+    serializer = get_serializer(type(instance))
+    if serializer is None:
+        return flat_object(instance)
+    data = serializer.to_canonical(instance)
+    data['id'] = instance.pk
+    return data
+
+
+def get_model(model_name, user):
+    model = API_MODELS.get(model_name)
+    if model is None:
+        raise Http404("No model called {0}".format(model_name))
+    if not user.has_perm('{0}.view_{1}'.format(model._meta.app_label, model_name)):
+        raise PermissionDenied
+    return model
+
+
+def base_queryset(model):
+    queryset = model._default_manager.all()
+    serializer = get_serializer(model)
+    if serializer is not None:
+        queryset = queryset.prefetch_related(*serializer.prefetch_paths())
+    return queryset
+
+
+def parse_ordering(model, value):
+    """
+    ?ordering=-date_of_admission -> ('date_of_admission', True)
+    """
+    descending = value.startswith('-')
+    name = value.lstrip('-')
+    if name in ('', 'pk'):
+        name = model._meta.pk.name
+    if name not in indexed_fields(model):
+        raise BadRequest("Cannot order by {0}: it is not indexed".format(name))
+    field = model._meta.get_field(name)
+    if field.null:
+        # NULLs have no place in a keyset comparison
+        raise BadRequest("Cannot order by {0}: it may be null".format(name))
+    return field, descending
+
+
+def parse_filters(model, params):
+    filters = {}
+    indexed = indexed_fields(model)
+    for key, value in params.items():
+        if key in ('ordering', 'limit', 'cursor'):
+            continue
+        name, _, lookup = key.partition('__')
+        lookup = lookup or 'exact'
+        if name not in indexed or lookup not in FILTER_LOOKUPS:
+            raise BadRequest("Cannot filter on {0}: only indexed fields can be filtered".format(key))
+        field = model._meta.get_field(name)
+        try:
+            filters['{0}__{1}'.format(field.attname, lookup)] = field.to_python(value)
+        except ValidationError as e:
+            raise BadRequest("{0}: {1}".format(key, '; '.join(e.messages)))
+    return filters
+
+
+def keyset(field, descending, value, pk):
+    """
+    The rows after (value, pk) in (field, pk) order, as
+    field >= value AND (field > value OR pk > pk): the first term alone
+    bounds a range scan of the field's index, which an OR of the two cases
+    cannot.
+    """
+    after = 'lt' if descending else 'gt'
+    if field.primary_key:
+        return Q(**{'pk__' + after: pk})
+    return Q(**{'{0}__{1}e'.format(field.attname, after): value}) & (
+        Q(**{'{0}__{1}'.format(field.attname, after): value})
+        | Q(**{'pk__' + after: pk})
+    )
+
+
+def encode_cursor(field, descending, filters, instance):
+    return signing.dumps({
+        'o': [field.name, descending],
+        'f': sorted((k, to_json(v)) for k, v in filters.items()),
+        'v': to_json(getattr(instance, field.attname)),
+        'pk': instance.pk,
+    }, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, field, descending, filters):
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise BadRequest("Invalid cursor")
+    if (data['o'] != [field.name, descending]
+            or data['f'] != [list(f) for f in sorted((k, to_json(v)) for k, v in filters.items())]):
+        raise BadRequest("The cursor belongs to a different ordering or filter")
+    return field.to_python(data['v']), data['pk']
+
+
+def list_page(model, params):
+    """
+    The page of `model` selected by the query string `params`, and the
+    cursor of the next page (None on the last page).
+    """
+    field, descending = parse_ordering(model, params.get('ordering', 'pk'))
+    filters = parse_filters(model, params)
+    try:
+        limit = max(1, min(int(params.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest("limit must be a number")
+    queryset = base_queryset(model).filter(**filters)
+    if 'cursor' in params:
+        value, pk = decode_cursor(params['cursor'], field, descending, filters)
+        queryset = queryset.filter(keyset(field, descending, value, pk))
+
+    prefix = '-' if descending else ''
+    order = [prefix + field.attname]
+    if not field.primary_key:
+        order.append(prefix + 'pk')
+    # one row more than the page, to know whether there is a next page
+    page = list(queryset.order_by(*order)[:limit + 1])
+    if len(page) <= limit:
+        return page, None
+    page = page[:limit]
+    return page, encode_cursor(field, descending, filters, page[-1])
+
+
+def get_instance(model, pk):
+    instance = base_queryset(model).filter(pk=pk).first()
+    if instance is None:
+        raise Http404("No {0} with id {1}".format(model._meta.model_name, pk))
+    return instance
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class DjangoOpenehrConfig(AppConfig):
+    name = 'django_openehr'
+
+    def ready(self):
+        # connect the signal receivers
+        from django_openehr import graph, identifiers, search, summaries, versioning  # noqa: F401
+        from django_openehr import audit, documents, rollups  # noqa: F401
+        # build the template form classes once, up front
+        from django_openehr.template_forms import compile_templates
+        compile_templates()
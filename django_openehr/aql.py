@@ -0,0 +1,557 @@
+"""
+A compiler for a practical subset of the Archetype Query Language (AQL)
+targeting the Django ORM.
+
+Supported:
+
+    SELECT p/problem_diagnosis_name AS name, p/severity
+    FROM EHR e CONTAINS COMPOSITION c
+        CONTAINS EVALUATION p[openEHR-EHR-EVALUATION.problem_diagnosis.v1]
+    WHERE p/severity = 'Severe' AND p/onset_date_time >= $since
+    ORDER BY p/onset_date_time DESC
+    LIMIT 50 OFFSET 100
+
+* FROM: a chain of CONTAINS over the archetype IDs listed in the README;
+  EHR and COMPOSITION (which are not modelled) are accepted and skipped. Each
+  contained archetype must fill a slot of the one before it, and becomes a
+  join through that slot.
+* Paths name model fields, either directly (p/severity) or in canonical
+  form (p/data[at0001]/items[severity]/value/defining_code/code_string),
+  matching the archetype_node_ids written by the serializers.
+* WHERE: =, !=, <, <=, >, >=, LIKE (% and * wildcards), matches {...},
+  EXISTS, NOT, AND, OR and parentheses. Values are literals or $parameters.
+* SELECT: paths (optionally AS name), or the bare root alias for instances.
+
+Compiled plans are cached in an LRU keyed by the normalized query text, and
+$parameters are bound at execution time, so repeated queries skip parsing.
+The LRU holds up to OPENEHR_AQL_CACHE_SIZE plans (default 256, None for no
+limit, 0 to turn it off), read whenever a plan is cached.
+"""
+import functools
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.db.models import F, Q
+
+from django_openehr import archetypes
+
+
+class AQLError(Exception):
+    pass
+
+
+KEYWORDS = {
+    'SELECT', 'FROM', 'CONTAINS', 'WHERE', 'ORDER', 'BY', 'ASC', 'ASCENDING',
+    'DESC', 'DESCENDING', 'LIMIT', 'OFFSET', 'AND', 'OR', 'NOT', 'AS', 'LIKE',
+    'MATCHES', 'EXISTS', 'TRUE', 'FALSE', 'NULL',
+}
+
+TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<number>-?\d+(?:\.\d+)?)
+  | (?P<param>\$[A-Za-z_]\w*)
+  | (?P<path>[A-Za-z_]\w*(?:\[[^\]]*\])?(?:/[A-Za-z_]\w*(?:\[[^\]]*\])?)*)
+  | (?P<op><=|>=|!=|=|<|>)
+  | (?P<punct>[(),{}])
+""", re.VERBOSE)
+
+# path suffixes which address the data value rather than the element
+VALUE_SUFFIXES = (
+    ('value', 'defining_code', 'code_string'),
+    ('value', 'value'),
+    ('value', 'magnitude'),
+    ('defining_code', 'code_string'),
+    ('value',),
+    ('magnitude',),
+)
+
+OPERATORS = {
+    '=': 'exact',
+    '>': 'gt',
+    '>=': 'gte',
+    '<': 'lt',
+    '<=': 'lte',
+}
+
+
+class Token(object):
+
+    def __init__(self, kind, text):
+        self.kind = kind
+        self.text = text
+
+    @property
+    def keyword(self):
+        if self.kind == 'path' and self.text.upper() in KEYWORDS:
+            return self.text.upper()
+        return None
+
+    def __str__(self):
+        return self.keyword or self.text
+
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            raise AQLError("Unexpected character {0!r} at {1}".format(text[position], position))
+        position = match.end()
+        if match.lastgroup != 'space':
+            tokens.append(Token(match.lastgroup, match.group()))
+    return tokens
+
+
+def normalize_query(text):
+    """
+    Canonical form of a query used as the plan cache key: single spaces
+    between tokens and upper case keywords.
+    """
+    return ' '.join(str(token) for token in tokenize(text))
+
+
+class Param(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Parser(object):
+    """
+    Recursive descent parser producing plain tuples:
+
+        ('and', [cond, ...]), ('or', [cond, ...]), ('not', cond),
+        ('cmp', path, op, value), ('exists', path)
+    """
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise AQLError("Unexpected end of query")
+        self.position += 1
+        return token
+
+    def at(self, *keywords):
+        token = self.peek()
+        return token is not None and (token.keyword in keywords or token.text in keywords)
+
+    def expect(self, keyword):
+        token = self.next()
+        if token.keyword != keyword and token.text != keyword:
+            raise AQLError("Expected {0} but found {1}".format(keyword, token.text))
+        return token
+
+    def path(self):
+        token = self.next()
+        if token.kind != 'path' or token.keyword:
+            raise AQLError("Expected a path but found {0}".format(token.text))
+        return token.text
+
+    def parse(self):
+        query = {'select': [], 'from': [], 'where': None, 'order_by': [], 'limit': None, 'offset': None}
+        self.expect('SELECT')
+        while True:
+            path = self.path()
+            name = None
+            if self.at('AS'):
+                self.next()
+                name = self.path()
+            query['select'].append((path, name))
+            if not self.at(','):
+                break
+            self.next()
+
+        self.expect('FROM')
+        while True:
+            rm_type = self.path()
+            node = self.path()
+            alias, _, predicate = node.partition('[')
+            query['from'].append((rm_type.upper(), alias, predicate.rstrip(']') or None))
+            if not self.at('CONTAINS'):
+                break
+            self.next()
+
+        if self.at('WHERE'):
+            self.next()
+            query['where'] = self.disjunction()
+        if self.at('ORDER'):
+            self.next()
+            self.expect('BY')
+            while True:
+                path = self.path()
+                descending = False
+                if self.at('DESC', 'DESCENDING'):
+                    self.next()
+                    descending = True
+                elif self.at('ASC', 'ASCENDING'):
+                    self.next()
+                query['order_by'].append((path, descending))
+                if not self.at(','):
+                    break
+                self.next()
+        if self.at('LIMIT'):
+            self.next()
+            query['limit'] = int(self.next().text)
+            if self.at('OFFSET'):
+                self.next()
+                query['offset'] = int(self.next().text)
+        if self.peek() is not None:
+            raise AQLError("Unexpected {0}".format(self.peek().text))
+        return query
+
+    def disjunction(self):
+        terms = [self.conjunction()]
+        while self.at('OR'):
+            self.next()
+            terms.append(self.conjunction())
+        return terms[0] if len(terms) == 1 else ('or', terms)
+
+    def conjunction(self):
+        terms = [self.negation()]
+        while self.at('AND'):
+            self.next()
+            terms.append(self.negation())
+        return terms[0] if len(terms) == 1 else ('and', terms)
+
+    def negation(self):
+        if self.at('NOT'):
+            self.next()
+            return ('not', self.negation())
+        if self.at('('):
+            self.next()
+            condition = self.disjunction()
+            self.expect(')')
+            return condition
+        if self.at('EXISTS'):
+            self.next()
+            return ('exists', self.path())
+        path = self.path()
+        if self.at('LIKE'):
+            self.next()
+            return ('cmp', path, 'LIKE', self.value())
+        if self.at('MATCHES'):
+            self.next()
+            self.expect('{')
+            values = [self.value()]
+            while self.at(','):
+                self.next()
+                values.append(self.value())
+            self.expect('}')
+            return ('cmp', path, 'MATCHES', values)
+        token = self.next()
+        if token.kind != 'op':
+            raise AQLError("Expected an operator but found {0}".format(token.text))
+        return ('cmp', path, token.text, self.value())
+
+    def value(self):
+        token = self.next()
+        if token.kind == 'string':
+            return re.sub(r'\\(.)', r'\1', token.text[1:-1])
+        if token.kind == 'number':
+            return float(token.text) if '.' in token.text else int(token.text)
+        if token.kind == 'param':
+            return Param(token.text[1:])
+        if token.keyword in ('TRUE', 'FALSE'):
+            return token.keyword == 'TRUE'
+        if token.keyword == 'NULL':
+            return None
+        raise AQLError("Expected a value but found {0}".format(token.text))
+
+
+class CompiledQuery(object):
+    """
+    A parsed and resolved query: every path has been turned into an ORM
+    lookup, so executing it only builds and returns a QuerySet.
+    """
+
+    def __init__(self, model, select, where, order_by, limit, offset):
+        self.model = model
+        # [(name, lookup)], or None to return model instances; a name equal
+        # to its lookup is selected as is, since values() cannot annotate a
+        # field under its own name
+        self.select = select
+        self.where = where
+        self.order_by = order_by
+        self.limit = limit
+        self.offset = offset
+
+    def bind(self, value, params):
+        if isinstance(value, Param):
+            if value.name not in params:
+                raise AQLError("No value given for ${0}".format(value.name))
+            return params[value.name]
+        if isinstance(value, list):
+            return [self.bind(v, params) for v in value]
+        return value
+
+    def q(self, condition, params):
+        kind = condition[0]
+        if kind == 'and':
+            return functools.reduce(lambda a, b: a & b, (self.q(c, params) for c in condition[1]))
+        if kind == 'or':
+            return functools.reduce(lambda a, b: a | b, (self.q(c, params) for c in condition[1]))
+        if kind == 'not':
+            return ~self.q(condition[1], params)
+        if kind == 'exists':
+            return Q(**{condition[1] + '__isnull': False})
+        _, lookup, op, value = condition
+        value = self.bind(value, params)
+        if op == 'MATCHES':
+            return Q(**{lookup + '__in': value})
+        if op == 'LIKE':
+            return like(lookup, value)
+        if value is None:
+            return Q(**{lookup + '__isnull': op == '='})
+        if op == '!=':
+            # as in SQL, an absent element is not unequal to anything
+            return ~Q(**{lookup: value}) & Q(**{lookup + '__isnull': False})
+        return Q(**{'{0}__{1}'.format(lookup, OPERATORS[op]): value})
+
+    def queryset(self, params=None, using=None):
+        queryset = self.model._default_manager.using(using)
+        if self.where is not None:
+            # a single filter() call, so conditions on the same slot share a join
+            try:
+                queryset = queryset.filter(self.q(self.where, params or {}))
+            except (ValueError, FieldError) as e:
+                # e.g. a coded text compared with something which is not a code
+                raise AQLError(str(e))
+        if self.select is None:
+            queryset = queryset.distinct()
+        else:
+            queryset = queryset.values(
+                *[lookup for name, lookup in self.select if name == lookup],
+                **{name: F(lookup) for name, lookup in self.select if name != lookup}
+            )
+        if self.order_by:
+            queryset = queryset.order_by(*[
+                F(lookup).desc() if descending else F(lookup).asc()
+                for lookup, descending in self.order_by
+            ])
+        if self.limit is not None or self.offset:
+            start = self.offset or 0
+            stop = start + self.limit if self.limit is not None else None
+            queryset = queryset[start:stop]
+        return queryset
+
+
+def like(lookup, pattern):
+    """
+    Translate an AQL/SQL LIKE pattern into the cheapest equivalent lookup, so
+    prefix searches can still use an index.
+    """
+    pattern = pattern.replace('*', '%')
+    inner = pattern.strip('%')
+    if '%' not in inner and '_' not in inner:
+        if pattern.startswith('%') and pattern.endswith('%') and len(pattern) > 1:
+            return Q(**{lookup + '__contains': inner})
+        if pattern.endswith('%'):
+            return Q(**{lookup + '__startswith': inner})
+        if pattern.startswith('%'):
+            return Q(**{lookup + '__endswith': inner})
+        return Q(**{lookup: inner})
+    regex = ''.join(
+        '.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern
+    )
+    return Q(**{lookup + '__regex': '^' + regex + '$'})
+
+
+def slot_between(parent, child):
+    for field in parent._meta.many_to_many:
+        if field.related_model is child:
+            return field.name
+    for rel in parent._meta.related_objects:
+        if rel.one_to_many and rel.related_model is child:
+            return rel.name
+    return None
+
+
+def strip_value_suffix(segments):
+    for suffix in VALUE_SUFFIXES:
+        if len(segments) > len(suffix) and tuple(segments[-len(suffix):]) == suffix:
+            return segments[:-len(suffix)]
+    return segments
+
+
+def resolve_path(path, aliases):
+    """
+    alias/field/... -> (model the path ends on, ORM lookup)
+    """
+    parts = path.split('/')
+    if parts[0] not in aliases:
+        raise AQLError("Unknown alias {0} in {1}".format(parts[0], path))
+    model, prefix = aliases[parts[0]]
+    segments = []
+    for part in parts[1:]:
+        name, _, predicate = part.partition('[')
+        predicate = predicate.rstrip(']')
+        if name == 'data':
+            # the ITEM_TREE of an ENTRY has no counterpart in the models
+            continue
+        segments.append(predicate if name == 'items' and predicate else name)
+    segments = strip_value_suffix(segments)
+    if not segments:
+        return model, prefix.rstrip('_') or 'pk'
+    lookup = prefix
+    for position, segment in enumerate(segments):
+        try:
+            field = model._meta.get_field(segment)
+        except FieldDoesNotExist:
+            raise AQLError("{0} has no element {1} (in {2})".format(model.__name__, segment, path))
+        if field.is_relation:
+            model = field.related_model
+            lookup += segment + '__'
+        elif position != len(segments) - 1:
+            raise AQLError("{0} is not a slot (in {1})".format(segment, path))
+        else:
+            lookup += segment
+    return model, lookup.rstrip('_') if lookup.endswith('__') else lookup
+
+
+def field_names(model):
+    """
+    The names values() will not take as the name of an annotation.
+    """
+    names = set()
+    for field in model._meta.get_fields():
+        names.add(field.name)
+        if hasattr(field, 'attname'):
+            names.add(field.attname)
+    return names
+
+
+def compile_tree(query):
+    aliases = {}
+    root = None
+    parent = None
+    for rm_type, alias, archetype_id in query['from']:
+        if archetype_id is None:
+            if rm_type in ('EHR', 'COMPOSITION', 'VERSION', 'VERSIONED_OBJECT'):
+                continue
+            raise AQLError("{0} {1} needs an archetype id".format(rm_type, alias))
+        model = archetypes.model_for_archetype(archetype_id)
+        if model is None:
+            raise AQLError("No model implements {0}".format(archetype_id))
+        if root is None:
+            root = model
+            aliases[alias] = (model, '')
+        else:
+            parent_model, parent_prefix = aliases[parent]
+            slot = slot_between(parent_model, model)
+            if slot is None:
+                raise AQLError("{0} has no slot for {1}".format(parent_model.__name__, archetype_id))
+            aliases[alias] = (model, parent_prefix + slot + '__')
+        parent = alias
+    if root is None:
+        raise AQLError("FROM must contain at least one archetype")
+
+    def lookup(path):
+        return resolve_path(path, aliases)[1]
+
+    def resolve(condition):
+        kind = condition[0]
+        if kind in ('and', 'or'):
+            return (kind, [resolve(c) for c in condition[1]])
+        if kind == 'not':
+            return ('not', resolve(condition[1]))
+        if kind == 'exists':
+            return ('exists', lookup(condition[1]))
+        return ('cmp', lookup(condition[1]), condition[2], condition[3])
+
+    select = query['select']
+    root_alias = next(a for a, (m, prefix) in aliases.items() if prefix == '')
+    if len(select) == 1 and select[0][0] == root_alias:
+        compiled_select = None
+    else:
+        compiled_select = []
+        reserved = field_names(root)
+        for path, name in select:
+            if '/' not in path:
+                raise AQLError("Only the root alias can be selected on its own")
+            name = name or re.sub(r'\W+', '_', path)
+            if name in (n for n, _ in compiled_select):
+                raise AQLError("{0} is selected more than once".format(name))
+            path_lookup = lookup(path)
+            if name != path_lookup and name in reserved:
+                raise AQLError("{0} names an element of {1}; select {2} AS another name".format(
+                    name, root.__name__, path))
+            compiled_select.append((name, path_lookup))
+
+    return CompiledQuery(
+        model=root,
+        select=compiled_select,
+        where=resolve(query['where']) if query['where'] is not None else None,
+        order_by=[(lookup(path), descending) for path, descending in query['order_by']],
+        limit=query['limit'],
+        offset=query['offset'],
+    )
+
+
+class PlanCache(object):
+    """
+    An LRU of CompiledQuery keyed by normalized query text.
+    """
+
+    def __init__(self):
+        self.plans = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.plans)
+
+    def get(self, normalized):
+        with self.lock:
+            plan = self.plans.get(normalized)
+            if plan is not None:
+                self.plans.move_to_end(normalized)
+                self.hits += 1
+                return plan
+        plan = compile_tree(Parser(normalized).parse())
+        size = getattr(settings, 'OPENEHR_AQL_CACHE_SIZE', 256)
+        with self.lock:
+            self.misses += 1
+            if size != 0:
+                self.plans[normalized] = plan
+            while size is not None and len(self.plans) > size:
+                self.plans.popitem(last=False)
+        return plan
+
+    def clear(self):
+        with self.lock:
+            self.plans.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+plans = PlanCache()
+
+
+def compile_query(text):
+    """
+    The CompiledQuery for `text`, from the plan cache where possible.
+    """
+    return plans.get(normalize_query(text))
+
+
+def execute(text, params=None, using=None):
+    """
+    Run an AQL query and return a QuerySet: dicts keyed by the SELECT names,
+    or model instances when the root alias alone is selected.
+    """
+    return compile_query(text).queryset(params, using)
@@ -0,0 +1,81 @@
+from django_openehr.models import (
+    AddressDetails,
+    AdverseReaction,
+    ClinicalSynopsis,
+    DemographicPersonal,
+    DemographicProfessional,
+    InpatientAdmission,
+    PersonName,
+    ProblemDiagnosis,
+    ReasonForEncounter,
+    RelevantContact,
+    SymptomSign,
+    TelecomDetails,
+    TherapeuticDirection,
+    TherapeuticDirectionDosage,
+)
+
+# the archetype implemented by each model, as listed in the README
+# Identifier is a Reference Model data type (DV_IDENTIFIER) rather than an
+# archetype, so it does not appear here
+ARCHETYPE_MODELS = (
+    ('openEHR-EHR-CLUSTER.address.v1', AddressDetails),
+    ('openEHR-EHR-EVALUATION.adverse_reaction_uk.v1', AdverseReaction),
+    ('openEHR-EHR-EVALUATION.clinical_synopsis.v1', ClinicalSynopsis),
+    ('openEHR-EHR-CLUSTER.individual_personal_uk.v1', DemographicPersonal),
+    ('openEHR-EHR-CLUSTER.individual_professional_uk.v1', DemographicProfessional),
+    ('openEHR-EHR-ADMIN_ENTRY.inpatient_admission_uk.v1', InpatientAdmission),
+    ('openEHR-EHR-CLUSTER.person_name.v1', PersonName),
+    ('openEHR-EHR-EVALUATION.problem_diagnosis.v1', ProblemDiagnosis),
+    ('openEHR-EHR-EVALUATION.reason_for_encounter.v1', ReasonForEncounter),
+    ('openEHR-EHR-ADMIN_ENTRY.relevant_contact_rcp.v0', RelevantContact),
+    ('openEHR-EHR-CLUSTER.symptom_sign.v1', SymptomSign),
+    ('openEHR-EHR-CLUSTER.telecom_uk.v1', TelecomDetails),
+    ('openEHR-EHR-CLUSTER.therapeutic_direction.v1', TherapeuticDirection),
+    ('openEHR-EHR-CLUSTER.dosage.v1', TherapeuticDirectionDosage),
+)
+
+_MODEL_BY_ARCHETYPE = dict(ARCHETYPE_MODELS)
+_ARCHETYPE_BY_MODEL = {model: archetype_id for archetype_id, model in ARCHETYPE_MODELS}
+
+
+def archetype_models():
+    """
+    Every model which implements an archetype, in README order.
+    """
+    return [model for _, model in ARCHETYPE_MODELS]
+
+
+def model_for_archetype(archetype_id):
+    """
+    The model implementing `archetype_id`, or None.
+    """
+    return _MODEL_BY_ARCHETYPE.get(archetype_id)
+
+
+def model_for_name(model_name):
+    """
+    The archetype model whose lowercase Django model_name is `model_name`.
+    """
+    for model in archetype_models():
+        if model._meta.model_name == model_name:
+            return model
+    return None
+
+
+def archetype_id_for(model):
+    return _ARCHETYPE_BY_MODEL.get(model)
+
+
+def rm_type(archetype_id):
+    """
+    openEHR-EHR-EVALUATION.problem_diagnosis.v1 -> EVALUATION
+    """
+    return archetype_id.split('.')[0].split('-', 2)[2]
+
+
+def concept(archetype_id):
+    """
+    openEHR-EHR-EVALUATION.problem_diagnosis.v1 -> problem_diagnosis
+    """
+    return archetype_id.split('.')[1]
@@ -0,0 +1,280 @@
+"""
+Archival tiering: cold instances moved out of the hot tables.
+
+A resolved ProblemDiagnosis and an old InpatientAdmission are rarely read
+again, but every one of them stays in its table and its indexes. archive()
+moves the instances of a model which went cold before a cutoff (see
+POLICIES) into ArchivedRecord, one zlib-compressed snapshot of fields and
+slot ids per instance, and restore() puts them back under their own primary
+keys.
+
+Both work in chunks of `chunk_size` instances, each chunk in a transaction
+of its own, so no lock is held for longer than one chunk takes: a chunk's
+rows are locked (skipping rows locked by others, where the database can),
+written to the other tier and removed from the first, then committed.
+
+The hot tier is what the models' managers return as ever;
+ProblemDiagnosis.objects.with_archived(**lookups) reads both tiers, the
+archived instances coming back unsaved with is_archived set. Its lookups
+are checked and their values converted as the ORM would (get_prep_value(),
+so a naive datetime is made aware) when it is called, and the TieredQuerySet
+it returns can be counted and filtered further.
+
+Instances being moved carry `archiving = True`, so receivers can tell a move
+from a clinical change: versioning and the audit log record nothing for
+them, while the search index and the document store drop archived instances
+and pick them up again on restore.
+"""
+import datetime
+import itertools
+import operator
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.db import connections, router, transaction
+from django.db.models.deletion import Collector
+from django.utils import timezone
+
+from django_openehr.models import ArchivedRecord, InpatientAdmission, ProblemDiagnosis
+from django_openehr.versioning import build_instance, compress, label, snapshot
+
+# model -> the date field whose value, once older than the model's
+# OPENEHR_ARCHIVE_AFTER_DAYS, makes an instance cold; instances where it is
+# null are never archived
+POLICIES = {
+    ProblemDiagnosis: 'resolution_date_time',
+    InpatientAdmission: 'date_of_admission',
+}
+
+ARCHIVE_AFTER_DAYS = getattr(settings, 'OPENEHR_ARCHIVE_AFTER_DAYS', {
+    'problemdiagnosis': 365,
+    'inpatientadmission': 730,
+})
+
+CHUNK_SIZE = getattr(settings, 'OPENEHR_ARCHIVE_CHUNK_SIZE', 200)
+
+# lookups with_archived() can apply to archived instances
+LOOKUPS = {
+    'exact': operator.eq,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'in': lambda value, values: value in values,
+    'isnull': lambda value, isnull: (value is None) == isnull,
+}
+
+
+def cutoff_for(model):
+    return timezone.now() - datetime.timedelta(days=ARCHIVE_AFTER_DAYS[model._meta.model_name])
+
+
+def cold_queryset(model, before, using):
+    field = POLICIES[model]
+    return model._default_manager.using(using).filter(**{field + '__lt': before})
+
+
+def lock(queryset, using):
+    # rows another transaction is holding are left for the next run
+    skip_locked = connections[using].features.has_select_for_update_skip_locked
+    return queryset.select_for_update(skip_locked=skip_locked)
+
+
+def archive(model, before=None, using=None, chunk_size=CHUNK_SIZE):
+    """
+    Move the instances of `model` which went cold before `before` (default:
+    OPENEHR_ARCHIVE_AFTER_DAYS ago) to the archive; returns how many were
+    moved.
+    """
+    using = using or router.db_for_write(model)
+    before = before or cutoff_for(model)
+    queryset = cold_queryset(model, before, using).order_by('pk').prefetch_related(
+        *[field.name for field in model._meta.many_to_many]
+    )
+    moved = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic(using=using):
+            chunk = list(lock(queryset.filter(pk__gt=last_pk), using)[:chunk_size])
+            if not chunk:
+                break
+            # taken first, as deleting an instance clears its pk
+            last_pk = chunk[-1].pk
+            move_to_archive(model, chunk, using)
+        moved += len(chunk)
+    return moved
+
+
+def move_to_archive(model, instances, using):
+    field = POLICIES[model]
+    now = timezone.now()
+    ArchivedRecord.objects.using(using).bulk_create([
+        ArchivedRecord(
+            model=label(model),
+            object_id=instance.pk,
+            cold_since=getattr(instance, field),
+            archived=now,
+            snapshot=compress(snapshot(instance)),
+        )
+        for instance in instances
+    ])
+    for instance in instances:
+        instance.archiving = True
+    # deleting these very instances, rather than a queryset, hands them
+    # (and their flag) to the delete signals
+    collector = Collector(using=using)
+    collector.collect(instances)
+    collector.delete()
+
+
+def restore(model, pks=None, using=None, chunk_size=CHUNK_SIZE):
+    """
+    Put the archived instances of `model` in `pks` (default: all of them)
+    back in their table; returns how many were restored.
+    """
+    using = using or router.db_for_write(model)
+    records = ArchivedRecord.objects.using(using).filter(model=label(model)).order_by('pk')
+    if pks is not None:
+        records = records.filter(object_id__in=list(pks))
+    restored = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic(using=using):
+            chunk = list(lock(records.filter(pk__gt=last_pk), using)[:chunk_size])
+            if not chunk:
+                break
+            restore_chunk(model, chunk, using)
+        last_pk = chunk[-1].pk
+        restored += len(chunk)
+    return restored
+
+
+def restore_chunk(model, records, using):
+    instances = [build_instance(model, record, using) for record in records]
+    for instance in instances:
+        instance.archiving = True
+        instance.save(force_insert=True, using=using)
+    for field in model._meta.many_to_many:
+        # a slot's instance may have been deleted since
+        related = field.related_model._default_manager.using(using)
+        ids = set()
+        for instance in instances:
+            ids.update(instance.versioned_m2m.get(field.name, []))
+        existing = set(related.filter(pk__in=list(ids)).values_list('pk', flat=True))
+        for instance in instances:
+            held = [pk for pk in instance.versioned_m2m.get(field.name, []) if pk in existing]
+            if held:
+                getattr(instance, field.name).set(held)
+    ArchivedRecord.objects.using(using).filter(pk__in=[record.pk for record in records]).delete()
+
+
+def prepare_lookups(model, lookups):
+    """
+    [(field, lookup, value), ...] for `lookups` ({'name__lookup': value}),
+    the values converted with the field's get_prep_value() as the ORM would
+    for a query. Raises FieldError for anything which cannot be applied to a
+    snapshot, before any is read.
+    """
+    prepared = []
+    for key, value in lookups.items():
+        name, _, lookup = key.partition('__')
+        lookup = lookup or 'exact'
+        try:
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise FieldError("Cannot resolve keyword {0!r} on archived {1}".format(name, model.__name__))
+        if lookup not in LOOKUPS or not field.concrete or field.many_to_many:
+            raise FieldError("Unsupported lookup {0} on archived {1}".format(key, model.__name__))
+        if lookup == 'in':
+            value = [field.get_prep_value(v) for v in value]
+        elif lookup == 'isnull':
+            value = bool(value)
+        elif value is not None:
+            value = field.get_prep_value(value)
+        prepared.append((field, lookup, value))
+    return prepared
+
+
+def matches(instance, prepared):
+    for field, lookup, value in prepared:
+        actual = getattr(instance, field.attname)
+        if actual is not None:
+            actual = field.get_prep_value(actual)
+        if lookup == 'isnull':
+            found = (actual is None) == value
+        elif lookup == 'in':
+            found = actual is not None and actual in value
+        elif actual is None or value is None:
+            # as in SQL, only exact=None matches a null
+            found = lookup == 'exact' and actual is value
+        else:
+            found = LOOKUPS[lookup](actual, value)
+        if not found:
+            return False
+    return True
+
+
+def archived_records(model, prepared, using):
+    """
+    The ArchivedRecords of `model`, narrowed by the lookups on its policy
+    field, which the (model, cold_since) index serves.
+    """
+    records = ArchivedRecord.objects.using(using).filter(model=label(model))
+    policy = POLICIES.get(model)
+    for field, lookup, value in prepared:
+        if field.name == policy:
+            records = records.filter(**{'cold_since__' + lookup: value})
+    return records
+
+
+def archived_matching(model, prepared, using=None):
+    for record in archived_records(model, prepared, using).order_by('object_id').iterator():
+        instance = build_instance(model, record, using)
+        if matches(instance, prepared):
+            instance.is_archived = True
+            yield instance
+
+
+def archived_instances(model, using=None, **lookups):
+    """
+    Yield the archived instances of `model` matching `lookups`, unsaved and
+    with is_archived set. Lookups are field names with one of the LOOKUPS
+    suffixes; those on the model's policy field are served by the
+    (model, cold_since) index, the rest are applied to each snapshot.
+    """
+    return archived_matching(model, prepare_lookups(model, lookups), using)
+
+
+class TieredQuerySet(object):
+    """
+    The instances of a model in both tiers, as returned by with_archived():
+    the rows of `queryset`, then the archived instances matching `prepared`
+    (see prepare_lookups()), each tier in primary key order.
+    """
+
+    def __init__(self, queryset, prepared=()):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.prepared = list(prepared)
+
+    def filter(self, **lookups):
+        prepared = prepare_lookups(self.model, lookups)
+        return type(self)(self.queryset.filter(**lookups), self.prepared + prepared)
+
+    def archived(self):
+        return archived_matching(self.model, self.prepared, self.queryset.db)
+
+    def __iter__(self):
+        return itertools.chain(self.queryset.order_by('pk'), self.archived())
+
+    def count(self):
+        archived = archived_records(self.model, self.prepared, self.queryset.db)
+        if all(field.name == POLICIES.get(self.model) for field, _, _ in self.prepared):
+            # the index has done all the filtering
+            archived = archived.count()
+        else:
+            archived = sum(1 for _ in self.archived())
+        return self.queryset.count() + archived
+
+    def exists(self):
+        return self.queryset.exists() or next(self.archived(), None) is not None
@@ -0,0 +1,238 @@
+"""
+The audit log: who changed which archetype instance, and when.
+
+A save, delete or slot change of an archetype instance (or an Identifier)
+costs no insert of its own. The receivers build unsaved AuditEntries and
+collect them in one callback per transaction (per savepoint, so that a
+rolled back savepoint takes its entries with it), registered with
+transaction.on_commit(): entries of a transaction which rolls back are never
+logged, and those of one which commits are written with a single
+bulk_create() as soon as it has committed, before the code which committed
+it carries on, e.g. before the request's response is returned.
+
+An entry is never lost once its transaction has committed: should that
+write fail, the entries are handed to an in-process buffer, which a
+background thread writes every OPENEHR_AUDIT_FLUSH_INTERVAL seconds until
+the database takes them, and which is written once more at interpreter
+exit. Each failure is logged.
+
+Add django_openehr.audit.AuditMiddleware to MIDDLEWARE to record the
+requesting user; use audit_user() to attribute changes made elsewhere, e.g.
+in a management command. Set OPENEHR_AUDIT = False to turn auditing off.
+"""
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils import timezone
+
+from django_openehr.models import AuditEntry
+from django_openehr.versioning import VERSIONED_MODELS
+
+ENABLED = getattr(settings, 'OPENEHR_AUDIT', True)
+BATCH_SIZE = getattr(settings, 'OPENEHR_AUDIT_BATCH_SIZE', 500)
+FLUSH_INTERVAL = getattr(settings, 'OPENEHR_AUDIT_FLUSH_INTERVAL', 2.0)
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+def current_user():
+    return getattr(_state, 'user', None)
+
+
+@contextmanager
+def audit_user(user):
+    """
+    Attribute the changes made in the block to `user`.
+    """
+    previous = current_user()
+    _state.user = user
+    try:
+        yield
+    finally:
+        _state.user = previous
+
+
+class AuditMiddleware(object):
+    """
+    Attribute the changes made while handling a request to its user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and not user.is_authenticated:
+            user = None
+        with audit_user(user):
+            return self.get_response(request)
+
+
+def write(entries):
+    AuditEntry.objects.using(router.db_for_write(AuditEntry)).bulk_create(
+        entries, batch_size=BATCH_SIZE
+    )
+
+
+class AuditBuffer(object):
+    """
+    Committed entries whose write failed, and the thread which retries
+    them.
+    """
+
+    def __init__(self, interval=FLUSH_INTERVAL):
+        self.interval = interval
+        self.entries = []
+        # held while writing, so entries are written in the order committed
+        self.write_lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entries):
+        with self.condition:
+            self.entries.extend(entries)
+            self.start()
+
+    def start(self):
+        # called with the condition held
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self.run, name='openehr-audit', daemon=True
+            )
+            self.thread.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait(self.interval)
+                if not self.entries:
+                    continue
+            close_old_connections()
+            self.flush()
+
+    def flush(self):
+        """
+        Write every buffered entry, and return how many were written.
+        """
+        with self.write_lock:
+            with self.condition:
+                entries, self.entries = self.entries, []
+            if not entries:
+                return 0
+            try:
+                write(entries)
+            except Exception:
+                logger.exception("Writing %d audit entries failed; they will be retried", len(entries))
+                with self.condition:
+                    self.entries[:0] = entries
+                return 0
+            return len(entries)
+
+
+buffer = AuditBuffer()
+
+
+def flush():
+    return buffer.flush()
+
+
+class PendingEntries(object):
+    """
+    The entries of one transaction (or savepoint), written when it commits.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def __call__(self):
+        try:
+            write(self.entries)
+        except Exception:
+            logger.exception("Writing %d audit entries failed; they will be retried", len(self.entries))
+            buffer.add(self.entries)
+
+
+def pending_entries(using):
+    """
+    The PendingEntries of the current transaction and savepoint of `using`,
+    registered with on_commit() the first time it is asked for.
+    """
+    connection = connections[using]
+    savepoints = set(connection.savepoint_ids)
+    for sids, callback in reversed(connection.run_on_commit):
+        if isinstance(callback, PendingEntries) and sids == savepoints:
+            return callback
+    pending = PendingEntries()
+    transaction.on_commit(pending, using=using)
+    return pending
+
+
+def log_change(instance, change_type, using):
+    user = current_user()
+    entry = AuditEntry(
+        model=instance._meta.label_lower,
+        object_id=instance.pk,
+        change_type=change_type,
+        user_id=user.pk if user is not None else None,
+        username=user.get_username() if user is not None else '',
+        timestamp=timezone.now(),
+    )
+    if connections[using].in_atomic_block:
+        pending_entries(using).entries.append(entry)
+    else:
+        # autocommit: the change has already been committed
+        pending = PendingEntries()
+        pending.entries.append(entry)
+        pending()
+
+
+def instance_saved(sender, instance, created, using, raw=False, **kwargs):
+    # a move to or from the archive changes nothing, see archive
+    if not raw and not getattr(instance, 'archiving', False):
+        log_change(instance, 'CREATION' if created else 'MODIFICATION', using)
+
+
+def instance_deleted(sender, instance, using, **kwargs):
+    if not getattr(instance, 'archiving', False):
+        log_change(instance, 'DELETED', using)
+
+
+def slot_changed(sender, instance, action, reverse, model, pk_set, using, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear') and not getattr(instance, 'archiving', False):
+            log_change(instance, 'MODIFICATION', using)
+        return
+    # reverse: the owners of the slot changed; a clear has to find them first
+    if action == 'pre_clear':
+        pk_set = model._default_manager.using(using).filter(
+            **{SLOT_FIELDS[sender]: instance}
+        ).values_list('pk', flat=True)
+    elif action not in ('post_add', 'post_remove'):
+        return
+    for pk in pk_set:
+        log_change(model(pk=pk), 'MODIFICATION', using)
+
+
+# through model -> the slot field it belongs to
+SLOT_FIELDS = {}
+
+
+if ENABLED:
+    for _model in VERSIONED_MODELS:
+        post_save.connect(instance_saved, sender=_model, dispatch_uid='openehr_audit_save')
+        post_delete.connect(instance_deleted, sender=_model, dispatch_uid='openehr_audit_delete')
+        for _field in _model._meta.many_to_many:
+            _through = getattr(_model, _field.name).through
+            SLOT_FIELDS[_through] = _field.name
+            m2m_changed.connect(slot_changed, sender=_through, dispatch_uid='openehr_audit_slot')
+    atexit.register(flush)
@@ -0,0 +1,246 @@
+"""
+Validation of whole batches of rows, with the same results as full_clean().
+
+    report = BatchValidator(TherapeuticDirectionDosage).validate(rows)
+    for index, errors in report.errors.items():
+        ...  # errors == the message_dict full_clean() would have raised
+
+Rows are dicts of field attname -> raw value (a missing field takes its
+default, as it would on a new instance), or the same data as columns: a dict
+of attname -> sequence, via validate_columns().
+
+The checks are those of full_clean(), in its order, and use the same
+definitions:
+
+* field checks: each field's own clean(), i.e. to_python(), choices, null
+  and blank, and its validators (MinValueValidator on dose_amount_*, ...),
+  called once per distinct value of a column rather than once per row; the
+  existence of foreign key targets is looked up with one query per chunk
+* cross-field rules: the rule objects in the model's RULES, which its
+  clean() runs as well (see validators.Rule)
+* unique and unique_together: one query per chunk of rows instead of one
+  per row
+
+so a row is only reported if full_clean() would have raised for it, with
+the same messages.
+"""
+from collections import OrderedDict
+
+from django.core.exceptions import NON_FIELD_ERRORS, ImproperlyConfigured, ValidationError
+from django.db import models, router
+from django.db.models import Q
+
+CHUNK_SIZE = 500
+
+
+class ValidationReport(object):
+    """
+    errors: {row index: message_dict} for the invalid rows, in row order
+    cleaned: {attname: [cleaned value per row]}, raw where a field failed
+    """
+
+    def __init__(self, size, errors, cleaned):
+        self.size = size
+        self.errors = errors
+        self.cleaned = cleaned
+
+    def __bool__(self):
+        return not self.errors
+
+    def valid_rows(self):
+        return [index for index in range(self.size) if index not in self.errors]
+
+
+def value_key(value):
+    # 1, 1.0 and True are equal dict keys, but need not clean alike
+    return (type(value), value)
+
+
+class BatchValidator(object):
+
+    def __init__(self, model, validate_unique=True, using=None):
+        if model.clean is not models.Model.clean and not hasattr(model, 'RULES'):
+            raise ImproperlyConfigured(
+                "{0}.clean() must run its RULES for batch validation".format(model.__name__)
+            )
+        self.model = model
+        self.validate_unique = validate_unique
+        self.using = using or router.db_for_read(model)
+        self.fields = model._meta.concrete_fields
+        self.rules = getattr(model, 'RULES', ())
+        unique_checks, date_checks = model()._get_unique_checks()
+        if date_checks:
+            raise ImproperlyConfigured(
+                "{0} has unique_for_date checks, which are not supported".format(model.__name__)
+            )
+        self.unique_checks = unique_checks
+
+    def validate(self, rows):
+        rows = list(rows)
+        given = set()
+        for row in rows:
+            given.update(row)
+        columns = {}
+        for field in self.fields:
+            if field.attname in given:
+                default = self.default_column(field, len(rows)) or [field.get_default()] * len(rows)
+                columns[field.attname] = [
+                    row.get(field.attname, default[index]) for index, row in enumerate(rows)
+                ]
+        return self.validate_columns(columns, len(rows))
+
+    def validate_columns(self, columns, size=None):
+        if size is None:
+            size = len(next(iter(columns.values()))) if columns else 0
+        errors = {}
+        cleaned = {}
+        for field in self.fields:
+            column = columns.get(field.attname)
+            if column is None:
+                column = self.default_column(field, size)
+            if column is None:
+                # every row has the same default, so it is cleaned once
+                value, messages = self.clean_value(field, field.get_default(), None)
+                if messages:
+                    for index in range(size):
+                        errors.setdefault(index, OrderedDict())[field.name] = list(messages)
+                cleaned[field.attname] = [value] * size
+            else:
+                cleaned[field.attname] = self.clean_column(field, column, errors)
+
+        for rule in self.rules:
+            rule_columns = {name: self.rule_column(name, cleaned) for name in rule.fields}
+            for index, messages in rule.errors(rule_columns, size).items():
+                errors.setdefault(index, OrderedDict()).setdefault(NON_FIELD_ERRORS, []).extend(messages)
+
+        if self.validate_unique:
+            for model_class, unique_check in self.unique_checks:
+                self.check_unique(model_class, unique_check, cleaned, errors, size)
+
+        return ValidationReport(size, OrderedDict(sorted(errors.items())), cleaned)
+
+    def default_column(self, field, size):
+        """
+        The column of a field no row gives, where its default is callable;
+        None where every row has the same default.
+        """
+        if field.has_default() and callable(field.default):
+            return [field.get_default() for _ in range(size)]
+        if field.is_relation and field.get_default() is not None:
+            # the target of the default still has to exist
+            return [field.get_default()] * size
+        return None
+
+    def rule_column(self, name, cleaned):
+        field = self.model._meta.get_field(name)
+        return cleaned[field.attname]
+
+    def clean_column(self, field, column, errors):
+        """
+        The cleaned values of one column, as Model.clean_fields() would set
+        them; failures are added to `errors`.
+        """
+        results = {}
+        existing = self.existing_targets(field, column) if field.is_relation else None
+        values = []
+        for index, value in enumerate(column):
+            key = value_key(value)
+            try:
+                result = results[key]
+            except KeyError:
+                result = results[key] = self.clean_value(field, value, existing)
+            except TypeError:
+                # unhashable
+                result = self.clean_value(field, value, existing)
+            value, messages = result
+            if messages:
+                errors.setdefault(index, OrderedDict())[field.name] = list(messages)
+            values.append(value)
+        return values
+
+    def clean_value(self, field, value, existing):
+        """
+        (cleaned value, None) or (raw value, messages) for one value.
+        """
+        if field.blank and value in field.empty_values:
+            return value, None
+        try:
+            if existing is not None:
+                python = field.to_python(value)
+                if python in existing:
+                    # known to exist, so only the validators are left
+                    field.run_validators(python)
+                    return python, None
+            return field.clean(value, None), None
+        except ValidationError as e:
+            return value, e.messages
+
+    def existing_targets(self, field, column):
+        """
+        The values of a foreign key column whose targets exist.
+        """
+        target = field.target_field
+        values = set()
+        for value in column:
+            if value in field.empty_values:
+                continue
+            try:
+                values.add(field.to_python(value))
+            except (ValidationError, TypeError):
+                continue
+        values = sorted(values, key=repr)
+        existing = set()
+        manager = field.remote_field.model._base_manager.using(self.using)
+        for start in range(0, len(values), CHUNK_SIZE):
+            existing.update(manager.filter(**{
+                target.attname + '__in': values[start:start + CHUNK_SIZE]
+            }).values_list(target.attname, flat=True))
+        return existing
+
+    def check_unique(self, model_class, unique_check, cleaned, errors, size):
+        """
+        Model._perform_unique_checks() for every row, a chunk of rows per
+        query.
+        """
+        fields = [self.model._meta.get_field(name) for name in unique_check]
+        lookups = {}
+        for index in range(size):
+            row_errors = errors.get(index, {})
+            if any(f.name in row_errors for f in fields):
+                # full_clean() leaves fields which failed out of the checks
+                continue
+            values = tuple(cleaned[f.attname][index] for f in fields)
+            if any(value is None for value in values):
+                continue
+            lookups.setdefault(values, []).append(index)
+        if not lookups:
+            return
+
+        names = [f.attname for f in fields]
+        taken = set()
+        manager = model_class._default_manager.using(self.using)
+        keys = list(lookups)
+        for start in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[start:start + CHUNK_SIZE]
+            if len(names) == 1:
+                queryset = manager.filter(**{names[0] + '__in': [values[0] for values in chunk]})
+            else:
+                condition = Q()
+                for values in chunk:
+                    condition |= Q(**dict(zip(names, values)))
+                queryset = manager.filter(condition)
+            taken.update(tuple(row) for row in queryset.values_list(*names))
+
+        key = unique_check[0] if len(unique_check) == 1 else NON_FIELD_ERRORS
+        message = None
+        for values, indexes in lookups.items():
+            if values not in taken:
+                continue
+            if message is None:
+                message = self.model().unique_error_message(model_class, unique_check).messages
+            for index in indexes:
+                errors.setdefault(index, OrderedDict()).setdefault(key, []).extend(message)
+
+
+def validate_rows(model, rows, validate_unique=True, using=None):
+    return BatchValidator(model, validate_unique, using).validate(rows)
@@ -0,0 +1,329 @@
+"""
+A benchmark suite for the hot paths, run by the benchmark_openehr command.
+
+Each benchmark builds its own data from a seeded random generator, so two
+runs with the same seed and scale do the same work, and runs inside a
+transaction which is rolled back, so the database is left as it was. Any
+configured database can be used: SQLite by default, PostgreSQL with
+--database.
+
+Nothing commits, so the work a commit would set off (audit entries,
+summaries, composition documents, search index updates, see
+transaction.on_commit()) is run by hand inside the transaction before it
+is rolled back: that of the set up untimed, and that of the benchmarked
+operation as part of its time.
+
+Every benchmark is run `repeat` times and reports its median. Results are a
+JSON document; compare() sets a run against a saved baseline.
+
+    insert.<model>       save() of `scale` instances, signals and their
+                         on_commit work included
+    read.<model>         fetching those instances back in one query
+    graph.demographics   with_full_demographics() of `scale` patients
+    graph.symptomsign    all_previous_episodes() along a chain of
+                         `scale` episodes
+    export.<model>       serializer stream of `scale` instances
+    validate.full_clean  full_clean() of `validation_rows` dosage rows
+                         (100,000 by default), one instance per row
+    validate.batch       BatchValidator over the same rows, for the
+                         speed-up over validate.full_clean
+"""
+import datetime
+import decimal
+import platform
+import random
+import statistics
+import string
+import time
+
+import django
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from django_openehr import archetypes
+from django_openehr.batch_validation import BatchValidator
+from django_openehr.managers import DemographicPersonalQuerySet
+from django_openehr.models import (
+    AddressDetails,
+    DemographicPersonal,
+    Identifier,
+    PersonName,
+    SymptomSign,
+    TelecomDetails,
+    TherapeuticDirection,
+    TherapeuticDirectionDosage,
+)
+from django_openehr.serializers import get_serializer
+
+# a metric whose median is more than this much slower than the baseline is
+# a regression
+DEFAULT_THRESHOLD = 0.10
+
+DEFAULT_VALIDATION_ROWS = 100000
+
+# raw dosage values as a feed would give them, a few of them invalid
+DOSE_AMOUNTS = ('0.5', '1', '1.5', '2', '2.5', '5', '10', '12.5', '20', '0', 'two')
+DOSE_UNITS = ('mg', 'ml', 'tablet', 'capsule', 'puff')
+
+
+class Rollback(Exception):
+    pass
+
+
+def sample_value(field, rng):
+    """
+    A random value which fits `field`.
+    """
+    if field.choices:
+        return rng.choice([code for code, _ in field.flatchoices])
+    internal_type = field.get_internal_type()
+    if internal_type in ('CharField', 'TextField'):
+        length = min(field.max_length or 200, 20)
+        return ''.join(rng.choice(string.ascii_letters) for _ in range(rng.randint(1, length)))
+    if internal_type == 'DateTimeField':
+        value = datetime.datetime(2000, 1, 1) + datetime.timedelta(seconds=rng.randint(0, 10 ** 9))
+        return timezone.make_aware(value, timezone.utc)
+    if internal_type == 'DateField':
+        return datetime.date(2000, 1, 1) + datetime.timedelta(days=rng.randint(0, 10000))
+    if internal_type == 'DecimalField':
+        whole = 10 ** min(field.max_digits - field.decimal_places, 4)
+        return decimal.Decimal(rng.randint(0, whole * 10 ** field.decimal_places - 1)).scaleb(-field.decimal_places)
+    if internal_type == 'FloatField':
+        return rng.random() * 100
+    if internal_type in ('BooleanField', 'NullBooleanField'):
+        return rng.random() < 0.5
+    if internal_type in ('IntegerField', 'PositiveIntegerField', 'BigIntegerField'):
+        return rng.randint(0, 1000)
+    return None
+
+
+def sample_instance(model, rng, using):
+    """
+    An unsaved instance of `model` with every field filled in, and any
+    instance a foreign key requires saved first.
+    """
+    values = {}
+    for field in model._meta.concrete_fields:
+        if field.primary_key:
+            continue
+        if field.is_relation:
+            values[field.name] = sample_instance(field.related_model, rng, using)
+            values[field.name].save(using=using)
+        else:
+            values[field.name] = sample_value(field, rng)
+    return model(**values)
+
+
+def timed(function):
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+
+class Benchmark(object):
+
+    def __init__(self, scale=200, repeat=5, seed=0, using=None, models=None,
+                 validation_rows=DEFAULT_VALIDATION_ROWS):
+        self.scale = scale
+        self.repeat = repeat
+        self.seed = seed
+        self.using = using or router.db_for_write(DemographicPersonal)
+        self.models = models or archetypes.archetype_models()
+        # 0 leaves the validation benchmarks out
+        self.validation_rows = validation_rows
+
+    def run(self):
+        results = {}
+        for name, function, operations in self.benchmarks():
+            runs = [self.measure(function) for _ in range(self.repeat)]
+            seconds = statistics.median(runs)
+            results[name] = {
+                'operations': operations,
+                'seconds': seconds,
+                'operations_per_second': operations / seconds if seconds else None,
+                'runs': runs,
+            }
+        return {'meta': self.meta(), 'results': results}
+
+    def meta(self):
+        connection = connections[self.using]
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'scale': self.scale,
+            'validation_rows': self.validation_rows,
+            'repeat': self.repeat,
+            'seed': self.seed,
+        }
+
+    def measure(self, function):
+        """
+        Seconds taken by function(rng) in a transaction which is then rolled
+        back; function returns the timed callable after doing its set up.
+        """
+        rng = random.Random(self.seed)
+        elapsed = None
+        try:
+            with transaction.atomic(using=self.using):
+                run = function(rng)
+                self.run_on_commit()
+
+                def run_and_commit():
+                    run()
+                    self.run_on_commit()
+                elapsed = timed(run_and_commit)
+                raise Rollback
+        except Rollback:
+            pass
+        return elapsed
+
+    def run_on_commit(self):
+        """
+        Run, and forget, the callbacks waiting for the transaction to
+        commit, as a commit would; those they register in turn are run too.
+        """
+        connection = connections[self.using]
+        while connection.run_on_commit:
+            callbacks, connection.run_on_commit = connection.run_on_commit, []
+            for _, callback in callbacks:
+                callback()
+
+    def benchmarks(self):
+        """
+        Yield (name, setup function, operations) for every benchmark.
+        """
+        for model in self.models:
+            yield 'insert.{0}'.format(model._meta.model_name), self.insert(model), self.scale
+        for model in self.models:
+            yield 'read.{0}'.format(model._meta.model_name), self.read(model), self.scale
+        yield 'graph.demographics', self.demographics_graph, self.scale
+        yield 'graph.symptomsign', self.symptom_sign_graph, self.scale
+        for model in self.models:
+            yield 'export.{0}'.format(model._meta.model_name), self.export(model), self.scale
+        if self.validation_rows:
+            yield 'validate.full_clean', self.validate_full_clean, self.validation_rows
+            yield 'validate.batch', self.validate_batch, self.validation_rows
+
+    def create(self, model, rng, count=None):
+        instances = [sample_instance(model, rng, self.using) for _ in range(count or self.scale)]
+        for instance in instances:
+            instance.save(using=self.using)
+        return instances
+
+    def insert(self, model):
+        def setup(rng):
+            instances = [sample_instance(model, rng, self.using) for _ in range(self.scale)]
+
+            def run():
+                for instance in instances:
+                    instance.save(using=self.using)
+            return run
+        return setup
+
+    def read(self, model):
+        def setup(rng):
+            pks = [instance.pk for instance in self.create(model, rng)]
+
+            def run():
+                list(model._default_manager.using(self.using).filter(pk__in=pks))
+            return run
+        return setup
+
+    def export(self, model):
+        def setup(rng):
+            pks = [instance.pk for instance in self.create(model, rng)]
+            queryset = model._default_manager.using(self.using).filter(pk__in=pks)
+
+            def run():
+                for _ in get_serializer(model).stream(queryset):
+                    pass
+            return run
+        return setup
+
+    def create_patients(self, rng):
+        patients = self.create(DemographicPersonal, rng)
+        for patient in patients:
+            patient.person_name.add(*self.create(PersonName, rng, 2))
+            patient.address_details.add(*self.create(AddressDetails, rng, 1))
+            patient.telecom_details.add(*self.create(TelecomDetails, rng, 2))
+            patient.identifier.add(*self.create(Identifier, rng, 2))
+        return patients
+
+    def demographics_graph(self, rng):
+        pks = [patient.pk for patient in self.create_patients(rng)]
+
+        def run():
+            for patient in DemographicPersonal.objects.using(self.using).with_full_demographics().filter(pk__in=pks):
+                for slot in DemographicPersonalQuerySet.CLUSTER_SLOTS:
+                    list(getattr(patient, slot).all())
+        return run
+
+    def symptom_sign_graph(self, rng):
+        chain = self.create(SymptomSign, rng)
+        for later, earlier in zip(chain[1:], chain):
+            later.previous_episodes.add(earlier)
+        head = chain[-1]
+
+        def run():
+            list(head.all_previous_episodes())
+        return run
+
+    def dosage_rows(self, rng):
+        """
+        `validation_rows` rows of raw TherapeuticDirectionDosage values, for
+        a handful of saved directions.
+        """
+        directions = [direction.pk for direction in self.create(TherapeuticDirection, rng, 10)]
+        # one which does not exist
+        directions.append(max(directions) + 1)
+        return [
+            {
+                'therapeutic_direction_id': rng.choice(directions),
+                'dosage_sequence': rng.randint(0, 4),
+                'dose_amount_exact': rng.choice(DOSE_AMOUNTS),
+                'dose_unit': rng.choice(DOSE_UNITS),
+            }
+            for _ in range(self.validation_rows)
+        ]
+
+    def validate_full_clean(self, rng):
+        rows = self.dosage_rows(rng)
+
+        def run():
+            for row in rows:
+                try:
+                    TherapeuticDirectionDosage(**row).full_clean()
+                except ValidationError:
+                    pass
+        return run
+
+    def validate_batch(self, rng):
+        rows = self.dosage_rows(rng)
+
+        def run():
+            BatchValidator(TherapeuticDirectionDosage, using=self.using).validate(rows)
+        return run
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    {metric: {'baseline', 'current', 'change', 'regression'}} for the
+    metrics in both `results` and `baseline`, where change is the relative
+    change in median seconds (0.25 is 25% slower).
+    """
+    comparison = {}
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None or not previous['seconds']:
+            continue
+        change = current['seconds'] / previous['seconds'] - 1
+        comparison[name] = {
+            'baseline': previous['seconds'],
+            'current': current['seconds'],
+            'change': change,
+            'regression': change > threshold,
+        }
+    return comparison
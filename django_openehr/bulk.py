@@ -0,0 +1,340 @@
+import itertools
+import sys
+import time
+from collections import Counter, OrderedDict
+
+from django.db import connections, models, router, transaction
+from django.db.models.sql import InsertQuery
+
+from django_openehr.models import DemographicPersonal
+
+
+# a saved model instance plus its many-to-many bookkeeping costs several times
+# the size of the plain dict it was built from, so each record's estimated
+# size is multiplied by this factor when it is counted against the budget
+INSTANCE_OVERHEAD = 4
+
+
+def estimate_size(value):
+    """
+    Rough, recursive estimate of the memory held by a nested record.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += estimate_size(k) + estimate_size(v)
+    elif isinstance(value, (list, tuple, set)):
+        for v in value:
+            size += estimate_size(v)
+    return size
+
+
+def can_return_pks(model, connection):
+    # SQLite gained INSERT ... RETURNING in 3.35
+    return (
+        connection.vendor == 'sqlite'
+        and connection.Database.sqlite_version_info >= (3, 35)
+        and isinstance(model._meta.pk, models.AutoField)
+    )
+
+
+def insert_returning_pks(model, instances, using, batch_size=None):
+    """
+    INSERT `instances` (none of which has a primary key yet) and set their
+    primary keys from INSERT ... RETURNING.
+
+    RETURNING gives the rows in no particular order, but rowids are handed
+    out in increasing order as the rows of one INSERT are written, so the
+    sorted keys are those of the instances in order, gaps or not.
+    """
+    connection = connections[using]
+    opts = model._meta
+    fields = [f for f in opts.concrete_fields if not isinstance(f, models.AutoField)]
+    max_batch_size = max(connection.ops.bulk_batch_size(fields, instances), 1)
+    batch_size = min(batch_size, max_batch_size) if batch_size else max_batch_size
+    returning = ' RETURNING {0}'.format(connection.ops.quote_name(opts.pk.column))
+    with connection.cursor() as cursor:
+        for start in range(0, len(instances), batch_size):
+            batch = instances[start:start + batch_size]
+            query = InsertQuery(model)
+            query.insert_values(fields, batch)
+            pks = []
+            for sql, params in query.get_compiler(using=using).as_sql():
+                cursor.execute(sql + returning, params)
+                pks.extend(row[0] for row in cursor.fetchall())
+            for obj, pk in zip(batch, sorted(pks)):
+                obj.pk = pk
+                obj._state.adding = False
+                obj._state.db = using
+    return instances
+
+
+def bulk_create_with_pks(model, instances, using, batch_size=None):
+    """
+    bulk_create() which guarantees every instance has a primary key afterwards,
+    so that many-to-many through rows can be written for it.
+    """
+    if not instances:
+        return instances
+    connection = connections[using]
+    if can_return_pks(model, connection) and all(obj.pk is None for obj in instances):
+        return insert_returning_pks(model, instances, using, batch_size)
+    model._default_manager.using(using).bulk_create(
+        instances, batch_size=batch_size
+    )
+    missing = [obj for obj in instances if obj.pk is None]
+    if not missing:
+        # the backend returned the new primary keys (e.g. PostgreSQL)
+        return instances
+    # no way to recover the keys in bulk, so fall back to one INSERT per row
+    for obj in missing:
+        obj.save(using=using, force_insert=True)
+    return instances
+
+
+class BulkLoadReport(object):
+    """
+    Counts and throughput for a GraphLoader run.
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.chunks = 0
+        self.rows = Counter()
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def records_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return self.records / self.elapsed
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return sum(self.rows.values()) / self.elapsed
+
+    def as_dict(self):
+        return {
+            'records': self.records,
+            'chunks': self.chunks,
+            'rows': dict(self.rows),
+            'elapsed_seconds': round(self.elapsed, 3),
+            'records_per_second': round(self.records_per_second, 1),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+    def __str__(self):
+        return "{0} records ({1} rows) in {2:.1f}s: {3:.0f} records/s, {4:.0f} rows/s".format(
+            self.records,
+            sum(self.rows.values()),
+            self.elapsed,
+            self.records_per_second,
+            self.rows_per_second,
+        )
+
+
+class GraphLoader(object):
+    """
+    Writes batches of nested dicts as whole object graphs using bulk_create,
+    many-to-many through rows included.
+
+    Each record is a dict of field values for `model`. Many-to-many slots are
+    given as lists whose items are either nested dicts (created recursively) or
+    existing instances, e.g. for DemographicPersonal:
+
+        {
+            'gender': 'FEMALE',
+            'person_name': [{'given_name': 'Ada', 'family_name': 'Lovelace'}],
+            'identifier': [{'identifier': '9434765919', 'identifier_type': 'NHS'}],
+        }
+
+    Reverse foreign keys can be given the same way under their accessor name,
+    e.g. 'therapeuticdirectiondosage_set' for a TherapeuticDirection.
+
+    Records are consumed lazily, one chunk at a time, and every chunk is
+    written in its own transaction, so memory use is bounded by the chunk size
+    rather than by the size of the feed.
+    """
+
+    def __init__(self, model=DemographicPersonal, chunk_size=1000,
+                 batch_size=500, memory_budget=None, using=None,
+                 on_chunk=None):
+        self.model = model
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        # memory_budget is in bytes, and caps the chunk size
+        self.memory_budget = memory_budget
+        self.using = using or router.db_for_write(model)
+        # called with the BulkLoadReport after every committed chunk
+        self.on_chunk = on_chunk
+
+    def _chunks(self, records):
+        records = iter(records)
+        if not self.memory_budget:
+            while True:
+                chunk = list(itertools.islice(records, self.chunk_size))
+                if not chunk:
+                    return
+                yield chunk
+        # every record is measured, as one large record early on says little
+        # about the size of the rest
+        chunk = []
+        used = 0
+        for record in records:
+            size = estimate_size(record) * INSTANCE_OVERHEAD
+            if chunk and (len(chunk) >= self.chunk_size or used + size > self.memory_budget):
+                yield chunk
+                chunk = []
+                used = 0
+            chunk.append(record)
+            used += size
+        if chunk:
+            yield chunk
+
+    def load(self, records):
+        """
+        Write every record and return a BulkLoadReport.
+        """
+        report = BulkLoadReport()
+        for chunk in self._chunks(records):
+            with transaction.atomic(using=self.using):
+                self.write(self.model, chunk, report.rows)
+            report.records += len(chunk)
+            report.chunks += 1
+            if self.on_chunk is not None:
+                self.on_chunk(report)
+        report.finished = time.monotonic()
+        return report
+
+    def reuse_existing(self, model, instances):
+        """
+        For models with a unique_together constraint (e.g. Identifier), swap
+        new instances for the existing row, or for an earlier instance in the
+        same chunk, with the same key rather than inserting a duplicate.
+        """
+        if not model._meta.unique_together:
+            return instances
+        fields = model._meta.unique_together[0]
+
+        def key(obj):
+            return tuple(getattr(obj, f) for f in fields)
+
+        def mergeable(obj):
+            # the database never treats NULLs as equal, so neither do we
+            return None not in key(obj)
+
+        candidates = [obj for obj in instances if obj.pk is None and mergeable(obj)]
+        if not candidates:
+            return instances
+        known = {}
+        lookup = {fields[-1] + '__in': {key(obj)[-1] for obj in candidates}}
+        for existing in model._default_manager.using(self.using).filter(**lookup):
+            known[key(existing)] = existing
+        resolved = []
+        for obj in instances:
+            if obj.pk is None and mergeable(obj):
+                obj = known.setdefault(key(obj), obj)
+            resolved.append(obj)
+        return resolved
+
+    def write(self, model, records, rows):
+        """
+        Write one chunk of `model` records, without opening a transaction, and
+        return the saved instances in record order. `rows` is a Counter of
+        rows written per table.
+        """
+        m2m_fields = {f.name: f for f in model._meta.many_to_many}
+        reverse_fks = {
+            rel.get_accessor_name(): rel
+            for rel in model._meta.related_objects if rel.one_to_many
+        }
+        instances = []
+        # field name -> list of (parent index, child record or instance)
+        links = {name: [] for name in m2m_fields}
+        dependants = {name: [] for name in reverse_fks}
+
+        for index, record in enumerate(records):
+            if isinstance(record, model):
+                instances.append(record)
+                continue
+            values = {}
+            for key, value in record.items():
+                if key in m2m_fields:
+                    links[key].extend((index, child) for child in value or ())
+                elif key in reverse_fks:
+                    dependants[key].extend((index, child) for child in value or ())
+                else:
+                    values[key] = value
+            instances.append(model(**values))
+
+        # children first, so that their primary keys exist for the through rows
+        for name, pairs in links.items():
+            if not pairs:
+                continue
+            children = self.write(
+                m2m_fields[name].related_model, [child for _, child in pairs], rows
+            )
+            links[name] = [
+                (index, child) for (index, _), child in zip(pairs, children)
+            ]
+
+        for obj in instances:
+            # bulk_create() bypasses save(), which maintains derived columns
+            if obj.pk is None and hasattr(obj, 'populate_derived_fields'):
+                obj.populate_derived_fields()
+        instances = self.reuse_existing(model, instances)
+
+        new_instances = []
+        seen = set()
+        for obj in instances:
+            if obj.pk is None and id(obj) not in seen:
+                seen.add(id(obj))
+                new_instances.append(obj)
+        bulk_create_with_pks(model, new_instances, self.using, self.batch_size)
+        rows[model._meta.label] += len(new_instances)
+
+        for name, pairs in links.items():
+            if not pairs:
+                continue
+            field = m2m_fields[name]
+            through = field.remote_field.through
+            source = through._meta.get_field(field.m2m_field_name()).attname
+            target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+            symmetrical = (
+                field.remote_field.symmetrical and field.related_model is model
+            )
+            edges = OrderedDict()
+            for index, child in pairs:
+                parent_pk = instances[index].pk
+                edges[(parent_pk, child.pk)] = None
+                if symmetrical and parent_pk != child.pk:
+                    edges[(child.pk, parent_pk)] = None
+            through_rows = [
+                through(**{source: parent_pk, target: child_pk})
+                for parent_pk, child_pk in edges
+            ]
+            through._default_manager.using(self.using).bulk_create(
+                through_rows, batch_size=self.batch_size
+            )
+            rows[through._meta.label] += len(through_rows)
+
+        # rows holding a foreign key to this model can only be written now
+        for name, pairs in dependants.items():
+            if not pairs:
+                continue
+            rel = reverse_fks[name]
+            children = []
+            for index, child in pairs:
+                child = dict(child)
+                child[rel.field.attname] = instances[index].pk
+                children.append(child)
+            self.write(rel.related_model, children, rows)
+
+        return instances
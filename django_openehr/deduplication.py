@@ -0,0 +1,325 @@
+"""
+Duplicate patient detection for DemographicPersonal.
+
+Comparing every pair of patients is O(n^2), so a run works in two resumable
+phases:
+
+1. KEYS: every patient gets a handful of blocking keys built from date of
+   birth, normalized post code and phonetic family name keys, stored in
+   PatientBlockingKey (indexed on key).
+2. SCORING: the keys are streamed in order; patients sharing a key form a
+   block, and only pairs within a block are scored, across a process pool.
+   Pairs scoring above the threshold are written to DuplicateCandidate,
+   with the run which found them: a pair an earlier run found gets this
+   run's score, and the pairs this run did not find again are removed when
+   it finishes.
+
+DeduplicationRun records a checkpoint after every chunk of patients and every
+batch of blocks, so an interrupted run carries on where it stopped, and keeps
+the counters from which pairs/second is reported.
+"""
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import transaction
+from django.utils import timezone
+
+from django_openehr.models import (
+    DeduplicationRun,
+    DemographicPersonal,
+    DuplicateCandidate,
+    PatientBlockingKey,
+)
+from django_openehr.phonetics import jaro_winkler
+from django_openehr.utils import chunked_queryset
+from django_openehr.validators import normalize_post_code
+
+# blocks bigger than this (e.g. everyone born on 1 January 1900, a common
+# placeholder) would reintroduce the quadratic cost, so they are skipped
+MAX_BLOCK_SIZE = 200
+
+# primary keys per IN (...), well within SQLite's 999 variables per query
+IN_CHUNK = 500
+
+# relative weight of each kind of evidence in score_pair()
+WEIGHTS = {
+    'identifier': 0.35,
+    'name': 0.30,
+    'date_of_birth': 0.20,
+    'post_code': 0.10,
+    'gender': 0.05,
+}
+
+
+def date_of_birth(value):
+    """
+    The calendar date of a date of birth, as ISO 8601: the date in the
+    current time zone, not in UTC, or a birth just after local midnight
+    would fall on the day before.
+    """
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        return timezone.localdate(value).isoformat()
+    return value.date().isoformat()
+
+
+def patient_record(patient):
+    """
+    The plain, picklable summary of a patient which blocking and scoring
+    work on; expects the cluster slots to have been prefetched.
+    """
+    return {
+        'pk': patient.pk,
+        'date_of_birth': date_of_birth(patient.date_of_birth),
+        'gender': patient.gender,
+        'names': [(n.given_name or '', n.family_name or '') for n in patient.person_name.all()],
+        'family_keys': [
+            (n.family_name_soundex, n.family_name_metaphone)
+            for n in patient.person_name.all() if n.family_name
+        ],
+        'post_codes': sorted({
+            normalize_post_code(a.post_code) for a in patient.address_details.all() if a.post_code
+        }),
+        'identifiers': sorted({
+            i.normalized_identifier for i in patient.identifier.all() if i.normalized_identifier
+        }),
+    }
+
+
+def blocking_keys(record):
+    keys = set()
+    dob = record['date_of_birth']
+    for family_soundex, family_metaphone in record['family_keys']:
+        if dob:
+            keys.add('dob+name:{0}:{1}'.format(dob, family_metaphone))
+        for post_code in record['post_codes']:
+            keys.add('pc+name:{0}:{1}'.format(post_code, family_soundex))
+    if dob:
+        for post_code in record['post_codes']:
+            keys.add('dob+pc:{0}:{1}'.format(dob, post_code))
+    for identifier in record['identifiers']:
+        keys.add('id:{0}'.format(identifier))
+    return keys
+
+
+def score_pair(a, b):
+    """
+    Likelihood, between 0.0 and 1.0, that two patient records describe the
+    same person; only evidence present on both records counts.
+    """
+    score = 0.0
+    weight = 0.0
+    if a['identifiers'] and b['identifiers']:
+        weight += WEIGHTS['identifier']
+        if set(a['identifiers']) & set(b['identifiers']):
+            score += WEIGHTS['identifier']
+    if a['names'] and b['names']:
+        weight += WEIGHTS['name']
+        best_name = 0.0
+        for given_a, family_a in a['names']:
+            for given_b, family_b in b['names']:
+                similarity = 0.7 * jaro_winkler(family_a, family_b) + 0.3 * jaro_winkler(given_a, given_b)
+                best_name = max(best_name, similarity)
+        score += WEIGHTS['name'] * best_name
+    if a['date_of_birth'] and b['date_of_birth']:
+        weight += WEIGHTS['date_of_birth']
+        if a['date_of_birth'] == b['date_of_birth']:
+            score += WEIGHTS['date_of_birth']
+        else:
+            # day and month transposed is a common keying error
+            year_a, month_a, day_a = a['date_of_birth'].split('-')
+            year_b, month_b, day_b = b['date_of_birth'].split('-')
+            if year_a == year_b and (month_a, day_a) == (day_b, month_b):
+                score += WEIGHTS['date_of_birth'] / 2
+    if a['post_codes'] and b['post_codes']:
+        weight += WEIGHTS['post_code']
+        if set(a['post_codes']) & set(b['post_codes']):
+            score += WEIGHTS['post_code']
+    if a['gender'] and b['gender']:
+        weight += WEIGHTS['gender']
+        if a['gender'] == b['gender']:
+            score += WEIGHTS['gender']
+    # a name alone is not enough to call two records the same person
+    if weight <= WEIGHTS['name']:
+        return 0.0
+    return score / weight
+
+
+def score_block(block_key, records, threshold):
+    """
+    Score every pair within one block; runs in a worker process.
+    Returns (block_key, pairs scored, [(pk, pk, score), ...]).
+    """
+    matches = []
+    pairs = 0
+    for a, b in itertools.combinations(sorted(records, key=lambda r: r['pk']), 2):
+        pairs += 1
+        score = score_pair(a, b)
+        if score >= threshold:
+            matches.append((a['pk'], b['pk'], score))
+    return block_key, pairs, matches
+
+
+def iter_blocks(after_key='', chunk_size=10000):
+    """
+    Yield (key, [patient pk, ...]) for every blocking key after `after_key`,
+    streaming the key index in keyset chunks.
+    """
+    block_key, members = None, []
+    last = (after_key, 0)
+    while True:
+        rows = list(
+            PatientBlockingKey.objects.filter(key__gte=last[0])
+            .exclude(key=last[0], patient_id__lte=last[1])
+            .order_by('key', 'patient_id')
+            .values_list('key', 'patient_id')[:chunk_size]
+        )
+        if not rows:
+            break
+        for key, patient_id in rows:
+            if key != block_key:
+                if block_key is not None and block_key > after_key:
+                    yield block_key, members
+                block_key, members = key, []
+            members.append(patient_id)
+        last = rows[-1]
+    if block_key is not None and block_key > after_key:
+        yield block_key, members
+
+
+class Deduplicator(object):
+
+    def __init__(self, workers=4, threshold=0.75, max_block_size=MAX_BLOCK_SIZE,
+                 chunk_size=1000, blocks_per_batch=500, stdout=None):
+        self.workers = workers
+        self.threshold = threshold
+        self.max_block_size = max_block_size
+        self.chunk_size = chunk_size
+        self.blocks_per_batch = blocks_per_batch
+        self.stdout = stdout
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def run(self, resume=True):
+        """
+        Carry on with the latest unfinished run (or start a new one) and
+        return the finished DeduplicationRun.
+        """
+        run = None
+        if resume:
+            run = DeduplicationRun.objects.exclude(phase='DONE').order_by('-pk').first()
+        if run is None:
+            run = DeduplicationRun.objects.create()
+        if run.phase == 'KEYS':
+            self.generate_keys(run)
+        if run.phase == 'SCORING':
+            self.score(run)
+        return run
+
+    def generate_keys(self, run):
+        queryset = DemographicPersonal.objects.with_full_demographics().filter(
+            pk__gt=run.last_patient_pk
+        )
+        for chunk in chunked_queryset(queryset, self.chunk_size):
+            keys = []
+            for patient in chunk:
+                for key in blocking_keys(patient_record(patient)):
+                    keys.append(PatientBlockingKey(key=key[:100], patient_id=patient.pk))
+            with transaction.atomic():
+                PatientBlockingKey.objects.filter(patient__in=chunk).delete()
+                PatientBlockingKey.objects.bulk_create(keys, batch_size=1000)
+                run.last_patient_pk = chunk[-1].pk
+                run.save(update_fields=['last_patient_pk'])
+            self.log("keys: up to patient {0}".format(run.last_patient_pk))
+        run.phase = 'SCORING'
+        run.save(update_fields=['phase'])
+
+    def load_records(self, pks):
+        pks = sorted(pks)
+        records = {}
+        for start in range(0, len(pks), IN_CHUNK):
+            queryset = DemographicPersonal.objects.with_full_demographics().filter(
+                pk__in=pks[start:start + IN_CHUNK]
+            )
+            records.update((patient.pk, patient_record(patient)) for patient in queryset)
+        return records
+
+    def score(self, run):
+        blocks = (
+            (key, members) for key, members in iter_blocks(run.last_block_key)
+            if 1 < len(members) <= self.max_block_size
+        )
+        executor = ProcessPoolExecutor(self.workers) if self.workers else None
+        try:
+            while True:
+                batch = list(itertools.islice(blocks, self.blocks_per_batch))
+                if not batch:
+                    break
+                started = time.monotonic()
+                records = self.load_records({pk for _, members in batch for pk in members})
+                jobs = [
+                    (key, [records[pk] for pk in members if pk in records], self.threshold)
+                    for key, members in batch
+                ]
+                if executor is not None:
+                    results = list(executor.map(score_block, *zip(*jobs), chunksize=16))
+                else:
+                    results = [score_block(*job) for job in jobs]
+                self.save_batch(run, batch[-1][0], results, time.monotonic() - started)
+                self.log("scoring: {0} blocks, {1} pairs, {2:.0f} pairs/s".format(
+                    run.blocks_scored, run.pairs_scored, run.pairs_per_second
+                ))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        with transaction.atomic():
+            # pairs which no longer score above the threshold
+            DuplicateCandidate.objects.exclude(run=run).delete()
+            run.phase = 'DONE'
+            run.finished = timezone.now()
+            run.save(update_fields=['phase', 'finished'])
+
+    def save_batch(self, run, last_block_key, results, seconds):
+        candidates = {}
+        pairs = 0
+        for block_key, block_pairs, matches in results:
+            pairs += block_pairs
+            for patient_id, duplicate_id, score in matches:
+                candidates.setdefault((patient_id, duplicate_id), DuplicateCandidate(
+                    patient_id=patient_id,
+                    duplicate_id=duplicate_id,
+                    score=score,
+                    block_key=block_key[:100],
+                    run=run,
+                ))
+        with transaction.atomic():
+            # a pair found again in a later block (or a resumed batch) of
+            # this run is already recorded, and is neither written nor
+            # counted again; one an earlier run found is rescored
+            recorded = {}
+            patient_ids = sorted({patient_id for patient_id, _ in candidates})
+            for start in range(0, len(patient_ids), IN_CHUNK):
+                for pk, patient_id, duplicate_id, run_id in DuplicateCandidate.objects.filter(
+                    patient_id__in=patient_ids[start:start + IN_CHUNK]
+                ).values_list('pk', 'patient_id', 'duplicate_id', 'run_id'):
+                    recorded[patient_id, duplicate_id] = (pk, run_id)
+            new = []
+            rescored = []
+            for pair, candidate in candidates.items():
+                if pair not in recorded:
+                    new.append(candidate)
+                elif recorded[pair][1] != run.pk:
+                    candidate.pk = recorded[pair][0]
+                    rescored.append(candidate)
+            DuplicateCandidate.objects.bulk_create(new, batch_size=1000, ignore_conflicts=True)
+            DuplicateCandidate.objects.bulk_update(rescored, ['score', 'block_key', 'run'], batch_size=1000)
+            run.last_block_key = last_block_key
+            run.blocks_scored += len(results)
+            run.pairs_scored += pairs
+            run.candidates_found += len(new) + len(rescored)
+            run.scoring_seconds += seconds
+            run.save()
@@ -0,0 +1,420 @@
+"""
+Document store mode: every composition also kept as one JSON document.
+
+With OPENEHR_DOCUMENT_STORE = True, each composition (an instance of an
+archetype model which is not held in another archetype's slot, e.g. a
+ProblemDiagnosis or a DemographicPersonal with its names and addresses) has
+a CompositionDocument row holding
+
+    {"composition": <canonical openEHR JSON, slots nested>,
+     "paths": {<archetype node id>: <value as text>, ...}}
+
+so get_document() reads a whole composition with one primary key fetch
+instead of a join per slot. "paths" holds the composition's own elements,
+with coded text as its code.
+
+The paths declared in OPENEHR_DOCUMENT_PATHS (lowercase model name -> node
+ids) are indexed by create_path_indexes(), run by the rebuild_documents
+command: expression indexes on json_extract() with SQLite's JSON1, and on
+PostgreSQL expression indexes on ->> plus a GIN index for containment.
+find_documents() writes its conditions as the indexed expressions, so path
+queries are index lookups. Path values are compared as text, so only
+text, coded text (by code, for equality) and date paths can be indexed or
+queried: dates and times are held in ISO 8601, in UTC, which orders them
+correctly, whereas numbers would be ordered as strings ('10' < '9').
+
+Documents are rebuilt from the signals of the composition and of every
+model in its slots, batched per transaction as summaries are. Loaders which
+bypass save() send no signals; run rebuild_documents after them.
+"""
+import functools
+import hashlib
+import json
+import re
+import datetime
+import threading
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections, models, router, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.utils import timezone
+
+from django_openehr import archetypes
+from django_openehr.fields import CodedTextField
+from django_openehr.models import CompositionDocument
+from django_openehr.serializers import get_serializer
+from django_openehr.utils import chunked_queryset, to_json
+
+ENABLED = getattr(settings, 'OPENEHR_DOCUMENT_STORE', False)
+
+DOCUMENT_PATHS = getattr(settings, 'OPENEHR_DOCUMENT_PATHS', {
+    'adversereaction': ['causative_agent'],
+    'inpatientadmission': ['date_of_admission', 'admission_method', 'source_of_admission'],
+    'problemdiagnosis': ['problem_diagnosis_name', 'severity', 'diagnostic_certainty'],
+    'symptomsign': ['symptom_sign_name'],
+})
+
+# comparisons find_documents() accepts, e.g. date_of_admission__gte
+OPERATORS = {'exact': '=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+NODE_ID = re.compile(r'^\w+$')
+
+
+def slot_lookup(slot):
+    # reverse foreign keys are accessed as <model>_set but looked up as <model>
+    return slot[:-len('_set')] if slot.endswith('_set') else slot
+
+
+def find_compositions():
+    """
+    The composition models, and {slot model: [(composition model, lookup)]}
+    giving the compositions that hold an instance of each slot model, e.g.
+    PersonName -> (InpatientAdmission, 'referrer_details__person_name').
+    """
+    containers = {}
+    for model in archetypes.archetype_models():
+        for path in get_serializer(model).prefetch_paths():
+            lookup = '__'.join(slot_lookup(part) for part in path.split('__'))
+            related = model
+            for part in lookup.split('__'):
+                related = related._meta.get_field(part).related_model
+            if related is not model:
+                containers.setdefault(related, []).append((model, lookup))
+    compositions = [m for m in archetypes.archetype_models() if m not in containers]
+    return compositions, {
+        slot_model: [(m, lookup) for m, lookup in holders if m in compositions]
+        for slot_model, holders in containers.items()
+    }
+
+
+COMPOSITION_MODELS, CONTAINERS = find_compositions()
+
+_state = threading.local()
+
+
+def _pending():
+    # database alias -> {composition model: primary keys to rebuild}
+    if not hasattr(_state, 'pending'):
+        _state.pending = {}
+    return _state.pending
+
+
+def label(model):
+    return model._meta.label_lower
+
+
+def build_document(instance):
+    """
+    The document of a composition, as a dict; expects its slots to have
+    been prefetched.
+    """
+    serializer = get_serializer(type(instance))
+    paths = {}
+    for field in serializer.get_fields():
+        if field.many_to_many:
+            continue
+        value = getattr(instance, field.attname)
+        if value is not None and value != '':
+            paths[field.name] = path_value(field, value)
+    return {'composition': serializer.to_canonical(instance), 'paths': paths}
+
+
+def rebuild_documents(model, pks=None, using=None, chunk_size=500):
+    """
+    Write the documents of the compositions of `model` in `pks` (default:
+    all of them), and return how many were written.
+    """
+    using = using or router.db_for_write(CompositionDocument)
+    queryset = model._default_manager.using(using).prefetch_related(
+        *get_serializer(model).prefetch_paths()
+    )
+    if pks is not None:
+        queryset = queryset.filter(pk__in=sorted(set(pks)))
+    written = 0
+    for chunk in chunked_queryset(queryset, chunk_size):
+        written += write_documents(model, chunk, using)
+    return written
+
+
+def write_documents(model, instances, using):
+    # the bulk operations bypass auto_now, so `updated` is set here
+    now = timezone.now()
+    documents = {
+        instance.pk: CompositionDocument(
+            model=label(model),
+            object_id=instance.pk,
+            archetype_id=archetypes.archetype_id_for(model),
+            document=json.dumps(build_document(instance), separators=(',', ':')),
+            updated=now,
+        )
+        for instance in instances
+    }
+    if not documents:
+        return 0
+    existing = dict(
+        CompositionDocument.objects.using(using)
+        .filter(model=label(model), object_id__in=list(documents))
+        .values_list('object_id', 'pk')
+    )
+    for object_id, pk in existing.items():
+        documents[object_id].pk = pk
+    with transaction.atomic(using=using):
+        CompositionDocument.objects.using(using).bulk_update(
+            [d for d in documents.values() if d.pk is not None], ['document', 'updated']
+        )
+        CompositionDocument.objects.using(using).bulk_create(
+            [d for d in documents.values() if d.pk is None]
+        )
+    return len(documents)
+
+
+def get_document(model, pk, using=None):
+    """
+    The document of composition `pk` of `model`, built on the spot if it
+    has never been stored, or None.
+    """
+    document = CompositionDocument.objects.using(using).filter(
+        model=label(model), object_id=pk
+    ).first()
+    if document is None:
+        rebuild_documents(model, [pk], using)
+        document = CompositionDocument.objects.using(using).filter(
+            model=label(model), object_id=pk
+        ).first()
+        if document is None:
+            return None
+    return document.data
+
+
+# -- path indexes and queries --------------------------------------------
+
+def path_field(model, node_id):
+    """
+    The field of `model` at path `node_id`, which has to be one whose
+    values compare correctly as text.
+    """
+    try:
+        field = model._meta.get_field(node_id)
+    except FieldDoesNotExist:
+        raise ValueError("{0} has no path {1!r}".format(model.__name__, node_id))
+    # CodedTextField is an integer field, but its paths hold the code
+    if not isinstance(field, (CodedTextField, models.CharField, models.TextField, models.DateField)):
+        raise ValueError(
+            "Path {0} of {1} is a {2}; only text, coded text and date paths "
+            "compare correctly as text".format(node_id, model.__name__, type(field).__name__)
+        )
+    return field
+
+
+def path_value(field, value):
+    """
+    A value of `field` as its path holds it: dates and times in ISO 8601,
+    times in UTC, so every value of a path is written alike.
+    """
+    if isinstance(value, datetime.datetime):
+        if not isinstance(field, models.DateTimeField):
+            value = value.date()
+        elif settings.USE_TZ:
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            value = value.astimezone(datetime.timezone.utc)
+    return str(to_json(value))
+
+
+def path_expression(vendor, node_id):
+    if not NODE_ID.match(node_id):
+        raise ValueError("Invalid archetype node id {0!r}".format(node_id))
+    # the node id is written into the SQL rather than passed as a parameter,
+    # as an expression index is only used for the very same expression
+    if vendor == 'sqlite':
+        return "json_extract(document, '$.paths.{0}')".format(node_id)
+    if vendor == 'postgresql':
+        return "((document::jsonb -> 'paths') ->> '{0}')".format(node_id)
+    raise NotSupportedError("Document path queries need SQLite or PostgreSQL, not {0}".format(vendor))
+
+
+def index_name(model_name, node_id):
+    digest = hashlib.md5('{0}.{1}'.format(model_name, node_id).encode('utf-8')).hexdigest()[:8]
+    return 'openehr_doc_{0}_{1}'.format(node_id[:30], digest)
+
+
+def create_path_indexes(using=None, stdout=None):
+    """
+    CREATE INDEX IF NOT EXISTS for every path in OPENEHR_DOCUMENT_PATHS,
+    and on PostgreSQL the GIN index of the paths; returns the index names.
+    """
+    using = using or router.db_for_write(CompositionDocument)
+    connection = connections[using]
+    table = connection.ops.quote_name(CompositionDocument._meta.db_table)
+    statements = []
+    for model_name, node_ids in sorted(DOCUMENT_PATHS.items()):
+        model = archetypes.model_for_name(model_name)
+        if model is None:
+            raise ValueError("OPENEHR_DOCUMENT_PATHS names no archetype model {0!r}".format(model_name))
+        for node_id in node_ids:
+            path_field(model, node_id)
+            name = index_name(model_name, node_id)
+            statements.append((name, 'CREATE INDEX IF NOT EXISTS {0} ON {1} (model, {2})'.format(
+                name, table, path_expression(connection.vendor, node_id)
+            )))
+    if connection.vendor == 'postgresql':
+        name = 'openehr_doc_paths_gin'
+        statements.append((name, (
+            'CREATE INDEX IF NOT EXISTS {0} ON {1} '
+            "USING gin ((document::jsonb -> 'paths') jsonb_path_ops)"
+        ).format(name, table)))
+    with connection.cursor() as cursor:
+        for name, sql in statements:
+            if stdout is not None:
+                stdout.write(name)
+            cursor.execute(sql)
+    return [name for name, _ in statements]
+
+
+def find_documents(model, using=None, **conditions):
+    """
+    The CompositionDocuments of `model` whose paths match `conditions`,
+    e.g. find_documents(ProblemDiagnosis, severity='Mild',
+    onset_date_time__gte='2019-01-01'); raises ValueError for a path which
+    does not compare as text, or a coded text compared other than exactly.
+    """
+    using = using or router.db_for_read(CompositionDocument)
+    vendor = connections[using].vendor
+    where, params = [], []
+    for key, value in conditions.items():
+        node_id, _, operator = key.partition('__')
+        if operator not in ('', *OPERATORS):
+            raise ValueError("Unsupported comparison {0}".format(key))
+        field = path_field(model, node_id)
+        if isinstance(field, CodedTextField) and operator not in ('', 'exact'):
+            raise ValueError("Coded text {0} can only be compared exactly".format(node_id))
+        where.append('{0} {1} %s'.format(
+            path_expression(vendor, node_id), OPERATORS[operator or 'exact']
+        ))
+        params.append(path_value(field, value))
+    queryset = CompositionDocument.objects.using(using).filter(model=label(model))
+    if where:
+        queryset = queryset.extra(where=where, params=params)
+    return queryset
+
+
+def contains(model, using=None, **paths):
+    """
+    The CompositionDocuments of `model` whose paths include all of `paths`;
+    served by the GIN index on PostgreSQL.
+    """
+    using = using or router.db_for_read(CompositionDocument)
+    if connections[using].vendor != 'postgresql':
+        return find_documents(model, using, **paths)
+    value = json.dumps({k: path_value(path_field(model, k), v) for k, v in paths.items()})
+    return CompositionDocument.objects.using(using).filter(model=label(model)).extra(
+        where=["(document::jsonb -> 'paths') @> %s::jsonb"], params=[value]
+    )
+
+
+# -- keeping documents up to date -----------------------------------------
+
+def flush(using=DEFAULT_DB_ALIAS):
+    pending = _pending().pop(using, None)
+    for model, pks in (pending or {}).items():
+        rebuild_documents(model, pks, using)
+
+
+# one callable per alias, so it can be recognised in the on_commit queue
+_flushers = {}
+
+
+def _flusher(using):
+    if using not in _flushers:
+        _flushers[using] = functools.partial(flush, using)
+    return _flushers[using]
+
+
+def schedule(model, pks, using=DEFAULT_DB_ALIAS):
+    """
+    Queue a rebuild of the documents of the compositions in `pks` for when
+    the current transaction commits.
+    """
+    pks = set(pks)
+    if not pks:
+        return
+    _pending().setdefault(using, {}).setdefault(model, set()).update(pks)
+    connection = connections[using]
+    flusher = _flusher(using)
+    # a rollback throws away the queued callback, so look for it rather than
+    # remembering that it was queued
+    if connection.in_atomic_block and any(f is flusher for _, f in connection.run_on_commit):
+        return
+    transaction.on_commit(flusher, using=using)
+
+
+def schedule_containing(model, pks, using):
+    """
+    Queue the compositions which are, or hold, the instances `pks` of
+    `model`.
+    """
+    if model in COMPOSITION_MODELS:
+        schedule(model, pks, using)
+    for composition, lookup in CONTAINERS.get(model, ()):
+        schedule(composition, composition._default_manager.using(using).filter(
+            **{lookup + '__in': list(pks)}
+        ).values_list('pk', flat=True), using)
+
+
+def instance_saved(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        schedule_containing(sender, [instance.pk], using)
+
+
+def instance_deleting(sender, instance, using, **kwargs):
+    # the compositions holding it have to be found before its slot rows go
+    if sender not in COMPOSITION_MODELS:
+        schedule_containing(sender, [instance.pk], using)
+
+
+def composition_deleted(sender, instance, using, **kwargs):
+    CompositionDocument.objects.using(using).filter(
+        model=label(sender), object_id=instance.pk
+    ).delete()
+
+
+def slot_changed(sender, instance, action, reverse, model, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    if not reverse:
+        if action != 'pre_clear':
+            schedule_containing(type(instance), [instance.pk], using)
+    elif action == 'pre_clear':
+        # the owners have to be found before the rows go
+        owners = model._default_manager.using(using).filter(
+            **{SLOT_FIELDS[sender]: instance}
+        ).values_list('pk', flat=True)
+        schedule_containing(model, list(owners), using)
+    elif pk_set:
+        schedule_containing(model, pk_set, using)
+
+
+# through model -> the slot field it belongs to
+SLOT_FIELDS = {}
+for _model in archetypes.archetype_models():
+    for _field in _model._meta.many_to_many:
+        SLOT_FIELDS[getattr(_model, _field.name).through] = _field.name
+
+
+def connect_signals():
+    """
+    Keep the documents up to date; done when the app is loaded with
+    OPENEHR_DOCUMENT_STORE = True.
+    """
+    for model in archetypes.archetype_models():
+        post_save.connect(instance_saved, sender=model, dispatch_uid='openehr_document_save')
+        pre_delete.connect(instance_deleting, sender=model, dispatch_uid='openehr_document_delete')
+        if model in COMPOSITION_MODELS:
+            post_delete.connect(composition_deleted, sender=model, dispatch_uid='openehr_document_deleted')
+    for through in SLOT_FIELDS:
+        m2m_changed.connect(slot_changed, sender=through, dispatch_uid='openehr_document_slot')
+
+
+if ENABLED:
+    connect_signals()
@@ -0,0 +1,220 @@
+import re
+
+from django.core import checks, exceptions
+from django.db import models
+from django.db.models.lookups import In
+
+
+class CodedTextField(models.PositiveSmallIntegerField):
+    """
+    A DV_CODED_TEXT element, stored as a small integer instead of its code
+    string.
+
+    In Python the value is still the code ('MILD', 'EMERGENCY', ...), so
+    choices, get_FOO_display(), forms and filters such as
+    filter(severity='MILD') work exactly as they did with a CharField; only
+    the column changes. `storage` (code -> integer) says which integer is
+    stored for each code; it is written into the migrations, so reordering
+    the choices changes nothing, and the system checks fail if a code which
+    has already been migrated is given a different integer.
+
+    Text pattern lookups (severity__startswith='MOD', __icontains, __regex,
+    ...) are matched against the codes in Python and run as an IN over the
+    integers of those which match.
+
+    `terminology` and `at_codes` (code -> archetype at-code) record the
+    element's terminology binding for serialization.
+    """
+    description = "Coded text, stored as a small integer"
+
+    def __init__(self, *args, storage=None, terminology='local', at_codes=None, **kwargs):
+        self.storage = storage
+        self.terminology = terminology
+        self.at_codes = at_codes or {}
+        super().__init__(*args, **kwargs)
+        if storage is None:
+            # migrations written before `storage` stored the code's position
+            storage = {code: i for i, (code, _) in enumerate(self.flatchoices, 1)}
+        self._storage = dict(storage)
+        self._codes = {i: code for code, i in self._storage.items()}
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.storage is not None:
+            kwargs['storage'] = self.storage
+        if self.terminology != 'local':
+            kwargs['terminology'] = self.terminology
+        if self.at_codes:
+            kwargs['at_codes'] = self.at_codes
+        return name, path, args, kwargs
+
+    @property
+    def validators(self):
+        # the integer range validators would be checked against code strings
+        return list(self._validators)
+
+    def check(self, **kwargs):
+        errors = super().check(**kwargs)
+        if not self.choices:
+            errors.append(checks.Error(
+                "{0} needs choices".format(type(self).__name__),
+                obj=self,
+                id='django_openehr.E001',
+            ))
+        elif self.storage is None:
+            errors.append(checks.Error(
+                "{0} needs storage, the integer stored for each code".format(type(self).__name__),
+                obj=self,
+                id='django_openehr.E002',
+            ))
+        else:
+            missing = [code for code, _ in self.flatchoices if code not in self.storage]
+            if missing:
+                errors.append(checks.Error(
+                    "storage has no integer for {0}".format(', '.join(missing)),
+                    obj=self,
+                    id='django_openehr.E003',
+                ))
+            if len(self._codes) != len(self.storage) or not all(
+                isinstance(i, int) and 0 <= i <= 32767 for i in self._codes
+            ):
+                errors.append(checks.Error(
+                    "storage must give each code a different integer from 0 to 32767",
+                    obj=self,
+                    id='django_openehr.E004',
+                ))
+        return errors
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self._codes.get(value, value)
+
+    def to_python(self, value):
+        if value is None or value in self._storage:
+            return value
+        if isinstance(value, int) and value in self._codes:
+            return self._codes[value]
+        raise exceptions.ValidationError(
+            self.error_messages['invalid_choice'],
+            code='invalid_choice',
+            params={'value': value},
+        )
+
+    def get_prep_value(self, value):
+        if value is None or value == '':
+            return None
+        if value in self._storage:
+            return self._storage[value]
+        if isinstance(value, int) and value in self._codes:
+            return value
+        raise ValueError("{0!r} is not a code of {1}".format(value, self.name))
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        # a choice field keyed by code; bypass IntegerField's number widgets
+        return models.Field.formfield(self, **kwargs)
+
+    def at_code(self, value):
+        """
+        The archetype at-code of a code, or the code itself where the
+        at-code is not known.
+        """
+        return self.at_codes.get(value, value)
+
+    def code_for(self, value):
+        """
+        The code for an incoming code string or at-code, or None.
+        """
+        if value in self._storage:
+            return value
+        for code, at_code in self.at_codes.items():
+            if at_code == value:
+                return code
+        return None
+
+
+@checks.register(checks.Tags.models)
+def check_migrated_storage(app_configs=None, **kwargs):
+    """
+    Fail when a CodedTextField stores a different integer for a code than
+    its migrations do: the rows already stored would change meaning.
+    """
+    from django.apps import apps
+    from django.db.migrations.loader import MigrationLoader
+
+    fields = [
+        field for model in apps.get_models()
+        if app_configs is None or apps.get_app_config(model._meta.app_label) in app_configs
+        for field in model._meta.local_fields if isinstance(field, CodedTextField)
+    ]
+    if not fields:
+        return []
+    state = MigrationLoader(None, ignore_no_migrations=True).project_state()
+    errors = []
+    for field in fields:
+        key = (field.model._meta.app_label, field.model._meta.model_name)
+        if key not in state.models:
+            continue
+        migrated = dict(state.models[key].fields).get(field.name)
+        if not isinstance(migrated, CodedTextField):
+            continue
+        changed = sorted(
+            code for code, i in field._storage.items()
+            if migrated._storage.get(code, i) != i
+            or migrated._codes.get(i, code) != code
+        )
+        if changed:
+            errors.append(checks.Error(
+                "The integers stored for {0} differ from the migrations'; rows already "
+                "stored would change code".format(', '.join(changed)),
+                hint="Give these codes their migrated integers back in `storage`.",
+                obj=field,
+                id='django_openehr.E005',
+            ))
+    return errors
+
+
+# lookup name -> whether a code matches the pattern
+PATTERNS = {
+    'iexact': lambda code, pattern: code.lower() == pattern.lower(),
+    'contains': lambda code, pattern: pattern in code,
+    'icontains': lambda code, pattern: pattern.lower() in code.lower(),
+    'startswith': lambda code, pattern: code.startswith(pattern),
+    'istartswith': lambda code, pattern: code.lower().startswith(pattern.lower()),
+    'endswith': lambda code, pattern: code.endswith(pattern),
+    'iendswith': lambda code, pattern: code.lower().endswith(pattern.lower()),
+    'regex': lambda code, pattern: re.search(pattern, code) is not None,
+    'iregex': lambda code, pattern: re.search(pattern, code, re.IGNORECASE) is not None,
+}
+
+
+class CodePatternLookup(In):
+    """
+    A text pattern lookup on a CodedTextField; the column holds integers,
+    which the database would compare with the pattern as text, so the codes
+    matching it are found here and looked up with IN.
+    """
+
+    def __init__(self, lhs, rhs):
+        if hasattr(rhs, 'resolve_expression'):
+            raise exceptions.FieldError(
+                "{0} on a coded text cannot compare with an expression".format(self.lookup_name)
+            )
+        field = lhs.output_field
+        try:
+            codes = [
+                code for code in field._storage
+                if PATTERNS[self.lookup_name](code, str(rhs))
+            ]
+        except re.error as e:
+            raise ValueError("Invalid pattern {0!r}: {1}".format(rhs, e))
+        super().__init__(lhs, codes)
+
+
+for _name in PATTERNS:
+    CodedTextField.register_lookup(
+        type('Code{0}'.format(_name.title()), (CodePatternLookup,), {'lookup_name': _name})
+    )
@@ -0,0 +1,208 @@
+"""
+Traversal of the SymptomSign self-links (previous_episodes and
+associated_symptom_sign) in a single query.
+
+Walking the links one hop at a time costs a query per hop. reachable()
+instead fetches everything reachable from a SymptomSign at once:
+
+* with a recursive CTE on backends which support one (PostgreSQL, SQLite),
+* otherwise from SymptomSignClosure, a closure table kept up to date from the
+  m2m_changed and delete signals while such a backend is in use; it can be
+  rebuilt with the rebuild_symptom_closure management command.
+
+Both links are symmetrical, so the graphs are full of cycles. The CTE keeps
+them finite by discarding rows it has already produced (UNION rather than
+UNION ALL). Without a `max_depth` its rows are nodes alone, so each node is
+produced once and the walk costs one pass over the component's edges. With
+one, the rows have to carry their depth to be cut off after `max_depth`
+hops; a node is then produced again for every distinct depth it is reached
+at, up to `max_depth` times, so bounded walks of large, cyclic components
+cost correspondingly more.
+"""
+from collections import deque
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
+
+from django_openehr.models import SymptomSign, SymptomSignClosure
+
+SLOTS = ('previous_episodes', 'associated_symptom_sign')
+
+# also the depth to which the closure table is materialized
+MAX_DEPTH = getattr(settings, 'OPENEHR_GRAPH_MAX_DEPTH', 50)
+
+CTE_VENDORS = ('postgresql', 'sqlite')
+
+# nodes alone: UNION drops a node reached again, which ends the walk
+REACHABLE_SQL = (
+    'WITH RECURSIVE walk(node) AS ('
+    'SELECT {to} AS node FROM {table} WHERE {from} = %s '
+    'UNION '
+    'SELECT t.{to} FROM walk w JOIN {table} t ON t.{from} = w.node'
+    ') SELECT node FROM walk WHERE node <> %s'
+)
+
+# with depth: a node is produced again for each distinct depth it is reached
+# at, so `depth < %s` is what ends the walk round a cycle
+REACHABLE_WITHIN_SQL = (
+    'WITH RECURSIVE walk(node, depth) AS ('
+    'SELECT {to} AS node, 1 AS depth FROM {table} WHERE {from} = %s '
+    'UNION '
+    'SELECT t.{to}, w.depth + 1 FROM walk w JOIN {table} t ON t.{from} = w.node '
+    'WHERE w.depth < %s'
+    ') SELECT node FROM walk WHERE node <> %s'
+)
+
+
+def through_columns(slot):
+    through = getattr(SymptomSign, slot).through
+    opts = through._meta
+    return {
+        'table': opts.db_table,
+        'from': opts.get_field('from_symptomsign').column,
+        'to': opts.get_field('to_symptomsign').column,
+    }
+
+
+def uses_cte(using):
+    return connections[using].vendor in CTE_VENDORS
+
+
+def reachable(instance, slot, max_depth=None, using=None):
+    """
+    Every SymptomSign reachable from `instance` through `slot` in at most
+    `max_depth` hops, as a QuerySet. Without `max_depth` the walk is
+    unbounded, except from the closure table, which holds MAX_DEPTH hops.
+    """
+    if slot not in SLOTS:
+        raise ValueError("{0} is not a SymptomSign self-link".format(slot))
+    using = using or instance._state.db or router.db_for_read(SymptomSign)
+    queryset = SymptomSign.objects.using(using)
+    if max_depth is not None and max_depth < 1:
+        return queryset.none()
+    if uses_cte(using):
+        if max_depth is None:
+            sql = REACHABLE_SQL.format(**through_columns(slot))
+            params = [instance.pk, instance.pk]
+        else:
+            sql = REACHABLE_WITHIN_SQL.format(**through_columns(slot))
+            params = [instance.pk, max_depth, instance.pk]
+        # extra() rather than pk__in=RawSQL(), whose doubled parentheses make
+        # SQLite treat the CTE as a scalar subquery
+        return queryset.extra(
+            where=['{0}.id IN ({1})'.format(SymptomSign._meta.db_table, sql)],
+            params=params,
+        )
+    closure = SymptomSignClosure.objects.using(using).filter(slot=slot, ancestor=instance.pk)
+    if max_depth is not None:
+        closure = closure.filter(depth__lte=max_depth)
+    return queryset.filter(pk__in=closure.values('descendant'))
+
+
+# -- closure table --------------------------------------------------------
+
+def walk(adjacency, start, max_depth=MAX_DEPTH):
+    """
+    Breadth first walk of an adjacency dict, returning {node: shortest depth};
+    the visited set is the cycle protection.
+    """
+    depths = {}
+    queue = deque([(start, 0)])
+    seen = {start}
+    while queue:
+        node, depth = queue.popleft()
+        if depth == max_depth:
+            continue
+        for neighbour in adjacency.get(node, ()):
+            if neighbour not in seen:
+                seen.add(neighbour)
+                depths[neighbour] = depth + 1
+                queue.append((neighbour, depth + 1))
+    return depths
+
+
+def component(slot, pks, using):
+    """
+    The given SymptomSigns and everything the closure table already links
+    them to, i.e. every node whose closure an edge change can affect.
+    """
+    nodes = set(pks)
+    nodes.update(
+        SymptomSignClosure.objects.using(using)
+        .filter(slot=slot, ancestor__in=pks).values_list('descendant', flat=True)
+    )
+    return nodes
+
+
+def rebuild_closure(slot, pks=None, using=None):
+    """
+    Recompute the closure rows of `slot` for the SymptomSigns in `pks` and
+    their existing components (every SymptomSign if `pks` is None).
+    """
+    using = using or router.db_for_write(SymptomSignClosure)
+    through = getattr(SymptomSign, slot).through
+    edges = through.objects.using(using)
+    closure = SymptomSignClosure.objects.using(using).filter(slot=slot)
+    if pks is not None:
+        nodes = component(slot, pks, using)
+        # the walk may reach further than the old closure did, e.g. when an
+        # edge joins two components, so expand along the current edges first
+        frontier = set(nodes)
+        while frontier:
+            found = set(
+                edges.filter(from_symptomsign__in=frontier).values_list('to_symptomsign', flat=True)
+            ) - nodes
+            nodes |= found
+            frontier = found
+        edges = edges.filter(from_symptomsign__in=nodes)
+        closure = closure.filter(ancestor__in=nodes)
+    adjacency = {}
+    for from_pk, to_pk in edges.values_list('from_symptomsign', 'to_symptomsign'):
+        adjacency.setdefault(from_pk, []).append(to_pk)
+    starts = adjacency if pks is None else nodes
+    rows = []
+    for start in starts:
+        for node, depth in walk(adjacency, start).items():
+            if node != start:
+                rows.append(SymptomSignClosure(
+                    slot=slot, ancestor_id=start, descendant_id=node, depth=depth
+                ))
+    with transaction.atomic(using=using):
+        closure.delete()
+        SymptomSignClosure.objects.using(using).bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def edges_changed(sender, instance, action, pk_set, using, **kwargs):
+    if uses_cte(using) or action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    slot = THROUGH_SLOTS[sender]
+    pks = {instance.pk} | set(pk_set or ())
+    rebuild_closure(slot, pks, using)
+
+
+def symptom_sign_deleting(sender, instance, using, **kwargs):
+    if uses_cte(using):
+        return
+    # remember the components before the delete cascades through them
+    instance._closure_components = {
+        slot: component(slot, [instance.pk], using) - {instance.pk} for slot in SLOTS
+    }
+
+
+def symptom_sign_deleted(sender, instance, using, **kwargs):
+    components = getattr(instance, '_closure_components', None)
+    if not components:
+        return
+    for slot, pks in components.items():
+        if pks:
+            rebuild_closure(slot, pks, using)
+
+
+THROUGH_SLOTS = {getattr(SymptomSign, slot).through: slot for slot in SLOTS}
+
+for _through in THROUGH_SLOTS:
+    m2m_changed.connect(edges_changed, sender=_through, dispatch_uid='openehr_graph_edges')
+pre_delete.connect(symptom_sign_deleting, sender=SymptomSign, dispatch_uid='openehr_graph_deleting')
+post_delete.connect(symptom_sign_deleted, sender=SymptomSign, dispatch_uid='openehr_graph_deleted')
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from django_openehr.models import DemographicPersonal, Identifier
+from django_openehr.validators import (
+    is_nhs_number_type,
+    nhs_number_is_valid,
+    normalize_identifier,
+    normalize_type,
+)
+
+
+class LookupCache(object):
+    """
+    A small thread-safe LRU of lookup key -> patient primary key.
+
+    Entries expire after `timeout` seconds, which bounds how stale a lookup
+    can be when another process changes an identifier; changes made in this
+    process clear the cache straight away through the signals below.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = LookupCache(
+    maxsize=getattr(settings, 'OPENEHR_IDENTIFIER_CACHE_SIZE', 10000),
+    timeout=getattr(settings, 'OPENEHR_IDENTIFIER_CACHE_TIMEOUT', 60),
+)
+
+
+def find_patient_by_identifier(identifier, identifier_type=None, issuer=None,
+                               use_cache=True):
+    """
+    The DemographicPersonal carrying `identifier`, or None.
+
+    The identifier and its type are normalized first, so spacing, case and
+    punctuation do not matter (as for Identifier.normalized_type), and NHS
+    numbers which fail their check digit are rejected without
+    touching the database. Where duplicate patient records share the
+    identifier the oldest one is returned.
+    """
+    normalized = normalize_identifier(identifier)
+    if not normalized:
+        return None
+    if is_nhs_number_type(identifier_type) and not nhs_number_is_valid(normalized):
+        return None
+
+    # the key holds exactly what the query below filters on, so a cached
+    # result is always the one the query would give
+    key = (normalized, normalize_type(identifier_type) if identifier_type is not None else None, issuer)
+    if use_cache:
+        pk = cache.get(key)
+        if pk is not None:
+            patient = DemographicPersonal.objects.filter(pk=pk).first()
+            if patient is not None:
+                return patient
+
+    filters = {'identifier__normalized_identifier': normalized}
+    if identifier_type is not None:
+        filters['identifier__normalized_type'] = normalize_type(identifier_type)
+    if issuer is not None:
+        filters['identifier__issuer'] = issuer
+    patient = DemographicPersonal.objects.filter(**filters).order_by('pk').first()
+    if patient is not None and use_cache:
+        cache.set(key, patient.pk)
+    return patient
+
+
+@receiver(post_save, sender=Identifier)
+@receiver(post_delete, sender=Identifier)
+@receiver(post_delete, sender=DemographicPersonal)
+@receiver(m2m_changed, sender=DemographicPersonal.identifier.through)
+def clear_lookup_cache(sender, **kwargs):
+    cache.clear()
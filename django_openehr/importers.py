@@ -0,0 +1,336 @@
+import json
+import re
+import time
+from collections import Counter, OrderedDict
+from xml.etree import ElementTree
+
+from django.core.exceptions import ValidationError
+from django.db import models as django_models, router, transaction
+
+from django_openehr import archetypes
+from django_openehr.bulk import BulkLoadReport, GraphLoader
+from django_openehr.fields import CodedTextField
+from django_openehr.models import Identifier
+from django_openehr.serializers import code_label
+
+XSI_TYPE = '{http://www.w3.org/2001/XMLSchema-instance}type'
+
+# FLAT path segments look like "problem_diagnosis:0" or "severity|code"
+FLAT_INDEX = re.compile(r':\d+$')
+
+
+def normalize_name(name):
+    """
+    "Problem/Diagnosis name", "problem_diagnosis_name" -> "problemdiagnosisname"
+    """
+    return re.sub(r'[^a-z0-9]', '', str(name).lower())
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+class ArchetypeImporter(object):
+    """
+    Maps incoming archetype instances onto the archetype models and writes
+    them in batches, one transaction per batch.
+
+    Subclasses parse a particular serialization, call `assign()` for every
+    data value and `add_record()` for every complete top-level record; only
+    the records of the current batch are ever held in memory.
+    """
+
+    def __init__(self, batch_size=1000, using=None):
+        self.batch_size = batch_size
+        self.using = using
+        self.report = BulkLoadReport()
+        # element names which did not map onto any model field
+        self.unmapped = Counter()
+        self._pending = OrderedDict()
+        self._pending_count = 0
+        self._fields = {}
+
+    # -- mapping --------------------------------------------------------
+
+    def model_for_node(self, node_id):
+        """
+        The model for an archetype id or a FLAT concept name, or None.
+        """
+        model = archetypes.model_for_archetype(node_id)
+        if model is not None:
+            return model
+        wanted = normalize_name(node_id)
+        for archetype_id, model in archetypes.ARCHETYPE_MODELS:
+            concept = archetypes.concept(archetype_id)
+            if wanted in (normalize_name(concept), normalize_name(re.sub(r'_uk$', '', concept))):
+                return model
+        return None
+
+    def fields_for(self, model):
+        """
+        Lookup of normalized field name and verbose name -> field.
+        """
+        if model not in self._fields:
+            lookup = {}
+            opts = model._meta
+            for field in list(opts.concrete_fields) + list(opts.many_to_many):
+                lookup[normalize_name(field.verbose_name)] = field
+                lookup[normalize_name(field.name)] = field
+            self._fields[model] = lookup
+        return self._fields[model]
+
+    def slot_for(self, parent_model, child_model):
+        """
+        The name under which `child_model` records nest in a `parent_model`
+        record, or None if the parent has no such slot.
+        """
+        for field in parent_model._meta.many_to_many:
+            if field.related_model is child_model:
+                return field.name
+        for rel in parent_model._meta.related_objects:
+            if rel.one_to_many and rel.related_model is child_model:
+                return rel.get_accessor_name()
+        return None
+
+    def python_value(self, field, dv):
+        """
+        Convert a parsed data value (a dict of its attributes) for `field`.
+        """
+        if field.choices:
+            codes = [code for code, _ in field.flatchoices]
+            if dv.get('code') in codes:
+                return dv['code']
+            if isinstance(field, CodedTextField) and field.code_for(dv.get('code')):
+                return field.code_for(dv['code'])
+            for code, label in field.flatchoices:
+                if normalize_name(code_label(label)) == normalize_name(dv.get('value', '')):
+                    return code
+            if isinstance(field, CodedTextField):
+                # only codes can be stored, anything else is invalid
+                return field.to_python(dv.get('code') or dv.get('value'))
+            return dv.get('code') or dv.get('value')
+        if isinstance(field, (django_models.BooleanField, django_models.NullBooleanField)):
+            return str(dv.get('value')).lower() == 'true'
+        if isinstance(field, (django_models.IntegerField, django_models.DecimalField)):
+            return field.to_python(dv.get('magnitude', dv.get('value')))
+        return field.to_python(dv.get('value'))
+
+    def assign(self, record, model, node_id, name, dv):
+        """
+        Put a data value onto a record, matching on the ELEMENT's node id or,
+        failing that, its name.
+        """
+        fields = self.fields_for(model)
+        field = fields.get(normalize_name(node_id)) or fields.get(normalize_name(name))
+        if field is None:
+            self.unmapped['{0}/{1}'.format(model.__name__, name or node_id)] += 1
+            return
+        if field.many_to_many and field.related_model is Identifier:
+            record.setdefault(field.name, []).append({
+                'identifier': dv.get('id') or dv.get('value'),
+                'issuer': dv.get('issuer'),
+                'assigner': dv.get('assigner'),
+                'identifier_type': dv.get('type'),
+            })
+            return
+        if field.many_to_many:
+            self.unmapped['{0}/{1}'.format(model.__name__, field.name)] += 1
+            return
+        try:
+            record[field.name] = self.python_value(field, dv)
+        except ValidationError:
+            self.unmapped['{0}/{1} (invalid)'.format(model.__name__, field.name)] += 1
+
+    # -- batching -------------------------------------------------------
+
+    def add_record(self, model, record):
+        """
+        Queue a complete top-level record, flushing when the batch is full.
+        """
+        self._pending.setdefault(model, []).append(record)
+        self._pending_count += 1
+        if self._pending_count >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        using = self.using or router.db_for_write(next(iter(self._pending)))
+        loader = GraphLoader(batch_size=self.batch_size, using=using)
+        with transaction.atomic(using=using):
+            for model, records in self._pending.items():
+                loader.write(model, records, self.report.rows)
+        self.report.records += self._pending_count
+        self.report.chunks += 1
+        self._pending = OrderedDict()
+        self._pending_count = 0
+
+    def import_file(self, source):
+        """
+        Import everything in `source` (a path or a file object) and return
+        the BulkLoadReport.
+        """
+        self.parse(source)
+        self.flush()
+        self.report.finished = time.monotonic()
+        return self.report
+
+    def parse(self, source):
+        raise NotImplementedError
+
+
+class CanonicalXMLImporter(ArchetypeImporter):
+    """
+    Imports openEHR canonical XML, e.g. an EHR extract or a stream of
+    COMPOSITIONs.
+
+    The document is read with iterparse and every subtree is discarded as soon
+    as it has been mapped, so memory use does not grow with the file size.
+    """
+
+    def parse(self, source):
+        # each open archetyped node: (model, record)
+        records = []
+        # every element currently open in the document, for pruning
+        elements = []
+        # ELEMENT subtrees have to stay intact until the ELEMENT itself ends
+        open_elements = 0
+        for event, elem in ElementTree.iterparse(source, events=('start', 'end')):
+            is_element = elem.get(XSI_TYPE, '').endswith('ELEMENT')
+            if event == 'start':
+                elements.append(elem)
+                open_elements += is_element
+                model = archetypes.model_for_archetype(elem.get('archetype_node_id'))
+                if model is not None:
+                    records.append((model, {}))
+                continue
+
+            elements.pop()
+            node_id = elem.get('archetype_node_id', '')
+            if is_element:
+                open_elements -= 1
+                if records:
+                    model, record = records[-1]
+                    self.assign(record, model, node_id, self.element_name(elem), self.data_value(elem))
+            elif records and node_id == archetypes.archetype_id_for(records[-1][0]):
+                model, record = records.pop()
+                self.end_record(records, model, record)
+
+            if open_elements:
+                continue
+            # the subtree has been mapped, so let it go
+            elem.clear()
+            if elements and len(elements[-1]) and elements[-1][-1] is elem:
+                del elements[-1][-1]
+
+    def end_record(self, records, model, record):
+        if records:
+            parent_model, parent = records[-1]
+            slot = self.slot_for(parent_model, model)
+            if slot is not None:
+                parent.setdefault(slot, []).append(record)
+                return
+        self.add_record(model, record)
+
+    def element_name(self, elem):
+        for child in elem:
+            if local_name(child.tag) == 'name':
+                for value in child:
+                    if local_name(value.tag) == 'value':
+                        return value.text
+        return None
+
+    def data_value(self, elem):
+        """
+        The ELEMENT's value as a flat dict, e.g. DV_CODED_TEXT ->
+        {'value': 'Mild', 'code': 'at0047', 'terminology': 'local'}
+        """
+        dv = {}
+        for child in elem:
+            if local_name(child.tag) != 'value':
+                continue
+            for part in child.iter():
+                tag = local_name(part.tag)
+                if tag == 'code_string':
+                    dv['code'] = part.text
+                elif tag == 'units':
+                    dv['unit'] = part.text
+                elif tag in ('magnitude', 'id', 'issuer', 'assigner', 'type'):
+                    dv[tag] = part.text
+            for part in child:
+                if local_name(part.tag) == 'value':
+                    dv['value'] = part.text
+        return dv
+
+
+class FlatJSONImporter(ArchetypeImporter):
+    """
+    Imports openEHR FLAT JSON, one composition per line (NDJSON), as produced
+    by most openEHR servers' bulk exports.
+
+    Paths are walked segment by segment: segments naming an archetype concept
+    (e.g. "problem_diagnosis:0" or "person_name:1") open a record, and the last
+    segment names the element, with an optional |attribute suffix.
+    """
+
+    ATTRIBUTES = {
+        'code': 'code',
+        'value': 'value',
+        'magnitude': 'magnitude',
+        'unit': 'unit',
+        'id': 'id',
+        'issuer': 'issuer',
+        'assigner': 'assigner',
+        'type': 'type',
+    }
+
+    def parse(self, source):
+        f = open(source) if isinstance(source, str) else source
+        try:
+            for line in f:
+                if line.strip():
+                    self.import_composition(json.loads(line))
+        finally:
+            if f is not source:
+                f.close()
+
+    def import_composition(self, flat):
+        # record key (path prefix) -> (model, record, parent key)
+        records = OrderedDict()
+        elements = OrderedDict()
+        for path, value in flat.items():
+            element_path, _, attribute = path.partition('|')
+            segments = element_path.split('/')
+            parent_key = None
+            for depth, segment in enumerate(segments[:-1]):
+                model = self.model_for_node(FLAT_INDEX.sub('', segment))
+                if model is None:
+                    continue
+                key = '/'.join(segments[:depth + 1])
+                if key not in records:
+                    records[key] = (model, {}, parent_key)
+                parent_key = key
+            if parent_key is None:
+                self.unmapped[element_path] += 1
+                continue
+            name = FLAT_INDEX.sub('', segments[-1])
+            dv = elements.setdefault((parent_key, segments[-1]), (name, {}))[1]
+            attribute = self.ATTRIBUTES.get(attribute) if attribute else 'value'
+            if attribute is not None:
+                dv[attribute] = value
+
+        for (key, _), (name, dv) in elements.items():
+            model, record, _ = records[key]
+            self.assign(record, model, name, name, dv)
+
+        # nest children into their parents, deepest first
+        for key in reversed(list(records)):
+            model, record, parent_key = records[key]
+            slot = None
+            if parent_key is not None:
+                parent_model, parent, _ = records[parent_key]
+                slot = self.slot_for(parent_model, model)
+            if slot is not None:
+                parent.setdefault(slot, []).insert(0, record)
+            else:
+                self.add_record(model, record)
@@ -0,0 +1,198 @@
+"""
+Query counting and N+1 detection.
+
+track_queries() records every query executed on the current thread's
+database connections, as a context manager or a decorator:
+
+    with track_queries(budget=10) as tracker:
+        render_ward_list()
+    tracker.report()
+
+Each query is recorded under its shape (the SQL with its parameters left
+out and IN lists collapsed), the model of the table it reads or writes, and
+its call site: the innermost frame outside Django and this module. The
+same shape run `n_plus_one_threshold` or more times from one call site is
+flagged as an N+1 pattern, e.g. person_name.all() inside a loop over
+patients. With a budget, leaving the block raises QueryBudgetExceeded if
+more queries than that were run, or, with fail_on_n_plus_one, if an N+1
+pattern was seen: for use in tests. As a decorator, each call is tracked
+(and its budget checked) on its own.
+
+QueryInstrumentationMiddleware logs the N+1 patterns of each request (and
+enforces OPENEHR_QUERY_BUDGET, if set) when OPENEHR_QUERY_INSTRUMENTATION is
+on. When it is off the middleware removes itself and no execute wrapper is
+installed, so nothing is paid.
+"""
+import contextlib
+import logging
+import os
+import re
+import sys
+import threading
+from collections import Counter
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+ENABLED = getattr(settings, 'OPENEHR_QUERY_INSTRUMENTATION', False)
+BUDGET = getattr(settings, 'OPENEHR_QUERY_BUDGET', None)
+N_PLUS_ONE_THRESHOLD = getattr(settings, 'OPENEHR_N_PLUS_ONE_THRESHOLD', 5)
+
+logger = logging.getLogger(__name__)
+
+# frames in these files and directories are never the call site
+SKIPPED_PATHS = (
+    os.path.dirname(django.__file__) + os.sep,
+    __file__,
+    contextlib.__file__,
+)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+[`"\[]?(\w+)', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+_tables = None
+_tables_lock = threading.Lock()
+
+
+def model_for_table(table):
+    global _tables
+    if _tables is None:
+        with _tables_lock:
+            _tables = {
+                model._meta.db_table: model._meta.label
+                for model in apps.get_models(include_auto_created=True)
+            }
+    return _tables.get(table, table)
+
+
+def query_shape(sql):
+    """
+    The SQL of a query with IN lists of any length made alike.
+    """
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def call_site():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(SKIPPED_PATHS):
+            return "{0}:{1} in {2}".format(filename, frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+class track_queries(contextlib.ContextDecorator):
+    """
+    Record the queries run in a block; see the module docstring.
+    """
+
+    def __init__(self, budget=None, fail_on_n_plus_one=False,
+                 n_plus_one_threshold=N_PLUS_ONE_THRESHOLD, using=None):
+        self.budget = budget
+        self.fail_on_n_plus_one = fail_on_n_plus_one
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.using = using
+        self.reset()
+
+    def reset(self):
+        # (shape, model, call site) per query
+        self.queries = []
+
+    def _recreate_cm(self):
+        # as a decorator, every call gets a tracker of its own, so that
+        # concurrent and re-entrant calls do not share queries or exit stacks
+        return type(self)(self.budget, self.fail_on_n_plus_one, self.n_plus_one_threshold, self.using)
+
+    def __enter__(self):
+        self.reset()
+        self._stack = contextlib.ExitStack()
+        aliases = [self.using] if self.using else list(connections)
+        for alias in aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self.record))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
+        if exc_type is None:
+            self.check()
+        return False
+
+    def record(self, execute, sql, params, many, context):
+        shape = query_shape(sql)
+        match = TABLE.search(shape)
+        self.queries.append((
+            shape,
+            model_for_table(match.group(1)) if match else None,
+            call_site(),
+        ))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def by_model(self):
+        return Counter(model for _, model, _ in self.queries)
+
+    def by_call_site(self):
+        return Counter(site for _, _, site in self.queries)
+
+    def n_plus_one(self):
+        """
+        [(count, call site, model, shape), ...] of the shapes repeated at
+        least n_plus_one_threshold times from one call site, most first.
+        """
+        counts = Counter((site, model, shape) for shape, model, site in self.queries)
+        return sorted(
+            ((count, site, model, shape) for (site, model, shape), count in counts.items()
+             if count >= self.n_plus_one_threshold),
+            reverse=True,
+            key=lambda pattern: pattern[0],
+        )
+
+    def check(self):
+        if self.budget is not None and len(self) > self.budget:
+            raise QueryBudgetExceeded("{0} queries run, budget {1}\n{2}".format(
+                len(self), self.budget, self.report()
+            ))
+        if self.fail_on_n_plus_one and self.n_plus_one():
+            raise QueryBudgetExceeded("N+1 queries\n{0}".format(self.report()))
+
+    def report(self):
+        lines = ["{0} queries".format(len(self))]
+        for model, count in self.by_model().most_common():
+            lines.append("  {0}: {1}".format(model, count))
+        for count, site, model, shape in self.n_plus_one():
+            lines.append("N+1: {0} x {1} at {2}\n    {3}".format(count, model, site, shape))
+        return "\n".join(lines)
+
+
+class QueryInstrumentationMiddleware(object):
+    """
+    Log the N+1 query patterns of each request, and raise
+    QueryBudgetExceeded when a request runs more than OPENEHR_QUERY_BUDGET
+    queries.
+    """
+
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        tracker = track_queries(budget=BUDGET)
+        with tracker:
+            response = self.get_response(request)
+        patterns = tracker.n_plus_one()
+        if patterns:
+            logger.warning("%s %s: %d queries, N+1 patterns found\n%s",
+                           request.method, request.path, len(tracker), tracker.report())
+        return response
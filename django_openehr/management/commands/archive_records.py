@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from django_openehr import archive
+
+
+class Command(BaseCommand):
+    help = "Move cold resolved problems and old admissions to the archive, or restore them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', choices=[m._meta.model_name for m in archive.POLICIES],
+                            help="Only this model (may be repeated)")
+        parser.add_argument('--before', help="Archive what went cold before this date/time "
+                                             "instead of OPENEHR_ARCHIVE_AFTER_DAYS ago")
+        parser.add_argument('--restore', action='store_true', help="Put archived instances back")
+        parser.add_argument('--id', type=int, action='append', dest='ids',
+                            help="With --restore, only this primary key (may be repeated)")
+        parser.add_argument('--chunk-size', type=int, default=archive.CHUNK_SIZE)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        before = None
+        if options['before']:
+            before = parse_datetime(options['before']) or parse_datetime(options['before'] + 'T00:00:00Z')
+            if before is None:
+                raise CommandError("Invalid --before {0}".format(options['before']))
+            if timezone.is_naive(before):
+                before = timezone.make_aware(before)
+        models = [m for m in archive.POLICIES if not options['model'] or m._meta.model_name in options['model']]
+        for model in models:
+            if options['restore']:
+                count = archive.restore(
+                    model, options['ids'], using=options['database'], chunk_size=options['chunk_size']
+                )
+                self.stdout.write("{0}: {1} restored".format(model.__name__, count))
+            else:
+                count = archive.archive(
+                    model, before, using=options['database'], chunk_size=options['chunk_size']
+                )
+                self.stdout.write("{0}: {1} archived".format(model.__name__, count))
+        self.stdout.write(self.style.SUCCESS("Done"))
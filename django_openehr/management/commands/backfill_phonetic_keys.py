@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from django_openehr.models import PersonName
+from django_openehr.utils import chunked_queryset
+
+PHONETIC_FIELDS = [
+    'family_name_soundex',
+    'family_name_metaphone',
+    'given_name_soundex',
+    'given_name_metaphone',
+]
+
+
+class Command(BaseCommand):
+    help = "Compute the phonetic key columns of every PersonName, in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        queryset = PersonName.objects.using(options['database']).only(
+            'pk', 'given_name', 'family_name', *PHONETIC_FIELDS
+        )
+        updated = 0
+        for chunk in chunked_queryset(queryset, options['chunk_size']):
+            changed = []
+            for name in chunk:
+                before = [getattr(name, f) for f in PHONETIC_FIELDS]
+                name.populate_derived_fields()
+                if [getattr(name, f) for f in PHONETIC_FIELDS] != before:
+                    changed.append(name)
+            # one short transaction per chunk, so the table is never locked for long
+            with transaction.atomic(using=options['database']):
+                PersonName.objects.using(options['database']).bulk_update(changed, PHONETIC_FIELDS)
+            updated += len(changed)
+            if options['verbosity'] > 1:
+                self.stdout.write("{0} updated, up to pk {1}".format(updated, chunk[-1].pk))
+        self.stdout.write(self.style.SUCCESS("{0} names updated".format(updated)))
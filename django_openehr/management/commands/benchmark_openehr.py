@@ -0,0 +1,76 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_openehr import archetypes
+from django_openehr.benchmarks import DEFAULT_THRESHOLD, DEFAULT_VALIDATION_ROWS, Benchmark, compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark inserts, reads, graph loads and export of the archetype "
+        "models, and batch validation, leaving the database as it was, and "
+        "write the results as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model_names', nargs='*',
+            help="Lowercase model names to benchmark, e.g. problemdiagnosis (default: all)"
+        )
+        parser.add_argument('--scale', type=int, default=200, help="Instances per benchmark")
+        parser.add_argument(
+            '--validation-rows', type=int, default=DEFAULT_VALIDATION_ROWS,
+            help="Rows per validation benchmark, 0 to leave them out (default: 100000)"
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None, help="File to write the results to (default: stdout)")
+        parser.add_argument('--baseline', default=None, help="Results file to compare against")
+        parser.add_argument(
+            '--threshold', type=float, default=DEFAULT_THRESHOLD,
+            help="Relative slowdown counted as a regression (default: 0.10)"
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help="Exit with an error if any metric regressed"
+        )
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        models = []
+        for model_name in options['model_names']:
+            model = archetypes.model_for_name(model_name)
+            if model is None:
+                raise CommandError("No archetype model called {0}".format(model_name))
+            models.append(model)
+
+        results = Benchmark(
+            scale=options['scale'],
+            repeat=options['repeat'],
+            seed=options['seed'],
+            using=options['database'],
+            models=models,
+            validation_rows=options['validation_rows'],
+        ).run()
+
+        regressions = []
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            results['comparison'] = compare(results, baseline, options['threshold'])
+            regressions = sorted(
+                name for name, c in results['comparison'].items() if c['regression']
+            )
+
+        out = open(options['output'], 'w') if options['output'] else sys.stdout
+        try:
+            json.dump(results, out, indent=2, sort_keys=True)
+            out.write('\n')
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError("Regressed: {0}".format(", ".join(regressions)))
@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from django_openehr.bulk import GraphLoader
+
+
+class Command(BaseCommand):
+    help = "Bulk load DemographicPersonal graphs from a newline-delimited JSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="NDJSON file, one nested patient dict per line")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--memory-budget-mb', type=int, default=None,
+            help="Upper bound on the memory used by one chunk"
+        )
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        memory_budget = None
+        if options['memory_budget_mb']:
+            memory_budget = options['memory_budget_mb'] * 1024 * 1024
+
+        def progress(report):
+            if options['verbosity'] > 1:
+                self.stdout.write(str(report))
+
+        loader = GraphLoader(
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            memory_budget=memory_budget,
+            using=options['database'],
+            on_chunk=progress,
+        )
+        with open(options['path']) as f:
+            records = (json.loads(line) for line in f if line.strip())
+            report = loader.load(records)
+        self.stdout.write(self.style.SUCCESS(str(report)))
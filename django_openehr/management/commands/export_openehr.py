@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_openehr import archetypes
+from django_openehr.serializers import get_serializer
+
+
+class Command(BaseCommand):
+    help = "Export archetype models as canonical openEHR JSON, one composition per line"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model_names', nargs='*',
+            help="Lowercase model names to export, e.g. problemdiagnosis (default: all)"
+        )
+        parser.add_argument('--output', default=None, help="File to write to (default: stdout)")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        if options['model_names']:
+            models = []
+            for model_name in options['model_names']:
+                model = archetypes.model_for_name(model_name)
+                if model is None:
+                    raise CommandError("No archetype model called {0}".format(model_name))
+                models.append(model)
+        else:
+            models = archetypes.archetype_models()
+
+        out = open(options['output'], 'w') if options['output'] else sys.stdout
+        try:
+            for model in models:
+                serializer = get_serializer(model)
+                queryset = model._default_manager.using(options['database'])
+                for line in serializer.stream(queryset.all(), options['chunk_size']):
+                    out.write(line)
+        finally:
+            if out is not sys.stdout:
+                out.close()
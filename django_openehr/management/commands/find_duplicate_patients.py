@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from django_openehr.deduplication import MAX_BLOCK_SIZE, Deduplicator
+
+
+class Command(BaseCommand):
+    help = (
+        "Find probable duplicate DemographicPersonal records, resuming the last "
+        "unfinished run unless --restart is given"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help="Scoring processes; 0 scores in this process",
+        )
+        parser.add_argument('--threshold', type=float, default=0.75)
+        parser.add_argument('--max-block-size', type=int, default=MAX_BLOCK_SIZE)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--restart', action='store_true')
+
+    def handle(self, *args, **options):
+        deduplicator = Deduplicator(
+            workers=options['workers'],
+            threshold=options['threshold'],
+            max_block_size=options['max_block_size'],
+            chunk_size=options['chunk_size'],
+            stdout=self.stdout if options['verbosity'] > 1 else None,
+        )
+        run = deduplicator.run(resume=not options['restart'])
+        self.stdout.write(self.style.SUCCESS(
+            "{0} candidates from {1} pairs in {2} blocks ({3:.0f} pairs/s)".format(
+                run.candidates_found, run.pairs_scored, run.blocks_scored, run.pairs_per_second
+            )
+        ))
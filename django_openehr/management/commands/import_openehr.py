@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from django_openehr.importers import CanonicalXMLImporter, FlatJSONImporter
+
+IMPORTERS = {
+    'xml': CanonicalXMLImporter,
+    'flat': FlatJSONImporter,
+}
+
+
+class Command(BaseCommand):
+    help = "Import openEHR canonical XML or FLAT JSON (NDJSON) into the archetype models"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(IMPORTERS), default='xml')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        importer = IMPORTERS[options['format']](
+            batch_size=options['batch_size'],
+            using=options['database'],
+        )
+        report = importer.import_file(options['path'])
+        self.stdout.write(self.style.SUCCESS(str(report)))
+        for name, count in importer.unmapped.most_common():
+            self.stdout.write("unmapped: {0} x{1}".format(name, count))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from django_openehr.terminology import load_release
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the SNOMED CT RF2 Snapshot files found under a directory, "
+        "replacing any release loaded before"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        try:
+            report = load_release(
+                options['path'],
+                batch_size=options['batch_size'],
+                using=options['database'],
+                stdout=self.stdout if options['verbosity'] > 1 else None,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(str(report)))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from django_openehr.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recount the hourly and daily admission rollups, reading the admissions in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only recount from the day of this date/time on")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since']) or parse_datetime(options['since'] + 'T00:00:00')
+            if since is None:
+                raise CommandError("Invalid --since {0}".format(options['since']))
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        written = rebuild_rollups(since, using=options['database'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS("{0} rollups written".format(written)))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from django_openehr import documents
+
+
+class Command(BaseCommand):
+    help = "Rebuild the JSON document of every composition, in chunks, and create the path indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--indexes', action='store_true',
+                            help="Only create the indexes of OPENEHR_DOCUMENT_PATHS")
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        names = documents.create_path_indexes(using=options['database'])
+        self.stdout.write("{0} path indexes in place".format(len(names)))
+        if options['indexes']:
+            return
+        written = 0
+        for model in documents.COMPOSITION_MODELS:
+            written += documents.rebuild_documents(
+                model, using=options['database'], chunk_size=options['chunk_size']
+            )
+        self.stdout.write(self.style.SUCCESS("{0} documents rebuilt".format(written)))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from django_openehr.summaries import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized summary of every patient, in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        written = rebuild_all(using=options['database'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS("{0} summaries rebuilt".format(written)))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from django_openehr import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text index over the clinical narrative fields"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        for model in search.SEARCH_FIELDS:
+            count = search.rebuild_index(
+                model, chunk_size=options['chunk_size'], using=options['database']
+            )
+            self.stdout.write("{0}: {1} indexed".format(model.__name__, count))
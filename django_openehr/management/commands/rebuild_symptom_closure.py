@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from django_openehr.graph import SLOTS, rebuild_closure
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the SymptomSign closure table, which is used for traversal on "
+        "databases without recursive CTEs"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        for slot in SLOTS:
+            rows = rebuild_closure(slot, using=options['database'])
+            self.stdout.write(self.style.SUCCESS("{0}: {1} closure rows".format(slot, rows)))
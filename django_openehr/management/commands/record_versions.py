@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from django_openehr.versioning import VERSIONED_MODELS, record_initial_versions
+
+
+class Command(BaseCommand):
+    help = "Record a first version of every archetype instance without a version history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--database', default=None)
+
+    def handle(self, *args, **options):
+        for model in VERSIONED_MODELS:
+            recorded = record_initial_versions(
+                model, using=options['database'], chunk_size=options['chunk_size']
+            )
+            self.stdout.write("{0}: {1} versions recorded".format(model.__name__, recorded))
+        self.stdout.write(self.style.SUCCESS("Done"))
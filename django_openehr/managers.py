@@ -0,0 +1,120 @@
+from django.db import models
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Coalesce
+
+
+class DemographicPersonalQuerySet(models.QuerySet):
+
+    # the cluster slots of openEHR-EHR-CLUSTER.individual_personal_uk.v1
+    # each slot is a plain ManyToManyField, so each one costs exactly one
+    # extra query when prefetched, however many patients are in the page
+    CLUSTER_SLOTS = (
+        'person_name',
+        'address_details',
+        'telecom_details',
+        'identifier',
+    )
+
+    def with_full_demographics(self):
+        """
+        Prefetch every cluster slot so that loading a page of patients costs
+        1 + len(CLUSTER_SLOTS) queries regardless of the page size.
+        """
+        return self.prefetch_related(*self.CLUSTER_SLOTS)
+
+
+class DemographicProfessionalQuerySet(models.QuerySet):
+
+    # the cluster slots of openEHR-EHR-CLUSTER.individual_professional_uk.v1
+    CLUSTER_SLOTS = (
+        'person_name',
+        'telecom_details',
+        'professional_identifier',
+    )
+
+    def with_full_demographics(self):
+        """
+        Prefetch every cluster slot so that loading a page of professionals
+        costs 1 + len(CLUSTER_SLOTS) queries regardless of the page size.
+        """
+        return self.prefetch_related(*self.CLUSTER_SLOTS)
+
+
+def dose_bounds():
+    """
+    The lower and upper dose of a TherapeuticDirectionDosage as SQL
+    expressions; an exact dose is both its own lower and upper bound.
+    """
+    return {
+        'dose_lower': Coalesce('dose_amount_exact', 'dose_amount_range_lower'),
+        'dose_upper': Coalesce('dose_amount_exact', 'dose_amount_range_upper'),
+    }
+
+
+class TherapeuticDirectionDosageQuerySet(models.QuerySet):
+
+    def with_dose_bounds(self):
+        """
+        Annotate dose_lower and dose_upper, whether the dose was recorded as
+        an exact amount or as a range.
+        """
+        return self.annotate(**dose_bounds())
+
+    def daily_doses(self, *group_by):
+        """
+        Total and single dose bounds per day, one row per direction and dose
+        unit (plus any further `group_by` fields), in a single query.
+
+        Each dosage is one administration a day, so the daily dose of a
+        direction is the sum of its dosages. Doses in different units are
+        never added together.
+        """
+        bounds = dose_bounds()
+        return self.values('therapeutic_direction', 'dose_unit', *group_by).annotate(
+            daily_dose_lower=Sum(bounds['dose_lower']),
+            daily_dose_upper=Sum(bounds['dose_upper']),
+            single_dose_min=Min(bounds['dose_lower']),
+            single_dose_max=Max(bounds['dose_upper']),
+            administrations_per_day=Count('pk'),
+        ).order_by('therapeutic_direction', 'dose_unit')
+
+
+class TherapeuticDirectionQuerySet(models.QuerySet):
+
+    def with_daily_dose(self):
+        """
+        Annotate each direction with daily_dose_lower/upper (the sum of its
+        dosages), single_dose_min/max and dose_units, the number of distinct
+        units; the totals only mean something where dose_units is 1.
+        """
+        lower = Coalesce('therapeuticdirectiondosage__dose_amount_exact',
+                         'therapeuticdirectiondosage__dose_amount_range_lower')
+        upper = Coalesce('therapeuticdirectiondosage__dose_amount_exact',
+                         'therapeuticdirectiondosage__dose_amount_range_upper')
+        return self.annotate(
+            daily_dose_lower=Sum(lower),
+            daily_dose_upper=Sum(upper),
+            single_dose_min=Min(lower),
+            single_dose_max=Max(upper),
+            dose_units=Count('therapeuticdirectiondosage__dose_unit', distinct=True),
+        )
+
+
+class ArchivableQuerySet(models.QuerySet):
+
+    def archived(self):
+        """
+        The archived instances of this model, see django_openehr.archive.
+        """
+        # imported here, as archive imports the models
+        from django_openehr import archive
+        return archive.archived_instances(self.model, using=self.db)
+
+    def with_archived(self, **lookups):
+        """
+        The instances matching `lookups` in both tiers: those in the table
+        (filtered like this queryset), then the archived ones, in primary
+        key order within each tier, as an archive.TieredQuerySet.
+        """
+        from django_openehr import archive
+        return archive.TieredQuerySet(self).filter(**lookups)
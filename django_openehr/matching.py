@@ -0,0 +1,43 @@
+from django.db.models import Q
+
+from django_openehr.models import PersonName
+from django_openehr.phonetics import jaro_winkler, metaphone, soundex
+
+
+def name_score(family_name, given_name, candidate):
+    """
+    Similarity of a PersonName to the searched names, between 0.0 and 1.0.
+    The family name carries most of the weight when a given name is searched.
+    """
+    family = jaro_winkler(family_name, candidate.family_name)
+    if not given_name:
+        return family
+    return 0.7 * family + 0.3 * jaro_winkler(given_name, candidate.given_name)
+
+
+def search_person_names(family_name, given_name=None, threshold=0.8, limit=50,
+                        queryset=None):
+    """
+    PersonNames similar to the given names, as a list of (score, PersonName)
+    with the best match first.
+
+    The phonetic key columns are used as a blocking step: only names sharing
+    the family name's Soundex or Metaphone key are fetched, through their
+    indexes, and only those candidates are scored.
+    """
+    if queryset is None:
+        queryset = PersonName.objects.all()
+    blocking = Q()
+    if metaphone(family_name):
+        blocking |= Q(family_name_metaphone=metaphone(family_name))
+    if soundex(family_name):
+        blocking |= Q(family_name_soundex=soundex(family_name))
+    if not blocking:
+        return []
+    scored = []
+    for candidate in queryset.filter(blocking):
+        score = name_score(family_name, given_name, candidate)
+        if score >= threshold:
+            scored.append((score, candidate))
+    scored.sort(key=lambda pair: (-pair[0], pair[1].pk))
+    return scored[:limit]
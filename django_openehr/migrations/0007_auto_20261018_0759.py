@@ -0,0 +1,76 @@
+# Generated by Django 2.2.28 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+from django_openehr.validators import normalize_identifier
+
+
+def populate_normalized_identifier(apps, schema_editor):
+    Identifier = apps.get_model('django_openehr', 'Identifier')
+    db_alias = schema_editor.connection.alias
+    batch = []
+    for identifier in Identifier.objects.using(db_alias).only('identifier').iterator():
+        identifier.normalized_identifier = normalize_identifier(identifier.identifier)
+        batch.append(identifier)
+        if len(batch) >= 1000:
+            Identifier.objects.using(db_alias).bulk_update(batch, ['normalized_identifier'])
+            batch = []
+    Identifier.objects.using(db_alias).bulk_update(batch, ['normalized_identifier'])
+
+
+def merge_duplicate_identifiers(apps, schema_editor):
+    """
+    Merge the identifiers which only spacing or case kept apart, e.g.
+    'AB 12' and 'ab12' from the same issuer, moving every slot link to the
+    oldest of them, so the unique constraint below can be added.
+    """
+    Identifier = apps.get_model('django_openehr', 'Identifier')
+    db_alias = schema_editor.connection.alias
+    identifiers = Identifier.objects.using(db_alias)
+
+    # the through models of every slot holding identifiers
+    throughs = [
+        (field.remote_field.through, field.m2m_reverse_field_name())
+        for model in apps.get_models()
+        for field in model._meta.many_to_many
+        if field.related_model is Identifier
+    ]
+    keep = {}
+    for pk, key in (
+        (pk, (issuer, identifier_type, normalized_identifier))
+        for pk, issuer, identifier_type, normalized_identifier in identifiers.order_by('pk').values_list(
+            'pk', 'issuer', 'identifier_type', 'normalized_identifier'
+        ).iterator()
+    ):
+        if key not in keep:
+            keep[key] = pk
+            continue
+        for through, column in throughs:
+            owner = [f.name for f in through._meta.fields if f.is_relation and f.name != column][0]
+            rows = through.objects.using(db_alias).filter(**{column: pk})
+            # an owner holding both identifiers keeps just the one link
+            held = through.objects.using(db_alias).filter(**{column: keep[key]}).values(owner)
+            rows.filter(**{owner + '__in': held}).delete()
+            rows.update(**{column: keep[key]})
+        identifiers.filter(pk=pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0006_auto_20180212_1507'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='identifier',
+            name='normalized_identifier',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_normalized_identifier, migrations.RunPython.noop),
+        migrations.RunPython(merge_duplicate_identifiers, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='identifier',
+            unique_together={('issuer', 'identifier_type', 'normalized_identifier')},
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import OperationalError, migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE django_openehr_search ('
+            'model varchar(100) NOT NULL, '
+            'object_id integer NOT NULL, '
+            'document tsvector NOT NULL, '
+            'PRIMARY KEY (model, object_id))'
+        )
+        schema_editor.execute(
+            'CREATE INDEX django_openehr_search_document '
+            'ON django_openehr_search USING GIN (document)'
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                'CREATE VIRTUAL TABLE django_openehr_search USING fts5('
+                'body, model UNINDEXED, object_id UNINDEXED, '
+                "tokenize = 'porter unicode61')"
+            )
+        except OperationalError as e:
+            # SQLite built without FTS5: search falls back to icontains
+            if 'no such module: fts5' not in str(e):
+                raise
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP TABLE IF EXISTS django_openehr_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0007_auto_20261018_0759'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personname',
+            name='family_name_metaphone',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=8),
+        ),
+        migrations.AddField(
+            model_name='personname',
+            name='family_name_soundex',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=4),
+        ),
+        migrations.AddField(
+            model_name='personname',
+            name='given_name_metaphone',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=8),
+        ),
+        migrations.AddField(
+            model_name='personname',
+            name='given_name_soundex',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=4),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0009_auto_20261018_0801'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeduplicationRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phase', models.CharField(choices=[('KEYS', 'Generating blocking keys'), ('SCORING', 'Scoring candidate pairs'), ('DONE', 'Done')], default='KEYS', max_length=10)),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('last_patient_pk', models.IntegerField(default=0)),
+                ('last_block_key', models.CharField(blank=True, default='', max_length=100)),
+                ('blocks_scored', models.BigIntegerField(default=0)),
+                ('pairs_scored', models.BigIntegerField(default=0)),
+                ('candidates_found', models.BigIntegerField(default=0)),
+                ('scoring_seconds', models.FloatField(default=0.0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PatientBlockingKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=100)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='django_openehr.DemographicPersonal')),
+            ],
+            options={
+                'unique_together': {('key', 'patient')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(db_index=True)),
+                ('block_key', models.CharField(max_length=100)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('duplicate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='django_openehr.DemographicPersonal')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='django_openehr.DemographicPersonal')),
+            ],
+            options={
+                'verbose_name_plural': 'Duplicate Candidates',
+                'ordering': ['-score'],
+                'unique_together': {('patient', 'duplicate')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0010_deduplicationrun_duplicatecandidate_patientblockingkey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientSummary',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='django_openehr.DemographicPersonal')),
+                ('document', models.TextField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Patient Summaries',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0011_patientsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SymptomSignClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.CharField(choices=[('previous_episodes', 'Previous episodes'), ('associated_symptom_sign', 'Associated symptom/sign')], max_length=30)),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='django_openehr.SymptomSign')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='django_openehr.SymptomSign')),
+            ],
+            options={
+                'unique_together': {('slot', 'ancestor', 'descendant')},
+                'index_together': {('slot', 'ancestor', 'depth')},
+            },
+        ),
+    ]
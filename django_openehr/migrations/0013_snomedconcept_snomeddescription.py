@@ -0,0 +1,45 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0012_symptomsignclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnomedConcept',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('effective_time', models.DateField()),
+                ('active', models.BooleanField()),
+                ('module_id', models.BigIntegerField()),
+                ('definition_status_id', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'SNOMED CT concept',
+            },
+        ),
+        migrations.CreateModel(
+            name='SnomedDescription',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('effective_time', models.DateField()),
+                ('active', models.BooleanField()),
+                ('module_id', models.BigIntegerField()),
+                ('language_code', models.CharField(max_length=8)),
+                ('type_id', models.BigIntegerField()),
+                ('term', models.CharField(max_length=512)),
+                ('preferred', models.BooleanField(default=False)),
+                ('concept', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='descriptions', to='django_openehr.SnomedConcept')),
+            ],
+            options={
+                'verbose_name': 'SNOMED CT description',
+                'index_together': {('concept', 'active', 'preferred')},
+            },
+        ),
+    ]
@@ -0,0 +1,258 @@
+"""
+Moves every coded element from a 255-character code string column to a
+small integer column (django_openehr.fields.CodedTextField): each field gets
+a new column, the codes are copied across with one UPDATE per code, then the
+old column is dropped and the new one takes its name.
+
+Rows holding a value which is not one of the field's codes stop the
+migration, with the values listed, rather than being lost; correct them and
+run it again.
+"""
+from django.db import migrations, models
+import django_openehr.fields
+
+# (model, field) converted by this migration
+CODED_FIELDS = (
+    ('addressdetails', 'address_type'),
+    ('personname', 'name_type'),
+    ('demographicpersonal', 'gender'),
+    ('inpatientadmission', 'admission_method'),
+    ('problemdiagnosis', 'severity'),
+    ('problemdiagnosis', 'diagnostic_certainty'),
+    ('relevantcontact', 'relationship_category'),
+    ('symptomsign', 'episodicity'),
+    ('symptomsign', 'severity_category'),
+    ('symptomsign', 'progression'),
+    ('symptomsign', 'modifying_factor_effect'),
+    ('therapeuticdirection', 'direction_duration'),
+)
+
+# the fields which may not be null
+REQUIRED_FIELDS = (
+    ('addressdetails', 'address_type'),
+)
+
+
+def forwards(apps, schema_editor):
+    using = schema_editor.connection.alias
+    problems = []
+    for model_name, name in CODED_FIELDS:
+        model = apps.get_model('django_openehr', model_name)
+        coded = model._meta.get_field(name + '_coded')
+        codes = [code for code, _ in coded.flatchoices]
+        unknown = (
+            model.objects.using(using)
+            .exclude(**{name + '__in': codes})
+            .exclude(**{name + '__isnull': True})
+        )
+        if (model_name, name) not in REQUIRED_FIELDS:
+            # blank CharFields may hold '' for "no value"
+            unknown = unknown.exclude(**{name: ''})
+        values = sorted(set(unknown.values_list(name, flat=True)[:1000]))
+        if values:
+            problems.append("{0}.{1}: {2}".format(model_name, name, ", ".join(repr(v) for v in values[:10])))
+            continue
+        for code in codes:
+            model.objects.using(using).filter(**{name: code}).update(**{name + '_coded': code})
+    if problems:
+        raise ValueError("Values which are not codes of their field:\n" + "\n".join(problems))
+
+
+def backwards(apps, schema_editor):
+    using = schema_editor.connection.alias
+    for model_name, name in CODED_FIELDS:
+        model = apps.get_model('django_openehr', model_name)
+        coded = model._meta.get_field(name + '_coded')
+        for code, _ in coded.flatchoices:
+            model.objects.using(using).filter(**{name + '_coded': code}).update(**{name: code})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0013_snomedconcept_snomeddescription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='addressdetails',
+            name='address_type_coded',
+            field=django_openehr.fields.CodedTextField(choices=[('RESIDENTIAL', 'Residential'), ('CORRESPONDENCE', 'Correspondence'), ('BUSINESS', 'Business'), ('TEMPORARY', 'Temporary')], help_text='The type of address.', null=True),
+        ),
+        migrations.AddField(
+            model_name='personname',
+            name='name_type_coded',
+            field=django_openehr.fields.CodedTextField(blank=True, choices=[('REGISTERED', 'Registered name [The name by which the subject is officially registered.]'), ('PREVIOUS', 'Previous name [Name previously used by this person.]'), ('BIRTH', 'Birth name [Name given to this person at birth.]'), ('AKA', 'AKA [Person also known as.]'), ('ALIAS', 'Alias [Other name used by this person.]'), ('MAIDEN', 'Maiden Name [Name used by this persion before marriage.]'), ('PROFESSIONAL', 'Professional name [The name used by the subject for business or professional purposes.]'), ('REPORTING', 'Reporting name [The subject’s name as it is to be used for reporting, when used with a specific identifier.]')], help_text='The type of name described', null=True),
+        ),
+        migrations.AddField(
+            model_name='demographicpersonal',
+            name='gender_coded',
+            field=django_openehr.fields.CodedTextField(blank=True, choices=[('FEMALE', 'Female'), ('MALE', 'Male'), ('UNSPECIFIED', 'Unspecified')], help_text='The administrative phenotypical gender of the individual.', null=True),
+        ),
+        migrations.AddField(
+            model_name='inpatientadmission',
+            name='admission_method_coded',
+            field=django_openehr.fields.CodedTextField(blank=True, choices=[('ELECTIVE', 'Elective [The admission was planned.]'), ('EMERGENCY', 'Emergency [The admission was made as an emergency.]'), ('TRANSFER', 'Transfer [The patient was transferred from another inpatient unit.]'), ('MATERNITY', 'Maternity [The admission was maternity-related.]')], help_text='How the patient was admitted to hospital', null=True),
+        ),
+        migrations.AddField(
+            model_name='problemdiagnosis',
+            name='severity_coded',
+            field=django_openehr.fields.CodedTextField(blank=True, choices=[('Mild', 'Mild [The problem or diagnosis does not interfere with normal activity or may cause damage to health if left untreated.]'), ('Moderate', 'Moderate [The problem or diagnosis causes interference with normal activity or will damage health if left untreated.]'), ('Severe', 'Severe [The problem or diagnosis prevents normal activity or will seriously damage health if left untreated.]')], help_text='An assessment of the overall severity of the problem or diagnosis', null=True),
+        ),
+        migrations.AddField(
+            model_name='problemdiagnosis',
+            name='diagnostic_certainty_coded',
+            field=django_openehr.fields.CodedTextField(blank=True, choices=[('Suspected', 'Suspected [The diagnosis has been identified with a low level of certainty.]'), ('Probable', 'Probable [The diagnosis has been identified with a high level of certainty.]'), ('Confirmed', 'Confirmed [The diagnosis has been confirmed against recognised criteria.]')], help_text='The level of confidence in the identification of the diagnosis', null=True),
+        ),
+        migrations.AddField(
+            model_name='relevantcontact',
+            name='relationship_category_coded',
+            field=django_openehr.fields.CodedTextField(blank=True, choices=[('INFORMAL_CARER', 'Informal carer [An individual identified by the person as offering care and support, excluding paid carers or carers from voluntary agencies.]'), ('MAIN_INFORMAL', 'Main informal carer [The contact is identified by the subject as being a primary informal source of care and support.]'), ('FORMAL_CARE_WORKER', 'Formal care worker [A health and social care professional or staff member, including a carer from voluntary sector.]'), ('KEY_FORMAL_CARE_WORKER', "Key formal care worker [The formal carer is the subject's key worker.]")], help_text='The broad category of care relationship which the contact holds with the subject.', null=True),
+        ),
+        migrations.AddField(
+            model_name='symptomsign',
+            name='episodicity_coded',
+            field=django_openehr.fields.CodedTextField(blank=True, choices=[('NEW', 'New'), ('ONGOING', 'Ongoing'), ('INDETERMINATE', 'Indeterminate')], help_text='Category of this episode for the identified symptom or sign.', null=True),
+        ),
+        migrations.AddField(
+            model_name='symptomsign',
+            name='severity_category_coded',
+            field=django_openehr.fields.CodedTextField(blank=True, choices=[('MILD', 'Mild [The intensity of the symptom or sign does not cause interference with normal activity.] [SNOMED-CT::162468002] (Symptom mild (finding)'), ('MODERATE', 'Moderate: Moderate [The intensity of the symptom or sign causes interference with normal activity.] [SNOMED-CT::162469005] (Symptom moderate (finding)'), ('SEVERE', 'Severe: Severe [The intensity of the symptom or sign prevents normal activity.] [SNOMED-CT::162470006] (Symptom severe (finding)')], help_text='Category representing the overall severity of the symptom or sign.', null=True),
+        ),
+        migrations.AddField(
+            model_name='symptomsign',
+            name='progression_coded',
+            field=django_openehr.fields.CodedTextField(blank=True, choices=[('WORSENING', 'Worsening [The severity of the symptom or sign has worsened overall during this episode.]'), ('UNCHANGED', 'Unchanged [The severity of the symptom or sign has not changed overall during this episode.]'), ('IMPROVING', 'Improving [The severity of the symptom or sign has improved overall during this episode.]'), ('RESOLVED', 'Resolved [The severity of the symptom or sign has resolved.]')], help_text='Description progression of the symptom or sign at the time of reporting.', null=True),
+        ),
+        migrations.AddField(
+            model_name='symptomsign',
+            name='modifying_factor_effect_coded',
+            field=django_openehr.fields.CodedTextField(blank=True, choices=[('Relieves', 'Relieves [The factor decreases the severity or impact of the symptom or sign, but does not fully # resolve it.]'), ('NOEFFECT', 'No effect [The factor has no impact on the symptom or sign.]'), ('WORSENS', 'Worsens [The factor increases the severity or impact of the symptom or sign.]')], help_text='Perceived effect of the modifying factor on the symptom or sign.', null=True),
+        ),
+        migrations.AddField(
+            model_name='therapeuticdirection',
+            name='direction_duration_coded',
+            field=django_openehr.fields.CodedTextField(blank=True, choices=[('INDEFINITE', 'Indefinite'), ('INDEFINITENTBDC', 'Indefinite - not to be discontinued')], null=True),
+        ),
+        # nullable before the data is copied, so that reversing can add the old
+        # column back and fill it before it becomes NOT NULL again
+        migrations.AlterField(
+            model_name='addressdetails',
+            name='address_type',
+            field=models.CharField(choices=[('RESIDENTIAL', 'Residential'), ('CORRESPONDENCE', 'Correspondence'), ('BUSINESS', 'Business'), ('TEMPORARY', 'Temporary')], help_text='The type of address.', max_length=255, null=True),
+        ),
+        migrations.RunPython(forwards, backwards),
+        migrations.RemoveField(
+            model_name='addressdetails',
+            name='address_type',
+        ),
+        migrations.RemoveField(
+            model_name='personname',
+            name='name_type',
+        ),
+        migrations.RemoveField(
+            model_name='demographicpersonal',
+            name='gender',
+        ),
+        migrations.RemoveField(
+            model_name='inpatientadmission',
+            name='admission_method',
+        ),
+        migrations.RemoveField(
+            model_name='problemdiagnosis',
+            name='severity',
+        ),
+        migrations.RemoveField(
+            model_name='problemdiagnosis',
+            name='diagnostic_certainty',
+        ),
+        migrations.RemoveField(
+            model_name='relevantcontact',
+            name='relationship_category',
+        ),
+        migrations.RemoveField(
+            model_name='symptomsign',
+            name='episodicity',
+        ),
+        migrations.RemoveField(
+            model_name='symptomsign',
+            name='severity_category',
+        ),
+        migrations.RemoveField(
+            model_name='symptomsign',
+            name='progression',
+        ),
+        migrations.RemoveField(
+            model_name='symptomsign',
+            name='modifying_factor_effect',
+        ),
+        migrations.RemoveField(
+            model_name='therapeuticdirection',
+            name='direction_duration',
+        ),
+        migrations.RenameField(
+            model_name='addressdetails',
+            old_name='address_type_coded',
+            new_name='address_type',
+        ),
+        migrations.RenameField(
+            model_name='personname',
+            old_name='name_type_coded',
+            new_name='name_type',
+        ),
+        migrations.RenameField(
+            model_name='demographicpersonal',
+            old_name='gender_coded',
+            new_name='gender',
+        ),
+        migrations.RenameField(
+            model_name='inpatientadmission',
+            old_name='admission_method_coded',
+            new_name='admission_method',
+        ),
+        migrations.RenameField(
+            model_name='problemdiagnosis',
+            old_name='severity_coded',
+            new_name='severity',
+        ),
+        migrations.RenameField(
+            model_name='problemdiagnosis',
+            old_name='diagnostic_certainty_coded',
+            new_name='diagnostic_certainty',
+        ),
+        migrations.RenameField(
+            model_name='relevantcontact',
+            old_name='relationship_category_coded',
+            new_name='relationship_category',
+        ),
+        migrations.RenameField(
+            model_name='symptomsign',
+            old_name='episodicity_coded',
+            new_name='episodicity',
+        ),
+        migrations.RenameField(
+            model_name='symptomsign',
+            old_name='severity_category_coded',
+            new_name='severity_category',
+        ),
+        migrations.RenameField(
+            model_name='symptomsign',
+            old_name='progression_coded',
+            new_name='progression',
+        ),
+        migrations.RenameField(
+            model_name='symptomsign',
+            old_name='modifying_factor_effect_coded',
+            new_name='modifying_factor_effect',
+        ),
+        migrations.RenameField(
+            model_name='therapeuticdirection',
+            old_name='direction_duration_coded',
+            new_name='direction_duration',
+        ),
+        migrations.AlterField(
+            model_name='addressdetails',
+            name='address_type',
+            field=django_openehr.fields.CodedTextField(choices=[('RESIDENTIAL', 'Residential'), ('CORRESPONDENCE', 'Correspondence'), ('BUSINESS', 'Business'), ('TEMPORARY', 'Temporary')], help_text='The type of address.'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0014_coded_text_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchetypeVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.PositiveIntegerField()),
+                ('version', models.PositiveIntegerField()),
+                ('change_type', models.CharField(choices=[('CREATION', 'Creation'), ('MODIFICATION', 'Modification'), ('DELETED', 'Deleted')], max_length=12)),
+                ('valid_from', models.DateTimeField()),
+                ('valid_to', models.DateTimeField(blank=True, null=True)),
+                ('snapshot', models.BinaryField()),
+            ],
+            options={
+                'unique_together': {('model', 'object_id', 'version')},
+                'index_together': {('model', 'object_id', 'valid_from'), ('model', 'valid_from', 'valid_to')},
+            },
+        ),
+    ]
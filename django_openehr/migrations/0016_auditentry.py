@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0015_archetypeversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.PositiveIntegerField()),
+                ('change_type', models.CharField(choices=[('CREATION', 'Creation'), ('MODIFICATION', 'Modification'), ('DELETED', 'Deleted')], max_length=12)),
+                ('user_id', models.IntegerField(blank=True, null=True)),
+                ('username', models.CharField(blank=True, max_length=150)),
+                ('timestamp', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'Audit Entries',
+                'index_together': {('model', 'object_id', 'timestamp'), ('user_id', 'timestamp')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0016_auditentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompositionDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.PositiveIntegerField()),
+                ('archetype_id', models.CharField(max_length=255)),
+                ('document', models.TextField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('model', 'object_id')},
+            },
+        ),
+    ]
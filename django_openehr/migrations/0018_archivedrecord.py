@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0017_compositiondocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.PositiveIntegerField()),
+                ('cold_since', models.DateTimeField(blank=True, null=True)),
+                ('archived', models.DateTimeField()),
+                ('snapshot', models.BinaryField()),
+            ],
+            options={
+                'unique_together': {('model', 'object_id')},
+                'index_together': {('model', 'cold_since')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0018_archivedrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdmissionRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grain', models.CharField(choices=[('HOUR', 'Hour'), ('DAY', 'Day')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('admission_method', models.CharField(blank=True, max_length=255)),
+                ('source_of_admission', models.CharField(blank=True, max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('grain', 'period_start', 'admission_method', 'source_of_admission')},
+            },
+        ),
+    ]
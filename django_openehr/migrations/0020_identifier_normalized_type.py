@@ -0,0 +1,80 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:43
+
+from django.db import migrations, models
+
+from django_openehr.validators import normalize_type
+
+
+def merge_duplicate_identifiers(apps, schema_editor):
+    """
+    Fill in normalized_type and the empty issuer, then merge the identifiers
+    which only a null issuer or the spelling of their type kept apart,
+    moving every slot link to the oldest of them.
+    """
+    Identifier = apps.get_model('django_openehr', 'Identifier')
+    db_alias = schema_editor.connection.alias
+    identifiers = Identifier.objects.using(db_alias)
+    identifiers.filter(issuer__isnull=True).update(issuer='')
+    batch = []
+    for identifier in identifiers.only('identifier_type').iterator():
+        identifier.normalized_type = normalize_type(identifier.identifier_type)
+        batch.append(identifier)
+        if len(batch) >= 1000:
+            identifiers.bulk_update(batch, ['normalized_type'])
+            batch = []
+    identifiers.bulk_update(batch, ['normalized_type'])
+
+    # the through models of every slot holding identifiers
+    throughs = [
+        (field.remote_field.through, field.m2m_reverse_field_name())
+        for model in apps.get_models()
+        for field in model._meta.many_to_many
+        if field.related_model is Identifier
+    ]
+    keep = {}
+    for pk, key in (
+        (pk, (issuer, normalized_type, normalized_identifier))
+        for pk, issuer, normalized_type, normalized_identifier in identifiers.order_by('pk').values_list(
+            'pk', 'issuer', 'normalized_type', 'normalized_identifier'
+        ).iterator()
+    ):
+        if key not in keep:
+            keep[key] = pk
+            continue
+        for through, column in throughs:
+            owner = [f.name for f in through._meta.fields if f.is_relation and f.name != column][0]
+            rows = through.objects.using(db_alias).filter(**{column: pk})
+            # an owner holding both identifiers keeps just the one link
+            held = through.objects.using(db_alias).filter(**{column: keep[key]}).values(owner)
+            rows.filter(**{owner + '__in': held}).delete()
+            rows.update(**{column: keep[key]})
+        identifiers.filter(pk=pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0019_admissionrollup'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='identifier',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='identifier',
+            name='normalized_type',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(merge_duplicate_identifiers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='identifier',
+            name='issuer',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterUniqueTogether(
+            name='identifier',
+            unique_together={('issuer', 'normalized_type', 'normalized_identifier')},
+        ),
+    ]
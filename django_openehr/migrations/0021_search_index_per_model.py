@@ -0,0 +1,68 @@
+from django.db import OperationalError, migrations
+
+# the FTS5 table of each indexed model, keyed by rowid = the model's pk
+SQLITE_TABLES = {
+    'django_openehr.clinicalsynopsis': 'django_openehr_search_clinicalsynopsis',
+    'django_openehr.problemdiagnosis': 'django_openehr_search_problemdiagnosis',
+    'django_openehr.symptomsign': 'django_openehr_search_symptomsign',
+}
+
+
+def split_search_index(apps, schema_editor):
+    """
+    On SQLite, replace the shared FTS5 table, whose (model, object_id)
+    columns FTS5 cannot index, with one table per model whose rowid is the
+    instance's primary key, moving the indexed documents across.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        shared = 'django_openehr_search' in schema_editor.connection.introspection.table_names(cursor)
+    for model, table in SQLITE_TABLES.items():
+        try:
+            schema_editor.execute(
+                'CREATE VIRTUAL TABLE {0} USING fts5(body, tokenize = \'porter unicode61\')'.format(table)
+            )
+        except OperationalError as e:
+            # SQLite built without FTS5: search falls back to icontains
+            if 'no such module: fts5' not in str(e):
+                raise
+            return
+        if shared:
+            schema_editor.execute(
+                'INSERT INTO {0} (rowid, body) '
+                'SELECT object_id, body FROM django_openehr_search WHERE model = %s'.format(table),
+                [model],
+            )
+    schema_editor.execute('DROP TABLE IF EXISTS django_openehr_search')
+
+
+def join_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not set(SQLITE_TABLES.values()) <= set(schema_editor.connection.introspection.table_names(cursor)):
+            return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE django_openehr_search USING fts5('
+        'body, model UNINDEXED, object_id UNINDEXED, '
+        "tokenize = 'porter unicode61')"
+    )
+    for model, table in SQLITE_TABLES.items():
+        schema_editor.execute(
+            'INSERT INTO django_openehr_search (body, model, object_id) '
+            'SELECT body, %s, rowid FROM {0}'.format(table),
+            [model],
+        )
+        schema_editor.execute('DROP TABLE {0}'.format(table))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0020_identifier_normalized_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_search_index, join_search_index),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:07
+
+from django.db import migrations
+import django_openehr.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0021_search_index_per_model'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='addressdetails',
+            name='address_type',
+            field=django_openehr.fields.CodedTextField(at_codes={'BUSINESS': 'at0013', 'CORRESPONDENCE': 'at0012', 'RESIDENTIAL': 'at0011', 'TEMPORARY': 'at0014'}, choices=[('RESIDENTIAL', 'Residential'), ('CORRESPONDENCE', 'Correspondence'), ('BUSINESS', 'Business'), ('TEMPORARY', 'Temporary')], help_text='The type of address.', storage={'BUSINESS': 3, 'CORRESPONDENCE': 2, 'RESIDENTIAL': 1, 'TEMPORARY': 4}),
+        ),
+        migrations.AlterField(
+            model_name='demographicpersonal',
+            name='gender',
+            field=django_openehr.fields.CodedTextField(at_codes={'FEMALE': 'at0010', 'MALE': 'at0011', 'UNSPECIFIED': 'at0012'}, blank=True, choices=[('FEMALE', 'Female'), ('MALE', 'Male'), ('UNSPECIFIED', 'Unspecified')], help_text='The administrative phenotypical gender of the individual.', null=True, storage={'FEMALE': 1, 'MALE': 2, 'UNSPECIFIED': 3}),
+        ),
+        migrations.AlterField(
+            model_name='inpatientadmission',
+            name='admission_method',
+            field=django_openehr.fields.CodedTextField(at_codes={'ELECTIVE': 'at0009', 'EMERGENCY': 'at0010', 'MATERNITY': 'at0012', 'TRANSFER': 'at0011'}, blank=True, choices=[('ELECTIVE', 'Elective [The admission was planned.]'), ('EMERGENCY', 'Emergency [The admission was made as an emergency.]'), ('TRANSFER', 'Transfer [The patient was transferred from another inpatient unit.]'), ('MATERNITY', 'Maternity [The admission was maternity-related.]')], help_text='How the patient was admitted to hospital', null=True, storage={'ELECTIVE': 1, 'EMERGENCY': 2, 'MATERNITY': 4, 'TRANSFER': 3}),
+        ),
+        migrations.AlterField(
+            model_name='personname',
+            name='name_type',
+            field=django_openehr.fields.CodedTextField(at_codes={'AKA': 'at0011', 'ALIAS': 'at0012', 'BIRTH': 'at0010', 'MAIDEN': 'at0020', 'PREVIOUS': 'at0009', 'PROFESSIONAL': 'at0021', 'REGISTERED': 'at0008', 'REPORTING': 'at0022'}, blank=True, choices=[('REGISTERED', 'Registered name [The name by which the subject is officially registered.]'), ('PREVIOUS', 'Previous name [Name previously used by this person.]'), ('BIRTH', 'Birth name [Name given to this person at birth.]'), ('AKA', 'AKA [Person also known as.]'), ('ALIAS', 'Alias [Other name used by this person.]'), ('MAIDEN', 'Maiden Name [Name used by this persion before marriage.]'), ('PROFESSIONAL', 'Professional name [The name used by the subject for business or professional purposes.]'), ('REPORTING', 'Reporting name [The subject’s name as it is to be used for reporting, when used with a specific identifier.]')], help_text='The type of name described', null=True, storage={'AKA': 4, 'ALIAS': 5, 'BIRTH': 3, 'MAIDEN': 6, 'PREVIOUS': 2, 'PROFESSIONAL': 7, 'REGISTERED': 1, 'REPORTING': 8}),
+        ),
+        migrations.AlterField(
+            model_name='problemdiagnosis',
+            name='diagnostic_certainty',
+            field=django_openehr.fields.CodedTextField(at_codes={'Confirmed': 'at0076', 'Probable': 'at0075', 'Suspected': 'at0074'}, blank=True, choices=[('Suspected', 'Suspected [The diagnosis has been identified with a low level of certainty.]'), ('Probable', 'Probable [The diagnosis has been identified with a high level of certainty.]'), ('Confirmed', 'Confirmed [The diagnosis has been confirmed against recognised criteria.]')], help_text='The level of confidence in the identification of the diagnosis', null=True, storage={'Confirmed': 3, 'Probable': 2, 'Suspected': 1}),
+        ),
+        migrations.AlterField(
+            model_name='problemdiagnosis',
+            name='severity',
+            field=django_openehr.fields.CodedTextField(at_codes={'Mild': 'at0047', 'Moderate': 'at0048', 'Severe': 'at0049'}, blank=True, choices=[('Mild', 'Mild [The problem or diagnosis does not interfere with normal activity or may cause damage to health if left untreated.]'), ('Moderate', 'Moderate [The problem or diagnosis causes interference with normal activity or will damage health if left untreated.]'), ('Severe', 'Severe [The problem or diagnosis prevents normal activity or will seriously damage health if left untreated.]')], help_text='An assessment of the overall severity of the problem or diagnosis', null=True, storage={'Mild': 1, 'Moderate': 2, 'Severe': 3}),
+        ),
+        migrations.AlterField(
+            model_name='relevantcontact',
+            name='relationship_category',
+            field=django_openehr.fields.CodedTextField(at_codes={'FORMAL_CARE_WORKER': 'at0034', 'INFORMAL_CARER': 'at0032', 'KEY_FORMAL_CARE_WORKER': 'at0035', 'MAIN_INFORMAL': 'at0033'}, blank=True, choices=[('INFORMAL_CARER', 'Informal carer [An individual identified by the person as offering care and support, excluding paid carers or carers from voluntary agencies.]'), ('MAIN_INFORMAL', 'Main informal carer [The contact is identified by the subject as being a primary informal source of care and support.]'), ('FORMAL_CARE_WORKER', 'Formal care worker [A health and social care professional or staff member, including a carer from voluntary sector.]'), ('KEY_FORMAL_CARE_WORKER', "Key formal care worker [The formal carer is the subject's key worker.]")], help_text='The broad category of care relationship which the contact holds with the subject.', null=True, storage={'FORMAL_CARE_WORKER': 3, 'INFORMAL_CARER': 1, 'KEY_FORMAL_CARE_WORKER': 4, 'MAIN_INFORMAL': 2}),
+        ),
+        migrations.AlterField(
+            model_name='symptomsign',
+            name='episodicity',
+            field=django_openehr.fields.CodedTextField(at_codes={'INDETERMINATE': 'at0178', 'NEW': 'at0176', 'ONGOING': 'at0177'}, blank=True, choices=[('NEW', 'New'), ('ONGOING', 'Ongoing'), ('INDETERMINATE', 'Indeterminate')], help_text='Category of this episode for the identified symptom or sign.', null=True, storage={'INDETERMINATE': 3, 'NEW': 1, 'ONGOING': 2}),
+        ),
+        migrations.AlterField(
+            model_name='symptomsign',
+            name='modifying_factor_effect',
+            field=django_openehr.fields.CodedTextField(at_codes={'NOEFFECT': 'at0157', 'Relieves': 'at0156', 'WORSENS': 'at0158'}, blank=True, choices=[('Relieves', 'Relieves [The factor decreases the severity or impact of the symptom or sign, but does not fully # resolve it.]'), ('NOEFFECT', 'No effect [The factor has no impact on the symptom or sign.]'), ('WORSENS', 'Worsens [The factor increases the severity or impact of the symptom or sign.]')], help_text='Perceived effect of the modifying factor on the symptom or sign.', null=True, storage={'NOEFFECT': 2, 'Relieves': 1, 'WORSENS': 3}),
+        ),
+        migrations.AlterField(
+            model_name='symptomsign',
+            name='progression',
+            field=django_openehr.fields.CodedTextField(at_codes={'IMPROVING': 'at0184', 'RESOLVED': 'at0185', 'UNCHANGED': 'at0183', 'WORSENING': 'at0182'}, blank=True, choices=[('WORSENING', 'Worsening [The severity of the symptom or sign has worsened overall during this episode.]'), ('UNCHANGED', 'Unchanged [The severity of the symptom or sign has not changed overall during this episode.]'), ('IMPROVING', 'Improving [The severity of the symptom or sign has improved overall during this episode.]'), ('RESOLVED', 'Resolved [The severity of the symptom or sign has resolved.]')], help_text='Description progression of the symptom or sign at the time of reporting.', null=True, storage={'IMPROVING': 3, 'RESOLVED': 4, 'UNCHANGED': 2, 'WORSENING': 1}),
+        ),
+        migrations.AlterField(
+            model_name='symptomsign',
+            name='severity_category',
+            field=django_openehr.fields.CodedTextField(at_codes={'MILD': 'at0023', 'MODERATE': 'at0024', 'SEVERE': 'at0025'}, blank=True, choices=[('MILD', 'Mild [The intensity of the symptom or sign does not cause interference with normal activity.] [SNOMED-CT::162468002] (Symptom mild (finding)'), ('MODERATE', 'Moderate: Moderate [The intensity of the symptom or sign causes interference with normal activity.] [SNOMED-CT::162469005] (Symptom moderate (finding)'), ('SEVERE', 'Severe: Severe [The intensity of the symptom or sign prevents normal activity.] [SNOMED-CT::162470006] (Symptom severe (finding)')], help_text='Category representing the overall severity of the symptom or sign.', null=True, storage={'MILD': 1, 'MODERATE': 2, 'SEVERE': 3}),
+        ),
+        migrations.AlterField(
+            model_name='therapeuticdirection',
+            name='direction_duration',
+            field=django_openehr.fields.CodedTextField(at_codes={'INDEFINITE': 'at0067', 'INDEFINITENTBDC': 'at0068'}, blank=True, choices=[('INDEFINITE', 'Indefinite'), ('INDEFINITENTBDC', 'Indefinite - not to be discontinued')], null=True, storage={'INDEFINITE': 1, 'INDEFINITENTBDC': 2}),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+def mark_preferred_acceptable(apps, schema_editor):
+    """
+    Which descriptions are merely acceptable was not kept, so until the
+    release is loaded again only the preferred synonyms are.
+    """
+    SnomedDescription = apps.get_model('django_openehr', 'SnomedDescription')
+    SnomedDescription.objects.using(schema_editor.connection.alias).filter(preferred=True).update(acceptable=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0022_coded_text_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snomeddescription',
+            name='acceptable',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_preferred_acceptable, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_openehr', '0023_snomeddescription_acceptable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='duplicatecandidate',
+            name='run',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='candidates', to='django_openehr.DeduplicationRun'),
+        ),
+    ]
@@ -1,34 +1,59 @@
 from .address_details import AddressDetails
+from .admission_rollup import AdmissionRollup
 from .adverse_reaction import AdverseReaction
+from .archive import ArchivedRecord
+from .audit import AuditEntry
 from .clinical_synopsis import ClinicalSynopsis
+from .composition_document import CompositionDocument
+from .deduplication import (
+    DeduplicationRun,
+    DuplicateCandidate,
+    PatientBlockingKey
+)
 from .demographic_personal import DemographicPersonal
 from .demographic_professional import DemographicProfessional
 from .identifier import Identifier
 from .inpatient_admission import InpatientAdmission
+from .patient_summary import PatientSummary
 from .person_name import PersonName
 from .problem_diagnosis import ProblemDiagnosis
 from .reason_for_encounter import ReasonForEncounter
 from .relevant_contact import RelevantContact
 from .symptom_sign import SymptomSign
+from .symptom_sign_closure import SymptomSignClosure
 from .telecom_details import TelecomDetails
+from .terminology import SnomedConcept, SnomedDescription
 from .therapeutic_direction import (
     TherapeuticDirection,
     TherapeuticDirectionDosage
 )
+from .versioning import ArchetypeVersion
 
 __all__ = [
     'AddressDetails',
+    'AdmissionRollup',
     'AdverseReaction',
+    'ArchetypeVersion',
+    'ArchivedRecord',
+    'AuditEntry',
     'ClinicalSynopsis',
+    'CompositionDocument',
+    'DeduplicationRun',
     'DemographicPersonal',
     'DemographicProfessional',
+    'DuplicateCandidate',
     'Identifier',
     'InpatientAdmission',
+    'PatientBlockingKey',
+    'PatientSummary',
     'PersonName',
     'ProblemDiagnosis',
     'ReasonForEncounter',
     'RelevantContact',
+    'SnomedConcept',
+    'SnomedDescription',
     'SymptomSign',
+    'SymptomSignClosure',
     'TelecomDetails',
     'TherapeuticDirection',
     'TherapeuticDirectionDosage',
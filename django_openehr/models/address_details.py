@@ -1,4 +1,5 @@
 from django.db import models
+from django_openehr.fields import CodedTextField
 
 
 class AddressDetails(models.Model):
@@ -16,8 +17,20 @@ class AddressDetails(models.Model):
 
     # coded text
     # mandatory
-    address_type = models.CharField(
-        max_length=255,
+    address_type = CodedTextField(
+        storage={
+            'RESIDENTIAL': 1,
+            'CORRESPONDENCE': 2,
+            'BUSINESS': 3,
+            'TEMPORARY': 4,
+        },
+        terminology='local',
+        at_codes={
+            'RESIDENTIAL': 'at0011',
+            'CORRESPONDENCE': 'at0012',
+            'BUSINESS': 'at0013',
+            'TEMPORARY': 'at0014',
+        },
         choices=ADDRESS_TYPE_CHOICES,
         help_text="The type of address."
     )
@@ -0,0 +1,31 @@
+from django.db import models
+
+
+class AdmissionRollup(models.Model):
+    # not an archetype: the number of InpatientAdmissions per hour or day,
+    # admission method and source of admission, kept up to date by
+    # django_openehr.rollups so dashboards never group the admissions
+
+    class Meta():
+        # the unique index leads with (grain, period_start), so it serves
+        # the period range of every rollup query
+        unique_together = (('grain', 'period_start', 'admission_method', 'source_of_admission'),)
+
+    HOUR = 'HOUR'
+    DAY = 'DAY'
+    GRAIN_CHOICES = (
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    )
+
+    grain = models.CharField(max_length=4, choices=GRAIN_CHOICES)
+    # the start of the hour or day, see rollups.period_start()
+    period_start = models.DateTimeField()
+    # the admissions' admission method and source of admission, '' where
+    # they had none (null would defeat the unique constraint)
+    admission_method = models.CharField(max_length=255, blank=True)
+    source_of_admission = models.CharField(max_length=255, blank=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return "{0} {1}: {2}".format(self.grain, self.period_start, self.count)
@@ -0,0 +1,35 @@
+import json
+import zlib
+
+from django.db import models
+
+
+class ArchivedRecord(models.Model):
+    # not an archetype: a cold archetype instance (a resolved problem, an old
+    # admission) moved out of its own table by django_openehr.archive, and
+    # put back by archive.restore()
+
+    class Meta():
+        unique_together = (('model', 'object_id'),)
+        index_together = (
+            # the archived instances of a model, by the date they went cold
+            ('model', 'cold_since'),
+        )
+
+    # the archived model's label, e.g. django_openehr.problemdiagnosis
+    model = models.CharField(max_length=100)
+    # the primary key the instance had, and gets back when restored
+    object_id = models.PositiveIntegerField()
+    # the value of the date field archive.POLICIES archives the model by,
+    # e.g. the resolution_date_time of a problem
+    cold_since = models.DateTimeField(null=True, blank=True)
+    archived = models.DateTimeField()
+    # zlib-compressed JSON snapshot of the instance, see versioning.snapshot()
+    snapshot = models.BinaryField()
+
+    @property
+    def data(self):
+        return json.loads(zlib.decompress(bytes(self.snapshot)).decode('utf-8'))
+
+    def __str__(self):
+        return "{0} {1}".format(self.model, self.object_id)
@@ -0,0 +1,30 @@
+from django.db import models
+
+
+class AuditEntry(models.Model):
+    # not an archetype: who changed which archetype instance and when,
+    # written in batches by django_openehr.audit
+
+    class Meta():
+        verbose_name_plural = "Audit Entries"
+        index_together = (
+            ('model', 'object_id', 'timestamp'),
+            ('user_id', 'timestamp'),
+        )
+
+    CHANGE_TYPE_CHOICES = (
+        ('CREATION', 'Creation'),
+        ('MODIFICATION', 'Modification'),
+        ('DELETED', 'Deleted'),
+    )
+
+    # the changed model's label, e.g. django_openehr.problemdiagnosis
+    model = models.CharField(max_length=100)
+    object_id = models.PositiveIntegerField()
+    change_type = models.CharField(max_length=12, choices=CHANGE_TYPE_CHOICES)
+    # the user is copied rather than referenced, so the entry outlives them;
+    # both are null for changes made outside a request (e.g. commands)
+    user_id = models.IntegerField(null=True, blank=True)
+    username = models.CharField(max_length=150, blank=True)
+    # when the change was made, not when the entry was written
+    timestamp = models.DateTimeField()
@@ -0,0 +1,25 @@
+import json
+
+from django.db import models
+
+
+class CompositionDocument(models.Model):
+    # not an archetype: the whole of one composition as a JSON document,
+    # kept alongside its relational rows by django_openehr.documents when
+    # OPENEHR_DOCUMENT_STORE is on, so reading it is a single row fetch
+
+    class Meta():
+        unique_together = (('model', 'object_id'),)
+
+    # the composition's model label, e.g. django_openehr.problemdiagnosis
+    model = models.CharField(max_length=100)
+    object_id = models.PositiveIntegerField()
+    archetype_id = models.CharField(max_length=255)
+    # JSON, see documents.build_document(); the declared paths are indexed
+    # by documents.create_path_indexes()
+    document = models.TextField()
+    updated = models.DateTimeField(auto_now=True)
+
+    @property
+    def data(self):
+        return json.loads(self.document)
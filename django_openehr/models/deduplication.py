@@ -0,0 +1,79 @@
+from django.db import models
+from django_openehr.models.demographic_personal import DemographicPersonal
+
+
+class PatientBlockingKey(models.Model):
+    # not an archetype: blocking keys for duplicate patient detection
+    # (see django_openehr.deduplication); only patients sharing a key are
+    # ever compared with each other
+
+    class Meta():
+        unique_together = (('key', 'patient'),)
+
+    key = models.CharField(max_length=100, db_index=True)
+    patient = models.ForeignKey(
+        DemographicPersonal,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+
+class DuplicateCandidate(models.Model):
+    # not an archetype: a pair of DemographicPersonal records which probably
+    # describe the same person, ranked by score
+
+    class Meta():
+        ordering = ['-score']
+        unique_together = (('patient', 'duplicate'),)
+        verbose_name_plural = "Duplicate Candidates"
+
+    # the lower primary key of the pair
+    patient = models.ForeignKey(
+        DemographicPersonal,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    duplicate = models.ForeignKey(
+        DemographicPersonal,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.FloatField(db_index=True)
+    # the first block in which the last run found the pair
+    block_key = models.CharField(max_length=100)
+    created = models.DateTimeField(auto_now_add=True)
+    # the run which last found (and scored) the pair
+    run = models.ForeignKey(
+        'DeduplicationRun',
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='candidates',
+    )
+
+
+class DeduplicationRun(models.Model):
+    # not an archetype: progress of a deduplication run, so an interrupted
+    # run can carry on from its last checkpoint
+
+    PHASE_CHOICES = (
+        ('KEYS', 'Generating blocking keys'),
+        ('SCORING', 'Scoring candidate pairs'),
+        ('DONE', 'Done'),
+    )
+    phase = models.CharField(max_length=10, choices=PHASE_CHOICES, default='KEYS')
+    started = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # checkpoints
+    last_patient_pk = models.IntegerField(default=0)
+    last_block_key = models.CharField(max_length=100, blank=True, default='')
+    # counters
+    blocks_scored = models.BigIntegerField(default=0)
+    pairs_scored = models.BigIntegerField(default=0)
+    candidates_found = models.BigIntegerField(default=0)
+    scoring_seconds = models.FloatField(default=0.0)
+
+    @property
+    def pairs_per_second(self):
+        if not self.scoring_seconds:
+            return 0.0
+        return self.pairs_scored / self.scoring_seconds
@@ -1,5 +1,6 @@
 from django.db import models
-from django.core.exceptions import ValidationError
+from django_openehr.fields import CodedTextField
+from django_openehr.managers import DemographicPersonalQuerySet
 from django_openehr.models.address_details import AddressDetails
 from django_openehr.models.identifier import Identifier
 from django_openehr.models.person_name import PersonName
@@ -13,6 +14,8 @@ class DemographicPersonal(models.Model):
     class Meta():
         verbose_name_plural = "Personal Demographics"
 
+    objects = DemographicPersonalQuerySet.as_manager()
+
     # PERSON NAME
     # optional
     # presumably repeated, because you can't have an 'AKA' as the only name in
@@ -69,31 +72,20 @@ class DemographicPersonal(models.Model):
         ('MALE', 'Male'),
         ('UNSPECIFIED', 'Unspecified')
     )
-    gender = models.CharField(
-        max_length=255,
+    gender = CodedTextField(
+        storage={
+            'FEMALE': 1,
+            'MALE': 2,
+            'UNSPECIFIED': 3,
+        },
+        terminology='local',
+        at_codes={
+            'FEMALE': 'at0010',
+            'MALE': 'at0011',
+            'UNSPECIFIED': 'at0012',
+        },
         choices=GENDER_CHOICES,
         null=True,
         blank=True,
         help_text="The administrative phenotypical gender of the individual."
     )
-
-    def clean(self):
-        """
-        Validation that requires access to multiple fields goes here.
-        """
-        structured_name_fields = [
-            'title'
-            'given_name',
-            'middle_name',
-            'family_name',
-            'suffix'
-        ]
-        present = 0
-        for f in structured_name_fields:
-            if getattr(self, f) is not None:
-                present += 1
-        if present == 1:
-            msg = "A structured name requires at least two of {0}".format(
-                ", ".join(structured_name_fields)
-            )
-            raise ValidationError(msg)
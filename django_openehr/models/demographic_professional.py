@@ -1,4 +1,5 @@
 from django.db import models
+from django_openehr.managers import DemographicProfessionalQuerySet
 from django_openehr.models.identifier import Identifier
 from django_openehr.models.person_name import PersonName
 from django_openehr.models.telecom_details import TelecomDetails
@@ -10,6 +11,8 @@ class DemographicProfessional(models.Model):
     class Meta():
         verbose_name_plural = "Professional Demographics"
 
+    objects = DemographicProfessionalQuerySet.as_manager()
+
     # Name
     # Slot (Cluster)
     # Optional
@@ -1,10 +1,68 @@
 from django.db import models
+from django_openehr.validators import (
+    ValidatorRule,
+    check_rules,
+    normalize_identifier,
+    normalize_type,
+    validate_identifier
+)
 
 
 class Identifier(models.Model):
     # implements RM class 'ID' Identifier as a class
 
-    issuer = models.CharField(max_length=255, blank=True, null=True)
+    class Meta():
+        # one row per real-world identifier, shared by every record that
+        # carries it, which also makes this the index for identifier lookups
+        unique_together = (('issuer', 'normalized_type', 'normalized_identifier'),)
+
+    # '' rather than null where there is no issuer, as the database would
+    # never treat two nulls as equal in the unique constraint above
+    issuer = models.CharField(max_length=255, blank=True, default='')
     assigner = models.CharField(max_length=255, blank=True, null=True)
     identifier = models.CharField(max_length=255)  # mandatory
     identifier_type = models.CharField(max_length=255, blank=True, null=True)
+
+    # the identifier with whitespace removed and letters upper-cased, so that
+    # '943 476 5919' and '9434765919' are the same NHS number
+    # maintained by populate_derived_fields(), never edited directly
+    normalized_identifier = models.CharField(
+        max_length=255,
+        db_index=True,
+        editable=False,
+        default='',
+    )
+
+    # the identifier type upper-cased with everything but letters and digits
+    # removed, so that 'Hospital No' and 'hospital no.' are the same type
+    # maintained by populate_derived_fields(), never edited directly
+    normalized_type = models.CharField(
+        max_length=255,
+        editable=False,
+        default='',
+    )
+
+    def populate_derived_fields(self):
+        """
+        Fill in the columns computed from other fields; called by save() and
+        by the bulk loaders, which bypass save().
+        """
+        self.normalized_identifier = normalize_identifier(self.identifier)
+        self.normalized_type = normalize_type(self.identifier_type)
+        if self.issuer is None:
+            self.issuer = ''
+
+    # cross-field rules, also run by batch_validation.BatchValidator
+    RULES = (
+        ValidatorRule(['identifier', 'identifier_type'], validate_identifier),
+    )
+
+    def clean(self):
+        """
+        Validation that requires access to multiple fields goes here.
+        """
+        check_rules(self, self.RULES)
+
+    def save(self, *args, **kwargs):
+        self.populate_derived_fields()
+        super().save(*args, **kwargs)
@@ -1,10 +1,15 @@
-from django.db import models
+from django.db import models, router, transaction
+from django_openehr.fields import CodedTextField
+from django_openehr.managers import ArchivableQuerySet
 from django_openehr.models.demographic_professional import DemographicProfessional
 
 
 class InpatientAdmission(models.Model):
     # implements openEHR-EHR-ADMIN_ENTRY.inpatient_admission_uk.v1
 
+    # old admissions are archived, see django_openehr.archive
+    objects = ArchivableQuerySet.as_manager()
+
     # Date of admission
     # Date/Time
     # Optional
@@ -24,9 +29,22 @@ class InpatientAdmission(models.Model):
         ("TRANSFER", "Transfer [The patient was transferred from another inpatient unit.]"),
         ("MATERNITY", "Maternity [The admission was maternity-related.]"),
     )
-    admission_method = models.CharField(
+    admission_method = CodedTextField(
+        storage={
+            'ELECTIVE': 1,
+            'EMERGENCY': 2,
+            'TRANSFER': 3,
+            'MATERNITY': 4,
+        },
+        terminology='local',
+        at_codes={
+            'ELECTIVE': 'at0009',
+            'EMERGENCY': 'at0010',
+            'TRANSFER': 'at0011',
+            'MATERNITY': 'at0012',
+        },
         blank=True, null=True,
-        max_length=255,
+        choices=ADMISSION_METHOD_CHOICES,
         help_text="How the patient was admitted to hospital")
 
     # Referrer details
@@ -49,3 +67,10 @@ class InpatientAdmission(models.Model):
         max_length=255,
         help_text="The locaton of the patient immediately prior to admission"
     )
+
+    def save(self, *args, **kwargs):
+        # the admission rollups are updated from post_save, so the save and
+        # its rollup updates commit, or roll back, together
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
@@ -0,0 +1,27 @@
+import json
+
+from django.db import models
+from django_openehr.models.demographic_personal import DemographicPersonal
+
+
+class PatientSummary(models.Model):
+    # not an archetype: the precomputed summary document of one patient,
+    # kept up to date by django_openehr.summaries so that reading it is a
+    # single primary key fetch
+
+    class Meta():
+        verbose_name_plural = "Patient Summaries"
+
+    patient = models.OneToOneField(
+        DemographicPersonal,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='summary',
+    )
+    # JSON, see summaries.build_summary()
+    document = models.TextField()
+    updated = models.DateTimeField(auto_now=True)
+
+    @property
+    def data(self):
+        return json.loads(self.document)
@@ -1,4 +1,7 @@
 from django.db import models
+from django_openehr.fields import CodedTextField
+from django_openehr.phonetics import metaphone, soundex
+from django_openehr.validators import NoneOrAtLeastTwoOf, check_rules
 
 
 class PersonName(models.Model):
@@ -15,8 +18,28 @@ class PersonName(models.Model):
         ('PROFESSIONAL', 'Professional name [The name used by the subject for business or professional purposes.]'),
         ('REPORTING',    'Reporting name [The subject’s name as it is to be used for reporting, when used with a specific identifier.]'),
     )
-    name_type = models.CharField(
-        max_length=255,
+    name_type = CodedTextField(
+        storage={
+            'REGISTERED': 1,
+            'PREVIOUS': 2,
+            'BIRTH': 3,
+            'AKA': 4,
+            'ALIAS': 5,
+            'MAIDEN': 6,
+            'PROFESSIONAL': 7,
+            'REPORTING': 8,
+        },
+        terminology='local',
+        at_codes={
+            'REGISTERED': 'at0008',
+            'PREVIOUS': 'at0009',
+            'BIRTH': 'at0010',
+            'AKA': 'at0011',
+            'ALIAS': 'at0012',
+            'MAIDEN': 'at0020',
+            'PROFESSIONAL': 'at0021',
+            'REPORTING': 'at0022',
+        },
         choices=NAME_TYPE_CHOICES,
         null=True,
         blank=True,
@@ -107,6 +130,51 @@ class PersonName(models.Model):
         help_text="The date until which this name was valid."
     )
 
+    # ## Phonetic keys ## #
+    # not part of the archetype: precomputed blocking keys for fuzzy name
+    # search, maintained by populate_derived_fields() and backfilled with
+    # the backfill_phonetic_keys management command
+    family_name_soundex = models.CharField(
+        max_length=4, blank=True, default='', editable=False, db_index=True
+    )
+    family_name_metaphone = models.CharField(
+        max_length=8, blank=True, default='', editable=False, db_index=True
+    )
+    given_name_soundex = models.CharField(
+        max_length=4, blank=True, default='', editable=False, db_index=True
+    )
+    given_name_metaphone = models.CharField(
+        max_length=8, blank=True, default='', editable=False, db_index=True
+    )
+
+    # cross-field rules, also run by batch_validation.BatchValidator
+    RULES = (
+        NoneOrAtLeastTwoOf(
+            ['title', 'given_name', 'middle_name', 'family_name', 'suffix'],
+            "A structured name requires at least two of {0}",
+        ),
+    )
+
+    def populate_derived_fields(self):
+        """
+        Fill in the columns computed from other fields; called by save() and
+        by the bulk loaders, which bypass save().
+        """
+        self.family_name_soundex = soundex(self.family_name)
+        self.family_name_metaphone = metaphone(self.family_name)
+        self.given_name_soundex = soundex(self.given_name)
+        self.given_name_metaphone = metaphone(self.given_name)
+
+    def clean(self):
+        """
+        Validation that requires access to multiple fields goes here.
+        """
+        check_rules(self, self.RULES)
+
+    def save(self, *args, **kwargs):
+        self.populate_derived_fields()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         if (self.given_name and self.given_name):
             return self.given_name + ' ' + self.family_name
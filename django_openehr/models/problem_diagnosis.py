@@ -1,4 +1,6 @@
 from django.db import models
+from django_openehr.fields import CodedTextField
+from django_openehr.managers import ArchivableQuerySet
 
 
 class ProblemDiagnosis(models.Model):
@@ -7,6 +9,9 @@ class ProblemDiagnosis(models.Model):
     class Meta:
         verbose_name_plural = "Problems / Diagnoses"
 
+    # resolved problems are archived, see django_openehr.archive
+    objects = ArchivableQuerySet.as_manager()
+
     # Problem/Diagnosis name
     # Text
     # Mandatory
@@ -72,10 +77,20 @@ class ProblemDiagnosis(models.Model):
         ("Moderate", "Moderate [The problem or diagnosis causes interference with normal activity or will damage health if left untreated.]"),
         ("Severe", "Severe [The problem or diagnosis prevents normal activity or will seriously damage health if left untreated.]"),
     )
-    severity = models.CharField(
+    severity = CodedTextField(
+        storage={
+            'Mild': 1,
+            'Moderate': 2,
+            'Severe': 3,
+        },
+        terminology='local',
+        at_codes={
+            'Mild': 'at0047',
+            'Moderate': 'at0048',
+            'Severe': 'at0049',
+        },
         blank=True, null=True,
         choices=SEVERITY_CHOICES,
-        max_length=255,
         help_text="An assessment of the overall severity of the problem or diagnosis",
     )
     # TODO ForeignKeyOrFreeText would work here, also SNOMED-CT terms instead
@@ -135,10 +150,20 @@ class ProblemDiagnosis(models.Model):
         ("Probable", "Probable [The diagnosis has been identified with a high level of certainty.]"),
         ("Confirmed", "Confirmed [The diagnosis has been confirmed against recognised criteria.]"),
     )
-    diagnostic_certainty = models.CharField(
+    diagnostic_certainty = CodedTextField(
+        storage={
+            'Suspected': 1,
+            'Probable': 2,
+            'Confirmed': 3,
+        },
+        terminology='local',
+        at_codes={
+            'Suspected': 'at0074',
+            'Probable': 'at0075',
+            'Confirmed': 'at0076',
+        },
         blank=True, null=True,
         choices = DIAGNOSTIC_CERTAINTY_CHOICES,
-        max_length=255,
         help_text="The level of confidence in the identification of the diagnosis"
     )
 
@@ -1,4 +1,5 @@
 from django.db import models
+from django_openehr.fields import CodedTextField
 
 
 class RelevantContact(models.Model):
@@ -24,9 +25,21 @@ class RelevantContact(models.Model):
         ("FORMAL_CARE_WORKER", "Formal care worker [A health and social care professional or staff member, including a carer from voluntary sector.]"),
         ("KEY_FORMAL_CARE_WORKER", "Key formal care worker [The formal carer is the subject's key worker.]")
     )
-    relationship_category = models.CharField(
+    relationship_category = CodedTextField(
+        storage={
+            'INFORMAL_CARER': 1,
+            'MAIN_INFORMAL': 2,
+            'FORMAL_CARE_WORKER': 3,
+            'KEY_FORMAL_CARE_WORKER': 4,
+        },
+        terminology='local',
+        at_codes={
+            'INFORMAL_CARER': 'at0032',
+            'MAIN_INFORMAL': 'at0033',
+            'FORMAL_CARE_WORKER': 'at0034',
+            'KEY_FORMAL_CARE_WORKER': 'at0035',
+        },
         blank=True, null=True,
-        max_length=255,
         choices=RELATIONSHIP_CATEGORY_CHOICES,
         help_text="The broad category of care relationship which the contact holds with the subject."
     )
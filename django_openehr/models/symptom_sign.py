@@ -1,4 +1,5 @@
 from django.db import models
+from django_openehr.fields import CodedTextField
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 
@@ -64,8 +65,18 @@ class SymptomSign(models.Model):
         # Indeterminate [It is not possible to determine if this occurrence of
         # the symptom or sign is new or # ongoing.]
     )
-    episodicity = models.CharField(
-        max_length=255,
+    episodicity = CodedTextField(
+        storage={
+            'NEW': 1,
+            'ONGOING': 2,
+            'INDETERMINATE': 3,
+        },
+        terminology='local',
+        at_codes={
+            'NEW': 'at0176',
+            'ONGOING': 'at0177',
+            'INDETERMINATE': 'at0178',
+        },
         null=True,
         blank=True,
         choices=EPISODICITY_CHOICES,
@@ -120,8 +131,18 @@ class SymptomSign(models.Model):
         ("MODERATE", "Moderate: Moderate [The intensity of the symptom or sign causes interference with normal activity.] [SNOMED-CT::162469005] (Symptom moderate (finding)"),
         ("SEVERE", "Severe: Severe [The intensity of the symptom or sign prevents normal activity.] [SNOMED-CT::162470006] (Symptom severe (finding)")
     )
-    severity_category = models.CharField(
-        max_length=255,
+    severity_category = CodedTextField(
+        storage={
+            'MILD': 1,
+            'MODERATE': 2,
+            'SEVERE': 3,
+        },
+        terminology='local',
+        at_codes={
+            'MILD': 'at0023',
+            'MODERATE': 'at0024',
+            'SEVERE': 'at0025',
+        },
         null=True,
         blank=True,
         choices=SEVERITY_CATEGORIES_CHOICES,
@@ -158,8 +179,20 @@ class SymptomSign(models.Model):
         ("IMPROVING","Improving [The severity of the symptom or sign has improved overall during this episode.]"),
         ("RESOLVED","Resolved [The severity of the symptom or sign has resolved.]")
     )
-    progression = models.CharField(
-        max_length=255,
+    progression = CodedTextField(
+        storage={
+            'WORSENING': 1,
+            'UNCHANGED': 2,
+            'IMPROVING': 3,
+            'RESOLVED': 4,
+        },
+        terminology='local',
+        at_codes={
+            'WORSENING': 'at0182',
+            'UNCHANGED': 'at0183',
+            'IMPROVING': 'at0184',
+            'RESOLVED': 'at0185',
+        },
         choices=PROGRESSION_CHOICES,
         null=True,
         blank=True,
@@ -203,8 +236,18 @@ class SymptomSign(models.Model):
         ("NOEFFECT", "No effect [The factor has no impact on the symptom or sign.]"),
         ("WORSENS", "Worsens [The factor increases the severity or impact of the symptom or sign.]")
     )
-    modifying_factor_effect = models.CharField(
-        max_length=255,
+    modifying_factor_effect = CodedTextField(
+        storage={
+            'Relieves': 1,
+            'NOEFFECT': 2,
+            'WORSENS': 3,
+        },
+        terminology='local',
+        at_codes={
+            'Relieves': 'at0156',
+            'NOEFFECT': 'at0157',
+            'WORSENS': 'at0158',
+        },
         null=True,
         blank=True,
         choices=EFFECT_CHOICES,
@@ -387,3 +430,19 @@ class SymptomSign(models.Model):
         blank=True,
         help_text="Additional narrative about the symptom or sign not captured in other fields."
     )
+
+    def all_previous_episodes(self, max_depth=None):
+        """
+        Every episode reachable through previous_episodes, however many hops
+        away (up to max_depth), fetched in a single query.
+        """
+        from django_openehr.graph import reachable
+        return reachable(self, 'previous_episodes', max_depth)
+
+    def all_associated_symptom_signs(self, max_depth=None):
+        """
+        The whole cluster of symptoms and signs reachable through
+        associated_symptom_sign, fetched in a single query.
+        """
+        from django_openehr.graph import reachable
+        return reachable(self, 'associated_symptom_sign', max_depth)
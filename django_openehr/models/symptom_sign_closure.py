@@ -0,0 +1,29 @@
+from django.db import models
+from django_openehr.models.symptom_sign import SymptomSign
+
+
+class SymptomSignClosure(models.Model):
+    # not an archetype: the transitive closure of the SymptomSign self-links,
+    # one row per (slot, ancestor, descendant) at the shortest depth found;
+    # maintained by django_openehr.graph on databases without recursive CTEs
+
+    class Meta():
+        unique_together = (('slot', 'ancestor', 'descendant'),)
+        index_together = (('slot', 'ancestor', 'depth'),)
+
+    SLOT_CHOICES = (
+        ('previous_episodes', 'Previous episodes'),
+        ('associated_symptom_sign', 'Associated symptom/sign'),
+    )
+    slot = models.CharField(max_length=30, choices=SLOT_CHOICES)
+    ancestor = models.ForeignKey(
+        SymptomSign,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    descendant = models.ForeignKey(
+        SymptomSign,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    depth = models.PositiveIntegerField()
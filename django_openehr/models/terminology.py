@@ -0,0 +1,46 @@
+from django.db import models
+
+
+class SnomedConcept(models.Model):
+    # not an archetype: a row of a SNOMED CT RF2 concept Snapshot file,
+    # loaded by django_openehr.terminology
+
+    class Meta():
+        verbose_name = "SNOMED CT concept"
+
+    # the SCTID
+    id = models.BigIntegerField(primary_key=True)
+    effective_time = models.DateField()
+    active = models.BooleanField()
+    module_id = models.BigIntegerField()
+    definition_status_id = models.BigIntegerField()
+
+
+class SnomedDescription(models.Model):
+    # not an archetype: a row of a SNOMED CT RF2 description Snapshot file,
+    # loaded by django_openehr.terminology
+
+    class Meta():
+        verbose_name = "SNOMED CT description"
+        index_together = (('concept', 'active', 'preferred'),)
+
+    id = models.BigIntegerField(primary_key=True)
+    effective_time = models.DateField()
+    active = models.BooleanField()
+    module_id = models.BigIntegerField()
+    # extension releases may describe concepts from another release, so
+    # the reference is not enforced by the database
+    concept = models.ForeignKey(
+        SnomedConcept,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='descriptions',
+    )
+    language_code = models.CharField(max_length=8)
+    # fully specified name or synonym, see terminology.FSN and SYNONYM
+    type_id = models.BigIntegerField()
+    term = models.CharField(max_length=512)
+    # the preferred synonym in one of the OPENEHR_SNOMED_LANGUAGE_REFSETS
+    preferred = models.BooleanField(default=False)
+    # preferred or acceptable in one of the OPENEHR_SNOMED_LANGUAGE_REFSETS
+    acceptable = models.BooleanField(default=False)
@@ -1,9 +1,17 @@
-from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
+from django_openehr.fields import CodedTextField
+from django_openehr.validators import AtMostOneOf, check_rules
+from django_openehr.managers import (
+    TherapeuticDirectionDosageQuerySet,
+    TherapeuticDirectionQuerySet
+)
 
 
 class TherapeuticDirection(models.Model):
+
+    objects = TherapeuticDirectionQuerySet.as_manager()
+
     # Direction sequence
     # Count
     # Optional
@@ -31,8 +39,17 @@ class TherapeuticDirection(models.Model):
     )
     # Choice of one of the following three fields:
 
-    direction_duration = models.CharField(
-        choices=DIRECTION_CHOICES, blank=True, null=True, max_length=255
+    direction_duration = CodedTextField(
+        storage={
+            'INDEFINITE': 1,
+            'INDEFINITENTBDC': 2,
+        },
+        terminology='local',
+        at_codes={
+            'INDEFINITE': 'at0067',
+            'INDEFINITENTBDC': 'at0068',
+        },
+        choices=DIRECTION_CHOICES, blank=True, null=True
     )
     # Duration >=0 seconds
     direction_duration_seconds = models.IntegerField(
@@ -74,27 +91,25 @@ class TherapeuticDirection(models.Model):
     # openEHR-EHR-CLUSTER.conditional_medication_rules.v0 and specialisations
 
 
+    # cross-field rules, also run by batch_validation.BatchValidator
+    RULES = (
+        AtMostOneOf(
+            ['direction_duration', 'direction_duration_seconds', 'direction_duration_text'],
+            "A direction duration may only be one of {0}",
+        ),
+    )
+
     def clean(self):
         """
         Validation that requires access to multiple fields goes here.
         """
-        direction_duration_fields = [
-            'direction_duration',
-            'direction_duration_seconds',
-            'direction_duration_text'
-        ]
-        present = 0
-        for f in direction_duration_fields:
-            if getattr(self, f) is not None:
-                present += 1
-        if present > 1:
-            msg = "A direction duration may only be one of {0}".format(
-                ", ".join(structured_name_fields)
-            )
-            raise ValidationError(msg)
+        check_rules(self, self.RULES)
 
 
 class TherapeuticDirectionDosage(models.Model):
+
+    objects = TherapeuticDirectionDosageQuerySet.as_manager()
+
     therapeutic_direction = models.ForeignKey(
         TherapeuticDirection,
         on_delete=models.CASCADE)
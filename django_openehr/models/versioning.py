@@ -0,0 +1,48 @@
+import json
+import zlib
+
+from django.db import models
+
+
+class ArchetypeVersion(models.Model):
+    # not an archetype: one version of an archetype instance, after the
+    # openEHR VERSIONED_OBJECT; appended by django_openehr.versioning each
+    # time an instance is saved or deleted
+
+    class Meta():
+        index_together = (
+            # the version of one instance as of a time
+            ('model', 'object_id', 'valid_from'),
+            # every instance of a model as of a time
+            ('model', 'valid_from', 'valid_to'),
+        )
+        unique_together = (('model', 'object_id', 'version'),)
+
+    CREATION = 'CREATION'
+    MODIFICATION = 'MODIFICATION'
+    DELETED = 'DELETED'
+    CHANGE_TYPE_CHOICES = (
+        (CREATION, 'Creation'),
+        (MODIFICATION, 'Modification'),
+        (DELETED, 'Deleted'),
+    )
+
+    # the versioned model's label, e.g. django_openehr.symptomsign
+    model = models.CharField(max_length=100)
+    object_id = models.PositiveIntegerField()
+    # 1 for the first version of an instance, 2 for the second, ...
+    version = models.PositiveIntegerField()
+    change_type = models.CharField(max_length=12, choices=CHANGE_TYPE_CHOICES)
+    # the version was current from valid_from until valid_to, or is still
+    # current where valid_to is null
+    valid_from = models.DateTimeField()
+    valid_to = models.DateTimeField(null=True, blank=True)
+    # zlib-compressed JSON snapshot of the instance, see versioning.snapshot()
+    snapshot = models.BinaryField()
+
+    @property
+    def data(self):
+        return json.loads(zlib.decompress(bytes(self.snapshot)).decode('utf-8'))
+
+    def __str__(self):
+        return "{0} {1} v{2}".format(self.model, self.object_id, self.version)
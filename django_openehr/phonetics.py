@@ -0,0 +1,190 @@
+"""
+Phonetic encodings and string similarity for patient name matching.
+
+soundex() and metaphone() turn a name into a short key that misspellings and
+phonetic variants tend to share ('Smith', 'Smyth', 'Smithe'); they are stored
+as indexed columns on PersonName and used as blocking keys. jaro_winkler()
+scores the candidates found through those keys.
+
+metaphone() is the original, single key Metaphone, not Double Metaphone:
+it gives one key per name, so each name needs one indexed column, and it
+has none of Double Metaphone's alternate keys for names of non-English
+origin ('Schmidt' is SKMTT, never SMT). The Soundex key, blocked on as
+well, catches some of the variants this misses.
+"""
+import re
+
+NON_ALPHA = re.compile(r'[^A-Z]')
+VOWELS = 'AEIOU'
+
+SOUNDEX_CODES = {}
+for _letters, _code in (('BFPV', '1'), ('CGJKQSXZ', '2'), ('DT', '3'),
+                        ('L', '4'), ('MN', '5'), ('R', '6')):
+    for _letter in _letters:
+        SOUNDEX_CODES[_letter] = _code
+
+
+def clean(name):
+    return NON_ALPHA.sub('', (name or '').upper())
+
+
+def soundex(name):
+    """
+    American Soundex, e.g. 'Robert' and 'Rupert' -> 'R163'
+    """
+    name = clean(name)
+    if not name:
+        return ''
+    key = name[0]
+    previous = SOUNDEX_CODES.get(name[0])
+    for letter in name[1:]:
+        code = SOUNDEX_CODES.get(letter)
+        if code is not None and code != previous:
+            key += code
+            if len(key) == 4:
+                break
+        # H and W do not separate letters with the same code; vowels do
+        if letter not in 'HW':
+            previous = code
+    return key.ljust(4, '0')
+
+
+def metaphone(name, max_length=8):
+    """
+    Lawrence Philips' original Metaphone, e.g. 'Knight' and 'Night' -> 'NT'
+    """
+    word = clean(name)
+    if not word:
+        return ''
+
+    # initial letter exceptions
+    if word[:2] in ('AE', 'GN', 'KN', 'PN', 'WR'):
+        word = word[1:]
+    elif word[0] == 'X':
+        word = 'S' + word[1:]
+    elif word[:2] == 'WH':
+        word = 'W' + word[2:]
+
+    def at(i):
+        return word[i] if 0 <= i < len(word) else ''
+
+    key = ''
+    for i, letter in enumerate(word):
+        if letter == at(i - 1) and letter != 'C':
+            continue
+        following = at(i + 1)
+        if letter in VOWELS:
+            if i == 0:
+                key += letter
+        elif letter == 'B':
+            if not (at(i - 1) == 'M' and i == len(word) - 1):
+                key += 'B'
+        elif letter == 'C':
+            if following == 'I' and at(i + 2) == 'A':
+                key += 'X'
+            elif following == 'H':
+                key += 'K' if at(i - 1) == 'S' else 'X'
+            elif following in ('I', 'E', 'Y'):
+                if at(i - 1) != 'S':
+                    key += 'S'
+            else:
+                key += 'K'
+        elif letter == 'D':
+            if following == 'G' and at(i + 2) in ('E', 'Y', 'I'):
+                key += 'J'
+            else:
+                key += 'T'
+        elif letter == 'G':
+            if following == 'H' and not (i + 2 >= len(word) or at(i + 2) in VOWELS):
+                continue
+            if following == 'N' and (i + 2 == len(word) or word[i + 1:] == 'NED'):
+                continue
+            if at(i - 1) == 'D' and following in ('I', 'E', 'Y'):
+                # already sounded as the J of DGE, DGI, DGY
+                continue
+            if following in ('I', 'E', 'Y') and at(i - 1) != 'G':
+                key += 'J'
+            else:
+                key += 'K'
+        elif letter == 'H':
+            if at(i - 1) in 'CSPTG' and at(i - 1):
+                continue
+            if at(i - 1) in VOWELS and at(i - 1) and following not in VOWELS:
+                continue
+            key += 'H'
+        elif letter == 'K':
+            if at(i - 1) != 'C':
+                key += 'K'
+        elif letter == 'P':
+            key += 'F' if following == 'H' else 'P'
+        elif letter == 'Q':
+            key += 'K'
+        elif letter == 'S':
+            if following == 'H' or (following == 'I' and at(i + 2) in ('O', 'A')):
+                key += 'X'
+            else:
+                key += 'S'
+        elif letter == 'T':
+            if following == 'I' and at(i + 2) in ('O', 'A'):
+                key += 'X'
+            elif following == 'H':
+                key += '0'
+            elif not (following == 'C' and at(i + 2) == 'H'):
+                key += 'T'
+        elif letter == 'V':
+            key += 'F'
+        elif letter in ('W', 'Y'):
+            if following and following in VOWELS:
+                key += letter
+        elif letter == 'X':
+            key += 'KS'
+        elif letter == 'Z':
+            key += 'S'
+        else:
+            # F, J, L, M, N, R
+            key += letter
+        if len(key) >= max_length:
+            break
+    return key[:max_length]
+
+
+def jaro_winkler(a, b, prefix_scale=0.1):
+    """
+    Jaro-Winkler similarity between 0.0 and 1.0, case-insensitive.
+    """
+    a = (a or '').upper()
+    b = (b or '').upper()
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    window = max(max(len(a), len(b)) // 2 - 1, 0)
+    a_matched = [False] * len(a)
+    b_matched = [False] * len(b)
+    matches = 0
+    for i, letter in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not b_matched[j] and b[j] == letter:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+    transpositions = 0
+    j = 0
+    for i, letter in enumerate(a):
+        if a_matched[i]:
+            while not b_matched[j]:
+                j += 1
+            if letter != b[j]:
+                transpositions += 1
+            j += 1
+    jaro = (
+        matches / len(a) + matches / len(b) + (matches - transpositions / 2) / matches
+    ) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
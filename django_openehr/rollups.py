@@ -0,0 +1,210 @@
+"""
+Admission counts per hour and per day, kept up to date as admissions change.
+
+AdmissionRollup holds the number of InpatientAdmissions per period (an hour,
+or a day), admission method and source of admission. Dashboards read them
+with admissions(), a range scan over a few rows per period, instead of
+grouping the admissions themselves:
+
+    admissions_since(days=90)  # per hour, method and source
+
+Each admission remembers the period, method and source it was counted
+under when it was loaded (post_init), so a save moves it between rollup
+rows with one UPDATE per grain, and only when one of the three changed; a
+delete takes it off. InpatientAdmission.save() runs in a transaction (its
+own in autocommit), as deletes always do, and the updates are made in it,
+so an admission and its counts commit, or roll back, together.
+
+Hours start on the hour in UTC; days start at midnight in the default time
+zone (TIME_ZONE).
+
+Moves to and from the archive (see archive) leave the counts alone: an
+archived admission still happened. Loaders which bypass save() send no
+signals; run the rebuild_admission_rollups command after them. Admissions
+saved while the command is counting may be missed, so run it when nothing
+else is loading admissions. Set OPENEHR_ADMISSION_ROLLUPS = False to turn
+rollups off.
+"""
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Sum
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.utils import timezone
+
+from django_openehr import archive
+from django_openehr.models import AdmissionRollup, InpatientAdmission
+from django_openehr.utils import chunked_queryset
+
+ENABLED = getattr(settings, 'OPENEHR_ADMISSION_ROLLUPS', True)
+
+GRAINS = (AdmissionRollup.HOUR, AdmissionRollup.DAY)
+
+# what an admission is counted by
+FIELDS = ('date_of_admission', 'admission_method', 'source_of_admission')
+
+GROUP_BY = ('admission_method', 'source_of_admission')
+
+
+def period_start(value, grain):
+    """
+    The start of the hour or day `value` falls in.
+    """
+    if grain == AdmissionRollup.HOUR:
+        if timezone.is_aware(value):
+            value = value.astimezone(timezone.utc)
+        return value.replace(minute=0, second=0, microsecond=0)
+    if timezone.is_naive(value):
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    zone = timezone.get_default_timezone()
+    midnight = timezone.localtime(value, zone).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    return timezone.make_aware(midnight, zone, is_dst=False)
+
+
+def state(instance):
+    return tuple(getattr(instance, name) for name in FIELDS)
+
+
+def rollup_keys(counted):
+    """
+    (grain, period_start, admission_method, source_of_admission) of each
+    rollup row an admission with the state `counted` is counted in.
+    """
+    if counted is None or counted[0] is None:
+        return []
+    when, method, source = counted
+    return [(grain, period_start(when, grain), method or '', source or '') for grain in GRAINS]
+
+
+def add(counted, delta, using):
+    for grain, start, method, source in rollup_keys(counted):
+        rollup = AdmissionRollup.objects.using(using).filter(
+            grain=grain, period_start=start, admission_method=method, source_of_admission=source,
+        )
+        if rollup.update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic(using=using):
+                AdmissionRollup.objects.using(using).create(
+                    grain=grain, period_start=start, admission_method=method,
+                    source_of_admission=source, count=delta,
+                )
+        except IntegrityError:
+            # created by a concurrent save in the meantime
+            rollup.update(count=F('count') + delta)
+
+
+def stored_state(instance, using):
+    """
+    The state of `instance` in the database, or None if it is not there.
+    """
+    row = type(instance)._base_manager.using(using).filter(pk=instance.pk).values_list(*FIELDS).first()
+    return tuple(row) if row is not None else None
+
+
+def admission_loaded(sender, instance, **kwargs):
+    # an instance built by hand with a pk may not match its row, so only
+    # instances without one are known not to be counted yet; the rest are
+    # settled in remember_state()
+    if instance.pk is None:
+        instance._rollup_state = None
+    elif not set(FIELDS) & instance.get_deferred_fields():
+        instance._rollup_state = state(instance)
+
+
+def remember_state(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    if instance._state.adding or '_rollup_state' not in instance.__dict__:
+        instance._rollup_state = stored_state(instance, using) if instance.pk is not None else None
+
+
+def admission_saved(sender, instance, using, raw=False, **kwargs):
+    if raw:
+        return
+    counted = state(instance)
+    # an archived admission was never taken off, see archive
+    if not getattr(instance, 'archiving', False) and counted != instance._rollup_state:
+        add(instance._rollup_state, -1, using)
+        add(counted, 1, using)
+    instance._rollup_state = counted
+
+
+def admission_deleted(sender, instance, using, **kwargs):
+    if not getattr(instance, 'archiving', False):
+        add(instance._rollup_state, -1, using)
+    instance._rollup_state = None
+
+
+def rebuild_rollups(since=None, using=None, chunk_size=1000):
+    """
+    Recount the rollups of every admission (or of those from the day of
+    `since` on), archived ones included, and return how many rows were
+    written.
+    """
+    using = using or router.db_for_write(AdmissionRollup)
+    admissions = InpatientAdmission.objects.using(using).filter(date_of_admission__isnull=False)
+    archived = {}
+    if since is not None:
+        since = period_start(since, AdmissionRollup.DAY)
+        admissions = admissions.filter(date_of_admission__gte=since)
+        archived['date_of_admission__gte'] = since
+    counts = Counter()
+    for chunk in chunked_queryset(admissions.only(*FIELDS), chunk_size):
+        for admission in chunk:
+            counts.update(rollup_keys(state(admission)))
+    for admission in archive.archived_instances(InpatientAdmission, using=using, **archived):
+        counts.update(rollup_keys(state(admission)))
+
+    rollups = AdmissionRollup.objects.using(using).all()
+    if since is not None:
+        rollups = rollups.filter(period_start__gte=since)
+    with transaction.atomic(using=using):
+        rollups.delete()
+        AdmissionRollup.objects.using(using).bulk_create([
+            AdmissionRollup(
+                grain=grain, period_start=start, admission_method=method,
+                source_of_admission=source, count=count,
+            )
+            for (grain, start, method, source), count in counts.items()
+        ], batch_size=chunk_size)
+    return len(counts)
+
+
+def admissions(grain=AdmissionRollup.HOUR, since=None, until=None, group_by=GROUP_BY, using=None):
+    """
+    [{'period_start', <group_by fields>, 'admissions'}, ...] for each period
+    of `grain` in [since, until) with admissions, in period order; group_by
+    may be any of GROUP_BY, or nothing for the totals per period.
+    """
+    for name in group_by:
+        if name not in GROUP_BY:
+            raise ValueError("Admission rollups cannot be grouped by {0}".format(name))
+    rollups = AdmissionRollup.objects.using(using).filter(grain=grain)
+    if since is not None:
+        rollups = rollups.filter(period_start__gte=period_start(since, grain))
+    if until is not None:
+        rollups = rollups.filter(period_start__lt=until)
+    return list(
+        rollups.values('period_start', *group_by)
+        .annotate(admissions=Sum('count'))
+        .filter(admissions__gt=0)
+        .order_by('period_start', *group_by)
+    )
+
+
+def admissions_since(days=90, grain=AdmissionRollup.HOUR, group_by=GROUP_BY, using=None):
+    """
+    admissions() over the last `days` days, e.g. for a dashboard.
+    """
+    return admissions(grain, timezone.now() - datetime.timedelta(days=days), None, group_by, using)
+
+
+if ENABLED:
+    post_init.connect(admission_loaded, sender=InpatientAdmission, dispatch_uid='openehr_rollup_loaded')
+    pre_save.connect(remember_state, sender=InpatientAdmission, dispatch_uid='openehr_rollup_saving')
+    post_save.connect(admission_saved, sender=InpatientAdmission, dispatch_uid='openehr_rollup_saved')
+    pre_delete.connect(remember_state, sender=InpatientAdmission, dispatch_uid='openehr_rollup_deleting')
+    post_delete.connect(admission_deleted, sender=InpatientAdmission, dispatch_uid='openehr_rollup_deleted')
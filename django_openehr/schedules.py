@@ -0,0 +1,236 @@
+"""
+Expansion of TherapeuticDirections into administration events.
+
+expand_directions() turns any number of directions into one timeline of
+(time, dose, unit) events for a window, e.g. a ward's prescriptions for the
+next 72 hours. Everything after the single query is numpy array arithmetic,
+so the cost does not depend on building a Python object per event.
+
+The rules, given what the models hold:
+
+* each TherapeuticDirectionDosage is one administration per day; the
+  timing_daily slot is not implemented, so a direction's dosages are spread
+  evenly over the day in dosage_sequence order, starting at
+  OPENEHR_DOSAGE_DAY_START_HOUR (08:00 by default): one dosage is given at
+  08:00, two at 08:00 and 20:00, three at 08:00, 16:00 and 00:00
+* a direction runs from its start time (`starts`, or the window start) for
+  direction_duration_seconds, or indefinitely
+* maximum_administrations counts administrations from the direction's start,
+  including any before the window
+* a dose range is kept as its lower and upper bound; an exact dose has both
+  equal
+
+Times are local wall-clock times in the current time zone.
+
+numpy is an optional dependency: pip install django_openehr[schedules]
+"""
+import datetime
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from django_openehr.models import TherapeuticDirectionDosage
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DAY_START_HOUR = getattr(settings, 'OPENEHR_DOSAGE_DAY_START_HOUR', 8)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def to_local_naive(value):
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.replace(tzinfo=None)
+
+
+def to_datetime64(value):
+    return np.datetime64(to_local_naive(value), 's')
+
+
+class DosageSchedule(object):
+    """
+    Administration events as parallel numpy arrays, ordered by time:
+
+    * time: datetime64[s], local wall-clock time
+    * direction, dosage: primary keys
+    * administration: 1 for a direction's first administration, 2 for its
+      second, ...
+    * dose_lower, dose_upper: float64, NaN where no dose amount is recorded
+    * unit: index into `units`
+    """
+
+    def __init__(self, time, direction, dosage, administration, dose_lower, dose_upper, unit, units):
+        self.time = time
+        self.direction = direction
+        self.dosage = dosage
+        self.administration = administration
+        self.dose_lower = dose_lower
+        self.dose_upper = dose_upper
+        self.unit = unit
+        self.units = units
+
+    def __len__(self):
+        return len(self.time)
+
+    def for_direction(self, pk):
+        return self.select(self.direction == pk)
+
+    def select(self, mask):
+        return DosageSchedule(
+            self.time[mask], self.direction[mask], self.dosage[mask],
+            self.administration[mask], self.dose_lower[mask], self.dose_upper[mask],
+            self.unit[mask], self.units,
+        )
+
+    def totals(self):
+        """
+        {unit: (lower, upper)} total dose over the schedule.
+        """
+        totals = {}
+        for index, unit in enumerate(self.units):
+            mask = self.unit == index
+            totals[unit] = (
+                float(np.nansum(self.dose_lower[mask])),
+                float(np.nansum(self.dose_upper[mask])),
+            )
+        return totals
+
+    def events(self):
+        """
+        Yield (time, dose, unit) per administration, with time an aware
+        datetime when USE_TZ is on and dose a (lower, upper) tuple, or None.
+        """
+        times = self.time.astype(datetime.datetime)
+        for i in range(len(self)):
+            time = times[i]
+            if settings.USE_TZ:
+                # the repeated hour when clocks go back is taken as the later one
+                time = timezone.make_aware(time, is_dst=False)
+            lower, upper = self.dose_lower[i], self.dose_upper[i]
+            dose = None if np.isnan(lower) else (float(lower), float(upper))
+            yield time, dose, self.units[self.unit[i]]
+
+
+def load_dosages(directions):
+    """
+    One row per dosage of `directions` (a QuerySet, or an iterable of
+    instances or primary keys), ordered by direction and dosage sequence.
+    """
+    if not hasattr(directions, 'values_list'):
+        directions = [getattr(d, 'pk', d) for d in directions]
+    return list(
+        TherapeuticDirectionDosage.objects.filter(therapeutic_direction__in=directions)
+        .with_dose_bounds()
+        .order_by('therapeutic_direction', 'dosage_sequence', 'pk')
+        .values_list(
+            'pk',
+            'therapeutic_direction',
+            'dose_lower',
+            'dose_upper',
+            'dose_unit',
+            'therapeutic_direction__direction_duration_seconds',
+            'therapeutic_direction__maximum_administrations',
+        )
+    )
+
+
+def expand_directions(directions, start=None, hours=72, starts=None):
+    """
+    The DosageSchedule of `directions` from `start` (default now) for
+    `hours`. `starts` maps direction primary keys to the time each direction
+    began, where that was before the window.
+    """
+    if np is None:
+        raise ImproperlyConfigured(
+            "Dosage schedule expansion requires numpy: pip install django_openehr[schedules]"
+        )
+    window_start = to_datetime64(start or timezone.now())
+    window_end = window_start + np.timedelta64(int(hours * 3600), 's')
+    rows = load_dosages(directions)
+    if not rows:
+        empty = np.array([], dtype=np.int64)
+        return DosageSchedule(
+            np.array([], dtype='datetime64[s]'), empty, empty, empty,
+            np.array([], dtype=np.float64), np.array([], dtype=np.float64), empty, [],
+        )
+
+    (dosage, direction, dose_lower, dose_upper, unit_names,
+     duration, maximum) = zip(*rows)
+    dosage = np.array(dosage, dtype=np.int64)
+    direction = np.array(direction, dtype=np.int64)
+    units = sorted({u or '' for u in unit_names})
+    unit = np.array([units.index(u or '') for u in unit_names], dtype=np.int64)
+    # None becomes NaN
+    dose_lower = np.array(dose_lower, dtype=np.float64)
+    dose_upper = np.array(dose_upper, dtype=np.float64)
+
+    # position of each dosage within its direction's day, and dosages per day
+    directions_, first, inverse, per_day = np.unique(
+        direction, return_index=True, return_inverse=True, return_counts=True
+    )
+    slot = np.arange(len(direction)) - first[inverse]
+    count = per_day[inverse]
+    offset = DAY_START_HOUR * 3600 + (slot * SECONDS_PER_DAY) // count
+
+    # when each direction began and ends, as seconds since the epoch
+    began = np.full(len(directions_), window_start.astype(np.int64))
+    for i, pk in enumerate(directions_):
+        if starts and pk in starts:
+            began[i] = to_datetime64(starts[pk]).astype(np.int64)
+    began = began[inverse]
+    duration = np.array([-1 if d is None else d for d in duration], dtype=np.int64)
+    ends = np.where(duration >= 0, began + duration, np.iinfo(np.int64).max)
+    ends = np.minimum(ends, window_end.astype(np.int64))
+    opens = np.maximum(began, window_start.astype(np.int64))
+
+    # the administrations of dosage i fall at midnight + day * 86400 + offset
+    # for whole days, counted from the midnight of the direction's start
+    midnight = began - began % SECONDS_PER_DAY
+
+    def first_day_at_or_after(t):
+        return -((midnight + offset - t) // SECONDS_PER_DAY)
+
+    first_day = first_day_at_or_after(opens)
+    last_day = first_day_at_or_after(ends)
+    per_dosage = np.maximum(last_day - first_day, 0)
+    # administrations between the direction's start and the window
+    before = np.maximum(first_day - first_day_at_or_after(began), 0)
+
+    # one entry per event
+    index = np.repeat(np.arange(len(dosage)), per_dosage)
+    day = first_day[index] + (
+        np.arange(len(index)) - np.repeat(np.cumsum(per_dosage) - per_dosage, per_dosage)
+    )
+    seconds = midnight[index] + day * SECONDS_PER_DAY + offset[index]
+
+    # number the administrations of each direction in time order
+    order = np.lexsort((seconds, direction[index]))
+    index, seconds = index[order], seconds[order]
+    event_direction = direction[index]
+    group_first = np.searchsorted(event_direction, event_direction, side='left')
+    before_window = np.bincount(inverse, weights=before, minlength=len(directions_)).astype(np.int64)
+    administration = (
+        np.arange(len(index)) - group_first + 1 + before_window[inverse[index]]
+    )
+
+    maximum = np.array([0 if m is None else m for m in maximum], dtype=np.int64)[index]
+    keep = (maximum == 0) | (administration <= maximum)
+    index, seconds, administration = index[keep], seconds[keep], administration[keep]
+
+    order = np.argsort(seconds, kind='stable')
+    index, seconds, administration = index[order], seconds[order], administration[order]
+    return DosageSchedule(
+        seconds.astype('datetime64[s]'),
+        direction[index],
+        dosage[index],
+        administration,
+        dose_lower[index],
+        dose_upper[index],
+        unit[index],
+        units,
+    )
@@ -0,0 +1,236 @@
+"""
+Full-text search over the clinical narrative fields.
+
+An inverted index is kept in side tables created by migrations 0008 and
+0021 for the database in use:
+
+* PostgreSQL: django_openehr_search, a tsvector column with a GIN index,
+  keyed by (model, object_id) and ranked with ts_rank
+* SQLite: an FTS5 virtual table per model, django_openehr_search_<model>,
+  whose rowid is the instance's primary key, ranked with bm25; FTS5 cannot
+  index ordinary columns, so keying by rowid is what keeps replacing one
+  instance's document a lookup rather than a scan of the index
+* anything else (or SQLite built without FTS5): no index; search() falls
+  back to icontains so callers keep working, just without the speed-up
+
+The index is updated on every save and delete of the indexed models, and
+can be rebuilt with the rebuild_search_index management command.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import FloatField, Q, Value
+from django.db.models.signals import post_delete, post_save
+
+from django_openehr.models import ClinicalSynopsis, ProblemDiagnosis, SymptomSign
+from django_openehr.utils import chunked_queryset
+
+SEARCH_TABLE = 'django_openehr_search'
+
+# model -> the narrative TextFields indexed for it
+SEARCH_FIELDS = {
+    ClinicalSynopsis: ('synopsis',),
+    ProblemDiagnosis: ('clinical_description', 'course_description'),
+    SymptomSign: ('episode_description', 'symptom_comment'),
+}
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def document_for(instance):
+    fields = SEARCH_FIELDS[type(instance)]
+    return '\n'.join(getattr(instance, f) or '' for f in fields).strip()
+
+
+def model_key(model):
+    return model._meta.label_lower
+
+
+class SearchBackend(object):
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def tables(self):
+        # the side tables the backend needs
+        return [SEARCH_TABLE]
+
+    def index(self, instances):
+        raise NotImplementedError
+
+    def remove(self, model, pks):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM {0} WHERE model = %s AND object_id = %s'.format(SEARCH_TABLE),
+                [(model_key(model), pk) for pk in pks]
+            )
+
+    def search(self, queryset, text):
+        """
+        `queryset` narrowed to rows matching `text`, annotated with
+        search_rank and ordered best match first.
+        """
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(SearchBackend):
+    config = getattr(settings, 'OPENEHR_SEARCH_CONFIG', 'english')
+
+    def index(self, instances):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO {0} (model, object_id, document) '
+                'VALUES (%s, %s, to_tsvector(%s::regconfig, %s)) '
+                'ON CONFLICT (model, object_id) DO UPDATE SET document = EXCLUDED.document'.format(SEARCH_TABLE),
+                [(model_key(type(i)), i.pk, self.config, document_for(i)) for i in instances]
+            )
+
+    def search(self, queryset, text):
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[
+                '{0}.model = %s'.format(SEARCH_TABLE),
+                '{0}.object_id = {1}.id'.format(SEARCH_TABLE, table),
+                '{0}.document @@ plainto_tsquery(%s::regconfig, %s)'.format(SEARCH_TABLE),
+            ],
+            params=[model_key(queryset.model), self.config, text],
+            select={
+                'search_rank': 'ts_rank({0}.document, plainto_tsquery(%s::regconfig, %s))'.format(SEARCH_TABLE),
+            },
+            select_params=[self.config, text],
+            order_by=['-search_rank'],
+        )
+
+
+class SQLiteSearchBackend(SearchBackend):
+
+    def table(self, model):
+        return '{0}_{1}'.format(SEARCH_TABLE, model._meta.model_name)
+
+    def tables(self):
+        return [self.table(model) for model in SEARCH_FIELDS]
+
+    def index(self, instances):
+        instances = list(instances)
+        if not instances:
+            return
+        # FTS5 tables have no unique constraints, so replace by delete + insert
+        model = type(instances[0])
+        self.remove(model, [i.pk for i in instances])
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO {0} (rowid, body) VALUES (%s, %s)'.format(self.table(model)),
+                [(i.pk, document_for(i)) for i in instances]
+            )
+
+    def remove(self, model, pks):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                'DELETE FROM {0} WHERE rowid = %s'.format(self.table(model)),
+                [(pk,) for pk in pks]
+            )
+
+    def match_expression(self, text):
+        # quote every word so that user input can never be FTS5 syntax
+        return ' '.join('"{0}"'.format(word) for word in WORD.findall(text))
+
+    def search(self, queryset, text):
+        expression = self.match_expression(text)
+        if not expression:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        search_table = self.table(queryset.model)
+        return queryset.extra(
+            tables=[search_table],
+            where=[
+                '{0}.rowid = {1}.id'.format(search_table, table),
+                '{0} MATCH %s'.format(search_table),
+            ],
+            params=[expression],
+            # bm25() is lower for better matches
+            select={'search_rank': '-bm25({0})'.format(search_table)},
+            order_by=['-search_rank'],
+        )
+
+
+class FallbackSearchBackend(SearchBackend):
+
+    def index(self, instances):
+        pass
+
+    def remove(self, model, pks):
+        pass
+
+    def search(self, queryset, text):
+        words = WORD.findall(text)
+        if not words:
+            return queryset.none()
+        for word in words:
+            q = Q()
+            for field in SEARCH_FIELDS[queryset.model]:
+                q |= Q(**{field + '__icontains': word})
+            queryset = queryset.filter(q)
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+# database alias -> backend, so the table is only looked for once
+_backends = {}
+
+
+def get_backend(using):
+    if using not in _backends:
+        connection = connections[using]
+        backend = BACKENDS.get(connection.vendor, FallbackSearchBackend)(connection)
+        if not isinstance(backend, FallbackSearchBackend):
+            with connection.cursor() as cursor:
+                tables = connection.introspection.table_names(cursor)
+            if not set(backend.tables()) <= set(tables):
+                backend = FallbackSearchBackend(connection)
+        _backends[using] = backend
+    return _backends[using]
+
+
+def search(model, text, queryset=None, using=None):
+    """
+    Instances of `model` whose narrative fields match `text`, as a QuerySet
+    annotated with search_rank and ordered best match first.
+    """
+    if model not in SEARCH_FIELDS:
+        raise ValueError("{0} has no searchable fields".format(model.__name__))
+    if queryset is None:
+        queryset = model._default_manager.all()
+    using = using or router.db_for_read(model)
+    return get_backend(using).search(queryset.using(using), text)
+
+
+def rebuild_index(model, chunk_size=1000, using=None):
+    using = using or router.db_for_write(model)
+    backend = get_backend(using)
+    queryset = model._default_manager.using(using).only('pk', *SEARCH_FIELDS[model])
+    count = 0
+    for chunk in chunked_queryset(queryset, chunk_size):
+        backend.index(chunk)
+        count += len(chunk)
+    return count
+
+
+def update_index(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        get_backend(using).index([instance])
+
+
+def remove_from_index(sender, instance, using, **kwargs):
+    get_backend(using).remove(sender, [instance.pk])
+
+
+for _model in SEARCH_FIELDS:
+    post_save.connect(update_index, sender=_model, dispatch_uid='openehr_search_update')
+    post_delete.connect(remove_from_index, sender=_model, dispatch_uid='openehr_search_remove')
@@ -0,0 +1,328 @@
+import json
+
+from django.db import models as django_models
+
+from django_openehr import archetypes
+from django_openehr.fields import CodedTextField
+from django_openehr.models import (
+    AddressDetails,
+    AdverseReaction,
+    ClinicalSynopsis,
+    DemographicPersonal,
+    DemographicProfessional,
+    Identifier,
+    InpatientAdmission,
+    PersonName,
+    ProblemDiagnosis,
+    ReasonForEncounter,
+    RelevantContact,
+    SymptomSign,
+    TelecomDetails,
+    TherapeuticDirection,
+    TherapeuticDirectionDosage,
+)
+from django_openehr.utils import chunked_queryset
+
+# the Reference Model release the canonical JSON is written against
+RM_VERSION = '1.0.4'
+
+
+def dv_text(value):
+    return {'_type': 'DV_TEXT', 'value': value}
+
+
+def code_label(label):
+    """
+    The CHOICES labels carry the archetype's description in square brackets,
+    e.g. "Mild [The reaction was mild.]" -> "Mild"
+    """
+    return str(label).split(' [')[0].strip()
+
+
+class ArchetypeSerializer(object):
+    """
+    Serializes one archetype model to canonical openEHR JSON.
+
+    ELEMENTs are generated from the model's concrete fields in declaration
+    order. The CKM at-codes were not retained when the archetypes were
+    converted to models, so each ELEMENT's archetype_node_id is the Django
+    field name. Many-to-many slots (and any `extra_slots`) are written as
+    nested archetyped CLUSTERs using the serializer of the related model.
+    """
+    model = None
+    # the human readable name of the archetype root
+    name = None
+    # reverse relations that should also be treated as slots
+    extra_slots = ()
+    exclude = ('id',)
+
+    @property
+    def archetype_id(self):
+        return archetypes.archetype_id_for(self.model)
+
+    @property
+    def rm_type(self):
+        return archetypes.rm_type(self.archetype_id)
+
+    def get_fields(self):
+        opts = self.model._meta
+        fields = list(opts.concrete_fields) + list(opts.many_to_many)
+        # columns derived from other fields (editable=False) are not archetype data
+        return [
+            f for f in sorted(fields, key=lambda f: f.creation_counter)
+            if f.name not in self.exclude and f.editable
+            and not isinstance(f, django_models.ForeignKey)
+        ]
+
+    def get_slots(self):
+        return [f.name for f in self.model._meta.many_to_many] + list(self.extra_slots)
+
+    def prefetch_paths(self, prefix=''):
+        """
+        Every prefetch_related() lookup needed to serialize an instance, and
+        its nested slots, without further queries.
+        """
+        paths = []
+        for slot in self.get_slots():
+            path = prefix + slot
+            paths.append(path)
+            related_model = self._slot_model(slot)
+            serializer = get_serializer(related_model)
+            # guard against recursive slots such as SymptomSign -> SymptomSign
+            if serializer is not None and related_model is not self.model:
+                paths.extend(serializer.prefetch_paths(path + '__'))
+        return paths
+
+    def _slot_model(self, slot):
+        # reverse foreign keys are accessed as <model>_set but looked up as <model>
+        if slot.endswith('_set'):
+            slot = slot[:-len('_set')]
+        return self.model._meta.get_field(slot).related_model
+
+    def element(self, field, value):
+        return {
+            '_type': 'ELEMENT',
+            'archetype_node_id': field.name,
+            'name': dv_text(str(field.verbose_name).capitalize()),
+            'value': self.data_value(field, value),
+        }
+
+    def data_value(self, field, value):
+        if field.choices:
+            labels = dict(field.flatchoices)
+            terminology, code_string = 'local', value
+            if isinstance(field, CodedTextField):
+                terminology, code_string = field.terminology, field.at_code(value)
+            return {
+                '_type': 'DV_CODED_TEXT',
+                'value': code_label(labels.get(value, value)),
+                'defining_code': {
+                    '_type': 'CODE_PHRASE',
+                    'terminology_id': {'_type': 'TERMINOLOGY_ID', 'value': terminology},
+                    'code_string': code_string,
+                },
+            }
+        if isinstance(field, django_models.DateTimeField):
+            return {'_type': 'DV_DATE_TIME', 'value': value.isoformat()}
+        if isinstance(field, (django_models.BooleanField, django_models.NullBooleanField)):
+            return {'_type': 'DV_BOOLEAN', 'value': value}
+        if isinstance(field, django_models.IntegerField):
+            return {'_type': 'DV_COUNT', 'magnitude': value}
+        if isinstance(field, django_models.DecimalField):
+            return {
+                '_type': 'DV_QUANTITY',
+                'magnitude': float(value),
+                'units': '1',
+                'precision': field.decimal_places,
+            }
+        return dv_text(value)
+
+    def items(self, instance):
+        items = []
+        for field in self.get_fields():
+            if field.many_to_many:
+                items.extend(self.slot_items(instance, field.name))
+                continue
+            value = getattr(instance, field.attname)
+            # openEHR omits absent optional elements rather than nulling them
+            if value is None or value == '':
+                continue
+            items.append(self.element(field, value))
+        for slot in self.extra_slots:
+            items.extend(self.slot_items(instance, slot))
+        return items
+
+    def slot_items(self, instance, slot):
+        serializer = get_serializer(self._slot_model(slot))
+        return [serializer.to_canonical(child) for child in getattr(instance, slot).all()]
+
+    def to_canonical(self, instance):
+        """
+        The canonical openEHR JSON for `instance`, as a dict.
+        """
+        data = {
+            '_type': self.rm_type,
+            'archetype_node_id': self.archetype_id,
+            'name': dv_text(self.name or self.model._meta.verbose_name.title()),
+            'archetype_details': {
+                'archetype_id': {'value': self.archetype_id},
+                'rm_version': RM_VERSION,
+            },
+        }
+        if self.rm_type == 'CLUSTER':
+            data['items'] = self.items(instance)
+        else:
+            # ENTRY subtypes hold their elements in a data ITEM_TREE
+            data['data'] = {
+                '_type': 'ITEM_TREE',
+                'archetype_node_id': 'at0001',
+                'name': dv_text('Tree'),
+                'items': self.items(instance),
+            }
+        return data
+
+    def stream(self, queryset=None, chunk_size=1000):
+        """
+        Yield one line of newline-delimited JSON per instance, reading the
+        table in keyset chunks so memory stays flat.
+        """
+        if queryset is None:
+            queryset = self.model._default_manager.all()
+        queryset = queryset.prefetch_related(*self.prefetch_paths())
+        for chunk in chunked_queryset(queryset, chunk_size):
+            for instance in chunk:
+                yield json.dumps(self.to_canonical(instance), separators=(',', ':')) + '\n'
+
+
+class IdentifierSerializer(ArchetypeSerializer):
+    # DV_IDENTIFIER is a Reference Model data value, so it is written as an
+    # ELEMENT rather than as an archetyped CLUSTER
+    model = Identifier
+
+    def to_canonical(self, instance):
+        value = {'_type': 'DV_IDENTIFIER', 'id': instance.identifier}
+        for attribute, field in (('issuer', 'issuer'),
+                                 ('assigner', 'assigner'),
+                                 ('type', 'identifier_type')):
+            if getattr(instance, field):
+                value[attribute] = getattr(instance, field)
+        return {
+            '_type': 'ELEMENT',
+            'archetype_node_id': 'identifier',
+            'name': dv_text('Identifier'),
+            'value': value,
+        }
+
+
+class AddressDetailsSerializer(ArchetypeSerializer):
+    model = AddressDetails
+    name = 'Address'
+
+
+class AdverseReactionSerializer(ArchetypeSerializer):
+    model = AdverseReaction
+    name = 'Adverse reaction'
+
+
+class ClinicalSynopsisSerializer(ArchetypeSerializer):
+    model = ClinicalSynopsis
+    name = 'Clinical synopsis'
+
+
+class DemographicPersonalSerializer(ArchetypeSerializer):
+    model = DemographicPersonal
+    name = 'Individual personal demographics'
+
+
+class DemographicProfessionalSerializer(ArchetypeSerializer):
+    model = DemographicProfessional
+    name = 'Individual professional demographics'
+
+
+class InpatientAdmissionSerializer(ArchetypeSerializer):
+    model = InpatientAdmission
+    name = 'Inpatient admission'
+
+
+class PersonNameSerializer(ArchetypeSerializer):
+    model = PersonName
+    name = 'Person name'
+
+
+class ProblemDiagnosisSerializer(ArchetypeSerializer):
+    model = ProblemDiagnosis
+    name = 'Problem/Diagnosis'
+
+
+class ReasonForEncounterSerializer(ArchetypeSerializer):
+    model = ReasonForEncounter
+    name = 'Reason for encounter'
+
+
+class RelevantContactSerializer(ArchetypeSerializer):
+    model = RelevantContact
+    name = 'Relevant contact'
+
+
+class SymptomSignSerializer(ArchetypeSerializer):
+    model = SymptomSign
+    name = 'Symptom/Sign'
+
+    def slot_items(self, instance, slot):
+        # previous episodes and associated symptoms are symmetrical links to
+        # other SymptomSign instances, so nesting them in full would recurse
+        # forever; they are written as references instead
+        return [
+            {
+                '_type': 'ELEMENT',
+                'archetype_node_id': slot,
+                'name': dv_text(str(self.model._meta.get_field(slot).verbose_name).capitalize()),
+                'value': {
+                    '_type': 'DV_EHR_URI',
+                    'value': 'ehr:/{0}/{1}'.format(self.archetype_id, other.pk),
+                },
+            }
+            for other in getattr(instance, slot).all()
+        ]
+
+
+class TelecomDetailsSerializer(ArchetypeSerializer):
+    model = TelecomDetails
+    name = 'Telecom details'
+
+
+class TherapeuticDirectionDosageSerializer(ArchetypeSerializer):
+    model = TherapeuticDirectionDosage
+    name = 'Dosage'
+
+
+class TherapeuticDirectionSerializer(ArchetypeSerializer):
+    model = TherapeuticDirection
+    name = 'Therapeutic direction'
+    extra_slots = ('therapeuticdirectiondosage_set',)
+
+
+SERIALIZERS = {
+    serializer.model: serializer()
+    for serializer in (
+        IdentifierSerializer,
+        AddressDetailsSerializer,
+        AdverseReactionSerializer,
+        ClinicalSynopsisSerializer,
+        DemographicPersonalSerializer,
+        DemographicProfessionalSerializer,
+        InpatientAdmissionSerializer,
+        PersonNameSerializer,
+        ProblemDiagnosisSerializer,
+        ReasonForEncounterSerializer,
+        RelevantContactSerializer,
+        SymptomSignSerializer,
+        TelecomDetailsSerializer,
+        TherapeuticDirectionSerializer,
+        TherapeuticDirectionDosageSerializer,
+    )
+}
+
+
+def get_serializer(model):
+    return SERIALIZERS.get(model)
@@ -0,0 +1,302 @@
+"""
+Materialized patient summaries.
+
+Every DemographicPersonal has one PatientSummary row holding its summary as
+a precomputed JSON document, so that reading it is a single primary key
+fetch instead of a query per cluster slot.
+
+Summaries are rebuilt from the signals of the contributing models. Changes
+are not rebuilt one by one: the patients touched are collected and rebuilt
+together, in bulk, when the transaction commits, so a burst of edits to one
+patient costs one rebuild. Outside a transaction (autocommit) every save
+commits straight away, so the patients touched are queued instead and
+rebuilt together by a background thread OPENEHR_SUMMARY_DEBOUNCE seconds
+after the first of them (0 rebuilds on every save); get_summary() rebuilds
+a queued patient on the spot, so a stale summary is never read in this
+process. Whatever is still queued at interpreter exit is rebuilt then.
+Wrapping a series of edits in transaction.atomic() or deferred_summaries()
+still batches them without the wait.
+
+The clinical archetype models carry no link to a patient, so only the
+demographic clusters contribute for now. Loaders which bypass save() (the
+bulk loader and the importers) send no signals; run the
+rebuild_patient_summaries command after them.
+"""
+import atexit
+import functools
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, router, transaction
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.utils import timezone
+
+from django_openehr.managers import DemographicPersonalQuerySet
+from django_openehr.models import DemographicPersonal, PatientSummary
+from django_openehr.serializers import get_serializer
+from django_openehr.utils import chunked_queryset
+
+DEBOUNCE = getattr(settings, 'OPENEHR_SUMMARY_DEBOUNCE', 1.0)
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+def _pending():
+    # database alias -> primary keys of the patients waiting for a rebuild
+    if not hasattr(_state, 'pending'):
+        _state.pending = {}
+        _state.deferred = 0
+    return _state.pending
+
+
+def build_summary(patient):
+    """
+    The summary document of `patient`, as a dict; expects the cluster slots
+    to have been prefetched (see with_full_demographics()).
+    """
+    return {
+        'patient': patient.pk,
+        'demographics': get_serializer(DemographicPersonal).to_canonical(patient),
+    }
+
+
+def rebuild_summaries(pks, using=None, chunk_size=500):
+    """
+    Rebuild the summaries of the patients in `pks` with a fixed number of
+    queries per chunk, and return how many were written.
+    """
+    using = using or router.db_for_write(PatientSummary)
+    pks = sorted(set(pks))
+    written = 0
+    for start in range(0, len(pks), chunk_size):
+        patients = DemographicPersonal.objects.using(using).with_full_demographics().filter(
+            pk__in=pks[start:start + chunk_size]
+        )
+        written += write_summaries(patients, using)
+    return written
+
+
+def write_summaries(patients, using):
+    # the bulk operations bypass auto_now, so `updated` is set here
+    now = timezone.now()
+    summaries = [
+        PatientSummary(
+            patient_id=patient.pk,
+            document=json.dumps(build_summary(patient), separators=(',', ':')),
+            updated=now,
+        )
+        for patient in patients
+    ]
+    if not summaries:
+        return 0
+    existing = set(
+        PatientSummary.objects.using(using)
+        .filter(pk__in=[s.pk for s in summaries])
+        .values_list('pk', flat=True)
+    )
+    with transaction.atomic(using=using):
+        PatientSummary.objects.using(using).bulk_update(
+            [s for s in summaries if s.pk in existing], ['document', 'updated']
+        )
+        PatientSummary.objects.using(using).bulk_create(
+            [s for s in summaries if s.pk not in existing]
+        )
+    return len(summaries)
+
+
+def rebuild_all(using=None, chunk_size=500):
+    using = using or router.db_for_write(PatientSummary)
+    queryset = DemographicPersonal.objects.using(using).with_full_demographics()
+    written = 0
+    for chunk in chunked_queryset(queryset, chunk_size):
+        written += write_summaries(chunk, using)
+    return written
+
+
+class RebuildQueue(object):
+    """
+    Patients saved in autocommit mode, waiting to be rebuilt together by a
+    timer thread `delay` seconds after the first of them was queued.
+    """
+
+    def __init__(self, delay=DEBOUNCE):
+        self.delay = delay
+        # database alias -> primary keys
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, pks, using):
+        if not pks:
+            return
+        with self.lock:
+            self.pending.setdefault(using, set()).update(pks)
+            if self.timer is None:
+                self.timer = threading.Timer(self.delay, self.run)
+                self.timer.name = 'openehr-summaries'
+                self.timer.daemon = True
+                self.timer.start()
+
+    def run(self):
+        close_old_connections()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Rebuilding queued patient summaries failed")
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        """
+        Rebuild every queued patient now, and return how many were written.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        return sum(rebuild_summaries(pks, using) for using, pks in pending.items())
+
+    def take(self, pk, using):
+        # whether `pk` was queued; it is no longer
+        with self.lock:
+            pks = self.pending.get(using, set())
+            if pk not in pks:
+                return False
+            pks.discard(pk)
+            return True
+
+
+queue = RebuildQueue()
+
+
+def get_summary(patient, using=None):
+    """
+    The summary document of `patient` (an instance or a primary key), built
+    on the spot if it has never been materialized or is waiting in the
+    rebuild queue.
+    """
+    pk = getattr(patient, 'pk', patient)
+    if queue.take(pk, using or router.db_for_write(PatientSummary)):
+        rebuild_summaries([pk], using)
+    summary = PatientSummary.objects.using(using).filter(pk=pk).first()
+    if summary is None:
+        rebuild_summaries([pk], using)
+        summary = PatientSummary.objects.using(using).filter(pk=pk).first()
+        if summary is None:
+            return None
+    return summary.data
+
+
+def flush(using=DEFAULT_DB_ALIAS):
+    pks = _pending().pop(using, None)
+    if pks:
+        rebuild_summaries(pks, using)
+
+
+# one callable per alias, so it can be recognised in the on_commit queue
+_flushers = {}
+
+
+def _flusher(using):
+    if using not in _flushers:
+        _flushers[using] = functools.partial(flush, using)
+    return _flushers[using]
+
+
+def _register(using, debounce=True):
+    connection = connections[using]
+    if debounce and DEBOUNCE and not connection.in_atomic_block:
+        # the save has already committed, and so would its rebuild
+        queue.add(_pending().pop(using, ()), using)
+        return
+    flusher = _flusher(using)
+    # a rollback throws away the queued callback, so look for it rather than
+    # remembering that it was queued
+    if connection.in_atomic_block and any(f is flusher for _, f in connection.run_on_commit):
+        return
+    transaction.on_commit(flusher, using=using)
+
+
+def schedule(pks, using=DEFAULT_DB_ALIAS):
+    """
+    Queue a rebuild of the summaries of the patients in `pks` for when the
+    current transaction commits.
+    """
+    pks = set(pks)
+    if not pks:
+        return
+    _pending().setdefault(using, set()).update(pks)
+    if not _state.deferred:
+        _register(using)
+
+
+@contextmanager
+def deferred_summaries():
+    """
+    Hold back summary rebuilds until the block exits, then rebuild every
+    patient touched in one go (on commit, if inside a transaction).
+    """
+    _pending()
+    _state.deferred += 1
+    try:
+        yield
+    finally:
+        _state.deferred -= 1
+        if not _state.deferred:
+            for using in list(_pending()):
+                _register(using, debounce=False)
+
+
+def patients_with(slot, instance, using):
+    return DemographicPersonal.objects.using(using).filter(
+        **{slot: instance}
+    ).values_list('pk', flat=True)
+
+
+def patient_saved(sender, instance, using, raw=False, **kwargs):
+    if not raw:
+        schedule([instance.pk], using)
+
+
+def cluster_changed(sender, instance, using, raw=False, **kwargs):
+    # a cluster may be shared by more than one patient (e.g. an Identifier)
+    if not raw:
+        schedule(patients_with(SLOTS[sender], instance, using), using)
+
+
+def slot_changed(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        schedule([instance.pk], using)
+    elif pk_set:
+        schedule(pk_set, using)
+    else:
+        # reverse clear: the patients have to be found before the rows go
+        schedule(patients_with(THROUGH_SLOTS[sender], instance, using), using)
+
+
+# cluster model -> the DemographicPersonal slot holding it
+SLOTS = {
+    DemographicPersonal._meta.get_field(slot).related_model: slot
+    for slot in DemographicPersonalQuerySet.CLUSTER_SLOTS
+}
+THROUGH_SLOTS = {
+    getattr(DemographicPersonal, slot).through: slot
+    for slot in DemographicPersonalQuerySet.CLUSTER_SLOTS
+}
+
+post_save.connect(patient_saved, sender=DemographicPersonal, dispatch_uid='openehr_summary_patient')
+for _model in SLOTS:
+    post_save.connect(cluster_changed, sender=_model, dispatch_uid='openehr_summary_cluster_save')
+    # deleting a cluster removes its slot rows without an m2m_changed signal
+    pre_delete.connect(cluster_changed, sender=_model, dispatch_uid='openehr_summary_cluster_delete')
+for _through in THROUGH_SLOTS:
+    m2m_changed.connect(slot_changed, sender=_through, dispatch_uid='openehr_summary_slot')
+atexit.register(queue.flush)
@@ -0,0 +1,266 @@
+"""
+openEHR templates as Django forms, compiled once.
+
+A template is defined declaratively as a list of Sections, each a selection
+of fields from one archetype model; compile_template() turns the definition
+into a TemplateForm class made of one ModelForm class per section. All the
+work of building those classes (model introspection, formfield() calls,
+choices with their blank option, widgets, validators) is done once per
+process, when the app is ready, and the classes are cached by template id.
+
+Instantiating a compiled form per request is then cheap:
+
+* each section's base fields are copied shallowly instead of with
+  copy.deepcopy(), sharing their precomputed choices; only what a form
+  instance may change (the widget and its attrs, error messages,
+  validators and querysets) is copied
+* the blank, unbound form is rendered once per language and cached, see
+  TemplateForm.render()
+
+    form = get_template_form(IDCR_TRANSFER_OF_CARE)(request.POST or None)
+    if form.is_valid():
+        instances = form.save()
+
+An optional section left blank is neither validated nor saved, and the
+sections are saved and linked in a single transaction.
+"""
+import copy
+from collections import OrderedDict
+
+from django import forms
+from django.db import router, transaction
+from django.utils import translation
+from django.utils.safestring import mark_safe
+
+from django_openehr.models import (
+    AdverseReaction,
+    ClinicalSynopsis,
+    DemographicPersonal,
+    InpatientAdmission,
+    PersonName,
+    ProblemDiagnosis,
+    ReasonForEncounter,
+    TherapeuticDirection,
+)
+
+IDCR_TRANSFER_OF_CARE = 'IDCR Transfer of Care summary (minimal).v0'
+
+
+class Section(object):
+    """
+    One archetype of a template: the fields of `model` it uses, and where
+    its instance is linked once saved, as (owner section, many-to-many
+    field of the owner), e.g. ('patient', 'person_name'). An `optional`
+    section may be left blank, and is then skipped.
+    """
+
+    def __init__(self, name, model, fields, required=(), labels=None, link=None, optional=False):
+        self.name = name
+        self.model = model
+        self.fields = tuple(fields)
+        self.required = tuple(required)
+        self.labels = labels or {}
+        self.link = link
+        self.optional = optional
+
+
+TEMPLATES = {
+    IDCR_TRANSFER_OF_CARE: (
+        Section('patient', DemographicPersonal, ['date_of_birth', 'gender'], required=['date_of_birth']),
+        Section(
+            'name', PersonName,
+            ['title', 'given_name', 'family_name'],
+            required=['given_name', 'family_name'],
+            link=('patient', 'person_name'),
+        ),
+        Section(
+            'admission', InpatientAdmission,
+            ['date_of_admission', 'admission_method', 'source_of_admission'],
+            optional=True,
+        ),
+        Section('reason', ReasonForEncounter, ['contact_type', 'presenting_problem'], optional=True),
+        Section(
+            'problem', ProblemDiagnosis,
+            ['problem_diagnosis_name', 'clinical_description', 'severity', 'diagnostic_certainty'],
+            required=['problem_diagnosis_name'],
+        ),
+        Section(
+            'adverse_reaction', AdverseReaction,
+            ['causative_agent', 'reaction_severity', 'reaction_certainty', 'reaction_comment'],
+            optional=True,
+        ),
+        Section(
+            'medication', TherapeuticDirection,
+            ['direction_duration', 'direction_duration_text', 'maximum_administrations'],
+            optional=True,
+        ),
+        Section('synopsis', ClinicalSynopsis, ['synopsis'], optional=True),
+    ),
+}
+
+
+def copy_field(field):
+    """
+    A copy of a form field which is safe to hand to one form instance, made
+    without copy.deepcopy().
+    """
+    result = copy.copy(field)
+    result.widget = copy.copy(field.widget)
+    result.widget.attrs = field.widget.attrs.copy()
+    result.error_messages = field.error_messages.copy()
+    result.validators = field.validators[:]
+    if isinstance(field, forms.ModelChoiceField):
+        # a fresh queryset, so instances do not share a result cache
+        result.queryset = field.queryset.all()
+    return result
+
+
+class CompiledFields(OrderedDict):
+    """
+    base_fields of a compiled form class; BaseForm.__init__() deep-copies
+    base_fields, which this makes a shallow copy of each field.
+    """
+
+    def __deepcopy__(self, memo):
+        return OrderedDict((name, copy_field(field)) for name, field in self.items())
+
+
+def compile_section(section):
+    form_class = forms.modelform_factory(
+        section.model,
+        fields=section.fields,
+        labels=section.labels,
+    )
+    fields = CompiledFields()
+    for name, field in form_class.base_fields.items():
+        if name in section.required:
+            field.required = True
+        fields[name] = field
+    form_class.base_fields = fields
+    return form_class
+
+
+class TemplateForm(object):
+    """
+    A form made of one ModelForm per Section of a template, each with the
+    section name as its prefix.
+    """
+    template_id = None
+    sections = ()
+    section_forms = OrderedDict()
+    # language -> rendered blank form; each compiled class has its own
+    blank_renders = {}
+
+    def __init__(self, data=None, files=None, instances=None):
+        instances = instances or {}
+        self.is_bound = data is not None or files is not None
+        self.forms = OrderedDict(
+            (section.name, self.section_forms[section.name](
+                data, files, prefix=section.name, instance=instances.get(section.name)
+            ))
+            for section in self.sections
+        )
+
+    def __getitem__(self, name):
+        return self.forms[name]
+
+    def __iter__(self):
+        return iter(self.forms.values())
+
+    def skipped(self, section):
+        """
+        Whether `section` is optional and was left as it was.
+        """
+        return section.optional and self.is_bound and not self.forms[section.name].has_changed()
+
+    def active_forms(self):
+        return OrderedDict(
+            (section.name, self.forms[section.name])
+            for section in self.sections if not self.skipped(section)
+        )
+
+    def is_valid(self):
+        return self.is_bound and all([form.is_valid() for form in self.active_forms().values()])
+
+    @property
+    def errors(self):
+        return {name: form.errors for name, form in self.active_forms().items() if form.errors}
+
+    def save(self, commit=True):
+        """
+        Save every section but the skipped ones, then link each to its
+        owner, all in one transaction; returns {section name: instance},
+        where a skipped section has its existing instance, or None.
+        """
+        if not commit:
+            return self._save(commit)
+        using = router.db_for_write(self.sections[0].model)
+        with transaction.atomic(using=using):
+            return self._save(commit)
+
+    def _save(self, commit):
+        instances = OrderedDict()
+        for section in self.sections:
+            form = self.forms[section.name]
+            if self.skipped(section):
+                instances[section.name] = form.instance if form.instance.pk else None
+            else:
+                instances[section.name] = form.save(commit=commit)
+        if commit:
+            for section in self.sections:
+                if section.link:
+                    owner, field = section.link
+                    if instances[owner] is not None and instances[section.name] is not None:
+                        getattr(instances[owner], field).add(instances[section.name])
+        return instances
+
+    def render_sections(self):
+        return mark_safe(''.join(
+            '<fieldset id="{0}">{1}</fieldset>'.format(name, form.as_p())
+            for name, form in self.forms.items()
+        ))
+
+    def render(self):
+        """
+        The form as HTML; the blank form is rendered once per language.
+        """
+        if self.is_bound or any(form.instance.pk for form in self.forms.values()):
+            return self.render_sections()
+        key = translation.get_language()
+        if key not in self.blank_renders:
+            self.blank_renders[key] = self.render_sections()
+        return self.blank_renders[key]
+
+    def __str__(self):
+        return self.render()
+
+
+def compile_template(template_id, sections):
+    """
+    The TemplateForm class of a template definition.
+    """
+    return type('TemplateForm', (TemplateForm,), {
+        'template_id': template_id,
+        'sections': tuple(sections),
+        'section_forms': OrderedDict(
+            (section.name, compile_section(section)) for section in sections
+        ),
+        'blank_renders': {},
+    })
+
+
+_compiled = {}
+
+
+def compile_templates():
+    """
+    Compile every template in TEMPLATES; called when the app is ready.
+    """
+    for template_id, sections in TEMPLATES.items():
+        _compiled[template_id] = compile_template(template_id, sections)
+
+
+def get_template_form(template_id):
+    if template_id not in _compiled:
+        _compiled[template_id] = compile_template(template_id, TEMPLATES[template_id])
+    return _compiled[template_id]
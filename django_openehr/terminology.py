@@ -0,0 +1,326 @@
+"""
+A local SNOMED CT terminology server.
+
+load_release() streams the RF2 Snapshot files of a release (e.g. the UK
+Clinical and Drug Extension releases, unzipped side by side) from disk into
+SnomedConcept and SnomedDescription, one batch at a time, so memory use does
+not depend on the size of the release. Only Snapshot files are read; a Full
+release holds every historical version of each row. The previous release is
+replaced in one transaction, so readers see it until the new one commits,
+and a load which fails part way leaves it in place.
+
+autocomplete() answers from a prefix index held in memory: the active
+synonyms of active concepts which are acceptable in one of the language
+reference sets (OPENEHR_SNOMED_LANGUAGE_REFSETS), ranked preferred first and then shortest first, with a sorted list
+of their distinct words and, per word, the compact array of terms containing
+it. Each query word is a bisect over the word list, so a lookup costs
+milliseconds even for the full UK edition, whose index takes a couple of
+hundred MB. The index is built on first use in each process.
+
+preferred_term() looks codes up in the database behind an LRU cache.
+"""
+import csv
+import datetime
+import fnmatch
+import heapq
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.functions import Length
+
+from django_openehr.bulk import BulkLoadReport
+from django_openehr.models import SnomedConcept, SnomedDescription
+
+FSN = 900000000000003001
+SYNONYM = 900000000000013009
+PREFERRED = 900000000000548007
+ACCEPTABLE = 900000000000549004
+
+# language reference sets whose preferred synonyms are the preferred terms:
+# UK clinical, UK pharmacy (dm+d) and GB English
+LANGUAGE_REFSETS = set(getattr(settings, 'OPENEHR_SNOMED_LANGUAGE_REFSETS', (
+    999001261000000100,
+    999000691000001104,
+    900000000000508004,
+)))
+
+# shorter query words would match most of the index
+MIN_PREFIX = 2
+
+CONCEPT_FILES = 'sct2_Concept_*Snapshot*.txt'
+LANGUAGE_FILES = 'der2_cRefset_Language*Snapshot*.txt'
+DESCRIPTION_FILES = 'sct2_Description_*Snapshot*.txt'
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def words(text):
+    """
+    'Ménière's disease' -> ['meniere', 's', 'disease']
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    return WORD.findall(''.join(c for c in text if not unicodedata.combining(c)))
+
+
+# -- loading --------------------------------------------------------------
+
+def find_files(path, pattern):
+    found = []
+    for directory, _, filenames in os.walk(path):
+        for filename in fnmatch.filter(filenames, pattern):
+            found.append(os.path.join(directory, filename))
+    return sorted(found)
+
+
+def read_rf2(filename):
+    """
+    Yield each row of an RF2 file as a dict of column name -> string.
+    """
+    with open(filename, encoding='utf-8', newline='') as f:
+        reader = csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE)
+        header = next(reader)
+        for row in reader:
+            yield dict(zip(header, row))
+
+
+def rf2_date(value):
+    return datetime.date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+
+
+class ReleaseLoader(object):
+    """
+    Loads the Snapshot files found under a directory, replacing whatever
+    was loaded before in a single transaction.
+    """
+
+    def __init__(self, path, batch_size=5000, using=None, stdout=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.using = using or router.db_for_write(SnomedConcept)
+        self.stdout = stdout
+        self.report = BulkLoadReport()
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def load(self):
+        concept_files = find_files(self.path, CONCEPT_FILES)
+        description_files = find_files(self.path, DESCRIPTION_FILES)
+        if not concept_files or not description_files:
+            raise ValueError("No RF2 Snapshot concept and description files under {0}".format(self.path))
+        # read before the transaction starts, as it writes nothing
+        acceptability = self.acceptability(find_files(self.path, LANGUAGE_FILES))
+        with transaction.atomic(using=self.using):
+            self.truncate(SnomedDescription)
+            self.truncate(SnomedConcept)
+            for filename in concept_files:
+                self.log("concepts: {0}".format(filename))
+                self.write(SnomedConcept, (self.concept(row) for row in read_rf2(filename)))
+            for filename in description_files:
+                self.log("descriptions: {0}".format(filename))
+                self.write(SnomedDescription, (
+                    self.description(row, acceptability) for row in read_rf2(filename)
+                ))
+            transaction.on_commit(clear_caches, using=self.using)
+        return self.report
+
+    def truncate(self, model):
+        connection = connections[self.using]
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {0}'.format(connection.ops.quote_name(model._meta.db_table)))
+
+    def write(self, model, instances):
+        batch = []
+        for instance in instances:
+            batch.append(instance)
+            if len(batch) >= self.batch_size:
+                self.flush(model, batch)
+                batch = []
+        if batch:
+            self.flush(model, batch)
+
+    def flush(self, model, batch):
+        model.objects.using(self.using).bulk_create(batch)
+        self.report.rows[model.__name__] += len(batch)
+        self.report.records += len(batch)
+        self.report.chunks += 1
+
+    def concept(self, row):
+        return SnomedConcept(
+            id=int(row['id']),
+            effective_time=rf2_date(row['effectiveTime']),
+            active=row['active'] == '1',
+            module_id=int(row['moduleId']),
+            definition_status_id=int(row['definitionStatusId']),
+        )
+
+    def acceptability(self, filenames):
+        """
+        Description id -> whether it is preferred (rather than merely
+        acceptable) in one of the LANGUAGE_REFSETS; a dict of ints is the
+        only part of a release held in memory while loading.
+        """
+        acceptability = {}
+        for filename in filenames:
+            self.log("language: {0}".format(filename))
+            for row in read_rf2(filename):
+                if row['active'] != '1' or int(row['refsetId']) not in LANGUAGE_REFSETS:
+                    continue
+                acceptability_id = int(row['acceptabilityId'])
+                if acceptability_id in (PREFERRED, ACCEPTABLE):
+                    pk = int(row['referencedComponentId'])
+                    acceptability[pk] = acceptability.get(pk, False) or acceptability_id == PREFERRED
+        return acceptability
+
+    def description(self, row, acceptability):
+        pk = int(row['id'])
+        type_id = int(row['typeId'])
+        return SnomedDescription(
+            id=pk,
+            effective_time=rf2_date(row['effectiveTime']),
+            active=row['active'] == '1',
+            module_id=int(row['moduleId']),
+            concept_id=int(row['conceptId']),
+            language_code=row['languageCode'],
+            type_id=type_id,
+            term=row['term'],
+            preferred=type_id == SYNONYM and acceptability.get(pk, False),
+            acceptable=pk in acceptability,
+        )
+
+
+def load_release(path, batch_size=5000, using=None, stdout=None):
+    return ReleaseLoader(path, batch_size, using, stdout).load()
+
+
+# -- autocomplete ---------------------------------------------------------
+
+class PrefixIndex(object):
+
+    def __init__(self, using=None):
+        # term number -> term and concept, in rank order
+        self.terms = []
+        self.concepts = array('q')
+        # distinct words, sorted, and the term numbers containing each word:
+        # those of words[i] are postings[offsets[i]:offsets[i + 1]]
+        self.words = []
+        self.offsets = array('I', [0])
+        self.postings = array('I')
+        self.build(using)
+
+    def build(self, using):
+        queryset = (
+            SnomedDescription.objects.using(using)
+            .filter(active=True, type_id=SYNONYM, acceptable=True, concept__active=True)
+            .order_by('-preferred', Length('term'), 'term')
+            .values_list('concept_id', 'term')
+        )
+        by_word = {}
+        for number, (concept, term) in enumerate(queryset.iterator(chunk_size=10000)):
+            self.terms.append(term)
+            self.concepts.append(concept)
+            for word in set(words(term)):
+                by_word.setdefault(word, array('I')).append(number)
+        self.words = sorted(by_word)
+        for word in self.words:
+            self.postings.extend(by_word.pop(word))
+            self.offsets.append(len(self.postings))
+
+    def __len__(self):
+        return len(self.terms)
+
+    def word_range(self, prefix):
+        return bisect_left(self.words, prefix), bisect_left(self.words, prefix + '\uffff')
+
+    def search(self, text, limit=10):
+        """
+        [(concept id, term), ...] of the best ranked terms with a word
+        starting with every word of `text`, one per concept.
+        """
+        prefixes = sorted(set(words(text)), key=len, reverse=True)
+        if not prefixes or len(prefixes[0]) < MIN_PREFIX:
+            return []
+        ranges = [self.word_range(prefix) for prefix in prefixes]
+        sizes = [self.offsets[hi] - self.offsets[lo] for lo, hi in ranges]
+        if not all(sizes):
+            return []
+        # walk the rarest prefix's terms in rank order and check the others
+        rarest = sizes.index(min(sizes))
+        lo, hi = ranges[rarest]
+        others = prefixes[:rarest] + prefixes[rarest + 1:]
+        candidates = heapq.merge(*(
+            self.postings[self.offsets[i]:self.offsets[i + 1]] for i in range(lo, hi)
+        ))
+        results = []
+        seen = set()
+        previous = None
+        for number in candidates:
+            if number == previous:
+                continue
+            previous = number
+            concept = self.concepts[number]
+            if concept in seen:
+                continue
+            if others:
+                term_words = words(self.terms[number])
+                if not all(any(w.startswith(p) for w in term_words) for p in others):
+                    continue
+            seen.add(concept)
+            results.append((concept, self.terms[number]))
+            if len(results) == limit:
+                break
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = PrefixIndex()
+    return _index
+
+
+def autocomplete(text, limit=10):
+    """
+    [(concept id, term), ...] for a partially typed term, e.g. 'myoc inf'
+    -> [(22298006, 'Myocardial infarction'), ...]
+    """
+    return get_index().search(text, limit)
+
+
+@lru_cache(maxsize=getattr(settings, 'OPENEHR_TERMINOLOGY_CACHE_SIZE', 10000))
+def preferred_term(concept_id):
+    """
+    The preferred term of a concept (its fully specified name if it has no
+    preferred synonym), or None for an unknown code.
+    """
+    try:
+        concept_id = int(concept_id)
+    except (TypeError, ValueError):
+        return None
+    return (
+        SnomedDescription.objects.filter(concept_id=concept_id, active=True)
+        # synonyms have the larger type id
+        .order_by('-preferred', '-type_id', 'pk')
+        .values_list('term', flat=True)
+        .first()
+    )
+
+
+def clear_caches():
+    global _index
+    _index = None
+    preferred_term.cache_clear()
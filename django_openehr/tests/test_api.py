@@ -0,0 +1,68 @@
+import base64
+import json
+import zlib
+
+from django.contrib.auth.models import User
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+from django.urls import resolve
+from django.utils import timezone
+
+from django_openehr import api
+from django_openehr.models import ArchetypeVersion, ProblemDiagnosis
+
+
+class APITestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        now = timezone.now()
+        cls.versions = [
+            ArchetypeVersion.objects.create(
+                model=model, object_id=i, version=1, change_type=ArchetypeVersion.CREATION,
+                valid_from=now, snapshot=zlib.compress(b'{}'),
+            )
+            for i, model in enumerate(['django_openehr.symptomsign'] * 5 + ['django_openehr.problemdiagnosis'])
+        ]
+
+    def get(self, url):
+        request = RequestFactory().get(url)
+        request.user = self.user
+        match = resolve(request.path)
+        response = match.func(request, *match.args, **match.kwargs)
+        return response.status_code, json.loads(response.content.decode('utf-8'))
+
+    def test_internal_tables_are_not_served(self):
+        for name in ('auditentry', 'deduplicationrun', 'patientblockingkey', 'compositiondocument',
+                     'admissionrollup', 'snomeddescription'):
+            self.assertNotIn(name, api.API_MODELS)
+            with self.assertRaises(Http404):
+                self.get('/api/{0}/'.format(name))
+        self.assertIn('problemdiagnosis', api.API_MODELS)
+
+    def test_binary_fields_are_base64(self):
+        status, data = self.get('/api/archetypeversion/{0}/'.format(self.versions[0].pk))
+        self.assertEqual(status, 200)
+        self.assertEqual(base64.b64decode(data['snapshot']), zlib.compress(b'{}'))
+
+    def test_keyset_pages_through_equal_values(self):
+        seen = []
+        url = '/api/archetypeversion/?ordering=model&limit=2'
+        while url:
+            status, data = self.get(url)
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+        expected = [v.pk for v in sorted(self.versions, key=lambda v: (v.model, v.pk))]
+        self.assertEqual(seen, expected)
+
+    def test_keyset_leads_with_a_range_on_the_field(self):
+        field = ArchetypeVersion._meta.get_field('model')
+        queryset = ArchetypeVersion.objects.filter(api.keyset(field, False, 'django_openehr.p', 3))
+        sql = str(queryset.query)
+        self.assertIn('"model" >= django_openehr.p AND', sql)
+
+    def test_archetype_models_are_canonical(self):
+        problem = ProblemDiagnosis.objects.create(problem_diagnosis_name='Asthma')
+        status, data = self.get('/api/problemdiagnosis/{0}/'.format(problem.pk))
+        self.assertEqual(data['id'], problem.pk)
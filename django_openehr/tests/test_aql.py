@@ -0,0 +1,158 @@
+import datetime
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from django_openehr import aql
+from django_openehr.models import DemographicPersonal, PersonName, ProblemDiagnosis
+
+PROBLEMS = "FROM EVALUATION p[openEHR-EHR-EVALUATION.problem_diagnosis.v1]"
+PEOPLE = (
+    "FROM EHR e CONTAINS CLUSTER d[openEHR-EHR-CLUSTER.individual_personal_uk.v1] "
+    "CONTAINS CLUSTER n[openEHR-EHR-CLUSTER.person_name.v1]"
+)
+
+
+class ParserTestCase(TestCase):
+
+    def test_parse(self):
+        query = aql.Parser(
+            "select p/severity as s, p/problem_diagnosis_name " + PROBLEMS + " "
+            "where (p/severity = 'Severe' or not exists p/onset_date_time) and p/severity matches {'Mild', $other} "
+            "order by p/onset_date_time desc, p/severity limit 10 offset 20"
+        ).parse()
+        self.assertEqual(query['select'], [('p/severity', 's'), ('p/problem_diagnosis_name', None)])
+        self.assertEqual(query['from'], [('EVALUATION', 'p', 'openEHR-EHR-EVALUATION.problem_diagnosis.v1')])
+        where = query['where']
+        self.assertEqual(where[0], 'and')
+        self.assertEqual(where[1][0], ('or', [
+            ('cmp', 'p/severity', '=', 'Severe'),
+            ('not', ('exists', 'p/onset_date_time')),
+        ]))
+        _, path, op, values = where[1][1]
+        self.assertEqual((path, op, values[0], values[1].name), ('p/severity', 'MATCHES', 'Mild', 'other'))
+        self.assertEqual(query['order_by'], [('p/onset_date_time', True), ('p/severity', False)])
+        self.assertEqual((query['limit'], query['offset']), (10, 20))
+
+    def test_normalize_query(self):
+        self.assertEqual(
+            aql.normalize_query("select  p\n" + PROBLEMS + " where p/severity='Mild'"),
+            "SELECT p " + PROBLEMS + " WHERE p/severity = 'Mild'",
+        )
+
+    def test_syntax_errors(self):
+        for text in (
+            "SELECT p",
+            "SELECT p " + PROBLEMS + " WHERE p/severity",
+            "SELECT p " + PROBLEMS + " WHERE p/severity = ",
+            "SELECT p " + PROBLEMS + " LIMIT 1 trailing",
+            "SELECT p " + PROBLEMS + " WHERE p/severity = 'Mild' ;",
+        ):
+            with self.subTest(text=text), self.assertRaises(aql.AQLError):
+                aql.Parser(text).parse()
+
+
+class CompileTestCase(TestCase):
+
+    def test_paths(self):
+        query = aql.compile_query(
+            "SELECT n/family_name, d/data[at0001]/items[gender]/value/defining_code/code_string AS g "
+            + PEOPLE + " WHERE d/gender = 'MALE'"
+        )
+        self.assertIs(query.model, DemographicPersonal)
+        self.assertEqual(query.select, [('n_family_name', 'person_name__family_name'), ('g', 'gender')])
+        self.assertEqual(query.where, ('cmp', 'gender', '=', 'MALE'))
+
+    def test_unresolvable(self):
+        for text in (
+            "SELECT x/severity " + PROBLEMS,
+            "SELECT p/nothing " + PROBLEMS,
+            "SELECT p/severity/code " + PROBLEMS,
+            "SELECT p FROM EVALUATION p[openEHR-EHR-EVALUATION.nothing.v1]",
+            "SELECT p FROM EHR e",
+            "SELECT p/severity " + PROBLEMS + " CONTAINS CLUSTER n[openEHR-EHR-CLUSTER.person_name.v1]",
+            # an alias naming another element
+            "SELECT p/severity AS comment " + PROBLEMS,
+            "SELECT p/severity AS s, p/comment AS s " + PROBLEMS,
+        ):
+            with self.subTest(text=text), self.assertRaises(aql.AQLError):
+                aql.compile_query(text)
+
+    def test_plans_are_cached(self):
+        aql.plans.clear()
+        first = aql.compile_query("SELECT p " + PROBLEMS)
+        self.assertIs(aql.compile_query("select p  " + PROBLEMS), first)
+        self.assertEqual((aql.plans.hits, aql.plans.misses), (1, 1))
+
+    def test_cache_size_setting(self):
+        aql.plans.clear()
+        with override_settings(OPENEHR_AQL_CACHE_SIZE=1):
+            aql.compile_query("SELECT p " + PROBLEMS)
+            aql.compile_query("SELECT p " + PROBLEMS + " LIMIT 1")
+            self.assertEqual(list(aql.plans.plans), ["SELECT p " + PROBLEMS + " LIMIT 1"])
+        with override_settings(OPENEHR_AQL_CACHE_SIZE=0):
+            aql.plans.clear()
+            aql.compile_query("SELECT p " + PROBLEMS)
+            self.assertEqual(len(aql.plans), 0)
+
+
+class ExecuteTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.mild = ProblemDiagnosis.objects.create(
+            problem_diagnosis_name='Eczema', severity='Mild', onset_date_time=now - datetime.timedelta(days=2),
+        )
+        cls.severe = ProblemDiagnosis.objects.create(
+            problem_diagnosis_name='Asthma', severity='Severe', onset_date_time=now - datetime.timedelta(days=1),
+        )
+        cls.unknown = ProblemDiagnosis.objects.create(problem_diagnosis_name='Gout')
+        cls.person = DemographicPersonal.objects.create(gender='FEMALE')
+        cls.person.person_name.add(
+            PersonName.objects.create(family_name='Smith', given_name='Ann'),
+            PersonName.objects.create(family_name='Jones', given_name='Ann'),
+        )
+        DemographicPersonal.objects.create(gender='MALE').person_name.add(
+            PersonName.objects.create(family_name='Smith', given_name='Bob'),
+        )
+
+    def test_select_alias_equal_to_field(self):
+        rows = aql.execute(
+            "SELECT p/severity AS severity " + PROBLEMS + " WHERE EXISTS p/severity ORDER BY p/severity"
+        )
+        self.assertEqual(list(rows), [{'severity': 'Mild'}, {'severity': 'Severe'}])
+
+    def test_select_names(self):
+        rows = aql.execute(
+            "SELECT p/problem_diagnosis_name AS name, p/severity " + PROBLEMS +
+            " ORDER BY p/onset_date_time DESC LIMIT 1"
+        )
+        self.assertEqual(list(rows), [{'name': 'Asthma', 'p_severity': 'Severe'}])
+
+    def test_conditions_and_params(self):
+        def names(where, **params):
+            rows = aql.execute("SELECT p/problem_diagnosis_name AS name " + PROBLEMS + " WHERE " + where, params)
+            return {row['name'] for row in rows}
+
+        self.assertEqual(names("p/severity = $severity", severity='Mild'), {'Eczema'})
+        self.assertEqual(names("p/severity != 'Mild'"), {'Asthma'})
+        self.assertEqual(names("p/severity = NULL"), {'Gout'})
+        self.assertEqual(names("p/severity matches {'Mild', 'Severe'}"), {'Eczema', 'Asthma'})
+        self.assertEqual(names("NOT EXISTS p/onset_date_time OR p/problem_diagnosis_name LIKE '*thma'"),
+                         {'Gout', 'Asthma'})
+        self.assertEqual(names("p/onset_date_time >= $since", since=self.severe.onset_date_time), {'Asthma'})
+        with self.assertRaises(aql.AQLError):
+            names("p/severity = $severity")
+        with self.assertRaises(aql.AQLError):
+            names("p/severity = 'Worst'")
+
+    def test_contains_joins_through_slot(self):
+        people = aql.execute(
+            "SELECT d " + PEOPLE + " WHERE n/family_name = 'Smith' AND n/given_name = 'Ann'"
+        )
+        self.assertEqual(list(people), [self.person])
+        rows = aql.execute(
+            "SELECT n/family_name AS family " + PEOPLE + " WHERE d/gender = 'FEMALE' ORDER BY n/family_name"
+        )
+        self.assertEqual(list(rows), [{'family': 'Jones'}, {'family': 'Smith'}])
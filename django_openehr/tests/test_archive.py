@@ -0,0 +1,61 @@
+import datetime
+import warnings
+
+from django.core.exceptions import FieldError
+from django.test import TestCase
+from django.utils import timezone
+
+from django_openehr import archive
+from django_openehr.models import ArchivedRecord, InpatientAdmission
+
+
+class WithArchivedTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.old_elective = InpatientAdmission.objects.create(
+            date_of_admission=now - datetime.timedelta(days=1000), admission_method='ELECTIVE',
+        )
+        cls.old_emergency = InpatientAdmission.objects.create(
+            date_of_admission=now - datetime.timedelta(days=900), admission_method='EMERGENCY',
+        )
+        cls.recent = InpatientAdmission.objects.create(date_of_admission=now, admission_method='ELECTIVE')
+        archive.archive(InpatientAdmission)
+
+    def pks(self, instances):
+        return [instance.pk for instance in instances]
+
+    def test_both_tiers(self):
+        self.assertEqual(ArchivedRecord.objects.count(), 2)
+        admissions = InpatientAdmission.objects.with_archived()
+        self.assertEqual(self.pks(admissions), [self.recent.pk, self.old_elective.pk, self.old_emergency.pk])
+        self.assertEqual(admissions.count(), 3)
+
+    def test_values_are_converted_like_the_orm(self):
+        with warnings.catch_warnings():
+            # a naive datetime, as the ORM warns about too
+            warnings.simplefilter('ignore', RuntimeWarning)
+            admissions = InpatientAdmission.objects.with_archived(date_of_admission__lt='2030-01-01')
+        self.assertEqual(admissions.count(), 3)
+        admissions = InpatientAdmission.objects.with_archived(admission_method='ELECTIVE')
+        self.assertEqual(self.pks(admissions), [self.recent.pk, self.old_elective.pk])
+        admissions = InpatientAdmission.objects.with_archived(admission_method__in=['EMERGENCY'])
+        self.assertEqual(self.pks(admissions), [self.old_emergency.pk])
+
+    def test_unsupported_lookups_fail_at_once(self):
+        with self.assertRaises(FieldError):
+            InpatientAdmission.objects.with_archived(admission_method__startswith='E')
+        with self.assertRaises(FieldError):
+            InpatientAdmission.objects.with_archived(no_such_field=1)
+
+    def test_filter_and_count(self):
+        cutoff = timezone.now() - datetime.timedelta(days=950)
+        admissions = InpatientAdmission.objects.with_archived(date_of_admission__gte=cutoff)
+        self.assertEqual(admissions.count(), 2)
+        admissions = admissions.filter(admission_method='EMERGENCY')
+        self.assertEqual(self.pks(admissions), [self.old_emergency.pk])
+        self.assertEqual(admissions.count(), 1)
+        self.assertTrue(admissions.exists())
+        self.assertFalse(admissions.filter(admission_method='ELECTIVE').exists())
+        self.assertTrue(all(a.is_archived for a in admissions))
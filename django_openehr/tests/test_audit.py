@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.db import OperationalError, transaction
+from django.test import TransactionTestCase
+
+from django_openehr import audit
+from django_openehr.models import AuditEntry, ProblemDiagnosis
+
+
+class AuditTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.buffer = audit.AuditBuffer(interval=60)
+        # no writer thread: the tests flush by hand
+        self.buffer.start = lambda: None
+        patcher = mock.patch.object(audit, 'buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def logged(self):
+        return list(AuditEntry.objects.order_by('pk').values_list('object_id', 'change_type'))
+
+    def test_rolled_back_changes_are_not_logged(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                ProblemDiagnosis.objects.create(problem_diagnosis_name='Asthma')
+                raise ValueError
+        self.assertEqual(self.logged(), [])
+
+    def test_committed_changes_are_logged_on_commit(self):
+        with transaction.atomic():
+            problem = ProblemDiagnosis.objects.create(problem_diagnosis_name='Asthma')
+            problem.problem_diagnosis_name = 'Severe asthma'
+            problem.save()
+            self.assertEqual(self.logged(), [])
+        self.assertEqual(self.logged(), [(problem.pk, 'CREATION'), (problem.pk, 'MODIFICATION')])
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_autocommit_changes_are_logged_at_once(self):
+        problem = ProblemDiagnosis.objects.create(problem_diagnosis_name='Asthma')
+        self.assertEqual(self.logged(), [(problem.pk, 'CREATION')])
+
+    def test_rolled_back_savepoint_drops_only_its_entries(self):
+        with transaction.atomic():
+            kept = ProblemDiagnosis.objects.create(problem_diagnosis_name='Asthma')
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    ProblemDiagnosis.objects.create(problem_diagnosis_name='Eczema')
+                    raise ValueError
+        self.assertEqual(self.logged(), [(kept.pk, 'CREATION')])
+
+    def test_failed_write_is_kept_until_written(self):
+        with mock.patch.object(audit, 'write', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('django_openehr.audit', 'ERROR'):
+            with transaction.atomic():
+                problem = ProblemDiagnosis.objects.create(problem_diagnosis_name='Asthma')
+            self.assertEqual(len(self.buffer), 1)
+            # still failing: kept for the next attempt
+            self.assertEqual(audit.flush(), 0)
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(self.logged(), [])
+        self.assertEqual(audit.flush(), 1)
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(self.logged(), [(problem.pk, 'CREATION')])
@@ -0,0 +1,82 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from django_openehr.batch_validation import BatchValidator
+from django_openehr.benchmarks import Benchmark
+from django_openehr.models import (
+    Identifier,
+    PersonName,
+    SymptomSign,
+    TherapeuticDirection,
+    TherapeuticDirectionDosage,
+)
+
+
+class BatchValidatorTestCase(TestCase):
+
+    def full_clean_errors(self, model, rows):
+        errors = {}
+        for index, row in enumerate(rows):
+            try:
+                model(**row).full_clean()
+            except ValidationError as e:
+                errors[index] = e.message_dict
+        return errors
+
+    def assertSameErrors(self, model, rows):
+        report = BatchValidator(model).validate(rows)
+        expected = self.full_clean_errors(model, rows)
+        self.assertEqual({index: dict(errors) for index, errors in report.errors.items()}, expected)
+        self.assertEqual(report.valid_rows(), [i for i in range(len(rows)) if i not in expected])
+        return expected
+
+    def test_dosage(self):
+        direction = TherapeuticDirection.objects.create()
+        errors = self.assertSameErrors(TherapeuticDirectionDosage, [
+            {'therapeutic_direction_id': direction.pk, 'dosage_sequence': 1, 'dose_amount_exact': '2.5'},
+            {'therapeutic_direction_id': direction.pk, 'dosage_sequence': '2', 'dose_unit': 'mg'},
+            {'therapeutic_direction_id': direction.pk, 'dosage_sequence': 0},
+            {'therapeutic_direction_id': direction.pk, 'dose_amount_exact': 'two'},
+            {'therapeutic_direction_id': direction.pk, 'dose_amount_exact': '0'},
+            {'therapeutic_direction_id': direction.pk + 1},
+            {'therapeutic_direction_id': direction.pk, 'dose_amount_exact': '1.23456'},
+            {'dosage_sequence': 1},
+        ])
+        self.assertEqual(sorted(errors), [2, 3, 4, 5, 6, 7])
+
+    def test_direction_rules(self):
+        errors = self.assertSameErrors(TherapeuticDirection, [
+            {'direction_sequence': 1},
+            {'direction_duration_seconds': 60, 'direction_duration_text': 'a minute'},
+            {'direction_sequence': 0, 'direction_duration_seconds': -1},
+            {'maximum_administrations': 'many'},
+        ])
+        self.assertEqual(sorted(errors), [1, 2, 3])
+
+    def test_person_name_rules(self):
+        errors = self.assertSameErrors(PersonName, [
+            {'given_name': 'Ada', 'family_name': 'Lovelace'},
+            {'family_name': 'Lovelace'},
+            {},
+            {'title': 'Dr', 'given_name': 'x' * 1000},
+        ])
+        self.assertEqual(sorted(errors), [1, 2, 3])
+
+    def test_identifier_rules_and_uniqueness(self):
+        Identifier.objects.create(identifier='9434765919', identifier_type='NHS', issuer='NHS')
+        errors = self.assertSameErrors(Identifier, [
+            {'identifier': '9434765919', 'identifier_type': 'NHS', 'issuer': 'NHS'},
+            {'identifier': '9434765918', 'identifier_type': 'NHS', 'issuer': 'NHS'},
+            {'identifier': 'A123', 'identifier_type': 'Hospital', 'issuer': 'St Elsewhere'},
+        ])
+        self.assertIn(1, errors)
+        self.assertNotIn(2, errors)
+
+
+class ValidationBenchmarkTestCase(TestCase):
+
+    def test_validation_benchmarks_run(self):
+        results = Benchmark(scale=2, repeat=1, models=[SymptomSign], validation_rows=50).run()['results']
+        for name in ('validate.full_clean', 'validate.batch'):
+            self.assertEqual(results[name]['operations'], 50)
+            self.assertGreater(results[name]['seconds'], 0)
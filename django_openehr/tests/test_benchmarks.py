@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.db import connections
+from django.test import TestCase
+
+from django_openehr import audit
+from django_openehr.benchmarks import Benchmark
+from django_openehr.models import AuditEntry, ProblemDiagnosis
+
+
+class BenchmarkTestCase(TestCase):
+
+    def test_on_commit_work_is_run_and_rolled_back(self):
+        written = []
+
+        def write(entries):
+            written.extend(entries)
+            AuditEntry.objects.bulk_create(entries)
+
+        benchmark = Benchmark(scale=3, repeat=1, models=[ProblemDiagnosis], validation_rows=0)
+        with mock.patch.object(audit, 'write', side_effect=write):
+            results = benchmark.run()['results']
+        # insert, read and export each create three problems, which are audited
+        problems = [entry for entry in written if entry.model == 'django_openehr.problemdiagnosis']
+        self.assertEqual(len(problems), 9)
+        self.assertEqual(set(results), {
+            'insert.problemdiagnosis', 'read.problemdiagnosis', 'export.problemdiagnosis',
+            'graph.demographics', 'graph.symptomsign',
+        })
+        self.assertFalse(ProblemDiagnosis.objects.exists())
+        self.assertFalse(AuditEntry.objects.exists())
+
+    def test_set_up_work_is_not_timed(self):
+        benchmark = Benchmark(scale=1, repeat=1, validation_rows=0)
+        connection = connections[benchmark.using]
+        pending = []
+
+        def setup(rng):
+            ProblemDiagnosis.objects.create(problem_diagnosis_name='Asthma')
+            return lambda: pending.append(len(connection.run_on_commit))
+
+        benchmark.measure(setup)
+        # the audit callback of the set up had run before the timed call
+        self.assertEqual(pending, [0])
@@ -0,0 +1,54 @@
+from django.test import TestCase, TransactionTestCase
+
+from django_openehr.bulk import GraphLoader, estimate_size, INSTANCE_OVERHEAD
+from django_openehr.models import DemographicPersonal, Identifier, PersonName
+
+
+def patient(index, **extra):
+    record = {
+        'person_name': [{'given_name': 'Given {0}'.format(index), 'family_name': 'Family {0}'.format(index)}],
+        'identifier': [{'identifier': '{0:010d}'.format(index), 'identifier_type': 'NHS number', 'issuer': 'NHS'}],
+    }
+    record.update(extra)
+    return record
+
+
+class GraphLoaderTestCase(TransactionTestCase):
+
+    def test_links_survive_gaps_in_primary_keys(self):
+        # deleting the newest rows leaves AUTOINCREMENT gaps, so the keys of
+        # the next load are not max(pk) + 1, ...
+        GraphLoader().load([patient(index) for index in range(5)])
+        PersonName.objects.filter(pk__gte=PersonName.objects.order_by('-pk')[1].pk).delete()
+        GraphLoader(batch_size=3).load([patient(index) for index in range(100, 110)])
+        for person in DemographicPersonal.objects.filter(identifier__identifier__gte='0000000100'):
+            number = int(person.identifier.get().identifier)
+            self.assertEqual(
+                [name.given_name for name in person.person_name.all()],
+                ['Given {0}'.format(number)],
+            )
+
+    def test_identifiers_are_reused(self):
+        GraphLoader().load([patient(1), patient(1)])
+        self.assertEqual(Identifier.objects.count(), 1)
+        self.assertEqual(Identifier.objects.get().demographicpersonal_set.count(), 2)
+
+
+class ChunkingTestCase(TestCase):
+
+    def test_memory_budget_measures_every_record(self):
+        small = patient(1)
+        large = patient(2, person_name=[{'given_name': 'x' * 10000}])
+        budget = estimate_size(large) * INSTANCE_OVERHEAD
+        chunks = list(GraphLoader(chunk_size=1000, memory_budget=budget)._chunks(
+            [small] * 3 + [large] + [small] * 3
+        ))
+        for chunk in chunks:
+            self.assertLessEqual(
+                sum(estimate_size(record) * INSTANCE_OVERHEAD for record in chunk), budget
+            )
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 7)
+
+    def test_chunk_size_without_budget(self):
+        chunks = list(GraphLoader(chunk_size=3)._chunks(range(7)))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
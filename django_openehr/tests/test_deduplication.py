@@ -0,0 +1,139 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from django_openehr import deduplication
+from django_openehr.deduplication import Deduplicator, date_of_birth
+from django_openehr.managers import DemographicPersonalQuerySet
+from django_openehr.models import (
+    AddressDetails,
+    DeduplicationRun,
+    DemographicPersonal,
+    DuplicateCandidate,
+    PersonName,
+)
+
+
+class DateOfBirthTestCase(TestCase):
+
+    @override_settings(TIME_ZONE='Europe/London')
+    def test_local_date(self):
+        # 00:30 on 1 June in London is still 31 May in UTC
+        born = datetime.datetime(1980, 5, 31, 23, 30, tzinfo=timezone.utc)
+        self.assertEqual(date_of_birth(born), '1980-06-01')
+
+    def test_naive_and_missing(self):
+        self.assertEqual(date_of_birth(datetime.datetime(1980, 5, 31, 23, 30)), '1980-05-31')
+        self.assertIsNone(date_of_birth(None))
+
+
+class SaveBatchTestCase(TestCase):
+
+    def test_known_pairs_are_not_counted_again(self):
+        a, b, c = [DemographicPersonal.objects.create() for _ in range(3)]
+        run = DeduplicationRun.objects.create()
+        deduplicator = Deduplicator(workers=1)
+        deduplicator.save_batch(run, 'key1', [('key1', 1, [(a.pk, b.pk, 0.9)])], 0.0)
+        deduplicator.save_batch(run, 'key2', [('key2', 2, [(a.pk, b.pk, 0.9), (a.pk, c.pk, 0.8)])], 0.0)
+        run.refresh_from_db()
+        self.assertEqual(DuplicateCandidate.objects.count(), 2)
+        self.assertEqual(run.candidates_found, 2)
+
+    def test_pairs_of_an_earlier_run_are_rescored(self):
+        a, b = [DemographicPersonal.objects.create() for _ in range(2)]
+        deduplicator = Deduplicator(workers=0)
+        first = DeduplicationRun.objects.create()
+        deduplicator.save_batch(first, 'key1', [('key1', 1, [(a.pk, b.pk, 0.8)])], 0.0)
+        second = DeduplicationRun.objects.create()
+        deduplicator.save_batch(second, 'key1', [('key1', 1, [(a.pk, b.pk, 0.95)])], 0.0)
+        candidate = DuplicateCandidate.objects.get()
+        self.assertEqual((candidate.score, candidate.run), (0.95, second))
+        second.refresh_from_db()
+        self.assertEqual(second.candidates_found, 1)
+
+
+class DeduplicatorRunTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        born = datetime.datetime(1980, 3, 4, 12, tzinfo=timezone.utc)
+        people = [
+            ('Ann', 'Smith', born, 'SW1A 1AA'),
+            ('Anne', 'Smyth', born, 'sw1a1aa'),
+            ('Ann', 'Smith', born, None),
+            ('Bob', 'Jones', datetime.datetime(1990, 1, 1, 12, tzinfo=timezone.utc), 'LS1 4AP'),
+            ('Robert', 'Jones', datetime.datetime(1990, 1, 1, 12, tzinfo=timezone.utc), 'LS1 4AP'),
+            ('Carol', 'White', datetime.datetime(1970, 7, 7, 12, tzinfo=timezone.utc), 'M1 1AA'),
+        ]
+        cls.patients = []
+        for given, family, dob, post_code in people:
+            patient = DemographicPersonal.objects.create(date_of_birth=dob, gender='FEMALE')
+            patient.person_name.add(PersonName.objects.create(given_name=given, family_name=family))
+            if post_code:
+                patient.address_details.add(
+                    AddressDetails.objects.create(address_type='RESIDENTIAL', post_code=post_code)
+                )
+            cls.patients.append(patient)
+
+    def pairs(self):
+        return set(DuplicateCandidate.objects.values_list('patient_id', 'duplicate_id'))
+
+    def expected(self):
+        ann, anne, ann_again, bob, robert, _ = [p.pk for p in self.patients]
+        return {(ann, anne), (ann, ann_again), (anne, ann_again), (bob, robert)}
+
+    def test_run(self):
+        run = Deduplicator(workers=0, chunk_size=2, blocks_per_batch=2).run()
+        self.assertEqual(run.phase, 'DONE')
+        self.assertEqual(self.pairs(), self.expected())
+        self.assertEqual(run.candidates_found, 4)
+        self.assertGreater(run.pairs_scored, 0)
+
+    def test_resume_after_interruption(self):
+        reference = Deduplicator(workers=0, chunk_size=2, blocks_per_batch=1).run()
+        DuplicateCandidate.objects.all().delete()
+
+        deduplicator = Deduplicator(workers=0, chunk_size=2, blocks_per_batch=1)
+        save_batch = deduplicator.save_batch
+        calls = []
+
+        def interrupted(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            save_batch(*args)
+
+        with mock.patch.object(deduplicator, 'save_batch', side_effect=interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                deduplicator.run()
+        run = DeduplicationRun.objects.exclude(phase='DONE').get()
+        self.assertEqual((run.phase, run.blocks_scored), ('SCORING', 1))
+
+        resumed = Deduplicator(workers=0, chunk_size=2, blocks_per_batch=1).run()
+        self.assertEqual(resumed.pk, run.pk)
+        self.assertEqual(self.pairs(), self.expected())
+        self.assertEqual(
+            (resumed.blocks_scored, resumed.pairs_scored, resumed.candidates_found),
+            (reference.blocks_scored, reference.pairs_scored, reference.candidates_found),
+        )
+
+    def test_next_run_rescores_and_drops_pairs_not_found_again(self):
+        Deduplicator(workers=0).run()
+        robert = self.patients[4]
+        robert.person_name.update(given_name='Robert', family_name='Grey')
+        PersonName.objects.filter(pk__in=robert.person_name.all()).update(
+            family_name_soundex='G600', family_name_metaphone='KR'
+        )
+        robert.address_details.all().delete()
+        run = Deduplicator(workers=0).run(resume=False)
+        self.assertEqual(self.pairs(), self.expected() - {(self.patients[3].pk, robert.pk)})
+        self.assertEqual(run.candidates_found, 3)
+        self.assertEqual(set(DuplicateCandidate.objects.values_list('run', flat=True)), {run.pk})
+
+    def test_load_records_chunks_the_lookup(self):
+        with mock.patch.object(deduplication, 'IN_CHUNK', 2):
+            with self.assertNumQueries(3 * (1 + len(DemographicPersonalQuerySet.CLUSTER_SLOTS))):
+                records = Deduplicator(workers=0).load_records({p.pk for p in self.patients})
+        self.assertEqual(set(records), {p.pk for p in self.patients})
@@ -0,0 +1,128 @@
+import datetime
+
+from django.db import connection
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from django_openehr import archetypes, documents
+from django_openehr.models import (
+    CompositionDocument,
+    DemographicProfessional,
+    InpatientAdmission,
+    PersonName,
+    ProblemDiagnosis,
+    SymptomSign,
+)
+
+
+def disconnect_signals():
+    for model in archetypes.archetype_models():
+        post_save.disconnect(sender=model, dispatch_uid='openehr_document_save')
+        pre_delete.disconnect(sender=model, dispatch_uid='openehr_document_delete')
+        post_delete.disconnect(sender=model, dispatch_uid='openehr_document_deleted')
+    for through in documents.SLOT_FIELDS:
+        m2m_changed.disconnect(sender=through, dispatch_uid='openehr_document_slot')
+
+
+class DocumentTestCase(TransactionTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        documents.connect_signals()
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect_signals()
+        super().tearDownClass()
+
+    def admission(self, **kwargs):
+        kwargs.setdefault('date_of_admission', timezone.make_aware(datetime.datetime(2019, 7, 1, 9, 30)))
+        return InpatientAdmission.objects.create(**kwargs)
+
+    def test_build(self):
+        admission = self.admission(admission_method='EMERGENCY', source_of_admission='Home')
+        document = documents.get_document(InpatientAdmission, admission.pk)
+        # a British summer time admission is held in UTC
+        self.assertEqual(document['paths'], {
+            'date_of_admission': '2019-07-01T08:30:00+00:00',
+            'admission_method': 'EMERGENCY',
+            'source_of_admission': 'Home',
+        })
+        self.assertEqual(document['composition']['archetype_node_id'], archetypes.archetype_id_for(InpatientAdmission))
+        stored = CompositionDocument.objects.get()
+        self.assertEqual((stored.model, stored.object_id), ('django_openehr.inpatientadmission', admission.pk))
+
+    def test_rebuild_on_slot_change(self):
+        admission = self.admission()
+        referrer = DemographicProfessional.objects.create()
+        admission.referrer_details.add(referrer)
+        self.assertNotIn('Okafor', str(documents.get_document(InpatientAdmission, admission.pk)))
+        name = PersonName.objects.create(given_name='Chidi', family_name='Okafor')
+        referrer.person_name.add(name)
+        self.assertIn('Okafor', str(documents.get_document(InpatientAdmission, admission.pk)))
+        name.family_name = 'Obi'
+        name.save()
+        document = str(documents.get_document(InpatientAdmission, admission.pk))
+        self.assertIn('Obi', document)
+        self.assertNotIn('Okafor', document)
+        referrer.person_name.clear()
+        self.assertNotIn('Obi', str(documents.get_document(InpatientAdmission, admission.pk)))
+
+    def test_delete(self):
+        kept = self.admission()
+        admission = self.admission()
+        self.assertEqual(CompositionDocument.objects.count(), 2)
+        admission.delete()
+        self.assertEqual(
+            list(CompositionDocument.objects.values_list('object_id', flat=True)), [kept.pk]
+        )
+
+    def test_find_documents(self):
+        summer = self.admission(admission_method='EMERGENCY')
+        winter = self.admission(
+            admission_method='ELECTIVE',
+            date_of_admission=timezone.make_aware(datetime.datetime(2019, 12, 1, 9, 30)),
+        )
+
+        def found(**conditions):
+            return set(
+                documents.find_documents(InpatientAdmission, **conditions)
+                .values_list('object_id', flat=True)
+            )
+
+        self.assertEqual(found(admission_method='EMERGENCY'), {summer.pk})
+        # a local time is compared as the UTC time it is stored as
+        self.assertEqual(
+            found(date_of_admission=timezone.make_aware(datetime.datetime(2019, 7, 1, 9, 30))),
+            {summer.pk},
+        )
+        self.assertEqual(found(date_of_admission__gte=datetime.date(2019, 8, 1)), {winter.pk})
+        self.assertEqual(found(date_of_admission__lt='2019-12-01T09:30'), {summer.pk})
+
+    def test_unsupported_paths_are_refused(self):
+        with self.assertRaisesMessage(ValueError, 'only text, coded text and date paths'):
+            documents.find_documents(SymptomSign, severity_rating__gte=5)
+        with self.assertRaisesMessage(ValueError, 'can only be compared exactly'):
+            documents.find_documents(ProblemDiagnosis, severity__gt='MILD')
+        with self.assertRaisesMessage(ValueError, "has no path 'ward'"):
+            documents.find_documents(InpatientAdmission, ward='A')
+        paths = documents.DOCUMENT_PATHS
+        documents.DOCUMENT_PATHS = {'symptomsign': ['severity_rating']}
+        try:
+            with self.assertRaisesMessage(ValueError, 'DecimalField'):
+                documents.create_path_indexes()
+        finally:
+            documents.DOCUMENT_PATHS = paths
+
+    def test_index_use(self):
+        names = documents.create_path_indexes()
+        self.assertIn(documents.index_name('inpatientadmission', 'source_of_admission'), names)
+        sql, params = documents.find_documents(
+            InpatientAdmission, source_of_admission='Home'
+        ).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn(documents.index_name('inpatientadmission', 'source_of_admission'), plan)
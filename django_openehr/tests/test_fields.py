@@ -0,0 +1,163 @@
+import io
+import json
+import re
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.apps import apps
+from django.core.exceptions import FieldError
+from django.db.models import F
+from django.test import TestCase
+
+from django_openehr import aql
+from django_openehr.fields import CodedTextField, check_migrated_storage
+from django_openehr.importers import XSI_TYPE, CanonicalXMLImporter, FlatJSONImporter
+from django_openehr.models import InpatientAdmission, ProblemDiagnosis, SymptomSign
+from django_openehr.serializers import get_serializer
+
+
+def canonical_xml(document, tag='items'):
+    """
+    Canonical JSON -> canonical XML, enough for the importer.
+    """
+    def build(tag, data):
+        elem = ElementTree.Element(tag)
+        for key, value in data.items():
+            if key == '_type':
+                elem.set(XSI_TYPE, value)
+            elif key == 'archetype_node_id':
+                elem.set(key, value)
+            elif isinstance(value, dict):
+                elem.append(build(key, value))
+            elif isinstance(value, list):
+                elem.extend(build(key, v) for v in value)
+            else:
+                ElementTree.SubElement(elem, key).text = str(value)
+        return elem
+    return ElementTree.tostring(build(tag, document))
+
+
+class CodedTextLookupTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.elective = InpatientAdmission.objects.create(admission_method='ELECTIVE')
+        cls.emergency = InpatientAdmission.objects.create(admission_method='EMERGENCY')
+        cls.maternity = InpatientAdmission.objects.create(admission_method='MATERNITY')
+
+    def filter(self, **lookups):
+        return set(InpatientAdmission.objects.filter(**lookups))
+
+    def test_pattern_lookups_match_codes(self):
+        self.assertEqual(self.filter(admission_method__startswith='E'), {self.elective, self.emergency})
+        self.assertEqual(self.filter(admission_method__istartswith='mat'), {self.maternity})
+        self.assertEqual(self.filter(admission_method__icontains='erg'), {self.emergency})
+        self.assertEqual(self.filter(admission_method__endswith='IVE'), {self.elective})
+        self.assertEqual(self.filter(admission_method__iexact='elective'), {self.elective})
+        self.assertEqual(self.filter(admission_method__regex='^E.*CY$'), {self.emergency})
+        self.assertEqual(self.filter(admission_method__contains='X'), set())
+        self.assertEqual(
+            set(InpatientAdmission.objects.exclude(admission_method__startswith='E')), {self.maternity}
+        )
+
+    def test_pattern_is_run_as_in(self):
+        sql = str(InpatientAdmission.objects.filter(admission_method__startswith='E').query)
+        self.assertIn('IN (1, 2)', sql)
+        self.assertNotIn('LIKE', sql)
+
+    def test_expression_is_refused(self):
+        with self.assertRaises(FieldError):
+            self.filter(admission_method__startswith=F('source_of_admission'))
+
+    def test_aql_like(self):
+        result = aql.execute(
+            "SELECT a FROM EHR e CONTAINS ADMIN_ENTRY "
+            "a[openEHR-EHR-ADMIN_ENTRY.inpatient_admission_uk.v1] "
+            "WHERE a/admission_method LIKE 'E%'"
+        )
+        self.assertEqual(set(result), {self.elective, self.emergency})
+
+
+class CodedTextStorageTestCase(TestCase):
+
+    def field(self, **kwargs):
+        field = CodedTextField(choices=ProblemDiagnosis.SEVERITY_CHOICES, **kwargs)
+        field.set_attributes_from_name('severity')
+        field.model = ProblemDiagnosis
+        return field
+
+    def test_storage_survives_reordering(self):
+        storage = {'Mild': 1, 'Moderate': 2, 'Severe': 3}
+        reordered = CodedTextField(choices=ProblemDiagnosis.SEVERITY_CHOICES[::-1], storage=storage)
+        self.assertEqual(reordered.get_prep_value('Severe'), 3)
+        self.assertEqual(reordered.from_db_value(1, None, None), 'Mild')
+
+    def test_storage_is_checked(self):
+        self.assertEqual([e.id for e in self.field().check()], ['django_openehr.E002'])
+        self.assertEqual([e.id for e in self.field(storage={'Mild': 1, 'Moderate': 2}).check()],
+                         ['django_openehr.E003'])
+        self.assertEqual([e.id for e in self.field(storage={'Mild': 1, 'Moderate': 2, 'Severe': 2}).check()],
+                         ['django_openehr.E004'])
+        self.assertEqual(self.field(storage={'Mild': 1, 'Moderate': 2, 'Severe': 3}).check(), [])
+
+    def test_changed_storage_fails_the_checks(self):
+        self.assertEqual(check_migrated_storage(), [])
+        field = ProblemDiagnosis._meta.get_field('severity')
+        swapped = {'Mild': 2, 'Moderate': 1, 'Severe': 3}
+        with mock.patch.object(field, '_storage', swapped), \
+                mock.patch.object(field, '_codes', {i: code for code, i in swapped.items()}):
+            errors = check_migrated_storage()
+        self.assertEqual([e.id for e in errors], ['django_openehr.E005'])
+        self.assertIn('Mild, Moderate', errors[0].msg)
+        # a new code with a new integer is fine
+        added = dict(field._storage, Critical=4)
+        with mock.patch.object(field, '_storage', added), \
+                mock.patch.object(field, '_codes', {i: code for code, i in added.items()}):
+            self.assertEqual(check_migrated_storage(), [])
+
+    def test_every_code_has_an_at_code(self):
+        for model in apps.get_app_config('django_openehr').get_models():
+            for field in model._meta.local_fields:
+                if isinstance(field, CodedTextField):
+                    with self.subTest(field=str(field)):
+                        self.assertEqual(set(field.at_codes), set(field._storage))
+                        self.assertTrue(all(re.match(r'^at\d{4}$', a) for a in field.at_codes.values()))
+                        self.assertEqual(len(set(field.at_codes.values())), len(field.at_codes))
+
+
+class CodedTextRoundTripTestCase(TestCase):
+
+    def test_serializer_writes_the_at_code(self):
+        problem = ProblemDiagnosis(problem_diagnosis_name='Asthma', severity='Mild')
+        items = get_serializer(ProblemDiagnosis).to_canonical(problem)['data']['items']
+        severity = next(item for item in items if item['archetype_node_id'] == 'severity')['value']
+        self.assertEqual(severity['value'], 'Mild')
+        self.assertEqual(severity['defining_code']['code_string'], 'at0047')
+        self.assertEqual(severity['defining_code']['terminology_id']['value'], 'local')
+
+    def test_flat_import_of_an_at_code(self):
+        flat = {
+            'problem_list/problem_diagnosis:0/problem_diagnosis_name': 'Asthma',
+            'problem_list/problem_diagnosis:0/severity|code': 'at0049',
+            'problem_list/problem_diagnosis:0/severity|value': 'Severe',
+            'problem_list/problem_diagnosis:0/diagnostic_certainty|code': 'at0075',
+        }
+        importer = FlatJSONImporter()
+        importer.import_file(io.StringIO(json.dumps(flat) + '\n'))
+        problem = ProblemDiagnosis.objects.get()
+        self.assertEqual((problem.severity, problem.diagnostic_certainty), ('Severe', 'Probable'))
+        self.assertFalse(importer.unmapped)
+
+    def test_canonical_round_trip(self):
+        original = SymptomSign.objects.create(
+            symptom_sign_name='Cough', severity_category='MODERATE', progression='IMPROVING',
+        )
+        document = get_serializer(SymptomSign).to_canonical(original)
+        SymptomSign.objects.all().delete()
+        xml = canonical_xml(document)
+        CanonicalXMLImporter().import_file(io.BytesIO(xml))
+        imported = SymptomSign.objects.get()
+        self.assertEqual(
+            (imported.symptom_sign_name, imported.severity_category, imported.progression),
+            ('Cough', 'MODERATE', 'IMPROVING'),
+        )
@@ -0,0 +1,45 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+
+from django_openehr import graph
+from django_openehr.models import SymptomSign
+
+
+class ReachableTestCase(TestCase):
+
+    def setUp(self):
+        # a ring of six episodes, and a chord from the first to the fourth
+        self.signs = [SymptomSign.objects.create() for _ in range(6)]
+        for a, b in zip(self.signs, self.signs[1:] + self.signs[:1]):
+            a.previous_episodes.add(b)
+        self.signs[0].previous_episodes.add(self.signs[3])
+
+    def pks(self, signs):
+        return sorted(sign.pk for sign in signs)
+
+    def check_depths(self):
+        first = self.signs[0]
+        self.assertEqual(self.pks(first.all_previous_episodes()), self.pks(self.signs[1:]))
+        self.assertEqual(
+            self.pks(first.all_previous_episodes(max_depth=1)),
+            self.pks([self.signs[1], self.signs[3], self.signs[5]])
+        )
+        self.assertEqual(self.pks(first.all_previous_episodes(max_depth=2)), self.pks(self.signs[1:]))
+        self.assertEqual(list(first.all_previous_episodes(max_depth=0)), [])
+
+    def test_cte(self):
+        self.check_depths()
+
+    def test_closure_table(self):
+        graph.rebuild_closure('previous_episodes')
+        with mock.patch.object(graph, 'uses_cte', return_value=False):
+            self.check_depths()
+
+    def test_unbounded_walk_produces_each_node_once(self):
+        sql = graph.REACHABLE_SQL.format(**graph.through_columns('previous_episodes'))
+        with connection.cursor() as cursor:
+            cursor.execute(sql.replace('WHERE node <> %s', ''), [self.signs[0].pk])
+            nodes = [row[0] for row in cursor.fetchall()]
+        self.assertEqual(sorted(nodes), self.pks(self.signs))
@@ -0,0 +1,65 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from django_openehr.identifiers import cache, find_patient_by_identifier
+from django_openehr.models import DemographicPersonal, Identifier
+
+
+class FindPatientByIdentifierTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.patient = DemographicPersonal.objects.create()
+        self.patient.identifier.add(Identifier.objects.create(identifier='abc 123', identifier_type='Hospital No'))
+
+    def test_type_is_normalized_without_the_cache(self):
+        self.assertEqual(find_patient_by_identifier('ABC123', 'hospital no', use_cache=False), self.patient)
+        self.assertEqual(find_patient_by_identifier('abc123', 'HOSPITAL NO.', use_cache=False), self.patient)
+        self.assertIsNone(find_patient_by_identifier('abc123', 'NHS number', use_cache=False))
+
+    def test_result_does_not_depend_on_the_cache(self):
+        primed = find_patient_by_identifier('abc123', 'Hospital No')
+        self.assertEqual(find_patient_by_identifier('abc123', 'hospital no'), primed)
+        self.assertEqual(find_patient_by_identifier('abc123', 'hospital no', use_cache=False), primed)
+
+    def test_missing_issuer_is_unique(self):
+        self.assertEqual(Identifier.objects.get().issuer, '')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Identifier.objects.create(identifier='ABC123', identifier_type='hospital no', issuer=None)
+
+
+class MergeDuplicateIdentifiersMigrationTestCase(TransactionTestCase):
+    before = [('django_openehr', '0006_auto_20180212_1507')]
+    after = [('django_openehr', '0007_auto_20261018_0759')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes('django_openehr'))
+
+    def test_spacing_and_case_duplicates_are_merged(self):
+        old = self.migrate(self.before)
+        Identifier = old.get_model('django_openehr', 'Identifier')
+        DemographicPersonal = old.get_model('django_openehr', 'DemographicPersonal')
+        kept = Identifier.objects.create(identifier='AB 12', identifier_type='NHS', issuer='NHS')
+        duplicate = Identifier.objects.create(identifier='ab12', identifier_type='NHS', issuer='NHS')
+        other = Identifier.objects.create(identifier='ab12', identifier_type='PAS', issuer='NHS')
+        first = DemographicPersonal.objects.create()
+        first.identifier.add(kept, duplicate)
+        second = DemographicPersonal.objects.create()
+        second.identifier.add(duplicate, other)
+
+        new = self.migrate(self.after)
+        Identifier = new.get_model('django_openehr', 'Identifier')
+        DemographicPersonal = new.get_model('django_openehr', 'DemographicPersonal')
+        self.assertEqual(set(Identifier.objects.values_list('pk', flat=True)), {kept.pk, other.pk})
+        self.assertEqual(list(DemographicPersonal.objects.get(pk=first.pk).identifier.values_list('pk', flat=True)),
+                         [kept.pk])
+        self.assertEqual(set(DemographicPersonal.objects.get(pk=second.pk).identifier.values_list('pk', flat=True)),
+                         {kept.pk, other.pk})
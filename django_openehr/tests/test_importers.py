@@ -0,0 +1,117 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from django_openehr.importers import CanonicalXMLImporter, FlatJSONImporter
+from django_openehr.models import DemographicPersonal, Identifier, PersonName, ProblemDiagnosis
+from django_openehr.serializers import get_serializer
+from django_openehr.tests.test_fields import canonical_xml
+
+
+def flat_patient(index):
+    return {
+        'individual_personal/gender|code': 'FEMALE',
+        'individual_personal/person_name:0/given_name': 'Ada',
+        'individual_personal/person_name:0/family_name': 'Family {0}'.format(index),
+        'individual_personal/person_name:1/unstructured_name': 'Ada Family {0}'.format(index),
+        'individual_personal/identifier|id': '{0:010d}'.format(index),
+        'individual_personal/identifier|issuer': 'NHS',
+        'individual_personal/identifier|type': 'NHS number',
+    }
+
+
+def ndjson(*compositions):
+    return io.StringIO(''.join(json.dumps(c) + '\n' for c in compositions))
+
+
+class FlatJSONImporterTestCase(TestCase):
+
+    def test_nested_records(self):
+        report = FlatJSONImporter().import_file(ndjson(flat_patient(1)))
+        self.assertEqual(report.records, 1)
+        patient = DemographicPersonal.objects.get()
+        self.assertEqual(patient.gender, 'FEMALE')
+        self.assertEqual(
+            list(patient.person_name.order_by('pk').values_list('family_name', 'unstructured_name')),
+            [('Family 1', None), (None, 'Ada Family 1')],
+        )
+        identifier = patient.identifier.get()
+        self.assertEqual(
+            (identifier.identifier, identifier.issuer, identifier.identifier_type),
+            ('0000000001', 'NHS', 'NHS number'),
+        )
+
+    def test_batches(self):
+        importer = FlatJSONImporter(batch_size=2)
+        report = importer.import_file(ndjson(*(flat_patient(i) for i in range(5))))
+        self.assertEqual((report.records, report.chunks), (5, 3))
+        self.assertEqual(DemographicPersonal.objects.count(), 5)
+        self.assertEqual(PersonName.objects.count(), 10)
+        self.assertEqual(Identifier.objects.count(), 5)
+
+    def test_unmapped_and_invalid_values_are_counted(self):
+        importer = FlatJSONImporter()
+        importer.import_file(ndjson({
+            'problem_list/problem_diagnosis:0/problem_diagnosis_name': 'Asthma',
+            'problem_list/problem_diagnosis:0/body_site_colour': 'Blue',
+            'problem_list/problem_diagnosis:0/severity|code': 'at9999',
+            'problem_list/comment': 'No archetype',
+        }))
+        self.assertEqual(ProblemDiagnosis.objects.get().severity, None)
+        self.assertEqual(importer.unmapped, {
+            'ProblemDiagnosis/body_site_colour': 1,
+            'ProblemDiagnosis/severity (invalid)': 1,
+            'problem_list/comment': 1,
+        })
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'patients.ndjson')
+            with open(path, 'w') as f:
+                f.write(ndjson(flat_patient(1), flat_patient(2)).getvalue())
+            out = io.StringIO()
+            call_command('import_openehr', path, format='flat', stdout=out)
+        self.assertEqual(DemographicPersonal.objects.count(), 2)
+
+
+class CanonicalXMLImporterTestCase(TestCase):
+
+    def test_round_trip(self):
+        patient = DemographicPersonal.objects.create(gender='MALE')
+        patient.person_name.add(PersonName.objects.create(given_name='George', family_name='Byron'))
+        patient.identifier.add(Identifier.objects.create(
+            identifier='9434765919', issuer='NHS', identifier_type='NHS number',
+        ))
+        document = get_serializer(DemographicPersonal).to_canonical(patient)
+        DemographicPersonal.objects.all().delete()
+        PersonName.objects.all().delete()
+        Identifier.objects.all().delete()
+
+        importer = CanonicalXMLImporter()
+        report = importer.import_file(io.BytesIO(canonical_xml(document, 'composition')))
+        self.assertEqual(report.records, 1)
+        self.assertFalse(importer.unmapped)
+        imported = DemographicPersonal.objects.get()
+        self.assertEqual(imported.gender, 'MALE')
+        name = imported.person_name.get()
+        self.assertEqual((name.given_name, name.family_name), ('George', 'Byron'))
+        self.assertEqual(imported.identifier.get().identifier, '9434765919')
+
+    def test_stream_of_compositions(self):
+        problems = [
+            get_serializer(ProblemDiagnosis).to_canonical(
+                ProblemDiagnosis(problem_diagnosis_name=name, severity='Mild')
+            )
+            for name in ('Asthma', 'Eczema', 'Gout')
+        ]
+        xml = b'<compositions>' + b''.join(canonical_xml(p, 'composition') for p in problems) + b'</compositions>'
+        report = CanonicalXMLImporter(batch_size=2).import_file(io.BytesIO(xml))
+        self.assertEqual((report.records, report.chunks), (3, 2))
+        self.assertEqual(
+            list(ProblemDiagnosis.objects.order_by('pk').values_list('problem_diagnosis_name', 'severity')),
+            [('Asthma', 'Mild'), ('Eczema', 'Mild'), ('Gout', 'Mild')],
+        )
@@ -0,0 +1,48 @@
+import threading
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from django_openehr.instrumentation import QueryBudgetExceeded, track_queries
+from django_openehr.models import SymptomSign
+
+
+class TrackQueriesTestCase(TransactionTestCase):
+
+    def test_reentrant_decorated_calls(self):
+        # each level runs one query, and its nested levels one each
+        @track_queries(budget=4)
+        def count(depth):
+            SymptomSign.objects.count()
+            if depth:
+                count(depth - 1)
+
+        count(3)
+        self.assertEqual(connection.execute_wrappers, [])
+        with self.assertRaises(QueryBudgetExceeded):
+            count(4)
+        self.assertEqual(connection.execute_wrappers, [])
+
+    def test_concurrent_decorated_calls(self):
+        SymptomSign.objects.create()
+        started = threading.Barrier(4)
+        errors = []
+
+        @track_queries(budget=2)
+        def read():
+            started.wait()
+            list(SymptomSign.objects.all())
+            list(SymptomSign.objects.all())
+
+        def run():
+            try:
+                read()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
@@ -0,0 +1,138 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from django_openehr.instrumentation import track_queries
+from django_openehr.managers import DemographicPersonalQuerySet, DemographicProfessionalQuerySet
+from django_openehr.models import (
+    AddressDetails,
+    DemographicPersonal,
+    DemographicProfessional,
+    Identifier,
+    PersonName,
+    TelecomDetails,
+    TherapeuticDirection,
+    TherapeuticDirectionDosage,
+)
+
+
+class WithFullDemographicsTestCase(TestCase):
+
+    def create_patients(self, count):
+        for index in range(count):
+            patient = DemographicPersonal.objects.create()
+            patient.person_name.add(
+                PersonName.objects.create(given_name='Given {0}'.format(index), family_name='Family'),
+                PersonName.objects.create(unstructured_name='Name {0}'.format(index), preferred_name=True),
+            )
+            patient.address_details.add(AddressDetails.objects.create(address_type='RESIDENTIAL', post_code='LS1 1AA'))
+            patient.telecom_details.add(TelecomDetails.objects.create(number='0113 000 0000'), TelecomDetails.objects.create(number='07700 900000'))
+            patient.identifier.add(Identifier.objects.get_or_create(
+                identifier='{0:010d}'.format(index), identifier_type='NHS number'
+            )[0])
+
+    def read_patients(self):
+        for patient in DemographicPersonal.objects.with_full_demographics():
+            for slot in DemographicPersonalQuerySet.CLUSTER_SLOTS:
+                list(getattr(patient, slot).all())
+
+    def test_query_count_is_bounded(self):
+        expected = 1 + len(DemographicPersonalQuerySet.CLUSTER_SLOTS)
+        for count in (1, 10, 30):
+            DemographicPersonal.objects.all().delete()
+            self.create_patients(count)
+            with self.assertNumQueries(expected):
+                self.read_patients()
+
+    def test_no_n_plus_one(self):
+        self.create_patients(20)
+        with track_queries(budget=1 + len(DemographicPersonalQuerySet.CLUSTER_SLOTS), fail_on_n_plus_one=True):
+            self.read_patients()
+
+    def test_professionals(self):
+        for index in range(10):
+            professional = DemographicProfessional.objects.create()
+            professional.person_name.add(PersonName.objects.create(given_name='Given', family_name='Family'))
+            professional.telecom_details.add(TelecomDetails.objects.create())
+            professional.professional_identifier.add(Identifier.objects.create(
+                identifier='G{0:07d}'.format(index), identifier_type='GMC number'
+            ))
+        with self.assertNumQueries(1 + len(DemographicProfessionalQuerySet.CLUSTER_SLOTS)):
+            for professional in DemographicProfessional.objects.with_full_demographics():
+                for slot in DemographicProfessionalQuerySet.CLUSTER_SLOTS:
+                    list(getattr(professional, slot).all())
+
+
+class DailyDoseTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.paracetamol = TherapeuticDirection.objects.create()
+        for sequence, dose in enumerate(['1000', '1000', '500', '500'], 1):
+            TherapeuticDirectionDosage.objects.create(
+                therapeutic_direction=cls.paracetamol, dosage_sequence=sequence,
+                dose_amount_exact=dose, dose_unit='mg',
+            )
+        cls.morphine = TherapeuticDirection.objects.create()
+        TherapeuticDirectionDosage.objects.create(
+            therapeutic_direction=cls.morphine, dosage_sequence=1,
+            dose_amount_range_lower='5', dose_amount_range_upper='10', dose_unit='mg',
+        )
+        TherapeuticDirectionDosage.objects.create(
+            therapeutic_direction=cls.morphine, dosage_sequence=2,
+            dose_amount_exact='10', dose_unit='mg',
+        )
+        TherapeuticDirectionDosage.objects.create(
+            therapeutic_direction=cls.morphine, dosage_sequence=3,
+            dose_amount_exact='2', dose_unit='ml',
+        )
+        cls.undosed = TherapeuticDirection.objects.create()
+
+    def test_daily_doses(self):
+        with self.assertNumQueries(1):
+            rows = list(TherapeuticDirectionDosage.objects.daily_doses())
+        self.assertEqual(rows, [
+            {
+                'therapeutic_direction': self.paracetamol.pk, 'dose_unit': 'mg',
+                'daily_dose_lower': Decimal('3000'), 'daily_dose_upper': Decimal('3000'),
+                'single_dose_min': Decimal('500'), 'single_dose_max': Decimal('1000'),
+                'administrations_per_day': 4,
+            },
+            {
+                'therapeutic_direction': self.morphine.pk, 'dose_unit': 'mg',
+                'daily_dose_lower': Decimal('15'), 'daily_dose_upper': Decimal('20'),
+                'single_dose_min': Decimal('5'), 'single_dose_max': Decimal('10'),
+                'administrations_per_day': 2,
+            },
+            # doses in another unit are never added in
+            {
+                'therapeutic_direction': self.morphine.pk, 'dose_unit': 'ml',
+                'daily_dose_lower': Decimal('2'), 'daily_dose_upper': Decimal('2'),
+                'single_dose_min': Decimal('2'), 'single_dose_max': Decimal('2'),
+                'administrations_per_day': 1,
+            },
+        ])
+
+    def test_daily_doses_grouped_further(self):
+        rows = TherapeuticDirectionDosage.objects.filter(
+            therapeutic_direction=self.paracetamol
+        ).daily_doses('dosage_sequence')
+        self.assertEqual(
+            [(row['dosage_sequence'], row['daily_dose_lower']) for row in rows],
+            [(1, Decimal('1000')), (2, Decimal('1000')), (3, Decimal('500')), (4, Decimal('500'))],
+        )
+
+    def test_with_daily_dose(self):
+        directions = {d.pk: d for d in TherapeuticDirection.objects.with_daily_dose()}
+        paracetamol = directions[self.paracetamol.pk]
+        self.assertEqual(
+            (paracetamol.daily_dose_lower, paracetamol.daily_dose_upper, paracetamol.dose_units),
+            (Decimal('3000'), Decimal('3000'), 1),
+        )
+        self.assertEqual(
+            (paracetamol.single_dose_min, paracetamol.single_dose_max), (Decimal('500'), Decimal('1000'))
+        )
+        # two units, so the totals mean nothing
+        self.assertEqual(directions[self.morphine.pk].dose_units, 2)
+        undosed = directions[self.undosed.pk]
+        self.assertEqual((undosed.daily_dose_lower, undosed.dose_units), (None, 0))
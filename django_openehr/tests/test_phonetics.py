@@ -0,0 +1,88 @@
+from django.test import SimpleTestCase, TestCase
+
+from django_openehr.models import PersonName
+from django_openehr.phonetics import jaro_winkler, metaphone, soundex
+
+
+class SoundexTestCase(SimpleTestCase):
+
+    def test_known_values(self):
+        for name, key in (
+            ('Robert', 'R163'),
+            ('Rupert', 'R163'),
+            ('Rubin', 'R150'),
+            # H and W do not separate letters with the same code
+            ('Ashcraft', 'A261'),
+            ('Ashcroft', 'A261'),
+            # vowels do
+            ('Tymczak', 'T522'),
+            # the first letter's code is not repeated
+            ('Pfister', 'P236'),
+            ('Honeyman', 'H555'),
+            ('Lee', 'L000'),
+            ("O'Hara", 'O600'),
+            ('', ''),
+            (None, ''),
+        ):
+            self.assertEqual(soundex(name), key, name)
+
+
+class MetaphoneTestCase(SimpleTestCase):
+
+    def test_known_values(self):
+        for name, key in (
+            ('Knight', 'NT'),
+            ('Night', 'NT'),
+            ('Gnome', 'NM'),
+            ('Wright', 'RT'),
+            ('Xavier', 'SFR'),
+            ('Thumb', '0M'),
+            ('Smith', 'SM0'),
+            ('Smyth', 'SM0'),
+            ('Philips', 'FLPS'),
+            ('Catherine', 'K0RN'),
+            ('Kathryn', 'K0RN'),
+            ('Edgar', 'ETKR'),
+            ('Judge', 'JJ'),
+            ('Sian', 'XN'),
+            ('', ''),
+        ):
+            self.assertEqual(metaphone(name), key, name)
+
+    def test_max_length(self):
+        self.assertEqual(metaphone('Featherstonehaugh'), 'F0RSTNHK')
+        self.assertEqual(metaphone('Featherstonehaugh', max_length=4), 'F0RS')
+
+
+class JaroWinklerTestCase(SimpleTestCase):
+
+    def test_known_values(self):
+        for a, b, similarity in (
+            ('MARTHA', 'MARHTA', 0.961),
+            ('DWAYNE', 'DUANE', 0.840),
+            ('DIXON', 'DICKSONX', 0.813),
+            # no common prefix, so the Jaro similarity
+            ('JELLYFISH', 'SMELLYFISH', 0.896),
+        ):
+            self.assertAlmostEqual(jaro_winkler(a, b), similarity, places=3)
+            self.assertAlmostEqual(jaro_winkler(b, a), similarity, places=3)
+
+    def test_edge_cases(self):
+        self.assertEqual(jaro_winkler('smith', 'SMITH'), 1.0)
+        self.assertEqual(jaro_winkler('ABC', 'XYZ'), 0.0)
+        self.assertEqual(jaro_winkler('', 'Smith'), 0.0)
+        self.assertEqual(jaro_winkler(None, None), 0.0)
+
+
+class PersonNameKeysTestCase(TestCase):
+
+    def test_keys_are_kept_on_save(self):
+        name = PersonName.objects.create(given_name='Catherine', family_name='Smyth')
+        self.assertEqual(
+            (name.family_name_soundex, name.family_name_metaphone, name.given_name_soundex, name.given_name_metaphone),
+            ('S530', 'SM0', 'C365', 'K0RN'),
+        )
+        name.family_name = 'Knight'
+        name.save()
+        name.refresh_from_db()
+        self.assertEqual((name.family_name_soundex, name.family_name_metaphone), ('K523', 'NT'))
@@ -0,0 +1,134 @@
+import datetime
+from unittest import mock
+
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from django_openehr import archive, rollups
+from django_openehr.models import AdmissionRollup, InpatientAdmission
+
+# 23:30 on 30 June in London, so the hour and the day differ from UTC's
+SUMMER = datetime.datetime(2019, 6, 30, 22, 30, tzinfo=timezone.utc)
+WINTER = datetime.datetime(2019, 12, 1, 9, 15, tzinfo=timezone.utc)
+
+
+def counts(grain=AdmissionRollup.HOUR):
+    return {
+        (rollup.period_start, rollup.admission_method, rollup.source_of_admission): rollup.count
+        for rollup in AdmissionRollup.objects.filter(grain=grain) if rollup.count
+    }
+
+
+def hour(value):
+    return rollups.period_start(value, AdmissionRollup.HOUR)
+
+
+class RollupTestCase(TestCase):
+
+    def test_create(self):
+        InpatientAdmission.objects.create(date_of_admission=SUMMER, admission_method='EMERGENCY')
+        InpatientAdmission.objects.create(date_of_admission=SUMMER, admission_method='EMERGENCY')
+        InpatientAdmission.objects.create(date_of_admission=SUMMER, source_of_admission='Home')
+        # no date, not counted
+        InpatientAdmission.objects.create(admission_method='EMERGENCY')
+        self.assertEqual(counts(), {
+            (hour(SUMMER), 'EMERGENCY', ''): 2,
+            (hour(SUMMER), '', 'Home'): 1,
+        })
+        # the day starts at midnight in London, 23:00 the day before in UTC
+        midnight = datetime.datetime(2019, 6, 29, 23, 0, tzinfo=timezone.utc)
+        self.assertEqual(counts(AdmissionRollup.DAY), {
+            (midnight, 'EMERGENCY', ''): 2,
+            (midnight, '', 'Home'): 1,
+        })
+
+    def test_move_between_methods_and_sources(self):
+        admission = InpatientAdmission.objects.create(date_of_admission=SUMMER, admission_method='ELECTIVE')
+        admission.admission_method = 'TRANSFER'
+        admission.source_of_admission = 'Ward 9'
+        admission.save()
+        self.assertEqual(counts(), {(hour(SUMMER), 'TRANSFER', 'Ward 9'): 1})
+        # loaded afresh, and moved in time
+        admission = InpatientAdmission.objects.get()
+        admission.date_of_admission = WINTER
+        admission.save()
+        self.assertEqual(counts(), {(hour(WINTER), 'TRANSFER', 'Ward 9'): 1})
+        # an unchanged save leaves the rollups alone
+        with CaptureQueriesContext(connection) as queries:
+            admission.save()
+        self.assertFalse([q for q in queries if 'admissionrollup' in q['sql']])
+
+    def test_delete(self):
+        kept, deleted = (
+            InpatientAdmission.objects.create(date_of_admission=SUMMER, admission_method='ELECTIVE')
+            for _ in range(2)
+        )
+        deleted.delete()
+        self.assertEqual(counts(), {(hour(SUMMER), 'ELECTIVE', ''): 1})
+        InpatientAdmission.objects.filter(pk=kept.pk).delete()
+        self.assertEqual(counts(), {})
+
+    def test_archive_and_restore(self):
+        old = InpatientAdmission.objects.create(
+            date_of_admission=timezone.now() - datetime.timedelta(days=1000), admission_method='ELECTIVE',
+        )
+        expected = {(hour(old.date_of_admission), 'ELECTIVE', ''): 1}
+        self.assertEqual(counts(), expected)
+        archive.archive(InpatientAdmission)
+        self.assertFalse(InpatientAdmission.objects.exists())
+        self.assertEqual(counts(), expected)
+        archive.restore(InpatientAdmission)
+        self.assertTrue(InpatientAdmission.objects.exists())
+        self.assertEqual(counts(), expected)
+
+    def test_rebuild_since(self):
+        InpatientAdmission.objects.create(date_of_admission=SUMMER, admission_method='ELECTIVE')
+        InpatientAdmission.objects.create(date_of_admission=WINTER, admission_method='ELECTIVE')
+        # counts gone wrong, e.g. after a bulk load
+        AdmissionRollup.objects.update(count=5)
+        self.assertEqual(rollups.rebuild_rollups(since=WINTER + datetime.timedelta(hours=1)), 2)
+        # rebuilt from the start of the day of `since`, the rest left alone
+        self.assertEqual(counts(), {
+            (hour(SUMMER), 'ELECTIVE', ''): 5,
+            (hour(WINTER), 'ELECTIVE', ''): 1,
+        })
+        self.assertEqual(rollups.rebuild_rollups(), 4)
+        self.assertEqual(counts(), {
+            (hour(SUMMER), 'ELECTIVE', ''): 1,
+            (hour(WINTER), 'ELECTIVE', ''): 1,
+        })
+
+    def test_admissions(self):
+        InpatientAdmission.objects.create(date_of_admission=SUMMER, admission_method='ELECTIVE')
+        InpatientAdmission.objects.create(date_of_admission=SUMMER, admission_method='EMERGENCY')
+        self.assertEqual(rollups.admissions(group_by=()), [{'period_start': hour(SUMMER), 'admissions': 2}])
+        with self.assertRaises(ValueError):
+            rollups.admissions(group_by=['gender'])
+
+
+class RollbackTestCase(TransactionTestCase):
+
+    def failing_add(self):
+        add = rollups.add
+
+        def failing(counted, delta, using):
+            add(counted, delta, using)
+            if delta > 0:
+                raise DatabaseError('disk full')
+
+        return mock.patch.object(rollups, 'add', side_effect=failing)
+
+    def test_failed_rollup_update_rolls_back_the_save(self):
+        # in autocommit, the save is its own transaction
+        admission = InpatientAdmission.objects.create(date_of_admission=SUMMER, admission_method='ELECTIVE')
+        admission.admission_method = 'EMERGENCY'
+        with self.failing_add(), self.assertRaises(DatabaseError):
+            admission.save()
+        self.assertEqual(InpatientAdmission.objects.get().admission_method, 'ELECTIVE')
+        self.assertEqual(counts(), {(hour(SUMMER), 'ELECTIVE', ''): 1})
+        with self.failing_add(), self.assertRaises(DatabaseError):
+            InpatientAdmission.objects.create(date_of_admission=WINTER)
+        self.assertEqual(InpatientAdmission.objects.count(), 1)
+        self.assertEqual(counts(), {(hour(SUMMER), 'ELECTIVE', ''): 1})
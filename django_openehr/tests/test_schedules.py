@@ -0,0 +1,96 @@
+import datetime
+import unittest
+
+from django.test import TestCase
+from django.utils import timezone
+
+from django_openehr import schedules
+from django_openehr.models import TherapeuticDirection, TherapeuticDirectionDosage
+
+
+def local(*args):
+    return timezone.make_aware(datetime.datetime(*args))
+
+
+def utc(*args):
+    return datetime.datetime(*args, tzinfo=timezone.utc)
+
+
+@unittest.skipIf(schedules.np is None, "numpy is not installed")
+class ExpandDirectionsTestCase(TestCase):
+
+    def direction(self, doses, unit='mg', **kwargs):
+        direction = TherapeuticDirection.objects.create(**kwargs)
+        for sequence, dose in enumerate(doses, 1):
+            if isinstance(dose, tuple):
+                amounts = {'dose_amount_range_lower': dose[0], 'dose_amount_range_upper': dose[1]}
+            else:
+                amounts = {'dose_amount_exact': dose}
+            TherapeuticDirectionDosage.objects.create(
+                therapeutic_direction=direction, dosage_sequence=sequence, dose_unit=unit, **amounts
+            )
+        return direction
+
+    def events(self, directions, start, hours, starts=None):
+        return list(schedules.expand_directions(directions, start, hours, starts).events())
+
+    def test_dosages_are_spread_over_the_day(self):
+        direction = self.direction([500, 250, (100, 200)])
+        events = self.events([direction], local(2019, 1, 10, 6, 0), 24)
+        self.assertEqual(events, [
+            (local(2019, 1, 10, 8, 0), (500.0, 500.0), 'mg'),
+            (local(2019, 1, 10, 16, 0), (250.0, 250.0), 'mg'),
+            (local(2019, 1, 11, 0, 0), (100.0, 200.0), 'mg'),
+        ])
+
+    def test_times_are_wall_clock_across_dst(self):
+        direction = self.direction([10])
+        # the clocks go forward at 01:00 UTC on 31 March 2019
+        events = self.events([direction], local(2019, 3, 30, 0, 0), 72)
+        self.assertEqual([time for time, _, _ in events], [
+            utc(2019, 3, 30, 8, 0), utc(2019, 3, 31, 7, 0), utc(2019, 4, 1, 7, 0),
+        ])
+        self.assertEqual({timezone.localtime(time).hour for time, _, _ in events}, {8})
+        # and back at 01:00 UTC on 27 October 2019
+        events = self.events([direction], local(2019, 10, 26, 0, 0), 72)
+        self.assertEqual([time for time, _, _ in events], [
+            utc(2019, 10, 26, 7, 0), utc(2019, 10, 27, 8, 0), utc(2019, 10, 28, 8, 0),
+        ])
+
+    def test_maximum_administrations_count_from_the_start(self):
+        direction = self.direction([1, 1], maximum_administrations=5)
+        window = local(2019, 1, 10, 0, 0)
+        # two administrations, at 08:00 and 20:00 on the 9th, were before the window
+        schedule = schedules.expand_directions(
+            [direction], window, 72, starts={direction.pk: local(2019, 1, 9, 0, 0)}
+        )
+        self.assertEqual(list(schedule.administration), [3, 4, 5])
+        self.assertEqual([time for time, _, _ in schedule.events()], [
+            local(2019, 1, 10, 8, 0), local(2019, 1, 10, 20, 0), local(2019, 1, 11, 8, 0),
+        ])
+        # started in the window, the first five are given
+        schedule = schedules.expand_directions([direction], window, 72)
+        self.assertEqual(list(schedule.administration), [1, 2, 3, 4, 5])
+
+    def test_duration_ends_the_direction(self):
+        direction = self.direction([1], direction_duration_seconds=36 * 60 * 60)
+        events = self.events([direction], local(2019, 1, 10, 0, 0), 96)
+        self.assertEqual([time for time, _, _ in events], [local(2019, 1, 10, 8, 0), local(2019, 1, 11, 8, 0)])
+
+    def test_directions_are_merged_and_totalled_by_unit(self):
+        tablets = self.direction([2, 2], unit='tablet')
+        morphine = self.direction([(5, 10)], unit='mg')
+        schedule = schedules.expand_directions(
+            TherapeuticDirection.objects.all(), local(2019, 1, 10, 0, 0), 48
+        )
+        self.assertEqual(len(schedule), 6)
+        self.assertEqual(list(schedule.time), sorted(schedule.time))
+        self.assertEqual(schedule.totals(), {'mg': (10.0, 20.0), 'tablet': (8.0, 8.0)})
+        self.assertEqual(len(schedule.for_direction(tablets.pk)), 4)
+        self.assertEqual(set(schedule.for_direction(morphine.pk).direction), {morphine.pk})
+
+    def test_no_dosages(self):
+        direction = TherapeuticDirection.objects.create()
+        schedule = schedules.expand_directions([direction], local(2019, 1, 10, 0, 0))
+        self.assertEqual(len(schedule), 0)
+        self.assertEqual(schedule.totals(), {})
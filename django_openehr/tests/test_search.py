@@ -0,0 +1,32 @@
+from django.db import connection
+from django.test import TestCase
+
+from django_openehr import search
+from django_openehr.models import ProblemDiagnosis
+
+
+class SQLiteSearchTestCase(TestCase):
+
+    def setUp(self):
+        # the backend is chosen once per database, by the tables it finds
+        search._backends.clear()
+        if not isinstance(search.get_backend('default'), search.SQLiteSearchBackend):
+            self.skipTest("needs SQLite with FTS5")
+
+    def test_index_follows_saves_and_deletes(self):
+        problem = ProblemDiagnosis.objects.create(clinical_description='wheeze at night')
+        self.assertEqual(list(search.search(ProblemDiagnosis, 'wheezing')), [problem])
+        problem.clinical_description = 'productive cough'
+        problem.save()
+        self.assertEqual(list(search.search(ProblemDiagnosis, 'wheeze')), [])
+        self.assertEqual(list(search.search(ProblemDiagnosis, 'cough')), [problem])
+        problem.delete()
+        self.assertEqual(list(search.search(ProblemDiagnosis, 'cough')), [])
+
+    def test_replacing_a_document_is_a_rowid_lookup(self):
+        table = search.get_backend('default').table(ProblemDiagnosis)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN DELETE FROM {0} WHERE rowid = 1'.format(table))
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        # an FTS5 index string of '=' is a rowid lookup; a bare one is a scan
+        self.assertIn('INDEX 0:=', plan)
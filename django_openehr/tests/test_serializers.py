@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import Permission, User
+from django.core.exceptions import PermissionDenied
+from django.core.management import CommandError, call_command
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+
+from django_openehr import views
+from django_openehr.models import (
+    DemographicPersonal,
+    Identifier,
+    PersonName,
+    ProblemDiagnosis,
+    SymptomSign,
+    TherapeuticDirection,
+    TherapeuticDirectionDosage,
+)
+from django_openehr.serializers import get_serializer
+
+
+def node(items, node_id):
+    return next(item for item in items if item['archetype_node_id'] == node_id)
+
+
+def create_patient(family_name='Lovelace', nhs_number='9434765919'):
+    patient = DemographicPersonal.objects.create(gender='FEMALE')
+    patient.person_name.add(PersonName.objects.create(given_name='Ada', family_name=family_name))
+    patient.identifier.add(Identifier.objects.create(
+        identifier=nhs_number, issuer='NHS', identifier_type='NHS number',
+    ))
+    return patient
+
+
+class SerializerTestCase(TestCase):
+
+    def test_cluster_with_nested_slots(self):
+        patient = create_patient()
+        document = get_serializer(DemographicPersonal).to_canonical(patient)
+        self.assertEqual(document['_type'], 'CLUSTER')
+        self.assertEqual(document['archetype_node_id'], 'openEHR-EHR-CLUSTER.individual_personal_uk.v1')
+        self.assertEqual(document['archetype_details']['rm_version'], '1.0.4')
+        name = node(document['items'], 'openEHR-EHR-CLUSTER.person_name.v1')
+        self.assertEqual(node(name['items'], 'family_name')['value'], {'_type': 'DV_TEXT', 'value': 'Lovelace'})
+        # derived columns, such as the phonetic keys, are not archetype data
+        self.assertEqual([item['archetype_node_id'] for item in name['items']], ['given_name', 'family_name'])
+        self.assertEqual(node(document['items'], 'identifier')['value'], {
+            '_type': 'DV_IDENTIFIER', 'id': '9434765919', 'issuer': 'NHS', 'type': 'NHS number',
+        })
+
+    def test_entry_data_values(self):
+        problem = ProblemDiagnosis(problem_diagnosis_name='Asthma', severity='Mild')
+        document = get_serializer(ProblemDiagnosis).to_canonical(problem)
+        self.assertEqual(document['_type'], 'EVALUATION')
+        items = document['data']['items']
+        self.assertEqual(node(items, 'problem_diagnosis_name')['value']['value'], 'Asthma')
+        self.assertEqual(node(items, 'severity')['value']['_type'], 'DV_CODED_TEXT')
+        # absent optional elements are left out
+        self.assertEqual([item['archetype_node_id'] for item in items], ['problem_diagnosis_name', 'severity'])
+
+    def test_extra_slots_and_quantities(self):
+        direction = TherapeuticDirection.objects.create(maximum_administrations=4)
+        TherapeuticDirectionDosage.objects.create(
+            therapeutic_direction=direction, dosage_sequence=1, dose_amount_exact='2.5', dose_unit='mg',
+        )
+        document = get_serializer(TherapeuticDirection).to_canonical(direction)
+        # a CLUSTER holds its elements directly
+        self.assertEqual(document['_type'], 'CLUSTER')
+        items = document['items']
+        self.assertEqual(node(items, 'maximum_administrations')['value'], {'_type': 'DV_COUNT', 'magnitude': 4})
+        dosage = node(items, 'openEHR-EHR-CLUSTER.dosage.v1')
+        self.assertEqual(node(dosage['items'], 'dose_amount_exact')['value']['magnitude'], 2.5)
+
+    def test_symptom_links_are_references(self):
+        cough = SymptomSign.objects.create(symptom_sign_name='Cough')
+        fever = SymptomSign.objects.create(symptom_sign_name='Fever')
+        cough.associated_symptom_sign.add(fever)
+        document = get_serializer(SymptomSign).to_canonical(cough)
+        reference = node(document['items'], 'associated_symptom_sign')
+        self.assertEqual(reference['value']['_type'], 'DV_EHR_URI')
+        self.assertTrue(reference['value']['value'].endswith('/{0}'.format(fever.pk)))
+
+    def test_stream_prefetches_every_slot(self):
+        for family_name, nhs_number in (('Lovelace', '1'), ('Byron', '2'), ('King', '3')):
+            create_patient(family_name, nhs_number)
+        serializer = get_serializer(DemographicPersonal)
+        expected = 1 + len(serializer.prefetch_paths())
+        # one chunk, plus the query finding that there is no further chunk
+        with self.assertNumQueries(expected + 1):
+            lines = list(serializer.stream(chunk_size=10))
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(line.endswith('\n') for line in lines))
+        self.assertEqual(
+            [json.loads(line)['archetype_node_id'] for line in lines],
+            ['openEHR-EHR-CLUSTER.individual_personal_uk.v1'] * 3,
+        )
+        self.assertEqual(len(list(serializer.stream(chunk_size=2))), 3)
+
+
+class ExportTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user('clinician')
+        ProblemDiagnosis.objects.create(problem_diagnosis_name='Asthma')
+        ProblemDiagnosis.objects.create(problem_diagnosis_name='Eczema')
+
+    def get(self, model_name, **params):
+        request = self.factory.get('/export/{0}.ndjson'.format(model_name), params)
+        request.user = self.user
+        return views.export(request, model_name)
+
+    def test_export_view(self):
+        with self.assertRaises(PermissionDenied):
+            self.get('problemdiagnosis')
+        self.user.user_permissions.add(Permission.objects.get(codename='view_problemdiagnosis'))
+        self.user = User.objects.get(pk=self.user.pk)
+        response = self.get('problemdiagnosis', chunk_size='1')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [node(json.loads(line)['data']['items'], 'problem_diagnosis_name')['value']['value'] for line in lines],
+            ['Asthma', 'Eczema'],
+        )
+        with self.assertRaises(Http404):
+            self.get('auditentry')
+
+    def test_export_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'problems.ndjson')
+            call_command('export_openehr', 'problemdiagnosis', output=path, chunk_size=1)
+            with open(path) as f:
+                self.assertEqual(len(f.readlines()), 2)
+        with self.assertRaises(CommandError):
+            call_command('export_openehr', 'nosuchmodel')
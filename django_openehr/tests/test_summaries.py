@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from django_openehr import summaries
+from django_openehr.models import DemographicPersonal, PatientSummary, PersonName
+
+
+class AutocommitSummaryTestCase(TransactionTestCase):
+
+    def setUp(self):
+        # long enough that the timer never fires during a test
+        self.delay = summaries.queue.delay
+        summaries.queue.delay = 60
+
+    def tearDown(self):
+        summaries.queue.flush()
+        summaries.queue.delay = self.delay
+
+    def test_saves_are_queued_and_rebuilt_together(self):
+        patient = DemographicPersonal.objects.create()
+        name = PersonName.objects.create(given_name='Ada', family_name='Lovelace')
+        # add() runs in a transaction of its own, and is rebuilt as it commits
+        patient.person_name.add(name)
+        summaries.queue.flush()
+        for family_name in ('Byron', 'King'):
+            name.family_name = family_name
+            name.save()
+        self.assertNotIn('King', str(PatientSummary.objects.get(pk=patient.pk).data))
+        self.assertEqual(summaries.queue.pending, {'default': {patient.pk}})
+        self.assertIsNotNone(summaries.queue.timer)
+        self.assertEqual(summaries.queue.flush(), 1)
+        self.assertIsNone(summaries.queue.timer)
+        document = PatientSummary.objects.get(pk=patient.pk).data
+        self.assertEqual(document['patient'], patient.pk)
+        self.assertIn('King', str(document))
+
+    def test_get_summary_rebuilds_a_queued_patient(self):
+        patient = DemographicPersonal.objects.create()
+        self.assertEqual(summaries.get_summary(patient)['patient'], patient.pk)
+        self.assertEqual(summaries.queue.pending, {'default': set()})
+
+    def test_atomic_block_rebuilds_on_commit(self):
+        with transaction.atomic():
+            patient = DemographicPersonal.objects.create()
+        self.assertTrue(PatientSummary.objects.filter(pk=patient.pk).exists())
+        self.assertFalse(summaries.queue.pending)
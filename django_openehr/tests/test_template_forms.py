@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase
+
+from django_openehr.models import (
+    ClinicalSynopsis,
+    DemographicPersonal,
+    InpatientAdmission,
+    PersonName,
+    ProblemDiagnosis,
+)
+from django_openehr.template_forms import IDCR_TRANSFER_OF_CARE, get_template_form
+
+REQUIRED = {
+    'patient-date_of_birth': '1970-01-01 00:00',
+    'name-given_name': 'Ann',
+    'name-family_name': 'Smith',
+    'problem-problem_diagnosis_name': 'Asthma',
+}
+
+
+class TemplateFormTestCase(TestCase):
+
+    def form(self, **data):
+        return get_template_form(IDCR_TRANSFER_OF_CARE)(dict(REQUIRED, **data))
+
+    def test_blank_optional_sections_are_skipped(self):
+        form = self.form()
+        self.assertTrue(form.is_valid(), form.errors)
+        instances = form.save()
+        self.assertIsNone(instances['synopsis'])
+        self.assertIsNone(instances['adverse_reaction'])
+        self.assertFalse(ClinicalSynopsis.objects.exists())
+        self.assertFalse(InpatientAdmission.objects.exists())
+        patient = DemographicPersonal.objects.get()
+        self.assertEqual(list(patient.person_name.all()), [instances['name']])
+        self.assertEqual(ProblemDiagnosis.objects.get().problem_diagnosis_name, 'Asthma')
+
+    def test_filled_optional_section_is_validated_and_saved(self):
+        form = self.form(**{'synopsis-synopsis': 'Stable', 'adverse_reaction-reaction_comment': 'Rash'})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(list(form.errors), ['adverse_reaction'])
+        form = self.form(**{'synopsis-synopsis': 'Stable'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save()['synopsis'].synopsis, 'Stable')
+        self.assertEqual(ClinicalSynopsis.objects.get().synopsis, 'Stable')
+
+    def test_required_sections_are_always_validated(self):
+        form = get_template_form(IDCR_TRANSFER_OF_CARE)({})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(set(form.errors), {'patient', 'name', 'problem'})
+
+    def test_failed_save_leaves_nothing_behind(self):
+        form = self.form(**{'synopsis-synopsis': 'Stable'})
+        self.assertTrue(form.is_valid(), form.errors)
+        with mock.patch.object(ClinicalSynopsis, 'save', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                form.save()
+        self.assertFalse(DemographicPersonal.objects.exists())
+        self.assertFalse(PersonName.objects.exists())
+        self.assertFalse(ProblemDiagnosis.objects.exists())
+
+    def test_commit_false_saves_nothing(self):
+        form = self.form()
+        self.assertTrue(form.is_valid(), form.errors)
+        instances = form.save(commit=False)
+        self.assertIsNone(instances['patient'].pk)
+        self.assertIsNone(instances['synopsis'])
+        self.assertFalse(DemographicPersonal.objects.exists())
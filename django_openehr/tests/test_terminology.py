@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from django_openehr import terminology
+from django_openehr.models import SnomedConcept, SnomedDescription
+
+CONCEPT_HEADER = 'id\teffectiveTime\tactive\tmoduleId\tdefinitionStatusId'
+DESCRIPTION_HEADER = 'id\teffectiveTime\tactive\tmoduleId\tconceptId\tlanguageCode\ttypeId\tterm\tcaseSignificanceId'
+LANGUAGE_HEADER = 'id\teffectiveTime\tactive\tmoduleId\trefsetId\treferencedComponentId\tacceptabilityId'
+GB_ENGLISH = '900000000000508004'
+
+
+class ReleaseLoaderTestCase(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def write_release(self, concepts, descriptions):
+        for name, header, rows in (
+            ('sct2_Concept_Snapshot_INT.txt', CONCEPT_HEADER, concepts),
+            ('sct2_Description_Snapshot-en_INT.txt', DESCRIPTION_HEADER, descriptions),
+        ):
+            with open(os.path.join(self.path, name), 'w', encoding='utf-8') as f:
+                f.write('\n'.join([header] + ['\t'.join(row) for row in rows]) + '\n')
+
+    def description(self, pk, concept, term, effective_time='20260401'):
+        return (pk, effective_time, '1', '1', concept, 'en', str(terminology.SYNONYM), term, '1')
+
+    def test_load_replaces_the_release(self):
+        self.write_release([('22298006', '20260401', '1', '1', '1')],
+                           [self.description('1', '22298006', 'Myocardial infarction')])
+        terminology.load_release(self.path)
+        self.write_release([('195967001', '20260401', '1', '1', '1')],
+                           [self.description('2', '195967001', 'Asthma')])
+        terminology.load_release(self.path)
+        self.assertEqual(list(SnomedConcept.objects.values_list('pk', flat=True)), [195967001])
+        self.assertEqual(list(SnomedDescription.objects.values_list('term', flat=True)), ['Asthma'])
+
+    def test_failed_load_keeps_the_previous_release(self):
+        self.write_release([('22298006', '20260401', '1', '1', '1')],
+                           [self.description('1', '22298006', 'Myocardial infarction')])
+        terminology.load_release(self.path)
+        self.write_release([('195967001', '20260401', '1', '1', '1')], [
+            self.description('2', '195967001', 'Asthma'),
+            self.description('3', '195967001', 'Asthmatic', effective_time='2026'),
+        ])
+        with self.assertRaises(ValueError):
+            terminology.load_release(self.path, batch_size=1)
+        self.assertEqual(list(SnomedConcept.objects.values_list('pk', flat=True)), [22298006])
+        self.assertEqual(
+            list(SnomedDescription.objects.values_list('term', flat=True)), ['Myocardial infarction']
+        )
+
+
+class PrefixIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        concepts = [
+            # (concept, active)
+            ('22298006', '1'), ('1755008', '1'), ('195967001', '1'), ('13645005', '1'),
+            ('155314004', '0'),
+        ]
+        descriptions = [
+            # (id, concept, term, acceptability or None, active, type)
+            ('11', '22298006', 'Myocardial infarction', terminology.PREFERRED, '1', terminology.SYNONYM),
+            ('12', '22298006', 'Heart attack', terminology.ACCEPTABLE, '1', terminology.SYNONYM),
+            ('13', '22298006', 'MI - myocardial infarction', terminology.ACCEPTABLE, '1', terminology.SYNONYM),
+            ('14', '22298006', 'Myocardial infarction (disorder)', terminology.PREFERRED, '1', terminology.FSN),
+            ('21', '1755008', 'Old myocardial infarction', terminology.PREFERRED, '1', terminology.SYNONYM),
+            ('22', '1755008', 'Healed myocardial infarction', terminology.ACCEPTABLE, '1', terminology.SYNONYM),
+            ('31', '195967001', 'Asthma', terminology.PREFERRED, '1', terminology.SYNONYM),
+            ('32', '195967001', 'Asthmatic', None, '1', terminology.SYNONYM),
+            ('33', '195967001', 'Bronchial asthma', terminology.ACCEPTABLE, '0', terminology.SYNONYM),
+            ('41', '13645005', 'Chronic obstructive lung disease', terminology.PREFERRED, '1', terminology.SYNONYM),
+            ('42', '13645005', 'Ménière-like lung disease', terminology.ACCEPTABLE, '1', terminology.SYNONYM),
+            # a retired concept
+            ('51', '155314004', 'Acute myocardial infarction', terminology.PREFERRED, '1', terminology.SYNONYM),
+        ]
+        for name, header, rows in (
+            ('sct2_Concept_Snapshot_INT.txt', CONCEPT_HEADER, [
+                (concept, '20260401', active, '1', '1') for concept, active in concepts
+            ]),
+            ('sct2_Description_Snapshot-en_INT.txt', DESCRIPTION_HEADER, [
+                (pk, '20260401', active, '1', concept, 'en', str(type_id), term, '1')
+                for pk, concept, term, _, active, type_id in descriptions
+            ]),
+            ('der2_cRefset_LanguageSnapshot-en_INT.txt', LANGUAGE_HEADER, [
+                ('a' + pk, '20260401', '1', '1', GB_ENGLISH, pk, str(acceptability))
+                for pk, _, _, acceptability, _, _ in descriptions if acceptability is not None
+            ] + [
+                # acceptable only in a refset which is not configured
+                ('b32', '20260401', '1', '1', '999', '32', str(terminology.PREFERRED)),
+            ]),
+        ):
+            with open(os.path.join(self.path, name), 'w', encoding='utf-8') as f:
+                f.write('\n'.join([header] + ['\t'.join(row) for row in rows]) + '\n')
+        terminology.load_release(self.path)
+        self.index = terminology.PrefixIndex()
+
+    def terms(self, text, limit=10):
+        return [term for _, term in self.index.search(text, limit)]
+
+    def test_only_acceptable_active_synonyms_of_active_concepts(self):
+        self.assertEqual(sorted(self.index.terms), sorted([
+            'Myocardial infarction', 'Heart attack', 'MI - myocardial infarction',
+            'Old myocardial infarction', 'Healed myocardial infarction', 'Asthma',
+            'Chronic obstructive lung disease', 'Ménière-like lung disease',
+        ]))
+        # not in a configured refset, inactive, or of a retired concept
+        self.assertEqual(self.terms('asthma'), ['Asthma'])
+        self.assertNotIn('Acute myocardial infarction', self.terms('acute'))
+
+    def test_ranking(self):
+        # preferred first, then shortest; one term per concept
+        self.assertEqual(self.terms('myoc inf'), ['Myocardial infarction', 'Old myocardial infarction'])
+        self.assertEqual(self.terms('inf'), ['Myocardial infarction', 'Old myocardial infarction'])
+        self.assertEqual(self.terms('infarction healed'), ['Healed myocardial infarction'])
+        self.assertEqual(self.index.search('heart', 1), [(22298006, 'Heart attack')])
+        self.assertEqual(self.terms('myoc', limit=1), ['Myocardial infarction'])
+
+    def test_prefixes(self):
+        self.assertEqual(self.terms('Lung'), ['Chronic obstructive lung disease'])
+        self.assertEqual(self.terms('menie'), ['Ménière-like lung disease'])
+        self.assertEqual(self.terms('ast'), ['Asthma'])
+        # every word has to match, and one letter is too short to search
+        self.assertEqual(self.terms('asthma attack'), [])
+        self.assertEqual(self.terms('a'), [])
+        self.assertEqual(self.terms(''), [])
+        self.assertEqual(self.terms('xyz'), [])
+
+    def test_preferred_flags(self):
+        flags = dict(SnomedDescription.objects.values_list('term', 'preferred'))
+        self.assertTrue(flags['Myocardial infarction'])
+        self.assertFalse(flags['Heart attack'])
+        # a fully specified name is never the preferred synonym
+        self.assertFalse(flags['Myocardial infarction (disorder)'])
+        self.assertFalse(flags['Asthmatic'])
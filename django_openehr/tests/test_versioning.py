@@ -0,0 +1,71 @@
+import datetime
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from django_openehr import versioning
+from django_openehr.models import ArchetypeVersion, ProblemDiagnosis
+
+
+class RecordVersionTestCase(TestCase):
+
+    def test_conflicting_version_is_retried(self):
+        problem = ProblemDiagnosis.objects.create(problem_diagnosis_name='Asthma')
+        current_version = versioning.current_version
+        stale = [None]
+
+        def racing_current_version(*args, **kwargs):
+            # the first read misses the version another save has just written
+            if stale:
+                return stale.pop()
+            return current_version(*args, **kwargs)
+
+        problem.problem_diagnosis_name = 'Severe asthma'
+        with mock.patch.object(versioning, 'current_version', racing_current_version):
+            problem.save()
+        versions = versioning.history(ProblemDiagnosis, problem.pk)
+        self.assertEqual([v.version for v in versions], [1, 2])
+        self.assertEqual(versions[1].change_type, ArchetypeVersion.MODIFICATION)
+
+
+class AsOfTestCase(TestCase):
+
+    def setUp(self):
+        self.problem = ProblemDiagnosis.objects.create(problem_diagnosis_name='Asthma')
+        self.problem.problem_diagnosis_name = 'Severe asthma'
+        self.problem.save()
+        first, second = versioning.history(ProblemDiagnosis, self.problem.pk)
+        # spread the versions out, as saves within a test share a timestamp
+        self.created = timezone.now() - datetime.timedelta(days=2)
+        self.modified = timezone.now() - datetime.timedelta(days=1)
+        ArchetypeVersion.objects.filter(pk=first.pk).update(valid_from=self.created, valid_to=self.modified)
+        ArchetypeVersion.objects.filter(pk=second.pk).update(valid_from=self.modified)
+
+    def name_as_of(self, when):
+        instance = versioning.instance_as_of(ProblemDiagnosis, self.problem.pk, when)
+        return instance and instance.problem_diagnosis_name
+
+    def test_instance_as_of(self):
+        hour = datetime.timedelta(hours=1)
+        self.assertIsNone(self.name_as_of(self.created - hour))
+        self.assertEqual(self.name_as_of(self.created), 'Asthma')
+        self.assertEqual(self.name_as_of(self.modified - hour), 'Asthma')
+        self.assertEqual(self.name_as_of(self.modified), 'Severe asthma')
+        self.problem.delete()
+        self.assertIsNone(self.name_as_of(timezone.now() + hour))
+
+    def test_instances_as_of(self):
+        when = self.modified - datetime.timedelta(hours=1)
+        for pks in (None, [self.problem.pk]):
+            instances = list(versioning.instances_as_of(ProblemDiagnosis, when, pks))
+            self.assertEqual([i.problem_diagnosis_name for i in instances], ['Asthma'])
+
+    def test_versions_as_of_seeks_the_instance_index(self):
+        queryset = versioning.versions_as_of(ProblemDiagnosis, self.modified, [self.problem.pk])
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('model=? AND object_id=? AND valid_from<?', plan)
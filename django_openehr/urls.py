@@ -4,4 +4,8 @@ from . import views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('export/<str:model_name>.ndjson', views.export, name='export'),
+    path('api/<str:model_name>/', views.api_list, name='api_list'),
+    path('api/<str:model_name>/<int:pk>/', views.api_detail, name='api_detail'),
+    path('terminology/snomed/autocomplete', views.snomed_autocomplete, name='snomed_autocomplete'),
 ]
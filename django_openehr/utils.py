@@ -0,0 +1,38 @@
+import base64
+import datetime
+import decimal
+
+
+def chunked_queryset(queryset, chunk_size=1000):
+    """
+    Yield lists of at most `chunk_size` instances from `queryset`, in primary
+    key order.
+
+    Each chunk is its own keyset query (pk > last pk seen), so memory stays
+    flat however large the table is and, unlike QuerySet.iterator(), any
+    prefetch_related() lookups on the queryset are honoured per chunk.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def to_json(value):
+    """
+    A field value as JSON can hold it, without loss: dates and times in ISO
+    8601, decimals as strings and binary data in base64, for the field's
+    to_python() to read back.
+    """
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode('ascii')
+    return value
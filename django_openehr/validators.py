@@ -0,0 +1,170 @@
+import re
+
+from django.core.exceptions import ValidationError
+
+WHITESPACE = re.compile(r'\s+')
+
+# identifier_type is free text, so these are compared after normalize_type()
+NHS_NUMBER_TYPES = ('NHS', 'NHSNUMBER', 'NHSNO')
+
+
+def normalize_identifier(value):
+    """
+    '943 476 5919' -> '9434765919', 'rj1 2345' -> 'RJ12345'
+    """
+    if value is None:
+        return ''
+    return WHITESPACE.sub('', value).upper()
+
+
+def normalize_post_code(value):
+    """
+    'sw1a 1aa' -> 'SW1A1AA'
+    """
+    return normalize_identifier(value)
+
+
+def normalize_type(identifier_type):
+    return re.sub(r'[^A-Z0-9]', '', (identifier_type or '').upper())
+
+
+def is_nhs_number_type(identifier_type):
+    return normalize_type(identifier_type) in NHS_NUMBER_TYPES
+
+
+def nhs_number_is_valid(value):
+    """
+    Modulus 11 check of a ten digit NHS number.
+    """
+    value = normalize_identifier(value)
+    if len(value) != 10 or not value.isdigit():
+        return False
+    total = sum(int(digit) * weight for digit, weight in zip(value[:9], range(10, 1, -1)))
+    check_digit = 11 - (total % 11)
+    if check_digit == 11:
+        check_digit = 0
+    # a check digit of 10 means the number can never be valid
+    return check_digit != 10 and check_digit == int(value[9])
+
+
+def validate_nhs_number(value):
+    if not nhs_number_is_valid(value):
+        raise ValidationError(
+            "%(value)s is not a valid NHS number", params={'value': value}
+        )
+
+
+def validate_identifier(value, identifier_type):
+    """
+    Identifier type specific checks; only NHS numbers carry a check digit.
+    """
+    if is_nhs_number_type(identifier_type):
+        validate_nhs_number(value)
+
+
+# -- cross-field rules ----------------------------------------------------
+#
+# A model's clean() runs the rules in its RULES, and
+# batch_validation.BatchValidator runs the same rule objects over whole
+# columns, so the two cannot disagree: a rule is only ever implemented once,
+# column-wise, and clean() runs it over columns of one row.
+
+def is_present(value):
+    return value is not None and value != ''
+
+
+class Rule(object):
+    """
+    A constraint over several fields of a model.
+    """
+    fields = ()
+
+    def errors(self, columns, size):
+        """
+        {row index: [message, ...]} for the rows of `columns` (field name
+        -> sequence of `size` values) which break the rule.
+        """
+        raise NotImplementedError
+
+    def check(self, instance):
+        columns = {f: [getattr(instance, f)] for f in self.fields}
+        return self.errors(columns, 1).get(0, [])
+
+
+class PresentCountRule(Rule):
+    """
+    Fails the rows where the number of `fields` filled in is invalid().
+    """
+
+    def __init__(self, fields, message):
+        self.fields = tuple(fields)
+        self.message = message.format(", ".join(self.fields))
+
+    def invalid(self, present):
+        raise NotImplementedError
+
+    def errors(self, columns, size):
+        errors = {}
+        for index, values in enumerate(zip(*[columns[f] for f in self.fields])):
+            if self.invalid(sum(1 for value in values if is_present(value))):
+                errors[index] = [self.message]
+        return errors
+
+
+class AtMostOneOf(PresentCountRule):
+
+    def invalid(self, present):
+        return present > 1
+
+
+class NoneOrAtLeastTwoOf(PresentCountRule):
+
+    def invalid(self, present):
+        return present == 1
+
+
+class ValidatorRule(Rule):
+    """
+    Calls validator(*values) for each distinct combination of values of
+    `fields`, and fails the rows with a combination it rejects.
+    """
+
+    def __init__(self, fields, validator):
+        self.fields = tuple(fields)
+        self.validator = validator
+
+    def errors(self, columns, size):
+        errors = {}
+        results = {}
+        for index, values in enumerate(zip(*[columns[f] for f in self.fields])):
+            try:
+                messages = results[values]
+            except KeyError:
+                try:
+                    self.validator(*values)
+                    messages = None
+                except ValidationError as e:
+                    messages = e.messages
+                results[values] = messages
+            except TypeError:
+                # unhashable values
+                try:
+                    self.validator(*values)
+                    messages = None
+                except ValidationError as e:
+                    messages = e.messages
+            if messages:
+                errors[index] = list(messages)
+        return errors
+
+
+def check_rules(instance, rules):
+    """
+    Raise a ValidationError holding the messages of every rule in `rules`
+    which `instance` breaks; for Model.clean().
+    """
+    messages = []
+    for rule in rules:
+        messages.extend(rule.check(instance))
+    if messages:
+        raise ValidationError(messages)
@@ -0,0 +1,302 @@
+"""
+Append-only version history of the archetype models.
+
+Every save or delete of an archetype instance (and of an Identifier, which
+the demographic clusters hold in a slot) appends an ArchetypeVersion: a
+zlib-compressed JSON snapshot of its fields and slot ids, with the interval
+[valid_from, valid_to) in which it was the current version. A save which
+changes nothing appends nothing. Concurrent saves of one instance are
+serialized on its current version row (select_for_update()); where the
+database cannot lock it, the loser of the race hits the unique version
+number and is retried in a savepoint against the winner's version.
+
+Because every version carries its own interval, nothing is ever replayed:
+
+* instance_as_of(SymptomSign, 7, t): the one version with
+  valid_from <= t < valid_to (or valid_to null), an index seek on
+  (model, object_id, valid_from)
+* instances_as_of(ProblemDiagnosis, t): the same interval test as one range
+  scan on (model, valid_from, valid_to), or as one seek per instance on
+  (model, object_id, valid_from) when given their primary keys
+* patient_as_of(patient, t): the patient's version and, per slot, the
+  versions of the clusters it held at t, by primary key
+
+The clinical archetype models carry no link to a patient, so a patient's
+state as of a time is their demographic record and its clusters.
+
+Loaders which bypass save() (the bulk loader and the importers) send no
+signals; run the record_versions command after them to give every instance
+without a history its first version. Set OPENEHR_VERSIONING = False to turn
+versioning off.
+"""
+import json
+import zlib
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils import timezone
+
+from django_openehr import archetypes
+from django_openehr.managers import DemographicPersonalQuerySet
+from django_openehr.models import ArchetypeVersion, DemographicPersonal, Identifier
+from django_openehr.utils import chunked_queryset, to_json
+
+ENABLED = getattr(settings, 'OPENEHR_VERSIONING', True)
+
+VERSIONED_MODELS = archetypes.archetype_models() + [Identifier]
+
+# attempts at appending a version before a conflicting one is given up on
+RETRIES = 3
+
+
+def label(model):
+    return model._meta.label_lower
+
+
+def snapshot(instance):
+    """
+    {'fields': {attname: value}, 'm2m': {slot: [ids]}} for `instance`;
+    prefetched slots are read from the prefetch cache.
+    """
+    opts = instance._meta
+    prefetched = getattr(instance, '_prefetched_objects_cache', {})
+    m2m = {}
+    for field in opts.many_to_many:
+        if field.name in prefetched:
+            ids = [related.pk for related in prefetched[field.name]]
+        else:
+            ids = list(getattr(instance, field.name).values_list('pk', flat=True))
+        m2m[field.name] = sorted(ids)
+    return {
+        'fields': {f.attname: to_json(getattr(instance, f.attname)) for f in opts.concrete_fields},
+        'm2m': m2m,
+    }
+
+
+def compress(data):
+    return zlib.compress(json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+
+
+def build_instance(model, version, using=None):
+    """
+    An unsaved instance of `model` holding the snapshot of `version`, with
+    the slot ids of the snapshot in `versioned_m2m`.
+    """
+    data = version.data
+    instance = model(**{
+        field.attname: field.to_python(data['fields'].get(field.attname))
+        for field in model._meta.concrete_fields
+    })
+    instance._state.db = using
+    instance.versioned_m2m = data['m2m']
+    return instance
+
+
+def current_version(model, pk, using, lock=False):
+    versions = ArchetypeVersion.objects.using(using).filter(
+        model=label(model), object_id=pk, valid_to__isnull=True
+    )
+    if lock:
+        versions = versions.select_for_update()
+    return versions.order_by('-version').first()
+
+
+def record_version(instance, change_type=None, using=None):
+    """
+    Append a version of `instance` unless it matches the current version,
+    and return the current version.
+    """
+    model = type(instance)
+    using = using or router.db_for_write(ArchetypeVersion, instance=instance)
+    # taken once: the slot rows are read outside the retried savepoint
+    packed = None if change_type == ArchetypeVersion.DELETED else compress(snapshot(instance))
+    for attempt in range(RETRIES):
+        try:
+            with transaction.atomic(using=using):
+                return append_version(model, instance.pk, change_type, packed, using)
+        except IntegrityError:
+            # a concurrent save took the version number; read it and retry
+            if attempt == RETRIES - 1:
+                raise
+
+
+def append_version(model, pk, change_type, packed, using):
+    latest = current_version(model, pk, using, lock=True)
+    if change_type == ArchetypeVersion.DELETED:
+        if latest is None or latest.change_type == ArchetypeVersion.DELETED:
+            return latest
+        # the slot rows are gone by now, so the deleted state is the last one
+        packed = bytes(latest.snapshot)
+    elif latest is not None and latest.change_type != ArchetypeVersion.DELETED:
+        if bytes(latest.snapshot) == packed:
+            return latest
+        change_type = ArchetypeVersion.MODIFICATION
+    else:
+        change_type = ArchetypeVersion.CREATION
+    now = timezone.now()
+    if latest is not None:
+        ArchetypeVersion.objects.using(using).filter(pk=latest.pk).update(valid_to=now)
+    return ArchetypeVersion.objects.using(using).create(
+        model=label(model),
+        object_id=pk,
+        version=latest.version + 1 if latest is not None else 1,
+        change_type=change_type,
+        valid_from=now,
+        snapshot=packed,
+    )
+
+
+def history(model, pk, using=None):
+    """
+    Every version of one instance, oldest first.
+    """
+    return ArchetypeVersion.objects.using(using).filter(
+        model=label(model), object_id=pk
+    ).order_by('version')
+
+
+def current_at(when):
+    # valid_from <= when < valid_to, where a null valid_to is still current
+    return Q(valid_from__lte=when) & (Q(valid_to__isnull=True) | Q(valid_to__gt=when))
+
+
+def version_as_of(model, pk, when, using=None):
+    """
+    The version of instance `pk` of `model` current at `when`, or None if it
+    did not exist then or had been deleted.
+    """
+    return (
+        ArchetypeVersion.objects.using(using)
+        .filter(current_at(when), model=label(model), object_id=pk)
+        .exclude(change_type=ArchetypeVersion.DELETED)
+        .order_by('-version')
+        .first()
+    )
+
+
+def versions_as_of(model, when, pks=None, using=None):
+    """
+    The versions of every instance of `model` (or of those in `pks`) current
+    at `when`, excluding deleted ones.
+    """
+    versions = ArchetypeVersion.objects.using(using).filter(
+        current_at(when), model=label(model)
+    ).exclude(change_type=ArchetypeVersion.DELETED)
+    if pks is not None:
+        versions = versions.filter(object_id__in=list(pks))
+    return versions
+
+
+def instance_as_of(model, pk, when, using=None):
+    """
+    Instance `pk` of `model` as it was at `when`, unsaved, or None.
+    """
+    version = version_as_of(model, pk, when, using)
+    if version is None:
+        return None
+    return build_instance(model, version, using)
+
+
+def instances_as_of(model, when, pks=None, using=None):
+    """
+    Yield every instance of `model` (or of those in `pks`) as it was at
+    `when`, in primary key order.
+    """
+    versions = versions_as_of(model, when, pks, using).order_by('object_id')
+    for version in versions.iterator():
+        yield build_instance(model, version, using)
+
+
+def patient_as_of(patient, when, using=None):
+    """
+    (patient, {slot: [cluster, ...]}) as they were at `when`, or None if the
+    patient did not exist then.
+    """
+    pk = getattr(patient, 'pk', patient)
+    instance = instance_as_of(DemographicPersonal, pk, when, using)
+    if instance is None:
+        return None
+    slots = {}
+    for slot in DemographicPersonalQuerySet.CLUSTER_SLOTS:
+        cluster_model = DemographicPersonal._meta.get_field(slot).related_model
+        ids = instance.versioned_m2m.get(slot, [])
+        slots[slot] = list(instances_as_of(cluster_model, when, ids, using)) if ids else []
+    return instance, slots
+
+
+def record_initial_versions(model, using=None, chunk_size=1000):
+    """
+    Give every instance of `model` without a current version its first
+    version, in bulk, and return how many were recorded.
+    """
+    using = using or router.db_for_write(ArchetypeVersion)
+    queryset = model._default_manager.using(using).prefetch_related(
+        *[field.name for field in model._meta.many_to_many]
+    )
+    recorded = 0
+    for chunk in chunked_queryset(queryset, chunk_size):
+        versioned = set(
+            ArchetypeVersion.objects.using(using)
+            .filter(model=label(model), object_id__in=[i.pk for i in chunk], valid_to__isnull=True)
+            .values_list('object_id', flat=True)
+        )
+        now = timezone.now()
+        versions = [
+            ArchetypeVersion(
+                model=label(model),
+                object_id=instance.pk,
+                version=1,
+                change_type=ArchetypeVersion.CREATION,
+                valid_from=now,
+                snapshot=compress(snapshot(instance)),
+            )
+            for instance in chunk if instance.pk not in versioned
+        ]
+        ArchetypeVersion.objects.using(using).bulk_create(versions)
+        recorded += len(versions)
+    return recorded
+
+
+def instance_saved(sender, instance, using, raw=False, **kwargs):
+    # a move to or from the archive is not a new version, see archive
+    if not raw and not getattr(instance, 'archiving', False):
+        record_version(instance, using=using)
+
+
+def instance_deleted(sender, instance, using, **kwargs):
+    if not getattr(instance, 'archiving', False):
+        record_version(instance, ArchetypeVersion.DELETED, using)
+
+
+def slot_changed(sender, instance, action, reverse, model, pk_set, using, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear') and not getattr(instance, 'archiving', False):
+            record_version(instance, using=using)
+        return
+    # reverse: the owners of the slot changed; a clear has to find them first
+    if action == 'pre_clear':
+        instance._versioning_cleared = list(
+            getattr(instance, OWNER_ACCESSORS[sender]).values_list('pk', flat=True)
+        )
+        return
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_versioning_cleared', [])
+    elif action not in ('post_add', 'post_remove'):
+        return
+    for owner in model._default_manager.using(using).filter(pk__in=pk_set):
+        record_version(owner, using=using)
+
+
+# through model -> the reverse accessor from a slot's cluster to its owners
+OWNER_ACCESSORS = {}
+
+if ENABLED:
+    for _model in VERSIONED_MODELS:
+        post_save.connect(instance_saved, sender=_model, dispatch_uid='openehr_version_save')
+        post_delete.connect(instance_deleted, sender=_model, dispatch_uid='openehr_version_delete')
+        for _field in _model._meta.many_to_many:
+            _through = getattr(_model, _field.name).through
+            OWNER_ACCESSORS[_through] = _field.remote_field.get_accessor_name()
+            m2m_changed.connect(slot_changed, sender=_through, dispatch_uid='openehr_version_slot')
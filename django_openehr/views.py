@@ -1,6 +1,77 @@
-from django.shortcuts import render
-from django.http import HttpResponse
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from django_openehr import api, archetypes, terminology
+from django_openehr.serializers import get_serializer
 
 
 def index(request):
     return HttpResponse("Hello, world. You're at the django-openehr index.")
+
+
+def export(request, model_name):
+    """
+    Stream every instance of an archetype model as canonical openEHR JSON,
+    one composition per line (NDJSON).
+    """
+    model = archetypes.model_for_name(model_name)
+    if model is None:
+        raise Http404("No archetype model called {0}".format(model_name))
+    if not request.user.has_perm('{0}.view_{1}'.format(model._meta.app_label, model_name)):
+        raise PermissionDenied
+    try:
+        chunk_size = int(request.GET.get('chunk_size', 1000))
+    except ValueError:
+        chunk_size = 1000
+    serializer = get_serializer(model)
+    response = StreamingHttpResponse(
+        serializer.stream(chunk_size=max(1, min(chunk_size, 10000))),
+        content_type='application/x-ndjson'
+    )
+    response['Content-Disposition'] = 'attachment; filename="{0}.ndjson"'.format(model_name)
+    return response
+
+
+def snomed_autocomplete(request):
+    """
+    SNOMED CT concepts matching a partially typed term, e.g. ?q=myoc+inf
+    """
+    if not request.user.is_authenticated:
+        raise PermissionDenied
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        limit = 10
+    results = terminology.autocomplete(request.GET.get('q', ''), max(1, min(limit, 100)))
+    return JsonResponse({
+        'results': [{'code': str(code), 'term': term} for code, term in results],
+    })
+
+
+@require_GET
+def api_list(request, model_name):
+    """
+    A page of any model, e.g. api/symptomsign/?ordering=-id&limit=100,
+    with a `next` link carrying the cursor of the following page.
+    """
+    model = api.get_model(model_name, request.user)
+    try:
+        page, cursor = api.list_page(model, request.GET)
+    except api.BadRequest as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    next_url = None
+    if cursor is not None:
+        params = request.GET.copy()
+        params['cursor'] = cursor
+        next_url = request.build_absolute_uri('?' + params.urlencode())
+    return JsonResponse({
+        'results': [api.represent(instance) for instance in page],
+        'next': next_url,
+    })
+
+
+@require_GET
+def api_detail(request, model_name, pk):
+    model = api.get_model(model_name, request.user)
+    return JsonResponse(api.represent(api.get_instance(model, pk)))
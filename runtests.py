@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""
+Run the django_openehr test suite against an in-memory SQLite database:
+
+    python runtests.py [test label ...]
+"""
+import os
+import sys
+
+import django
+from django.conf import settings
+from django.test.utils import get_runner
+
+# allow runtests.py to be run from any path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+if __name__ == '__main__':
+    settings.configure(
+        SECRET_KEY='django_openehr tests',
+        INSTALLED_APPS=[
+            'django.contrib.contenttypes',
+            'django.contrib.auth',
+            'django_openehr',
+        ],
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        ROOT_URLCONF='django_openehr.urls',
+        USE_TZ=True,
+        TIME_ZONE='Europe/London',
+    )
+    django.setup()
+    runner = get_runner(settings)()
+    failures = runner.run_tests(sys.argv[1:] or ['django_openehr.tests'])
+    sys.exit(bool(failures))
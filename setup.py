@@ -12,4 +12,8 @@ setup(name='django_openehr',
       author='Open Health Care UK',
       license='MIT',
       packages=find_packages(),
+      extras_require={
+          # dosage schedule expansion, django_openehr.schedules
+          'schedules': ['numpy'],
+      },
       zip_safe=False)